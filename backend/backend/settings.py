@@ -41,6 +41,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres', # Búsqueda de texto completo / trigramas del catálogo local.
     'corsheaders', # CORS: Permite peticiones desde React.
     'rest_framework',
     'core'
@@ -48,6 +49,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware', # CORS: Permite peticiones desde React.
+    'core.middleware.CompressionMiddleware', # brotli (si está instalado) o gzip
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -109,6 +111,170 @@ DATABASES = {
 }
 
 
+# Cliente HTTP compartido (core/services/http_client.py)
+# Pools keep-alive por host, gzip y reintentos con backoff para datos.gob.es, SPARQL e INE.
+HTTP_CLIENT = {
+    "POOL_CONNECTIONS": 10,
+    "POOL_MAXSIZE": 20,
+    "CONNECT_TIMEOUT": 5,
+    "READ_TIMEOUT": 30,
+    "RETRIES": 3,
+    "BACKOFF_FACTOR": 0.5,
+    "ASYNC_MAX_CONNECTIONS": 500,   # cliente aiohttp de las vistas ASGI (/api/async/...)
+    "ASYNC_LIMIT_PER_HOST": 200,
+    "HOSTS": {
+        "servicios.ine.es": {"POOL_MAXSIZE": 30},
+    },
+}
+
+
+# Caché de respuestas remotas (core/utils/dataset_cache.py)
+# BACKEND: "locmem" (LRU en proceso), "filesystem" (disco con límites) o "django" (CACHES).
+DATASET_CACHE = {
+    "BACKEND": "filesystem",
+    "DIRECTORY": BASE_DIR / "core" / "data" / "cache",
+    "MAX_ENTRIES": 2000,
+    "MAX_BYTES": 256 * 1024 * 1024,
+    "SERIALIZER": "json",
+    "COMPRESS": True,
+    "DEFAULT_TTL": 60 * 60,
+    "STALE_TTL": 24 * 60 * 60,
+    "TTLS": {
+        "search_title": 60 * 60,
+        "search_keyword": 60 * 60,
+        "search_spatial": 6 * 60 * 60,
+        "search_category": 6 * 60 * 60,
+        "search_sparql": 60 * 60,
+        "analyze": {"TTL": 5 * 60, "STALE_TTL": 0},
+        "ine_metadata": {"TTL": 7 * 24 * 60 * 60, "STALE_TTL": 30 * 24 * 60 * 60},
+        "ine_metadata_miss": {"TTL": 5 * 60, "STALE_TTL": 0},   # fallos de metadatos: se reintenta a los 5 min
+        # pasado el TTL se revalida con If-None-Match / If-Modified-Since
+        "distribution_links": {"TTL": 6 * 60 * 60, "STALE_TTL": 30 * 24 * 60 * 60},
+        "chart_data": {"TTL": 30 * 60, "STALE_TTL": 0},
+        "correlation": {"TTL": 60 * 60, "STALE_TTL": 0},
+        # modelos ajustados por tabla; se invalidan serie a serie por la huella de sus datos
+        "forecast_models": {"TTL": 30 * 24 * 60 * 60, "STALE_TTL": 0},
+    },
+}
+
+# Perfilado completo de /dataset/analyze/?profile=1 (core/services/column_profiler.py)
+DATASET_PROFILE = {
+    "BATCH_ROWS": 10000,
+    "MAX_BYTES": 2 * 1024 ** 3,
+    "KLL_K": 200,
+    "HLL_PRECISION": 14,
+    "TOP_K": 10,
+}
+
+# Metadatos de tablas del INE (SERIES_TABLA/TABLAS_OPERACION), cacheados en "ine_metadata"
+INE_METADATA = {
+    "ENABLED": True,
+    "TIMEOUT": 30,
+}
+
+# Búsquedas con all_pages=1 (NDJSON, core/services/search_fanout.py)
+SEARCH_FANOUT = {
+    "CONCURRENCY": 4,
+    "RATE": 5.0,        # peticiones/s hacia datos.gob.es por proceso
+    "MAX_PAGES": 50,
+    "MAX_FAILURES": 2,  # páginas fallidas seguidas antes de dejar de pedir más
+}
+
+# Análisis por lotes (/process-datasets/, core/services/batch_analysis.py)
+BATCH_ANALYSIS = {
+    "MAX_ITEMS": 50,
+    "CONCURRENCY": 8,       # distribuciones analizándose a la vez por petición
+    "ITEM_TIMEOUT": 120,    # segundos; pasado el plazo el elemento se da por fallido (504)
+}
+
+# Almacén columnar local de distribuciones (/dataset/materialize/, ?materialize=1,
+# core/services/columnar_store.py)
+COLUMNAR_STORE = {
+    "ENABLED": True,
+    "AUTO": False,              # True: profile=1 materializa sin pedirlo
+    "MAX_BYTES": 2 * 1024 ** 3,
+    "MAX_ENTRIES": 200,
+    "TTL": 24 * 60 * 60,
+}
+
+# Datos de gráficos agregados/reducidos en el servidor (/dataset/chart-data/, core/services/chart_data.py)
+CHART_DATA = {
+    "WIDTH": 800,           # puntos por serie por defecto (≈ ancho del gráfico en píxeles)
+    "MAX_WIDTH": 5000,
+    "METHOD": "lttb",       # lttb | minmax | none
+    "MAX_SERIES": 20,
+}
+
+# Correlación entre series (/correlation/, core/services/correlation.py)
+CORRELATION = {
+    "MAX_SOURCES": 20,
+    "MAX_SERIES": 500,      # series en total (una tabla del INE aporta todas las suyas)
+    "MAX_LAG": 24,
+    "MIN_PERIODS": 3,
+}
+
+# Predicción de series del INE (/forecast/, core/services/forecasting.py)
+FORECAST = {
+    "PROCESSES": None,      # pool de ajuste; None = os.cpu_count()
+    "MIN_PARALLEL": 8,      # menos ajustes pendientes que esto: en el propio proceso
+    "CHUNK_SIZE": 8,
+    "MAX_SERIES": 500,
+    "MAX_HORIZON": 60,
+}
+
+# Índice geográfico y geometrías simplificadas (core/services/geo_index.py,
+# geo_shapes.py; se construyen con python manage.py build_geo_index)
+GEO = {
+    "ZOOMS": [4, 6, 8, 10],     # un TopoJSON por capa y zoom
+    "DEFAULT_ZOOM": 6,
+    "PIXEL_TOLERANCE": 0.5,     # error de simplificación en píxeles de cada zoom
+}
+
+# Resolución de páginas de distribución (/distribution/resolve/, core/services/distribution_resolver.py)
+DISTRIBUTION_RESOLVER = {
+    "CONCURRENCY": 8,       # páginas a la vez por petición
+    "VALIDATE": True,       # HEAD de cada enlace candidato (Content-Type)
+    "HEAD_CONCURRENCY": 8,
+    "MAX_URLS": 50,
+}
+
+# Cola de análisis en segundo plano (/jobs/, core/services/analysis_jobs.py)
+ANALYSIS_JOBS = {
+    "PROCESSES": 2,         # python manage.py run_analysis_worker
+    "HEARTBEAT_INTERVAL": 2.0,
+    "STALE_AFTER": 120,     # s sin latido -> el trabajo se reencola
+    "KEEP_DAYS": 7,
+}
+
+# Búsqueda SPARQL con cursor (/search/sparql/, core/services/sparql_search.py)
+SPARQL_SEARCH = {
+    "PAGE_SIZE": 50,
+    "MAX_PAGE_SIZE": 500,
+    "PREFETCH": True,
+}
+
+# Instantánea de las estadísticas de la Home (core/services/stats_snapshot.py,
+# manage.py refresh_stats_snapshot). Con SCHEDULER los workers web la refrescan cada INTERVAL s.
+STATS_SNAPSHOT = {
+    "ENABLED": True,
+    "SCHEDULER": True,
+    "INTERVAL": 15 * 60,
+}
+
+# Índice local del catálogo (core/models.py, manage.py harvest_catalog).
+# Con datos, las búsquedas se sirven desde PostgreSQL; vacío o desactivado, desde la API.
+CATALOG_INDEX = {
+    "ENABLED": True,
+    "CHECK_TTL": 60,
+}
+
+# Coalescencia de peticiones idénticas concurrentes (core/utils/single_flight.py)
+SINGLE_FLIGHT = {
+    "LOCK_DIR": BASE_DIR / "core" / "data" / "locks",
+    "WAIT_TIMEOUT": 90,
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -2,3 +2,27 @@
 from django.contrib import admin
 
 # Register your models here.
+from core.models import AnalysisJob, Dataset, Distribution, Keyword, StatsSnapshot, Theme
+
+
+@admin.register(Dataset)
+class DatasetAdmin(admin.ModelAdmin):
+    list_display = ("title", "publisher", "modified")
+    search_fields = ("title", "uri")
+
+
+admin.site.register(Distribution)
+admin.site.register(Keyword)
+admin.site.register(Theme)
+
+
+@admin.register(StatsSnapshot)
+class StatsSnapshotAdmin(admin.ModelAdmin):
+    list_display = ("key", "version", "changed_at", "refreshed_at", "last_error")
+
+
+@admin.register(AnalysisJob)
+class AnalysisJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "status", "created_at", "rows_parsed", "bytes_read", "worker")
+    list_filter = ("status",)
+    exclude = ("result",)
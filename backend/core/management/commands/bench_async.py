@@ -0,0 +1,145 @@
+# core/management/commands/bench_async.py
+# Benchmark: vistas síncronas (WSGI, pool de hilos) vs vistas async (ASGI, un event loop)
+# contra un upstream simulado local con latencia fija.
+#
+#   python manage.py bench_async --requests 400 --latency 0.2 --wsgi-threads 8 --asgi-concurrency 400
+import asyncio
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client, override_settings
+from django.test.utils import setup_test_environment
+
+from core.services import async_http_client, search_datasets
+from core.utils import dataset_cache
+
+
+class MockUpstream:
+    """Servidor HTTP/1.1 keep-alive mínimo sobre asyncio, en un hilo propio."""
+
+    def __init__(self, latency: float, items: int = 20):
+        self.latency = latency
+        body = {"result": {"items": [{"_about": f"https://datos.gob.es/catalogo/ds-{i}", "title": f"Dataset {i}"}
+                                     for i in range(items)]}}
+        self.body = json.dumps(body).encode("utf-8")
+        self.port = None
+        self._loop = None
+        self._ready = threading.Event()
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                while True:
+                    header = await reader.readline()
+                    if header in (b"\r\n", b"\n", b""):
+                        break
+                await asyncio.sleep(self.latency)
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    + f"Content-Length: {len(self.body)}\r\n\r\n".encode("ascii")
+                    + self.body
+                )
+                await writer.drain()
+        except (ConnectionResetError, BrokenPipeError):
+            pass
+        finally:
+            writer.close()
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        server = self._loop.run_until_complete(
+            asyncio.start_server(self._handle, "127.0.0.1", 0, backlog=2048)
+        )
+        self.port = server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+        self._ready.wait()
+        return f"http://127.0.0.1:{self.port}"
+
+
+def _summary(label, latencies, wall):
+    lat = sorted(latencies)
+    p99 = lat[min(len(lat) - 1, int(0.99 * len(lat)))]
+    return {
+        "mode": label,
+        "requests": len(lat),
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(lat) / wall, 1),
+        "p50_ms": round(statistics.median(lat) * 1000, 1),
+        "p99_ms": round(p99 * 1000, 1),
+    }
+
+
+class Command(BaseCommand):
+    help = "Compara throughput y latencia p99 de las búsquedas sync (WSGI) vs async (ASGI) contra un upstream simulado."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=400)
+        parser.add_argument("--latency", type=float, default=0.2, help="Latencia del upstream simulado (s)")
+        parser.add_argument("--wsgi-threads", type=int, default=8, help="Hilos del worker WSGI simulado")
+        parser.add_argument("--asgi-concurrency", type=int, default=400, help="Peticiones en vuelo en el worker ASGI")
+
+    def handle(self, *args, **opts):
+        setup_test_environment()  # permite el host 'testserver' del cliente de test
+        upstream = MockUpstream(opts["latency"]).start()
+        search_datasets.API_BASE = upstream
+        n = opts["requests"]
+
+        # Caché en memoria, consultas únicas y sin índice local: cada petición llega al upstream
+        with override_settings(DATASET_CACHE={"BACKEND": "locmem"}, CATALOG_INDEX={"ENABLED": False}):
+            dataset_cache._backend = None
+            sync_result = self._bench_sync(n, opts["wsgi_threads"])
+            async_result = self._bench_async(n, opts["asgi_concurrency"])
+        dataset_cache._backend = None
+
+        self.stdout.write(json.dumps([sync_result, async_result], indent=2))
+        speedup = async_result["throughput_rps"] / max(sync_result["throughput_rps"], 1e-9)
+        self.stdout.write(self.style.SUCCESS(f"Throughput async/sync: x{speedup:.1f}"))
+
+    def _bench_sync(self, n, threads):
+        local = threading.local()
+
+        def one(i):
+            client = getattr(local, "client", None)
+            if client is None:
+                client = local.client = Client()
+            t0 = time.perf_counter()
+            resp = client.get("/api/search/title/", {"title": f"sync-{i}"})
+            assert resp.status_code == 200, resp.content[:200]
+            return time.perf_counter() - t0
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            latencies = list(pool.map(one, range(n)))
+        return _summary(f"sync WSGI ({threads} threads)", latencies, time.perf_counter() - start)
+
+    def _bench_async(self, n, concurrency):
+        async def run():
+            client = AsyncClient()
+            sem = asyncio.Semaphore(concurrency)
+
+            async def one(i):
+                async with sem:
+                    t0 = time.perf_counter()
+                    resp = await client.get("/api/async/search/title/", {"title": f"async-{i}"})
+                    assert resp.status_code == 200, resp.content[:200]
+                    return time.perf_counter() - t0
+
+            start = time.perf_counter()
+            latencies = await asyncio.gather(*(one(i) for i in range(n)))
+            wall = time.perf_counter() - start
+            await async_http_client.aclose_session()
+            return latencies, wall
+
+        latencies, wall = asyncio.run(run())
+        return _summary(f"async ASGI (1 loop, {concurrency} in flight)", latencies, wall)
@@ -0,0 +1,112 @@
+# core/management/commands/bench_columnar_store.py
+# Benchmark: análisis en frío (descarga + parseo, y materialización) vs en
+# caliente (tabla columnar local) de la misma distribución, servida por un
+# upstream local con latencia y ancho de banda simulados.
+#
+#   python manage.py bench_columnar_store --rows 200000 --latency 0.2 --bandwidth 20
+import json
+import random
+import shutil
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from core.services.dataset_analyzer import analyze_distribution_url, materialize_distribution
+
+
+def synthetic_csv(n_rows: int, seed: int = 0) -> bytes:
+    """CSV tipo portal: fecha, provincia, sexo, código con ceros, valor con huecos."""
+    rnd = random.Random(seed)
+    provinces = [f"Provincia {i}" for i in range(52)]
+    lines = ["fecha;provincia;sexo;codigo;valor;tasa"]
+    for i in range(n_rows):
+        value = "" if rnd.random() < 0.02 else str(rnd.randint(0, 100000))
+        lines.append(f"{2000 + i % 24}-{i % 12 + 1:02d}-01;{rnd.choice(provinces)};{rnd.choice(['H', 'M', 'T'])};"
+                     f"{rnd.randint(1, 52):02d}001;{value};{rnd.random() * 100:.3f}")
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def serve(body: bytes, latency: float, bandwidth_mb: float):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            self.send_response(200)   # ignora Range: el sondeo sigue leyendo la misma respuesta
+            self.send_header("Content-Type", "text/csv")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            step = 64 * 1024
+            try:
+                for i in range(0, len(body), step):
+                    self.wfile.write(body[i:i + step])
+                    if bandwidth_mb:
+                        time.sleep(step / (bandwidth_mb * 1024 * 1024))
+            except (BrokenPipeError, ConnectionResetError):
+                pass   # el muestreo cierra la conexión al tener sus filas
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _timed(fn, repeat=1):
+    best, result = None, None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        wall = time.perf_counter() - t0
+        best = wall if best is None else min(best, wall)
+    return result, round(best, 4)
+
+
+class Command(BaseCommand):
+    help = "Compara el análisis en frío (red + parseo) con el análisis sobre la tabla columnar materializada."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=200000)
+        parser.add_argument("--latency", type=float, default=0.2, help="Segundos por petición al upstream")
+        parser.add_argument("--bandwidth", type=float, default=20.0, help="MB/s del upstream (0 = sin límite)")
+        parser.add_argument("--sample-rows", type=int, default=5000)
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **opts):
+        body = synthetic_csv(opts["rows"])
+        server = serve(body, opts["latency"], opts["bandwidth"])
+        url = f"http://127.0.0.1:{server.server_address[1]}/bench.csv"
+        directory = tempfile.mkdtemp(prefix="bench-columnar-")
+        results = {"rows": opts["rows"], "source_bytes": len(body)}
+        try:
+            with override_settings(COLUMNAR_STORE={"DIRECTORY": directory, "ENABLED": False}):
+                _, results["cold_sample_s"] = _timed(
+                    lambda: analyze_distribution_url(url, "csv", sample_rows=opts["sample_rows"]), opts["repeat"])
+                _, results["cold_profile_s"] = _timed(
+                    lambda: analyze_distribution_url(url, "csv", sample_rows=opts["sample_rows"], profile=True))
+
+            with override_settings(COLUMNAR_STORE={"DIRECTORY": directory, "ENABLED": True}):
+                table, results["materialize_s"] = _timed(lambda: materialize_distribution(url, "csv", force=True))
+                results["materialized_bytes"] = table.meta["bytes"]
+                results["column_kinds"] = {c["name"]: c["kind"] for c in table.meta["columns"]}
+                warm, results["warm_sample_s"] = _timed(
+                    lambda: analyze_distribution_url(url, "csv", sample_rows=opts["sample_rows"]), opts["repeat"])
+                _, results["warm_profile_s"] = _timed(
+                    lambda: analyze_distribution_url(url, "csv", sample_rows=opts["sample_rows"], profile=True))
+                _, results["warm_groupby_s"] = _timed(
+                    lambda: table.to_frame(["provincia", "valor"]).groupby("provincia", observed=True)["valor"].sum(),
+                    opts["repeat"])
+                results["warm_round_trips"] = warm["upstream_round_trips"]
+        finally:
+            server.shutdown()
+            shutil.rmtree(directory, ignore_errors=True)
+
+        self.stdout.write(json.dumps(results, indent=2))
+        self.stdout.write(self.style.SUCCESS(
+            f"Muestra de {opts['sample_rows']} filas: x{results['cold_sample_s'] / max(results['warm_sample_s'], 1e-9):.1f}; "
+            f"perfil completo: x{results['cold_profile_s'] / max(results['warm_profile_s'], 1e-9):.1f} "
+            f"(materializar: {results['materialize_s']:.2f}s una vez)"
+        ))
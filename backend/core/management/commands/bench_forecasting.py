@@ -0,0 +1,95 @@
+# core/management/commands/bench_forecasting.py
+# Benchmark: predicción de todas las series de una tabla grande del INE
+# (sintética, con la forma de DATOS_TABLA) en frío secuencial, en frío con el
+# pool de procesos, en caliente (modelos de la caché) y con un 10% de series
+# con datos nuevos (sólo esas se reajustan).
+#
+#   python manage.py bench_forecasting --series 200 --points 240 --processes 4
+import json
+import math
+import random
+import time
+
+import pandas as pd
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from core.services import forecasting
+from core.services.ine_api_service import normalize_ine_data
+
+
+def synthetic_table(n_series: int, n_points: int, seed: int = 0):
+    """Series mensuales tendencia + estacionalidad + ruido, Fecha en ms (medianoche local)."""
+    rnd = random.Random(seed)
+    stamps = pd.date_range("2000-01-01", periods=n_points, freq="MS", tz="Europe/Madrid")
+    fechas = [int(s.timestamp() * 1000) for s in stamps]
+    raw = []
+    for i in range(n_series):
+        level, slope, amp = rnd.uniform(50, 500), rnd.uniform(-0.2, 0.5), rnd.uniform(2, 30)
+        raw.append({"COD": f"BENCH{i}", "Nombre": f"Serie sintética {i}", "Data": [
+            {"Fecha": f, "Anyo": s.year, "Valor": round(level + slope * t + amp * math.sin(2 * math.pi * t / 12)
+                                                        + rnd.gauss(0, amp / 4), 2)}
+            for t, (f, s) in enumerate(zip(fechas, stamps))
+        ]})
+    return raw
+
+
+def _timed(fn):
+    t0 = time.perf_counter()
+    result = fn()
+    return result, round(time.perf_counter() - t0, 3)
+
+
+class Command(BaseCommand):
+    help = "Mide la predicción por lotes (secuencial, pool de procesos y caché de modelos) sobre una tabla sintética."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--series", type=int, default=200)
+        parser.add_argument("--points", type=int, default=240)
+        parser.add_argument("--model", default="ets", choices=forecasting.forecast_models.MODELS)
+        parser.add_argument("--horizon", type=int, default=12)
+        parser.add_argument("--processes", type=int, default=None, help="Procesos del pool (por defecto cpu_count)")
+        parser.add_argument("--changed", type=float, default=0.1, help="Fracción de series con un dato nuevo")
+
+    def handle(self, *args, **opts):
+        raw = synthetic_table(opts["series"], opts["points"])
+        data = normalize_ine_data(raw)
+        labels, series = data["labels"], data["series"]
+        options = forecasting.normalize_options(opts["model"], opts["horizon"], None)
+        table_id = f"BENCH-{time.time_ns()}"
+        results = {"series": len(series), "points": len(labels), "model": options["model"]}
+
+        sequential = {**forecasting.DEFAULTS, "PROCESSES": 1, "MAX_SERIES": len(series)}
+        pooled = {**sequential, "PROCESSES": opts["processes"]}
+        try:
+            with override_settings(FORECAST=sequential):
+                _, results["cold_sequential_s"] = _timed(
+                    lambda: forecasting.forecast_series(table_id, labels, series, options, refit=True))
+            with override_settings(FORECAST=pooled):
+                conf = forecasting.get_config()
+                results["processes"] = conf["PROCESSES"]
+                forecasting.forecast_series(table_id, labels, series[:conf["MIN_PARALLEL"]], options,
+                                            refit=True, conf=conf)   # arranque de los procesos, fuera de la medida
+                _, results["cold_pool_s"] = _timed(
+                    lambda: forecasting.forecast_series(table_id, labels, series, options, refit=True, conf=conf))
+                warm, results["warm_cached_s"] = _timed(
+                    lambda: forecasting.forecast_series(table_id, labels, series, options, conf=conf))
+                results["warm_from_cache"] = warm["stats"]["from_cache"]
+
+                changed = max(1, int(len(series) * opts["changed"]))
+                updated = [{**s, "data": s["data"][:-1] + [(s["data"][-1] or 0) + 1.0]} if i < changed else s
+                           for i, s in enumerate(series)]
+                partial, results["partial_refit_s"] = _timed(
+                    lambda: forecasting.forecast_series(table_id, labels, updated, options, conf=conf))
+                results["partial_refitted"] = partial["stats"]["refitted"]
+                results["errors"] = partial["stats"]["errors"]
+        finally:
+            forecasting.shutdown_pool()
+
+        self.stdout.write(json.dumps(results, indent=2))
+        self.stdout.write(self.style.SUCCESS(
+            f"Pool ({results['processes']} procesos): x{results['cold_sequential_s'] / max(results['cold_pool_s'], 1e-9):.1f}; "
+            f"caché de modelos: x{results['cold_sequential_s'] / max(results['warm_cached_s'], 1e-9):.1f}; "
+            f"{results['partial_refitted']} series reajustadas: x"
+            f"{results['cold_sequential_s'] / max(results['partial_refit_s'], 1e-9):.1f}"
+        ))
@@ -0,0 +1,141 @@
+# core/management/commands/bench_ine_normalizer.py
+# Benchmark: normalize_ine_data anterior (listas, dateutil, una pasada por
+# columna) vs la versión columnar, sobre respuestas sintéticas de
+# wstempus DATOS_TABLA (series x periodos).
+#
+#   python manage.py bench_ine_normalizer --shapes 100x120 2000x300 --sample-rows 80
+import calendar
+import json
+import random
+import time
+
+from dateutil import parser as dateparser
+from django.core.management.base import BaseCommand, CommandError
+
+from core.services.ine_api_service import _infer_type, normalize_ine_data
+
+
+def synthetic_table(n_series, n_periods, seed=0, missing=0.03):
+    """Respuesta tipo DATOS_TABLA: Fecha en epoch-ms, FK_Periodo/Anyo y algún hueco."""
+    rnd = random.Random(seed)
+    out = []
+    for s in range(n_series):
+        data = []
+        for k in range(n_periods):
+            if rnd.random() < missing:
+                continue
+            year, month = 2000 + k // 12, k % 12 + 1
+            data.append({
+                "Fecha": calendar.timegm((year, month, 1, 0, 0, 0)) * 1000,
+                "FK_TipoDato": 1,
+                "FK_Periodo": month,
+                "Anyo": year,
+                "Valor": None if rnd.random() < 0.01 else round(rnd.random() * 1000, 2),
+                "Secreto": False,
+            })
+        out.append({"COD": f"SYN{s}", "Nombre": f"Provincia {s % 52}. Sexo {s % 3}. Serie {s}.",
+                    "FK_Unidad": 1, "FK_Escala": 1, "Data": data})
+    return out
+
+
+def legacy_normalize(raw_series):
+    """Implementación anterior de normalize_ine_data (referencia del benchmark)."""
+    labels = []
+    for serie in raw_series:
+        for punto in serie.get("Data", []):
+            fecha = punto.get("Fecha")
+            if fecha not in labels:
+                labels.append(fecha)
+    try:
+        labels.sort(key=lambda x: dateparser.parse(str(x)))
+    except Exception:
+        labels.sort()
+
+    series_data = []
+    for serie in raw_series:
+        valores_map = {}
+        for p in serie.get("Data", []):
+            val = p.get("Valor")
+            try:
+                val = float(str(val).replace(",", ".")) if val not in (None, "") else None
+            except Exception:
+                val = None
+            valores_map[p.get("Fecha")] = val
+        series_data.append({"name": serie.get("Nombre", "Sin nombre"),
+                            "data": [valores_map.get(f, None) for f in labels]})
+
+    cols = []
+    for serie in raw_series:
+        for p in serie.get("Data", []):
+            for k in p.keys():
+                if k not in cols:
+                    cols.append(k)
+
+    schema = []
+    for c in cols:
+        muestras = [p.get(c, "") for serie in raw_series for p in serie.get("Data", [])]
+        muestras = [m for m in muestras if m not in (None, "")]
+        tipo = "string"
+        if muestras:
+            tipos = [_infer_type(v) for v in muestras[:20]]
+            if tipos.count("numeric") / len(tipos) > 0.8:
+                tipo = "numeric"
+            elif tipos.count("datetime") / len(tipos) > 0.8:
+                tipo = "datetime"
+        schema.append({"name": c, "inferred_type": tipo})
+
+    rows = []
+    for serie in raw_series:
+        for p in serie.get("Data", []):
+            rows.append({c: (", ".join(map(str, p.get(c, ""))) if isinstance(p.get(c, ""), list) else p.get(c, ""))
+                         for c in cols})
+    return {"schema": schema, "sample_rows": rows, "items_count": len(rows), "labels": labels, "series": series_data}
+
+
+def _timed(fn, repeat):
+    best, result = None, None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        wall = time.perf_counter() - t0
+        best = wall if best is None else min(best, wall)
+    return result, best
+
+
+class Command(BaseCommand):
+    help = "Compara la normalización INE anterior con la columnar sobre tablas sintéticas."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--shapes", nargs="+", default=["100x120", "1000x240", "3000x300"],
+                            help="Tamaños SERIESxPERIODOS")
+        parser.add_argument("--sample-rows", type=int, default=80, help="Puntos de muestra por serie (max_rows)")
+        parser.add_argument("--repeat", type=int, default=3)
+        parser.add_argument("--skip-legacy", action="store_true", help="No ejecutar la versión anterior")
+
+    def handle(self, *args, **opts):
+        results = []
+        for shape in opts["shapes"]:
+            try:
+                n_series, n_periods = (int(x) for x in shape.lower().split("x"))
+            except ValueError:
+                raise CommandError(f"Tamaño no válido: {shape} (usa SERIESxPERIODOS)")
+            raw = synthetic_table(n_series, n_periods)
+            points = sum(len(s["Data"]) for s in raw)
+            row = {"series": n_series, "periods": n_periods, "points": points}
+
+            full, row["columnar_full_s"] = _timed(lambda: normalize_ine_data(raw), opts["repeat"])
+            _, row["columnar_sample_s"] = _timed(
+                lambda: normalize_ine_data(raw, max_rows=opts["sample_rows"]), opts["repeat"])
+            if not opts["skip_legacy"]:
+                legacy, row["legacy_s"] = _timed(lambda: legacy_normalize(raw), 1)
+                row["same_output"] = json.dumps(legacy, sort_keys=True) == json.dumps(full, sort_keys=True)
+            results.append({k: round(v, 4) if isinstance(v, float) else v for k, v in row.items()})
+
+        self.stdout.write(json.dumps(results, indent=2))
+        for r in results:
+            if "legacy_s" in r:
+                self.stdout.write(self.style.SUCCESS(
+                    f"{r['series']}x{r['periods']} ({r['points']} puntos): "
+                    f"x{r['legacy_s'] / max(r['columnar_full_s'], 1e-9):.1f} (todas las filas), "
+                    f"x{r['legacy_s'] / max(r['columnar_sample_s'], 1e-9):.1f} (muestra de {opts['sample_rows']})"
+                ))
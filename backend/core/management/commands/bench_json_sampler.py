@@ -0,0 +1,132 @@
+# core/management/commands/bench_json_sampler.py
+# Benchmark: muestreo JSON completo (resp.json() + slicing) vs streaming
+# (stream_samplers.stream_json_sample) sobre ficheros sintéticos grandes
+# servidos por un servidor HTTP local.
+#
+#   python manage.py bench_json_sampler --sizes-mb 50 200 --layout items --rows 80
+import functools
+import json
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+from core.services import http_client
+from core.services.dataset_analyzer import find_first_list_in_json, sample_json_from_url
+
+
+def _record(i):
+    return {
+        "id": i,
+        "municipio": f"Municipio {i % 8131}",
+        "provincia": "Comunidad de Madrid" if i % 3 else "Andalucía",
+        "fecha": f"20{10 + i % 14}-{1 + i % 12:02d}-01",
+        "valor": round(i * 1.37, 2),
+        "etiquetas": ["open-data", "sintético"],
+    }
+
+
+def write_synthetic_json(path, size_mb, layout):
+    """
+    Escribe un JSON de ~size_mb MB. layout:
+      list     -> [ {...}, ... ]
+      items    -> {"meta": {...}, "items": [ ... ]}
+      fallback -> {"meta": {...}, "registros": [ ... ]}   (sin clave preferida)
+    """
+    target = size_mb * 1024 * 1024
+    key = {"items": "items", "fallback": "registros"}.get(layout)
+    written = 0
+    with open(path, "w", encoding="utf-8") as f:
+        if key:
+            head = '{"meta": {"fuente": "benchmark", "version": 1}, "%s": [' % key
+        else:
+            head = "["
+        f.write(head)
+        written += len(head)
+        i = 0
+        while written < target:
+            chunk = ",".join(json.dumps(_record(j), ensure_ascii=False) for j in range(i, i + 1000))
+            f.write(("," if i else "") + chunk)
+            written += len(chunk.encode("utf-8")) + 1
+            i += 1000
+        f.write("]}" if key else "]")
+    return i
+
+
+def _measure(fn):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    try:
+        result = fn()
+    finally:
+        wall = time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return result, wall, peak
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = "Compara tiempo, bytes descargados y pico de memoria del muestreo JSON completo vs streaming."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes-mb", type=int, nargs="+", default=[50, 200])
+        parser.add_argument("--layout", choices=["list", "items", "fallback"], default="items")
+        parser.add_argument("--rows", type=int, default=80)
+        parser.add_argument("--skip-full", action="store_true", help="No ejecutar la variante resp.json()")
+
+    def handle(self, *args, **opts):
+        with tempfile.TemporaryDirectory() as tmp:
+            server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(_QuietHandler, directory=tmp))
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            base = f"http://127.0.0.1:{server.server_address[1]}"
+            results = []
+            try:
+                for size_mb in opts["sizes_mb"]:
+                    name = f"synthetic-{size_mb}mb-{opts['layout']}.json"
+                    records = write_synthetic_json(os.path.join(tmp, name), size_mb, opts["layout"])
+                    file_size = os.path.getsize(os.path.join(tmp, name))
+                    url = f"{base}/{name}"
+                    results.extend(self._bench_file(url, size_mb, records, file_size, opts))
+            finally:
+                server.shutdown()
+
+        self.stdout.write(json.dumps(results, indent=2))
+        for full, stream in zip(results[::2], results[1::2]):
+            if full["mode"] != "full":
+                continue
+            self.stdout.write(self.style.SUCCESS(
+                f"{stream['size_mb']} MB ({stream['layout']}): tiempo full/stream x{full['wall_s'] / max(stream['wall_s'], 1e-9):.1f}, "
+                f"pico de memoria {full['peak_mb']} MB -> {stream['peak_mb']} MB"
+            ))
+
+    def _bench_file(self, url, size_mb, records, file_size, opts):
+        n = opts["rows"]
+        out = []
+        common = {"size_mb": size_mb, "file_bytes": file_size, "records": records, "layout": opts["layout"]}
+
+        if not opts["skip_full"]:
+            def full():
+                resp = http_client.get(url)
+                data = resp.json()
+                arr = find_first_list_in_json(data) or []
+                return [item if isinstance(item, dict) else {"value": item} for item in arr[:n]], len(resp.content)
+
+            (rows, downloaded), wall, peak = _measure(full)
+            out.append({**common, "mode": "full", "rows": len(rows), "bytes_downloaded": downloaded,
+                        "wall_s": round(wall, 3), "peak_mb": round(peak / 2 ** 20, 1)})
+
+        info = {}
+        rows, wall, peak = _measure(lambda: sample_json_from_url(url, max_rows=n, info=info))
+        out.append({**common, "mode": "stream", "rows": len(rows), "bytes_downloaded": info.get("bytes_downloaded"),
+                    "json_path": info.get("json_path"), "peak_buffer_bytes": info.get("peak_buffer_bytes"),
+                    "wall_s": round(wall, 3), "peak_mb": round(peak / 2 ** 20, 2)})
+        return out
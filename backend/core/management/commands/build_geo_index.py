@@ -0,0 +1,77 @@
+# core/management/commands/build_geo_index.py
+# Construye el índice geográfico (nombres y códigos INE -> ids canónicos) y las
+# geometrías simplificadas por zoom a partir de un fichero de límites (GeoJSON,
+# shapefile, GeoPackage... de IGN/CNIG o INE). Ver core/services/geo_index.py
+# y core/services/geo_shapes.py.
+#
+#   python manage.py build_geo_index                                  # sólo el índice básico
+#   python manage.py build_geo_index --file municipios.gpkg --level mun \
+#       --code-field CODIGOINE --name-field NAMEUNIT --parents        # municipios + provincias + comunidades
+#   python manage.py build_geo_index --file provincias.geojson --level prov --name-field name
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.services import geo_index, geo_shapes
+
+
+class Command(BaseCommand):
+    help = "Genera el índice de nombres/códigos geográficos y las topologías simplificadas por zoom."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--file", help="Fichero de límites (cualquier formato que lea geopandas)")
+        parser.add_argument("--level", choices=geo_index.LEVELS, default="prov")
+        parser.add_argument("--code-field", help="Columna con el código INE (se usan sus últimas cifras)")
+        parser.add_argument("--name-field", help="Columna con el nombre (si no hay código, se busca en el índice)")
+        parser.add_argument("--parents", action="store_true",
+                            help="Generar también los niveles superiores uniendo las geometrías")
+        parser.add_argument("--zooms", help="Zooms separados por comas (por defecto GEO['ZOOMS'])")
+        parser.add_argument("--reset", action="store_true", help="Partir del índice básico (descarta municipios guardados)")
+
+    def handle(self, *args, **opts):
+        started = time.perf_counter()
+        index = geo_index.GeoIndex.seed() if opts["reset"] else geo_index.get_index()
+        if not opts["file"]:
+            path = geo_index.save_index(index)
+            self.stdout.write(self.style.SUCCESS(f"Índice con {len(index.records)} entradas en {path}"))
+            return
+        if not (opts["code_field"] or opts["name_field"]):
+            raise CommandError("Indica --code-field y/o --name-field")
+        try:
+            zooms = [int(z) for z in opts["zooms"].split(",")] if opts["zooms"] else None
+        except ValueError:
+            raise CommandError("--zooms debe ser una lista de enteros (4,6,8)")
+
+        try:
+            frame = geo_shapes.read_boundaries(opts["file"])
+            level = opts["level"]
+            features, unresolved = geo_shapes.features_from_frame(
+                frame, level, index, opts["code_field"], opts["name_field"])
+            if unresolved:
+                self.stderr.write(f"{len(unresolved)} filas sin id: {', '.join(map(str, unresolved[:10]))}")
+            if level == "mun":
+                for geo_id, name, _ in features:
+                    index.add(geo_id, name, "mun", f"prov:{geo_id[4:6]}")
+            path = geo_index.save_index(index)
+            self.stdout.write(f"Índice: {len(index.records)} entradas, {len(index.names)} claves ({path})")
+
+            layers = [(level, features)]
+            while opts["parents"] and layers[-1][0] != "ccaa":
+                parent_level = geo_index.LEVELS[geo_index.LEVELS.index(layers[-1][0]) - 1]
+                layers.append((parent_level, geo_shapes.parent_features(layers[-1][1], index)))
+
+            source = {"file": os.path.basename(opts["file"]), "code_field": opts["code_field"],
+                      "name_field": opts["name_field"]}
+            geojson_bytes = len(frame.to_json().encode("utf-8"))
+            for layer, layer_features in layers:
+                entry = geo_shapes.write_layer(layer, layer_features, {**source, "derived": layer != level}, zooms)
+                self.stdout.write(f"Capa {layer}: {json.dumps(entry['zooms'])}")
+        except geo_shapes.GeoShapesError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(features)} geometrías de '{level}' en {time.perf_counter() - started:.1f}s "
+            f"(GeoJSON original: {geojson_bytes / 1024:.0f} KB)"
+        ))
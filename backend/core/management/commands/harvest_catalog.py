@@ -0,0 +1,55 @@
+# core/management/commands/harvest_catalog.py
+# Vuelca el catálogo de datos.gob.es a las tablas locales (core/models.py)
+# para que las búsquedas se sirvan desde PostgreSQL.
+#
+#   python manage.py harvest_catalog                               # SPARQL, todo el catálogo
+#   python manage.py harvest_catalog --page-size 500 --max-pages 4
+#   python manage.py harvest_catalog --source dump --file catalogo.json
+import itertools
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Dataset
+from core.services import catalog_harvest
+
+
+class Command(BaseCommand):
+    help = "Vuelca el catálogo (SPARQL o un volcado JSON de la API) al índice local de búsqueda."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--source", choices=["sparql", "dump"], default="sparql")
+        parser.add_argument("--file", help="Volcado JSON de la API (con --source dump)")
+        parser.add_argument("--page-size", type=int, default=1000, help="Datasets por página/lote")
+        parser.add_argument("--max-pages", type=int, default=None)
+        parser.add_argument("--timeout", type=float, default=60, help="Timeout de cada consulta SPARQL (s)")
+        parser.add_argument("--skip-themes", action="store_true", help="No actualizar etiquetas de temáticas")
+
+    def handle(self, *args, **opts):
+        if opts["source"] == "dump" and not opts["file"]:
+            raise CommandError("--source dump necesita --file")
+
+        start = time.perf_counter()
+        if not opts["skip_themes"]:
+            try:
+                self.stdout.write(f"Temáticas: {catalog_harvest.sync_theme_labels()}")
+            except Exception as e:
+                self.stderr.write(f"No se pudieron obtener las etiquetas de temáticas: {e}")
+
+        if opts["source"] == "sparql":
+            batches = catalog_harvest.iter_sparql_records(opts["page_size"], opts["max_pages"], opts["timeout"])
+        else:
+            records = catalog_harvest.iter_dump_records(opts["file"])
+            batches = iter(lambda: list(itertools.islice(records, opts["page_size"])), [])
+            if opts["max_pages"] is not None:
+                batches = itertools.islice(batches, opts["max_pages"])
+
+        total = 0
+        for n, batch in enumerate(batches, start=1):
+            total += catalog_harvest.store_records(batch)
+            self.stdout.write(f"Lote {n}: {total} datasets ({time.perf_counter() - start:.1f}s)")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} datasets volcados en {time.perf_counter() - start:.1f}s "
+            f"({Dataset.objects.count()} en el índice)"
+        ))
@@ -0,0 +1,30 @@
+# core/management/commands/refresh_stats_snapshot.py
+# Materializa las estadísticas SPARQL de la Home en StatsSnapshot (para cron o
+# si el planificador en proceso está desactivado).
+#
+#   python manage.py refresh_stats_snapshot
+#   python manage.py refresh_stats_snapshot --only total_datasets --only-stale
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.services import stats_snapshot
+
+
+class Command(BaseCommand):
+    help = "Refresca la instantánea local de las estadísticas del catálogo (SPARQL)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--only", nargs="+", choices=list(stats_snapshot.SNAPSHOTS),
+                            help="Claves a refrescar (por defecto todas)")
+        parser.add_argument("--only-stale", action="store_true",
+                            help="Saltar las instantáneas refrescadas hace menos de INTERVAL segundos")
+
+    def handle(self, *args, **opts):
+        start = time.perf_counter()
+        results = stats_snapshot.refresh_all(opts["only"], only_stale=opts["only_stale"])
+        for key, result in results.items():
+            self.stdout.write(f"{key}: {result}")
+        if any(r.startswith("error") for r in results.values()):
+            raise CommandError("Alguna instantánea no se pudo refrescar")
+        self.stdout.write(self.style.SUCCESS(f"Instantáneas refrescadas en {time.perf_counter() - start:.1f}s"))
@@ -0,0 +1,94 @@
+# core/management/commands/run_analysis_worker.py
+# Workers de la cola de análisis (AnalysisJob): un proceso por worker, que se
+# relanza si muere; el proceso padre reencola los trabajos huérfanos y purga
+# los antiguos. Ctrl+C / SIGTERM: los workers terminan el trabajo en curso
+# (hasta --grace segundos) y salen.
+#
+#   python manage.py run_analysis_worker --processes 4
+#   python manage.py run_analysis_worker --once      # vacía la cola en este proceso y sale
+#
+# Los procesos se crean con "spawn" (igual en Linux, macOS y Windows), así que
+# este módulo no importa modelos al cargarse: el hijo configura Django primero.
+import logging
+import multiprocessing
+import signal
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+def _worker_main(stop):
+    import django
+    django.setup()
+    from core.services import analysis_jobs
+
+    # La parada la gobierna el padre a través de `stop`
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    analysis_jobs.work(stop)
+
+
+class Command(BaseCommand):
+    help = "Procesa la cola de análisis en segundo plano (/api/jobs/analyze/)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, help="Procesos worker (por defecto ANALYSIS_JOBS['PROCESSES'])")
+        parser.add_argument("--once", action="store_true", help="Procesar lo pendiente en este proceso y salir")
+        parser.add_argument("--grace", type=float, default=30.0,
+                            help="Segundos de espera a los trabajos en curso al parar")
+
+    def handle(self, *args, **opts):
+        from core.services import analysis_jobs
+
+        conf = analysis_jobs.get_config()
+        analysis_jobs.recover_stale()
+        if opts["once"]:
+            done = analysis_jobs.work(threading.Event(), once=True)
+            self.stdout.write(self.style.SUCCESS(f"{done} trabajos procesados"))
+            return
+
+        ctx = multiprocessing.get_context("spawn")
+        stop = ctx.Event()
+        n = max(1, opts["processes"] or conf["PROCESSES"])
+        workers = [None] * n
+
+        def shutdown(*_):
+            # No se toca `stop` aquí: el hilo principal puede estar dentro de stop.wait()
+            raise KeyboardInterrupt
+
+        signal.signal(signal.SIGTERM, shutdown)
+
+        self.stdout.write(f"Arrancando {n} workers de análisis")
+        last_maintenance = 0.0
+        try:
+            while not stop.is_set():
+                for i, proc in enumerate(workers):
+                    if proc is None or not proc.is_alive():
+                        if proc is not None:
+                            logger.warning("Worker %s terminó (código %s); se relanza", proc.name, proc.exitcode)
+                        connections.close_all()   # el hijo abre sus propias conexiones
+                        workers[i] = ctx.Process(target=_worker_main, args=(stop,), name=f"analysis-worker-{i}")
+                        workers[i].start()
+                if time.monotonic() - last_maintenance >= conf["STALE_AFTER"] / 2:
+                    recovered = analysis_jobs.recover_stale()
+                    purged = analysis_jobs.purge_finished()
+                    if any(recovered.values()) or purged:
+                        logger.info("Mantenimiento de la cola: %s, %s purgados", recovered, purged)
+                    last_maintenance = time.monotonic()
+                stop.wait(conf["POLL_INTERVAL"] * 5)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            stop.set()
+            deadline = time.monotonic() + opts["grace"]
+            for proc in workers:
+                if proc is not None:
+                    proc.join(max(deadline - time.monotonic(), 0))
+                    if proc.is_alive():
+                        # El trabajo en curso se queda sin latido y recover_stale lo reencola
+                        proc.terminate()
+                        proc.join()
+        self.stdout.write(self.style.SUCCESS("Workers detenidos"))
@@ -0,0 +1,86 @@
+# core/middleware.py
+# Compresión de respuestas: brotli si el cliente lo acepta y el paquete
+# `brotli` está instalado (opcional), gzip en el resto de casos. Las
+# respuestas en streaming (NDJSON de all_pages, process-datasets) van con
+# gzip en un único miembro con Z_SYNC_FLUSH tras cada trozo: el cliente puede
+# descomprimir cada línea en cuanto llega (compress_sequence de Django no
+# vacía el compresor hasta el final y retendría todo el stream).
+import zlib
+
+from django.middleware.gzip import GZipMiddleware, re_accepts_gzip
+from django.utils.cache import patch_vary_headers
+from django.utils.regex_helper import _lazy_re_compile
+
+try:
+    import brotli
+except ImportError:  # sin brotli: sólo gzip
+    brotli = None
+
+re_accepts_br = _lazy_re_compile(r"\bbr\b")
+
+BROTLI_QUALITY = 5   # buen equilibrio velocidad/tamaño para JSON generado en cada petición
+GZIP_LEVEL = 6
+
+
+def _gzip_compressor():
+    return zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)   # 16+: cabecera gzip
+
+
+def flush_gzip(chunks):
+    """Comprime un iterable de bytes emitiendo cada trozo completo al momento."""
+    z = _gzip_compressor()
+    for chunk in chunks:
+        if chunk:
+            yield z.compress(chunk) + z.flush(zlib.Z_SYNC_FLUSH)
+    yield z.flush()
+
+
+async def aflush_gzip(chunks):
+    """Variante asíncrona de flush_gzip para StreamingHttpResponse con iterador async."""
+    z = _gzip_compressor()
+    async for chunk in chunks:
+        if chunk:
+            yield z.compress(chunk) + z.flush(zlib.Z_SYNC_FLUSH)
+    yield z.flush()
+
+
+class CompressionMiddleware(GZipMiddleware):
+    def process_response(self, request, response):
+        if response.streaming:
+            return self._compress_stream(request, response)
+        if (
+            brotli is None
+            or len(response.content) < 200
+            or response.has_header("Content-Encoding")
+            or not re_accepts_br.search(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        ):
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        compressed = brotli.compress(response.content, quality=BROTLI_QUALITY)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response.headers["Content-Length"] = str(len(compressed))
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = "br"
+        return response
+
+    def _compress_stream(self, request, response):
+        if response.has_header("Content-Encoding"):
+            return response
+        patch_vary_headers(response, ("Accept-Encoding",))
+        if not re_accepts_gzip.search(request.META.get("HTTP_ACCEPT_ENCODING", "")):
+            return response
+        if response.is_async:
+            response.streaming_content = aflush_gzip(response.streaming_content)
+        else:
+            response.streaming_content = flush_gzip(response.streaming_content)
+        del response.headers["Content-Length"]
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = "gzip"
+        return response
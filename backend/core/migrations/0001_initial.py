@@ -0,0 +1,95 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:45
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+import django.contrib.postgres.operations
+import django.contrib.postgres.search
+import django.db.models.deletion
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        # gin_trgm_ops (índice de trigramas del título)
+        django.contrib.postgres.operations.TrigramExtension(),
+        migrations.CreateModel(
+            name='Dataset',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('uri', models.URLField(max_length=500, unique=True)),
+                ('identifier', models.CharField(blank=True, max_length=500)),
+                ('title', models.TextField(blank=True)),
+                ('description', models.TextField(blank=True)),
+                ('titles', models.JSONField(blank=True, default=list)),
+                ('descriptions', models.JSONField(blank=True, default=list)),
+                ('keywords_text', models.TextField(blank=True)),
+                ('publisher', models.CharField(blank=True, max_length=500)),
+                ('issued', models.CharField(blank=True, max_length=50)),
+                ('modified', models.CharField(blank=True, max_length=50)),
+                ('spatial', django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=500), blank=True, default=list, size=None)),
+                ('spatial_keys', django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=300), blank=True, default=list, size=None)),
+                ('search_vector', django.contrib.postgres.search.SearchVectorField(editable=False, null=True)),
+                ('harvested_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Keyword',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=500, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Theme',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('uri', models.URLField(max_length=500, unique=True)),
+                ('code', models.CharField(db_index=True, max_length=200)),
+                ('label', models.CharField(blank=True, max_length=500)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Distribution',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('uri', models.URLField(blank=True, max_length=1000)),
+                ('access_url', models.URLField(max_length=2000)),
+                ('format', models.CharField(blank=True, max_length=200)),
+                ('title', models.TextField(blank=True)),
+                ('dataset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='distributions', to='core.dataset')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='dataset',
+            name='keywords',
+            field=models.ManyToManyField(blank=True, related_name='datasets', to='core.keyword'),
+        ),
+        migrations.AddField(
+            model_name='dataset',
+            name='themes',
+            field=models.ManyToManyField(blank=True, related_name='datasets', to='core.theme'),
+        ),
+        migrations.AddIndex(
+            model_name='dataset',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='catalog_dataset_search_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='dataset',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('title'), name='gin_trgm_ops'), name='catalog_dataset_title_trgm'),
+        ),
+        migrations.AddIndex(
+            model_name='dataset',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['spatial_keys'], name='catalog_dataset_spatial_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='dataset',
+            index=models.Index(fields=['title'], name='catalog_dataset_title_idx'),
+        ),
+    ]
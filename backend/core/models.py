@@ -1,5 +1,129 @@
 # Modelos de PostgreSQL
 # Define las tablas de PostgreSQL.
+#
+# Índice local del catálogo de datos.gob.es (se rellena con
+# `python manage.py harvest_catalog`). Las búsquedas por título, keyword,
+# ámbito geográfico y categoría se sirven desde estas tablas:
+#   - título: tsvector con stemming en español (GIN) + trigramas sobre el título
+#   - keyword / categoría: tablas indexadas y relaciones M2M
+#   - spatial: array de "Tipo/Valor" con índice GIN
+#
+# Instantánea de las estadísticas de la Home (StatsSnapshot), refrescada en
+# segundo plano para que /stats/ no espere nunca a SPARQL.
+#
+# Cola de análisis en segundo plano (AnalysisJob): /jobs/analyze/ encola y
+# `python manage.py run_analysis_worker` los procesa; sin broker externo.
+import uuid
+
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.db.models.functions import Upper
+
+
+class Theme(models.Model):
+    # uri: http://datos.gob.es/kos/sector-publico/sector/economia -> code: economia
+    uri = models.URLField(max_length=500, unique=True)
+    code = models.CharField(max_length=200, db_index=True)
+    label = models.CharField(max_length=500, blank=True)
+
+    def __str__(self):
+        return self.label or self.code
+
+
+class Keyword(models.Model):
+    # name normalizado (minúsculas, sin espacios extremos) para búsquedas exactas por índice
+    name = models.CharField(max_length=500, unique=True)
+
+    def __str__(self):
+        return self.name
+
+
+class Dataset(models.Model):
+    uri = models.URLField(max_length=500, unique=True)          # "_about" en la API
+    identifier = models.CharField(max_length=500, blank=True)
+    title = models.TextField(blank=True)                        # título preferido (es > en > otro)
+    description = models.TextField(blank=True)
+    titles = models.JSONField(default=list, blank=True)         # [{"_value", "_lang"}], como la API
+    descriptions = models.JSONField(default=list, blank=True)
+    keywords_text = models.TextField(blank=True)                # keywords unidas, para el tsvector
+    publisher = models.CharField(max_length=500, blank=True)
+    issued = models.CharField(max_length=50, blank=True)
+    modified = models.CharField(max_length=50, blank=True)
+    spatial = ArrayField(models.CharField(max_length=500), default=list, blank=True)
+    spatial_keys = ArrayField(models.CharField(max_length=300), default=list, blank=True)  # "Provincia/Madrid"
+    themes = models.ManyToManyField(Theme, related_name="datasets", blank=True)
+    keywords = models.ManyToManyField(Keyword, related_name="datasets", blank=True)
+    search_vector = SearchVectorField(null=True, editable=False)
+    harvested_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=["search_vector"], name="catalog_dataset_search_gin"),
+            # Sirve a title__icontains (UPPER(title) LIKE UPPER('%...%')) y a la similitud
+            GinIndex(OpClass(Upper("title"), name="gin_trgm_ops"), name="catalog_dataset_title_trgm"),
+            GinIndex(fields=["spatial_keys"], name="catalog_dataset_spatial_gin"),
+            models.Index(fields=["title"], name="catalog_dataset_title_idx"),
+        ]
+
+    def __str__(self):
+        return self.title or self.uri
+
+
+class Distribution(models.Model):
+    dataset = models.ForeignKey(Dataset, related_name="distributions", on_delete=models.CASCADE)
+    uri = models.URLField(max_length=1000, blank=True)
+    access_url = models.URLField(max_length=2000)
+    format = models.CharField(max_length=200, blank=True)       # media type (text/csv, ...)
+    title = models.TextField(blank=True)
+
+    def __str__(self):
+        return self.access_url
+
+
+class StatsSnapshot(models.Model):
+    # Agregados de SPARQL materializados (manage.py refresh_stats_snapshot o el
+    # planificador en proceso). key: total_datasets, all_themes, dataset_counts_by_theme
+    key = models.CharField(max_length=100, unique=True)
+    data = models.JSONField(null=True, blank=True)
+    version = models.PositiveIntegerField(default=0)            # sube cuando cambia data
+    etag = models.CharField(max_length=64, blank=True)          # sha1 de data
+    changed_at = models.DateTimeField(null=True, blank=True)    # Last-Modified
+    refreshed_at = models.DateTimeField(null=True, blank=True)  # última consulta correcta
+    last_error = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"{self.key} v{self.version}"
+
+
+class AnalysisJob(models.Model):
+    # Análisis largos (rows=-1, profile) fuera del ciclo petición/respuesta.
+    # params es exactamente el de la caché "analyze": el resultado se comparte.
+    QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+    STATUS_CHOICES = [(s, s) for s in (QUEUED, RUNNING, DONE, FAILED, CANCELLED)]
+    FINISHED = (DONE, FAILED, CANCELLED)
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=QUEUED)
+    params = models.JSONField()                                  # url, format, rows, profile, ine_filters
+    params_key = models.CharField(max_length=100, db_index=True)  # clave de caché de params
+    bytes_read = models.BigIntegerField(default=0)
+    total_bytes = models.BigIntegerField(null=True, blank=True)  # Content-Length / Content-Range si se conoce
+    rows_parsed = models.BigIntegerField(default=0)
+    result = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)  # como JsonResponse
+    error = models.TextField(blank=True)
+    cancel_requested = models.BooleanField(default=False)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True)        # host:pid del proceso que lo ejecuta
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)   # latido del worker (trabajos huérfanos)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "created_at"], name="core_job_status_created_idx")]
 
-# Create your models here.
+    def __str__(self):
+        return f"{self.id} {self.status}"
@@ -0,0 +1,239 @@
+# core/services/analysis_jobs.py
+# Cola de análisis en segundo plano sobre la base de datos (AnalysisJob), sin
+# broker externo:
+#   submit()     encola; si ya hay un trabajo igual en curso lo reutiliza y si
+#                la caché "analyze" tiene el resultado lo da por terminado
+#   claim_next() toma el más antiguo con un UPDATE condicional (status=queued),
+#                válido en PostgreSQL y SQLite sin bloqueos de fila
+#   run_job()    run_analysis con progreso (bytes leídos / filas parseadas) y
+#                cancelación cooperativa
+# Los workers son procesos (`python manage.py run_analysis_worker`). El
+# resultado queda en la tabla, así que sobrevive a reinicios, y además en la
+# caché "analyze", compartida con /dataset/analyze/.
+import logging
+import os
+import socket
+import threading
+from datetime import timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from core.models import AnalysisJob
+from core.services.dataset_analyzer import AnalysisProgress, run_analysis
+from core.utils import dataset_cache, single_flight
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE = "analyze"
+
+DEFAULTS = {
+    "PROCESSES": 2,
+    "POLL_INTERVAL": 1.0,        # segundos entre consultas a la cola vacía
+    "HEARTBEAT_INTERVAL": 2.0,   # volcado de progreso y lectura de cancelación
+    "STALE_AFTER": 120,          # sin latido durante más segundos -> worker perdido
+    "MAX_ATTEMPTS": 2,           # reintentos de un trabajo huérfano
+    "KEEP_DAYS": 7,              # los trabajos terminados se borran pasado este plazo
+}
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def get_config() -> Dict[str, Any]:
+    conf = dict(DEFAULTS)
+    conf.update(getattr(settings, "ANALYSIS_JOBS", {}) or {})
+    return conf
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+# -----------------------
+# Cola
+# -----------------------
+def submit(params: Dict[str, Any]) -> Tuple[AnalysisJob, bool]:
+    """
+    Encola un análisis; params como la caché "analyze" (url, format, rows,
+    profile, ine_filters). Devuelve (job, creado).
+    """
+    key = dataset_cache.make_cache_key(NAMESPACE, params)
+    with single_flight.interprocess_lock(f"job:{key}", timeout=5):
+        existing = (AnalysisJob.objects.filter(params_key=key, status__in=(AnalysisJob.QUEUED, AnalysisJob.RUNNING))
+                    .order_by("created_at").first())
+        if existing is not None:
+            return existing, False
+
+        data, state = dataset_cache.lookup(key)
+        if state == dataset_cache.FRESH and data:
+            now = timezone.now()
+            job = AnalysisJob.objects.create(
+                params=params, params_key=key, status=AnalysisJob.DONE, result=data,
+                rows_parsed=data.get("sample_rows_count") or 0, started_at=now, finished_at=now,
+            )
+            return job, True
+        return AnalysisJob.objects.create(params=params, params_key=key), True
+
+
+def cancel(job_id) -> Optional[AnalysisJob]:
+    """En cola: se cancela al momento. En curso: lo marca y el worker aborta en la siguiente lectura."""
+    now = timezone.now()
+    jobs = AnalysisJob.objects.filter(pk=job_id)
+    if not jobs.filter(status=AnalysisJob.QUEUED).update(status=AnalysisJob.CANCELLED, cancel_requested=True,
+                                                         finished_at=now):
+        jobs.filter(status=AnalysisJob.RUNNING).update(cancel_requested=True)
+    return jobs.first()
+
+
+def claim_next(worker: str) -> Optional[AnalysisJob]:
+    candidates = (AnalysisJob.objects.filter(status=AnalysisJob.QUEUED)
+                  .order_by("created_at").values_list("pk", flat=True)[:10])
+    for pk in candidates:
+        now = timezone.now()
+        claimed = AnalysisJob.objects.filter(pk=pk, status=AnalysisJob.QUEUED).update(
+            status=AnalysisJob.RUNNING, worker=worker, started_at=now, heartbeat_at=now,
+            attempts=F("attempts") + 1,
+        )
+        if claimed:   # otro worker pudo adelantarse entre la lectura y el UPDATE
+            return AnalysisJob.objects.get(pk=pk)
+    return None
+
+
+def recover_stale() -> Dict[str, int]:
+    """Trabajos sin latido (worker muerto): se reencolan o, agotados los intentos, fallan."""
+    conf = get_config()
+    now = timezone.now()
+    stale = AnalysisJob.objects.filter(status=AnalysisJob.RUNNING,
+                                       heartbeat_at__lt=now - timedelta(seconds=conf["STALE_AFTER"]))
+    return {
+        "cancelled": stale.filter(cancel_requested=True).update(status=AnalysisJob.CANCELLED, finished_at=now),
+        "failed": stale.filter(attempts__gte=conf["MAX_ATTEMPTS"]).update(
+            status=AnalysisJob.FAILED, error="El worker dejó de responder", finished_at=now),
+        "requeued": stale.update(status=AnalysisJob.QUEUED, worker=""),
+    }
+
+
+def purge_finished() -> int:
+    cutoff = timezone.now() - timedelta(days=get_config()["KEEP_DAYS"])
+    deleted, _ = AnalysisJob.objects.filter(status__in=AnalysisJob.FINISHED, finished_at__lt=cutoff).delete()
+    return deleted
+
+
+# -----------------------
+# Ejecución
+# -----------------------
+class _Heartbeat:
+    """
+    Hilo que vuelca el progreso a la tabla cada HEARTBEAT_INTERVAL y lee
+    cancel_requested. El análisis sólo actualiza contadores en memoria; al ver
+    la cancelación, la siguiente lectura del recurso lanza JobCancelled.
+    """
+
+    def __init__(self, job_id, interval: float):
+        self.job_id = job_id
+        self.interval = interval
+        self.cancelled = threading.Event()
+        self.progress = AnalysisProgress(self._check)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"job-heartbeat-{job_id}", daemon=True)
+
+    def _check(self, *_):
+        if self.cancelled.is_set():
+            raise JobCancelled()
+
+    def fields(self) -> Dict[str, Any]:
+        p = self.progress
+        return {"bytes_read": p.bytes_read, "rows_parsed": p.rows_parsed, "total_bytes": p.total_bytes,
+                "heartbeat_at": timezone.now()}
+
+    def _flush(self):
+        AnalysisJob.objects.filter(pk=self.job_id, status=AnalysisJob.RUNNING).update(**self.fields())
+        if AnalysisJob.objects.filter(pk=self.job_id, cancel_requested=True).exists():
+            self.cancelled.set()
+
+    def _run(self):
+        try:
+            while not self._stop.wait(self.interval):
+                try:
+                    self._flush()
+                except Exception:
+                    logger.exception("Error actualizando el progreso del trabajo %s", self.job_id)
+        finally:
+            connection.close()   # conexión propia de este hilo
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_job(job: AnalysisJob) -> str:
+    """Ejecuta un trabajo ya reclamado y guarda su estado final. Devuelve el estado."""
+    p = job.params
+    status, result, error = AnalysisJob.DONE, None, ""
+    with _Heartbeat(job.pk, get_config()["HEARTBEAT_INTERVAL"]) as heartbeat:
+        try:
+            result = run_analysis(p["url"], p.get("format"), p.get("rows"),
+                                  {"profile": p.get("profile", False), "ine_filters": p.get("ine_filters") or {}},
+                                  progress=heartbeat.progress)
+        except Exception as e:
+            # JobCancelled puede llegar envuelta en el RuntimeError del analizador
+            status, error = AnalysisJob.FAILED, str(e) or e.__class__.__name__
+
+    if heartbeat.cancelled.is_set() or AnalysisJob.objects.filter(pk=job.pk, cancel_requested=True).exists():
+        status, result, error = AnalysisJob.CANCELLED, None, ""
+    elif status == AnalysisJob.DONE:
+        try:
+            dataset_cache.store(NAMESPACE, job.params_key, result)
+        except Exception:
+            logger.exception("No se pudo guardar en caché el resultado del trabajo %s", job.pk)
+
+    fields = {**heartbeat.fields(), "status": status, "result": result, "error": error,
+              "finished_at": timezone.now()}
+    try:
+        AnalysisJob.objects.filter(pk=job.pk, status=AnalysisJob.RUNNING).update(**fields)
+    except Exception as e:
+        # p.ej. un valor no serializable en el resultado
+        logger.exception("No se pudo guardar el resultado del trabajo %s", job.pk)
+        fields.update(status=AnalysisJob.FAILED, result=None, error=f"No se pudo guardar el resultado: {e}")
+        AnalysisJob.objects.filter(pk=job.pk, status=AnalysisJob.RUNNING).update(**fields)
+    return fields["status"]
+
+
+def work(stop, once: bool = False) -> int:
+    """
+    Bucle de un worker: reclama y ejecuta trabajos hasta que stop (un Event de
+    threading o multiprocessing) se activa. Con once=True sale al vaciar la cola.
+    """
+    conf = get_config()
+    name = worker_name()
+    done = 0
+    while not stop.is_set():
+        close_old_connections()
+        job = claim_next(name)
+        if job is None:
+            if once:
+                break
+            stop.wait(conf["POLL_INTERVAL"])
+            continue
+        logger.info("Trabajo %s (%s) en %s", job.pk, job.params.get("url"), name)
+        status = run_job(job)
+        logger.info("Trabajo %s: %s", job.pk, status)
+        done += 1
+    return done
+
+
+def job_progress(job: AnalysisJob) -> Dict[str, Any]:
+    percent = None
+    if job.total_bytes:
+        percent = 100.0 if job.status == AnalysisJob.DONE else round(min(job.bytes_read / job.total_bytes, 1) * 100, 1)
+    return {"bytes_read": job.bytes_read, "total_bytes": job.total_bytes, "rows_parsed": job.rows_parsed,
+            "percent": percent}
@@ -0,0 +1,150 @@
+# core/services/async_http_client.py
+# Variante asíncrona (aiohttp) del cliente HTTP compartido, para las vistas ASGI.
+# Usa la misma configuración (settings.HTTP_CLIENT) y registra en las mismas
+# métricas por host que core/services/http_client.py.
+import asyncio
+import json
+import threading
+import time
+import weakref
+from typing import Any, Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from core.services.http_client import get_config, host_metrics
+
+
+class AsyncHTTPError(Exception):
+    """Error de red, timeout o respuesta 4xx/5xx del cliente asíncrono."""
+
+
+class AsyncResponse:
+    """Respuesta ya leída, con la misma interfaz mínima que requests.Response."""
+
+    def __init__(self, url: str, status_code: int, headers, content: bytes, encoding: Optional[str]):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.encoding = encoding or "utf-8"
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding, errors="replace")
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise AsyncHTTPError(f"{self.status_code} para {self.url}")
+
+
+# -----------------------
+# Métricas vía TraceConfig
+# -----------------------
+async def _on_request_start(session, ctx, params):
+    host_metrics(ctx.trace_request_ctx["host"]).incr("exchanges")
+
+
+async def _on_connection_create_end(session, ctx, params):
+    host_metrics(ctx.trace_request_ctx["host"]).incr("connections_opened")
+
+
+def _build_session() -> aiohttp.ClientSession:
+    conf = get_config()
+    trace = aiohttp.TraceConfig()
+    trace.on_request_start.append(_on_request_start)
+    trace.on_connection_create_end.append(_on_connection_create_end)
+    connector = aiohttp.TCPConnector(
+        limit=conf["ASYNC_MAX_CONNECTIONS"],
+        limit_per_host=conf["ASYNC_LIMIT_PER_HOST"],
+        keepalive_timeout=30,
+        ttl_dns_cache=300,
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(sock_connect=conf["CONNECT_TIMEOUT"], sock_read=conf["READ_TIMEOUT"]),
+        headers={"User-Agent": conf["USER_AGENT"], "Accept-Encoding": "gzip, deflate"},
+        trace_configs=[trace],
+    )
+
+
+# Una ClientSession queda ligada al event loop en el que se crea. Con uvicorn hay
+# un único loop por worker; con async_to_sync (runserver/WSGI) puede haber varios.
+_sessions: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aiohttp.ClientSession]" = weakref.WeakKeyDictionary()
+_sessions_lock = threading.Lock()
+
+
+def get_session() -> aiohttp.ClientSession:
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        with _sessions_lock:
+            session = _sessions.get(loop)
+            if session is None or session.closed:
+                session = _build_session()
+                _sessions[loop] = session
+    return session
+
+
+async def aclose_session():
+    session = _sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None:
+        await session.close()
+
+
+# -----------------------
+# API pública
+# -----------------------
+async def request(method: str, url: str, timeout: Optional[float] = None, **kwargs) -> AsyncResponse:
+    """
+    Igual que http_client.request pero asíncrono; devuelve la respuesta ya leída.
+    Reintenta con backoff exponencial los errores de conexión y los códigos de
+    STATUS_FORCELIST (sólo métodos idempotentes). Cualquier error de aiohttp
+    llega al llamador como AsyncHTTPError.
+    """
+    conf = get_config()
+    if timeout is not None:
+        kwargs["timeout"] = aiohttp.ClientTimeout(sock_connect=min(conf["CONNECT_TIMEOUT"], timeout), sock_read=timeout)
+
+    host = urlsplit(url).hostname or ""
+    metrics = host_metrics(host)
+    metrics.incr("requests")
+    retries = conf["RETRIES"] if method.upper() in ("GET", "HEAD", "OPTIONS") else 0
+    start = time.perf_counter()
+    attempt = 0
+    try:
+        while True:
+            delay = None
+            try:
+                async with get_session().request(method, url, trace_request_ctx={"host": host}, **kwargs) as resp:
+                    if resp.status in conf["STATUS_FORCELIST"] and attempt < retries:
+                        retry_after = resp.headers.get("Retry-After")
+                        if retry_after and retry_after.isdigit():
+                            delay = float(retry_after)
+                    else:
+                        content = await resp.read()
+                        response = AsyncResponse(str(resp.url), resp.status, resp.headers, content, resp.charset)
+                        break
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt >= retries:
+                    raise AsyncHTTPError(f"Error de red en {url}: {e!r}") from e
+            except aiohttp.ClientError as e:
+                # URL no válida, demasiadas redirecciones, cuerpo corrupto...: no se reintenta
+                raise AsyncHTTPError(f"Error HTTP en {url}: {e!r}") from e
+            await asyncio.sleep(delay if delay is not None else conf["BACKOFF_FACTOR"] * (2 ** attempt))
+            attempt += 1
+    except AsyncHTTPError:
+        metrics.incr("errors")
+        raise
+    finally:
+        metrics.add_latency((time.perf_counter() - start) * 1000.0)
+    if response.status_code >= 500:
+        metrics.incr("errors")
+    return response
+
+
+async def get(url: str, **kwargs) -> AsyncResponse:
+    return await request("GET", url, **kwargs)
@@ -0,0 +1,191 @@
+# core/services/batch_analysis.py
+# Análisis por lotes (/api/process-datasets/): una lista de distribuciones
+# (URLs del INE o genéricas) se analiza en un pool acotado, cada una con su
+# propio plazo, y los resultados se entregan según van terminando. El lote
+# tarda lo que la distribución más lenta, no la suma.
+#
+# Quien llama aporta run_item(url, fmt) -> (datos, mensaje, status), la misma
+# tupla que handle_dataset_file, así cada elemento comparte caché y
+# single-flight con /dataset/analyze/.
+import asyncio
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from django.conf import settings
+
+DEFAULTS = {
+    "MAX_ITEMS": 50,
+    "CONCURRENCY": 8,
+    "ITEM_TIMEOUT": 120,     # segundos por distribución
+}
+
+SUPPORTED_FORMATS = ("json", "csv", "xml", "rdf+xml", "html", "pc-axis")
+
+# media type / etiqueta de formato de la API -> formato del analizador
+_FORMAT_HINTS = (
+    ("csv", "csv"), ("json", "json"), ("px", "pc-axis"), ("pc-axis", "pc-axis"),
+    ("rdf", "rdf+xml"), ("xml", "xml"), ("html", "html"),
+)
+
+
+class BatchError(ValueError):
+    pass
+
+
+def get_config() -> Dict[str, Any]:
+    conf = dict(DEFAULTS)
+    conf.update(getattr(settings, "BATCH_ANALYSIS", {}) or {})
+    return conf
+
+
+# -----------------------
+# Entrada
+# -----------------------
+def _format_hint(value: Any) -> Optional[str]:
+    if isinstance(value, dict):
+        value = value.get("value") or value.get("_value") or ""
+    value = str(value or "").lower()
+    for hint, fmt in _FORMAT_HINTS:
+        if hint in value:
+            return fmt
+    return None
+
+
+def _distribution_url(item: Dict[str, Any]) -> tuple:
+    # Item de la API: la primera distribución con un formato que sepamos analizar
+    dists = item.get("distribution") or []
+    dists = dists if isinstance(dists, list) else [dists]
+    candidates = []
+    for d in dists:
+        if isinstance(d, dict):
+            url = d.get("accessURL")
+            url = url[0] if isinstance(url, list) and url else url
+            candidates.append((str(url or ""), _format_hint(d.get("format"))))
+        elif d:
+            candidates.append((str(d), None))
+    candidates = [c for c in candidates if c[0]]
+    for url, fmt in candidates:
+        if fmt:
+            return url, fmt
+    return candidates[0] if candidates else ("", None)
+
+
+def parse_items(datasets: Any) -> List[Dict[str, Any]]:
+    """
+    Acepta URLs, objetos {"url", "format"} o items de la API (con distribution).
+    Devuelve [{"index", "url", "format"}] o lanza BatchError.
+    """
+    if not isinstance(datasets, list) or not datasets:
+        raise BatchError("'datasets' debe ser una lista no vacía")
+    conf = get_config()
+    if len(datasets) > conf["MAX_ITEMS"]:
+        raise BatchError(f"Como máximo {conf['MAX_ITEMS']} datasets por lote")
+
+    items = []
+    for index, entry in enumerate(datasets):
+        if isinstance(entry, str):
+            url, fmt = entry.strip(), None
+        elif isinstance(entry, dict) and (entry.get("url") or entry.get("accessURL")):
+            url = str(entry.get("url") or entry.get("accessURL")).strip()
+            fmt = (entry.get("format") or "").lower() or None
+        elif isinstance(entry, dict):
+            url, fmt = _distribution_url(entry)
+        else:
+            url, fmt = "", None
+        if not url:
+            raise BatchError(f"Elemento {index}: sin URL de distribución")
+        if fmt and fmt not in SUPPORTED_FORMATS:
+            raise BatchError(f"Elemento {index}: formato '{fmt}' no soportado")
+        items.append({"index": index, "url": url, "format": fmt})
+    return items
+
+
+def _result(item: Dict[str, Any], started: float, outcome: Any = None, error: Optional[str] = None,
+            status: int = 200) -> Dict[str, Any]:
+    out = {"index": item["index"], "url": item["url"], "elapsed_ms": round((time.monotonic() - started) * 1000)}
+    if error is None and outcome is not None:
+        data, message, status = outcome
+        if status == 200 and data:
+            return {**out, "success": True, "data": data}
+        error = message
+    return {**out, "success": False, "status": status if status != 200 else 500, "message": error}
+
+
+# -----------------------
+# Síncrono: pool de hilos
+# -----------------------
+def iter_batch(items: List[Dict[str, Any]], run_item: Callable[[str, Optional[str]], Any],
+               concurrency: Optional[int] = None, item_timeout: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Resultados por elemento en orden de finalización. Un elemento que supera
+    item_timeout se da por fallido (504); su hilo termina cuando venza el
+    timeout de la propia descarga, sin retener la respuesta.
+    """
+    conf = get_config()
+    concurrency = concurrency or conf["CONCURRENCY"]
+    item_timeout = item_timeout or conf["ITEM_TIMEOUT"]
+    queue = list(reversed(items))
+    pending: Dict[Any, Dict[str, Any]] = {}
+    starts: Dict[int, float] = {}   # el plazo corre desde que el hilo empieza, no desde la cola
+
+    def call(item):
+        starts[item["index"]] = time.monotonic()
+        return run_item(item["url"], item["format"])
+
+    pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch-analysis")
+    try:
+        while queue or pending:
+            while queue and len(pending) < concurrency:
+                item = queue.pop()
+                pending[pool.submit(call, item)] = item
+
+            deadlines = [starts[i["index"]] + item_timeout for i in pending.values() if i["index"] in starts]
+            timeout = max(min(deadlines) - time.monotonic(), 0) if deadlines else 1.0
+            finished, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in finished:
+                item = pending.pop(future)
+                started = starts.get(item["index"], time.monotonic())
+                try:
+                    yield _result(item, started, future.result())
+                except Exception as e:
+                    yield _result(item, started, error=str(e))
+
+            now = time.monotonic()
+            for future, item in list(pending.items()):
+                started = starts.get(item["index"])
+                if started is not None and now - started >= item_timeout:
+                    pending.pop(future)
+                    yield _result(item, started, error=f"Tiempo agotado ({item_timeout:g}s)", status=504)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+# -----------------------
+# Asíncrono: tareas con semáforo
+# -----------------------
+async def aiter_batch(items: List[Dict[str, Any]], arun_item: Callable[[str, Optional[str]], Any],
+                      concurrency: Optional[int] = None,
+                      item_timeout: Optional[float] = None) -> AsyncIterator[Dict[str, Any]]:
+    conf = get_config()
+    semaphore = asyncio.Semaphore(concurrency or conf["CONCURRENCY"])
+    item_timeout = item_timeout or conf["ITEM_TIMEOUT"]
+
+    async def run(item):
+        async with semaphore:
+            started = time.monotonic()
+            try:
+                outcome = await asyncio.wait_for(arun_item(item["url"], item["format"]), item_timeout)
+                return _result(item, started, outcome)
+            except asyncio.TimeoutError:
+                return _result(item, started, error=f"Tiempo agotado ({item_timeout:g}s)", status=504)
+            except Exception as e:
+                return _result(item, started, error=str(e))
+
+    tasks = [asyncio.ensure_future(run(item)) for item in items]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
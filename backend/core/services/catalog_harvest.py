@@ -0,0 +1,368 @@
+# core/services/catalog_harvest.py
+# Volcado del catálogo de datos.gob.es a las tablas locales (core/models.py).
+# Dos orígenes que producen el mismo registro normalizado:
+#   - SPARQL (sparql_service.run_sparql_query), paginando por URI de dataset
+#   - un volcado local en JSON con items de la API (apidata, formato linked-data-api)
+# La escritura es por lotes: bulk_create con ON CONFLICT (upsert) y un UPDATE
+# del tsvector por lote.
+import json
+import logging
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from django.contrib.postgres.search import SearchVector
+from django.db import transaction
+
+from core.models import Dataset, Distribution, Keyword, Theme
+from core.services.sparql_service import get_all_themes, run_sparql_query
+
+logger = logging.getLogger(__name__)
+
+SPARQL_MAX_ROWS = 10000   # límite de filas por respuesta del Virtuoso de datos.gob.es
+PREFERRED_LANGS = ("es", "en")
+
+_PREFIXES = """
+    PREFIX dcat: <http://www.w3.org/ns/dcat#>
+    PREFIX dct: <http://purl.org/dc/terms/>
+    PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+"""
+
+# Página de datasets: todas las consultas de facetas comparten la misma subconsulta
+_PAGE = "{{ SELECT ?dataset WHERE {{ ?dataset a dcat:Dataset }} ORDER BY ?dataset LIMIT {limit} OFFSET {offset} }}"
+
+_CORE_QUERY = _PREFIXES + """
+    SELECT ?dataset ?identifier ?publisher ?issued ?modified WHERE {{
+      {page}
+      OPTIONAL {{ ?dataset dct:identifier ?identifier }}
+      OPTIONAL {{ ?dataset dct:publisher ?publisher }}
+      OPTIONAL {{ ?dataset dct:issued ?issued }}
+      OPTIONAL {{ ?dataset dct:modified ?modified }}
+    }}
+"""
+
+_FACET_QUERY = _PREFIXES + """
+    SELECT ?dataset ?value (LANG(?value) AS ?lang) WHERE {{
+      {page}
+      ?dataset {predicate} ?value .
+    }}
+"""
+
+_DISTRIBUTION_QUERY = _PREFIXES + """
+    SELECT ?dataset ?distribution ?url ?format ?title WHERE {{
+      {page}
+      ?dataset dcat:distribution ?distribution .
+      ?distribution dcat:accessURL ?url .
+      OPTIONAL {{ ?distribution dct:format ?f . ?f rdf:value ?format }}
+      OPTIONAL {{ ?distribution dct:title ?title }}
+    }}
+"""
+
+# campo del registro normalizado -> predicado
+_FACETS = {
+    "titles": "dct:title",
+    "descriptions": "dct:description",
+    "keywords": "dcat:keyword",
+    "themes": "dcat:theme",
+    "spatial": "dct:spatial",
+}
+
+
+# -----------------------
+# Utilidades
+# -----------------------
+def _as_list(value) -> List[Any]:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _text_values(value) -> List[Dict[str, str]]:
+    """Normaliza un literal de la API ("x", {"_value", "_lang"} o lista) a [{"_value", "_lang"}]."""
+    out = []
+    for v in _as_list(value):
+        if isinstance(v, dict):
+            text = v.get("_value") or v.get("value")
+            if text:
+                out.append({"_value": str(text), "_lang": v.get("_lang") or v.get("lang") or ""})
+        elif v not in (None, ""):
+            out.append({"_value": str(v), "_lang": ""})
+    return out
+
+
+def _uri_values(value) -> List[str]:
+    out = []
+    for v in _as_list(value):
+        uri = (v.get("_about") or v.get("value")) if isinstance(v, dict) else v
+        if uri:
+            out.append(str(uri))
+    return out
+
+
+def preferred_text(values: List[Dict[str, str]]) -> str:
+    for lang in PREFERRED_LANGS:
+        for v in values:
+            if v["_lang"] == lang:
+                return v["_value"]
+    return values[0]["_value"] if values else ""
+
+
+def normalize_keyword(keyword: str) -> str:
+    return " ".join(str(keyword).split()).lower()
+
+
+def theme_code(uri: str) -> str:
+    return uri.rstrip("/").rsplit("/", 1)[-1]
+
+
+def spatial_key(uri: str) -> str:
+    # .../territorio/Provincia/Madrid -> "Provincia/Madrid" (mismo par que /spatial/<tipo>/<valor>)
+    return "/".join(uri.rstrip("/").split("/")[-2:])
+
+
+def _empty_record(uri: str) -> Dict[str, Any]:
+    return {
+        "uri": uri, "identifier": "", "publisher": "", "issued": "", "modified": "",
+        "titles": [], "descriptions": [], "keywords": [], "themes": [], "spatial": [],
+        "distributions": [],
+    }
+
+
+# -----------------------
+# Origen: volcado local (items de la API)
+# -----------------------
+def record_from_api_item(item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    uri = item.get("_about")
+    if not uri:
+        return None
+    record = _empty_record(uri)
+    record.update({
+        "identifier": (_uri_values(item.get("identifier")) or [""])[0],
+        "publisher": (_uri_values(item.get("publisher")) or [""])[0],
+        "issued": str(item.get("issued") or ""),
+        "modified": str(item.get("modified") or ""),
+        "titles": _text_values(item.get("title")),
+        "descriptions": _text_values(item.get("description")),
+        "keywords": [k["_value"] for k in _text_values(item.get("keyword"))],
+        "themes": _uri_values(item.get("theme")),
+        "spatial": _uri_values(item.get("spatial")),
+    })
+    for dist in _as_list(item.get("distribution")):
+        if not isinstance(dist, dict):
+            continue
+        url = (_uri_values(dist.get("accessURL")) or [""])[0]
+        if not url:
+            continue
+        fmt = dist.get("format")
+        if isinstance(fmt, dict):
+            fmt = fmt.get("value") or fmt.get("_value") or ""
+        record["distributions"].append({
+            "uri": dist.get("_about") or "",
+            "access_url": url,
+            "format": str(fmt or ""),
+            "title": preferred_text(_text_values(dist.get("title"))),
+        })
+    return record
+
+
+def api_item_from_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Registro normalizado -> item con la forma de la API (la que consume el frontend)."""
+    return {
+        "_about": record["uri"],
+        "identifier": record["identifier"],
+        "title": record["titles"],
+        "description": record["descriptions"],
+        "keyword": [{"_value": k} for k in dict.fromkeys(record["keywords"])],
+        "theme": list(dict.fromkeys(record["themes"])),
+        "spatial": list(dict.fromkeys(record["spatial"])),
+        "publisher": record["publisher"],
+        "issued": record["issued"],
+        "modified": record["modified"],
+        "distribution": [
+            {"_about": d["uri"], "accessURL": d["access_url"], "format": {"value": d["format"]}, "title": d["title"]}
+            for d in record["distributions"]
+        ],
+    }
+
+
+def iter_dump_records(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Lee un volcado JSON de la API: una respuesta ({"result": {"items": [...]}}),
+    una lista de items o una lista de respuestas (páginas guardadas).
+    """
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    pages = data if isinstance(data, list) and data and isinstance(data[0], dict) and "result" in data[0] else [data]
+    for page in pages:
+        items = page.get("result", {}).get("items", []) if isinstance(page, dict) else page
+        for item in items or []:
+            record = record_from_api_item(item) if isinstance(item, dict) else None
+            if record:
+                yield record
+
+
+# -----------------------
+# Origen: SPARQL
+# -----------------------
+def _bindings(query: str, timeout: float, order: str) -> List[Dict[str, Any]]:
+    """
+    Todas las filas de `query`: el servidor corta cada respuesta en
+    SPARQL_MAX_ROWS, así que se pagina con ORDER BY `order` + LIMIT/OFFSET hasta
+    recibir una página incompleta (una página de datasets con muchos títulos o
+    keywords por dataset supera el límite aunque tenga pocos datasets).
+    """
+    rows: List[Dict[str, Any]] = []
+    while True:
+        paged = f"{query} ORDER BY {order} LIMIT {SPARQL_MAX_ROWS} OFFSET {len(rows)}"
+        batch = run_sparql_query(paged, timeout=timeout).get("results", {}).get("bindings", [])
+        rows.extend(batch)
+        if len(batch) < SPARQL_MAX_ROWS:
+            return rows
+
+
+def _val(binding: Dict[str, Any], name: str) -> str:
+    return binding.get(name, {}).get("value", "")
+
+
+def fetch_sparql_page(limit: int, offset: int, timeout: float = 60) -> List[Dict[str, Any]]:
+    """Registros normalizados de una página de datasets (una consulta por faceta)."""
+    return fetch_sparql_records(_PAGE.format(limit=limit, offset=offset), timeout)
+
+
+def fetch_sparql_records(page: str, timeout: float = 60,
+                         facets: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Registros normalizados de los datasets que selecciona `page` (subconsulta o
+    bloque VALUES sobre ?dataset), en el orden en que los devuelve el servidor.
+    `facets` limita las facetas consultadas (por defecto todas).
+    """
+    records: Dict[str, Dict[str, Any]] = {}
+    for b in _bindings(_CORE_QUERY.format(page=page), timeout, "?dataset ?identifier ?publisher ?issued ?modified"):
+        uri = _val(b, "dataset")
+        records[uri] = record = _empty_record(uri)
+        for field in ("identifier", "publisher", "issued", "modified"):
+            record[field] = _val(b, field)
+    if not records:
+        return []
+
+    for field, predicate in _FACETS.items():
+        if facets is not None and field not in facets:
+            continue
+        for b in _bindings(_FACET_QUERY.format(page=page, predicate=predicate), timeout, "?dataset ?value LANG(?value)"):
+            record = records.get(_val(b, "dataset"))
+            value = _val(b, "value")
+            if record is None or not value:
+                continue
+            if field in ("titles", "descriptions"):
+                record[field].append({"_value": value, "_lang": _val(b, "lang")})
+            else:
+                record[field].append(value)
+
+    for b in _bindings(_DISTRIBUTION_QUERY.format(page=page), timeout, "?dataset ?distribution ?url ?format ?title"):
+        record = records.get(_val(b, "dataset"))
+        if record is not None:
+            record["distributions"].append({
+                "uri": _val(b, "distribution"),
+                "access_url": _val(b, "url"),
+                "format": _val(b, "format"),
+                "title": _val(b, "title"),
+            })
+    return list(records.values())
+
+
+def iter_sparql_records(page_size: int = 1000, max_pages: Optional[int] = None,
+                        timeout: float = 60) -> Iterator[List[Dict[str, Any]]]:
+    page = 0
+    while max_pages is None or page < max_pages:
+        records = fetch_sparql_page(page_size, page * page_size, timeout)
+        if not records:
+            return
+        yield records
+        page += 1
+
+
+# -----------------------
+# Escritura
+# -----------------------
+def sync_theme_labels() -> int:
+    """Etiquetas de las temáticas (skos:prefLabel), con la consulta ya existente."""
+    themes = [t for t in get_all_themes() if t.get("uri")]
+    labels = {}
+    for t in themes:
+        labels.setdefault(t["uri"], t.get("label") or "")
+    Theme.objects.bulk_create(
+        [Theme(uri=uri, code=theme_code(uri), label=label) for uri, label in labels.items()],
+        update_conflicts=True, unique_fields=["uri"], update_fields=["code", "label"],
+    )
+    return len(labels)
+
+
+def _id_map(model, field: str, values: Iterable[str]) -> Dict[str, int]:
+    values = set(values)
+    return dict(model.objects.filter(**{f"{field}__in": values}).values_list(field, "id")) if values else {}
+
+
+@transaction.atomic
+def store_records(records: List[Dict[str, Any]]) -> int:
+    """Upsert de un lote de registros normalizados y de sus relaciones."""
+    records = list({r["uri"]: r for r in records}.values())  # un mismo URI dos veces rompe el upsert
+    if not records:
+        return 0
+
+    theme_uris = {u for r in records for u in r["themes"]}
+    Theme.objects.bulk_create([Theme(uri=u, code=theme_code(u)) for u in theme_uris], ignore_conflicts=True)
+    keyword_names = {normalize_keyword(k) for r in records for k in r["keywords"]} - {""}
+    Keyword.objects.bulk_create([Keyword(name=k) for k in keyword_names], ignore_conflicts=True)
+
+    Dataset.objects.bulk_create(
+        [Dataset(
+            uri=r["uri"],
+            identifier=r["identifier"],
+            title=preferred_text(r["titles"]),
+            description=preferred_text(r["descriptions"]),
+            titles=r["titles"],
+            descriptions=r["descriptions"],
+            keywords_text=", ".join(dict.fromkeys(r["keywords"])),
+            publisher=r["publisher"],
+            issued=r["issued"],
+            modified=r["modified"],
+            spatial=list(dict.fromkeys(r["spatial"])),
+            spatial_keys=list(dict.fromkeys(spatial_key(u) for u in r["spatial"])),
+        ) for r in records],
+        update_conflicts=True,
+        unique_fields=["uri"],
+        update_fields=["identifier", "title", "description", "titles", "descriptions", "keywords_text",
+                       "publisher", "issued", "modified", "spatial", "spatial_keys", "harvested_at"],
+    )
+    dataset_ids = _id_map(Dataset, "uri", (r["uri"] for r in records))
+    theme_ids = _id_map(Theme, "uri", theme_uris)
+    keyword_ids = _id_map(Keyword, "name", keyword_names)
+    ids = list(dataset_ids.values())
+
+    # Relaciones: se reemplazan las del lote
+    ThemeLink, KeywordLink = Dataset.themes.through, Dataset.keywords.through
+    ThemeLink.objects.filter(dataset_id__in=ids).delete()
+    KeywordLink.objects.filter(dataset_id__in=ids).delete()
+    Distribution.objects.filter(dataset_id__in=ids).delete()
+    ThemeLink.objects.bulk_create(
+        [ThemeLink(dataset_id=dataset_ids[r["uri"]], theme_id=theme_ids[u])
+         for r in records for u in set(r["themes"])],
+        ignore_conflicts=True,
+    )
+    KeywordLink.objects.bulk_create(
+        [KeywordLink(dataset_id=dataset_ids[r["uri"]], keyword_id=keyword_ids[k])
+         for r in records for k in {normalize_keyword(k) for k in r["keywords"]} if k in keyword_ids],
+        ignore_conflicts=True,
+    )
+    Distribution.objects.bulk_create(
+        [Distribution(dataset_id=dataset_ids[r["uri"]], uri=d["uri"], access_url=d["access_url"],
+                      format=d["format"], title=d["title"])
+         for r in records for d in r["distributions"]],
+        batch_size=2000,
+    )
+
+    # tsvector en español: título (A), keywords (B), descripción (C)
+    Dataset.objects.filter(id__in=ids).update(search_vector=(
+        SearchVector("title", weight="A", config="spanish")
+        + SearchVector("keywords_text", weight="B", config="spanish")
+        + SearchVector("description", weight="C", config="spanish")
+    ))
+    return len(records)
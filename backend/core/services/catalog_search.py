@@ -0,0 +1,142 @@
+# core/services/catalog_search.py
+# Búsquedas sobre el índice local del catálogo (core/models.py). Devuelven la
+# misma forma que la API de datos.gob.es ({"result": {"items": [...]}}, items
+# en formato linked-data-api) para que vistas y frontend no cambien.
+# Si el índice está desactivado, vacío, no tiene resultados para la búsqueda o
+# la BD no responde devuelven None y search_datasets sigue usando la API remota.
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F, Q
+
+from core.models import Dataset
+from core.services.catalog_harvest import normalize_keyword
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "ENABLED": True,
+    "CHECK_TTL": 60,            # segundos que se recuerda si el índice tiene datos
+}
+
+_ready = {"value": None, "checked_at": 0.0}
+_ready_lock = threading.Lock()
+
+
+def get_config() -> Dict[str, Any]:
+    conf = dict(DEFAULTS)
+    conf.update(getattr(settings, "CATALOG_INDEX", {}) or {})
+    return conf
+
+
+def index_ready() -> bool:
+    """¿Hay catálogo local? Se comprueba como mucho una vez cada CHECK_TTL segundos."""
+    conf = get_config()
+    if not conf["ENABLED"]:
+        return False
+    now = time.monotonic()
+    with _ready_lock:
+        if _ready["value"] is not None and now - _ready["checked_at"] < conf["CHECK_TTL"]:
+            return _ready["value"]
+    try:
+        ready = Dataset.objects.exists()
+    except Exception as e:
+        logger.warning("Índice local del catálogo no disponible: %s", e)
+        ready = False
+    with _ready_lock:
+        _ready.update(value=ready, checked_at=now)
+    return ready
+
+
+# -----------------------
+# Serialización (formato de la API)
+# -----------------------
+def _item(ds: Dataset) -> Dict[str, Any]:
+    return {
+        "_about": ds.uri,
+        "identifier": ds.identifier,
+        "title": ds.titles or ds.title,
+        "description": ds.descriptions or ds.description,
+        "keyword": [{"_value": k.name} for k in ds.keywords.all()],
+        "theme": [t.uri for t in ds.themes.all()],
+        "spatial": ds.spatial,
+        "publisher": ds.publisher,
+        "issued": ds.issued,
+        "modified": ds.modified,
+        "distribution": [
+            {"_about": d.uri, "accessURL": d.access_url, "format": {"value": d.format}, "title": d.title}
+            for d in ds.distributions.all()
+        ],
+    }
+
+
+def _page(qs, page: int, page_size: int) -> Dict[str, Any]:
+    start = max(page, 0) * page_size
+    rows = (qs.defer("search_vector", "keywords_text")
+            .prefetch_related("distributions", "keywords", "themes")[start:start + page_size])
+    items: List[Dict[str, Any]] = [_item(ds) for ds in rows]
+    return {
+        "result": {
+            "items": items,
+            "itemsPerPage": page_size,
+            "page": page,
+            "startIndex": start,
+            "source": "local-index",
+        }
+    }
+
+
+def _run(label: str, build_qs, page: int, page_size: int) -> Optional[Dict[str, Any]]:
+    if not index_ready():
+        return None
+    try:
+        result = _page(build_qs(), page, page_size)
+    except Exception as e:
+        logger.warning("Error en %s (índice local): %s", label, e)
+        return None
+    # El índice puede estar a medio volcar (o con --max-pages): sin resultados
+    # locales se pregunta a la API en vez de dar (y cachear) una respuesta vacía
+    return result if result["result"]["items"] else None
+
+
+# -----------------------
+# Búsquedas
+# -----------------------
+def search_by_title(title: str, page: int = 0, page_size: int = 200) -> Optional[Dict[str, Any]]:
+    """
+    Texto completo en español (stemming: "poblaciones" encuentra "población")
+    sobre título, keywords y descripción, más subcadena del título (trigramas),
+    ordenado por relevancia.
+    """
+    def build():
+        query = SearchQuery(title, config="spanish", search_type="websearch")
+        return (Dataset.objects
+                .filter(Q(search_vector=query) | Q(title__icontains=title))
+                .annotate(rank=SearchRank(F("search_vector"), query))
+                .order_by("-rank", "title", "id"))
+    return _run("search_by_title", build, page, page_size)
+
+
+def search_by_keyword(keyword: str, page: int = 0, page_size: int = 200) -> Optional[Dict[str, Any]]:
+    def build():
+        return Dataset.objects.filter(keywords__name=normalize_keyword(keyword)).order_by("title", "id")
+    return _run("search_by_keyword", build, page, page_size)
+
+
+def search_by_spatial(spatial_type: str, spatial_value: str, page: int = 0,
+                      page_size: int = 200) -> Optional[Dict[str, Any]]:
+    def build():
+        return Dataset.objects.filter(spatial_keys__contains=[f"{spatial_type}/{spatial_value}"]).order_by("title", "id")
+    return _run("search_by_spatial", build, page, page_size)
+
+
+def search_by_category(category: str, page: int = 0, page_size: int = 200) -> Optional[Dict[str, Any]]:
+    # Se acepta el código ("economia") o la URI completa de la temática
+    def build():
+        lookup = {"themes__uri": category} if category.startswith("http") else {"themes__code": category}
+        return Dataset.objects.filter(**lookup).order_by("title", "id")
+    return _run("search_by_category", build, page, page_size)
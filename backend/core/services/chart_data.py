@@ -0,0 +1,442 @@
+# core/services/chart_data.py
+# Datos listos para pintar una sugerencia de build_suggestions /
+# suggest_from_metadata, calculados en el servidor sobre el recurso completo:
+#   - timeseries: agregación por fecha y reducción a ~`width` puntos (LTTB o
+#     min-max por cubeta), una o varias series (INE)
+#   - barchart / piechart: suma / media / ... por categoría con groupby; las
+#     categorías más allá de las `top` primeras van a "Otros"
+#   - choropleth: los nombres/códigos se resuelven a ids canónicos con el índice
+#     geográfico (geo_index) y se agrega por región, con la referencia a la
+#     topología simplificada del nivel y zoom pedidos (geo_shapes)
+#   - heatmap: coordenadas agrupadas en una rejilla (celda, nº de puntos)
+# Los recursos que no son del INE se leen de la tabla materializada
+# (columnar_store, se crea la primera vez); el INE, de la matriz de series.
+# El resultado se cachea en el namespace "chart_data".
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.urls import reverse
+
+from core.services import columnar_store, geo_shapes
+from core.services.dataset_analyzer import materialize_distribution
+from core.services.geo_index import LEVELS, get_index
+from core.services.ine_api_service import get_series_matrix, is_ine_dataset
+from core.services.schema_inference import coerce_numeric
+from core.utils import dataset_cache, single_flight
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE = "chart_data"
+
+DEFAULTS = {
+    "WIDTH": 800,           # puntos por serie si no se indica width
+    "MAX_WIDTH": 5000,
+    "METHOD": "lttb",       # lttb | minmax | none
+    "TOP": {"barchart": 20, "piechart": 8, "choropleth": 0},   # 0 = todas las categorías
+    "MAX_SERIES": 20,       # series del INE por gráfico
+    "HEATMAP_CELLS": 200,   # máximo de celdas de la rejilla en el eje más largo
+}
+
+# campos de la sugerencia que necesita cada tipo de gráfico
+CHART_FIELDS = {
+    "timeseries": ("x", "y"),
+    "barchart": ("category", "value"),
+    "piechart": ("category", "value"),
+    "choropleth": ("geo_name", "value"),
+    "heatmap": ("lat", "lon"),
+}
+AGGREGATIONS = ("sum", "mean", "count", "min", "max")
+METHODS = ("lttb", "minmax", "none")
+OTHERS_LABEL = "Otros"
+
+
+class ChartDataError(ValueError):
+    """Petición que no se puede servir (gráfico, columna o parámetro no válido)."""
+
+
+def get_config() -> Dict[str, Any]:
+    conf = dict(DEFAULTS)
+    conf.update(getattr(settings, "CHART_DATA", {}) or {})
+    return conf
+
+
+def normalize_spec(spec: Dict[str, Any], conf: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Sugerencia + opciones (agg, width, top, method) validadas y con valores por defecto."""
+    conf = conf or get_config()
+    chart = (spec.get("type") or "").lower()
+    if chart not in CHART_FIELDS:
+        raise ChartDataError(f"Tipo de gráfico '{chart}' no soportado (usa {', '.join(CHART_FIELDS)})")
+    out = {"type": chart}
+    for field in CHART_FIELDS[chart]:
+        value = (spec.get(field) or "").strip()
+        if not value:
+            raise ChartDataError(f"El gráfico '{chart}' necesita el parámetro '{field}'")
+        out[field] = value
+    agg = (spec.get("agg") or "sum").lower()
+    if agg not in AGGREGATIONS:
+        raise ChartDataError(f"Agregación '{agg}' no soportada (usa {', '.join(AGGREGATIONS)})")
+    method = (spec.get("method") or conf["METHOD"]).lower()
+    if method not in METHODS:
+        raise ChartDataError(f"Método '{method}' no soportado (usa {', '.join(METHODS)})")
+    try:
+        width = int(spec.get("width") or conf["WIDTH"])
+        top = int(spec["top"]) if spec.get("top") not in (None, "") else conf["TOP"].get(chart, 0)
+    except (TypeError, ValueError):
+        raise ChartDataError("width y top deben ser enteros")
+    out.update({"agg": agg, "method": method, "width": max(3, min(width, conf["MAX_WIDTH"])), "top": max(0, top)})
+    if chart == "choropleth":
+        level = (spec.get("level") or "auto").lower()
+        if level not in ("auto", *LEVELS):
+            raise ChartDataError(f"Nivel '{level}' no soportado (usa auto, {', '.join(LEVELS)})")
+        try:
+            zoom = int(spec["zoom"]) if spec.get("zoom") not in (None, "") else None
+        except (TypeError, ValueError):
+            raise ChartDataError("zoom debe ser un entero")
+        out.update({"level": level, "zoom": zoom})
+    return out
+
+
+# -----------------------
+# Reducción de series
+# -----------------------
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: índices de los `n_out` puntos que mejor
+    conservan la forma de la serie (primero y último siempre incluidos).
+    Las medias de cada cubeta salen de sumas acumuladas; el bucle es por cubeta.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    every = (n - 2) / (n_out - 2)
+    # cubeta b (0..n_out-3) = [starts[b], starts[b + 1]); la última acaba en n - 1
+    starts = np.floor(np.arange(n_out - 1) * every).astype(np.int64) + 1
+    starts[-1] = n - 1
+    cx = np.concatenate(([0.0], np.cumsum(x)))
+    cy = np.concatenate(([0.0], np.cumsum(y)))
+    # media de la cubeta siguiente a cada una (la del último punto para la última)
+    lo, hi = starts[1:], np.append(starts[2:], n)
+    avg_x = (cx[hi] - cx[lo]) / (hi - lo)
+    avg_y = (cy[hi] - cy[lo]) / (hi - lo)
+
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for b in range(n_out - 2):
+        s, e = starts[b], starts[b + 1]
+        xs, ys = x[s:e], y[s:e]
+        area = np.abs((x[a] - avg_x[b]) * (ys - y[a]) - (x[a] - xs) * (avg_y[b] - y[a]))
+        a = s + int(np.argmax(area))
+        out[b + 1] = a
+    return out
+
+
+def minmax_indices(y: np.ndarray, n_out: int) -> np.ndarray:
+    """Mínimo y máximo de cada una de n_out / 2 cubetas (conserva picos), más los extremos."""
+    n = len(y)
+    if n_out >= n or n_out < 4:
+        return np.arange(n)
+    buckets = np.arange(n) * (n_out // 2) // n
+    order = np.lexsort((y, buckets))
+    first = np.flatnonzero(np.r_[True, buckets[order][1:] != buckets[order][:-1]])
+    last = np.r_[first[1:] - 1, n - 1]
+    return np.unique(np.concatenate(([0, n - 1], order[first], order[last])))
+
+
+def downsample(x: np.ndarray, y: np.ndarray, width: int, method: str) -> np.ndarray:
+    """Índices de los puntos a enviar; los NaN se descartan antes de reducir."""
+    valid = np.flatnonzero(~np.isnan(y))
+    if method == "none" or len(valid) <= width:
+        return valid
+    if method == "minmax":
+        return valid[minmax_indices(y[valid], width)]
+    return valid[lttb_indices(x[valid], y[valid], width)]
+
+
+# -----------------------
+# Columnas de la tabla
+# -----------------------
+def _column(table: columnar_store.Table, name: str):
+    if name not in table.columns:
+        raise ChartDataError(f"La columna '{name}' no existe (columnas: {', '.join(table.columns)})")
+    return table.column(name)
+
+
+def numeric_column(table: columnar_store.Table, name: str) -> np.ndarray:
+    """float64 con NaN; las columnas de texto ("1.234,5") se convierten por categoría, no por fila."""
+    col = _column(table, name)
+    if isinstance(col, pd.Categorical):
+        values = coerce_numeric([str(c) for c in col.categories])
+        return values[col.codes]
+    return np.asarray(col, dtype=np.float64)
+
+
+def _parse_dates(labels: pd.Series) -> pd.Series:
+    # ISO 8601 primero; si no encaja, formatos libres con día delante (dd/mm/aaaa)
+    parsed = pd.to_datetime(labels, errors="coerce", format="ISO8601")
+    if parsed.isna().mean() > 0.2:
+        parsed = pd.to_datetime(labels, errors="coerce", format="mixed", dayfirst=True)
+    return parsed
+
+
+def time_axis(table: columnar_store.Table, name: str) -> Tuple[np.ndarray, str]:
+    """
+    (clave numérica ordenable por fila, tipo): "datetime" (ns), "numeric" (años,
+    etc.) o "label" (orden de aparición). Las fechas de texto se parsean una
+    vez por valor distinto.
+    """
+    col = _column(table, name)
+    if not isinstance(col, pd.Categorical):
+        return np.asarray(col, dtype=np.float64), "numeric"
+    cats = pd.Series([str(c) for c in col.categories], dtype=object)
+    parsed = _parse_dates(cats)
+    if parsed.notna().mean() >= 0.8:
+        keys = parsed.to_numpy(dtype="datetime64[ns]").astype(np.int64).astype(np.float64)
+        keys[parsed.isna().to_numpy()] = np.nan
+        return keys[col.codes], "datetime"
+    return col.codes.astype(np.float64), "label"
+
+
+def _format_keys(keys: np.ndarray, kind: str, table: Optional[columnar_store.Table] = None,
+                 name: Optional[str] = None) -> List[Any]:
+    if kind == "datetime":
+        stamps = keys.astype(np.int64).astype("datetime64[ns]")
+        unit = "D" if np.all(keys.astype(np.int64) % (86400 * 10 ** 9) == 0) else "s"
+        return np.datetime_as_string(stamps, unit=unit).tolist()
+    if kind == "label":
+        cats = np.asarray(_column(table, name).categories, dtype=object)
+        return cats[keys.astype(np.int64)].tolist()
+    return [int(k) if float(k).is_integer() else float(k) for k in keys]
+
+
+def _label(key: Any) -> str:
+    if isinstance(key, float) and key.is_integer():
+        return str(int(key))   # años y códigos numéricos sin ".0"
+    return str(key)
+
+
+def _json_values(values: np.ndarray) -> List[Optional[float]]:
+    out = values.astype(object)
+    out[np.isnan(values)] = None
+    return out.tolist()
+
+
+# -----------------------
+# Agregación
+# -----------------------
+def _grouped(keys, values: np.ndarray, agg: str, sort: bool = True) -> pd.DataFrame:
+    """sum / count / min / max por clave (columnas "sum", "n", "rows", "min", "max")."""
+    frame = pd.DataFrame({"k": keys, "v": values})
+    g = frame.groupby("k", sort=sort, observed=True, dropna=True)["v"]
+    out = pd.DataFrame({"sum": g.sum(min_count=1), "n": g.count(), "rows": g.size()})
+    if agg in ("min", "max"):
+        out["min"], out["max"] = g.min(), g.max()
+    return out
+
+
+def _value(stats: pd.DataFrame, agg: str) -> np.ndarray:
+    if agg == "mean":
+        return (stats["sum"] / stats["n"].where(stats["n"] > 0)).to_numpy(dtype=np.float64)
+    if agg == "count":
+        return stats["rows"].to_numpy(dtype=np.float64)
+    return stats[agg].to_numpy(dtype=np.float64)
+
+
+def _others(rest: pd.DataFrame, agg: str) -> Optional[float]:
+    # "Otros" agrega las filas de las categorías restantes, no sus valores ya agregados
+    if agg == "mean":
+        n = rest["n"].sum()
+        return float(rest["sum"].sum() / n) if n else None
+    if agg == "count":
+        return float(rest["rows"].sum())
+    if agg == "sum":
+        return float(rest["sum"].sum()) if rest["sum"].notna().any() else None
+    value = getattr(rest[agg], agg)()
+    return None if pd.isna(value) else float(value)
+
+
+def categorical_chart(keys, values: np.ndarray, spec: Dict[str, Any]) -> Dict[str, Any]:
+    agg, top = spec["agg"], spec["top"]
+    stats = _grouped(keys, values, agg, sort=False)
+    stats["value"] = _value(stats, agg)
+    stats = stats.sort_values("value", ascending=False, na_position="last", kind="stable")
+    head, rest = (stats.iloc[:top], stats.iloc[top:]) if top else (stats, stats.iloc[:0])
+    labels = [_label(k) for k in head.index]
+    data = head["value"].to_numpy(dtype=np.float64)
+    others = None
+    if len(rest):
+        others = {"label": OTHERS_LABEL, "categories": len(rest), "value": _others(rest, agg)}
+        labels.append(OTHERS_LABEL)
+        data = np.append(data, np.nan if others["value"] is None else others["value"])
+    return {"labels": labels, "values": _json_values(data), "categories_total": len(stats), "others": others}
+
+
+def _topology_ref(level: str, zoom: Optional[int]) -> Optional[Dict[str, Any]]:
+    chosen = geo_shapes.pick_zoom(level, zoom)
+    if chosen is None:
+        return None
+    return {"layer": level, "zoom": chosen, "url": f"{reverse('geo_shapes_view', args=[level])}?zoom={chosen}"}
+
+
+def choropleth_chart(keys, values: np.ndarray, spec: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Valores agregados por región: cada nombre o código distinto se resuelve una
+    vez en el índice geográfico y las filas se agrupan por el id resultante.
+    """
+    if isinstance(keys, pd.Categorical):
+        codes, labels = keys.codes, [str(c) for c in keys.categories]
+    else:
+        codes, uniques = pd.factorize(np.asarray(keys))
+        labels = [_label(u) for u in uniques.tolist()]
+    index = get_index()
+    resolved = index.resolve(labels, spec["level"])
+    region, ids = pd.factorize(pd.Series(resolved["ids"], dtype=object))   # -1 = sin resolver
+    region = np.append(region, -1)[codes]                                  # código -1 (vacío) -> sin resolver
+
+    matched = region >= 0
+    stats = _grouped(region[matched], values[matched], spec["agg"])
+    data = _value(stats, spec["agg"])
+    region_ids = [ids[i] for i in stats.index]
+
+    unmatched_rows = np.bincount(codes[~matched & (codes >= 0)], minlength=len(labels))
+    order = np.argsort(-unmatched_rows, kind="stable")
+    finite = data[np.isfinite(data)]
+    return {
+        "level": resolved["level"],
+        "ids": region_ids,
+        "names": [index.name(i) for i in region_ids],
+        "values": _json_values(data),
+        "range": [float(finite.min()), float(finite.max())] if len(finite) else None,
+        "matched_rows": int(matched.sum()),
+        "unmatched": {"categories": int(np.count_nonzero(unmatched_rows)), "rows": int(unmatched_rows.sum()),
+                      "labels": [labels[i] for i in order[:20] if unmatched_rows[i]]},
+        "ambiguous": resolved["ambiguous"][:20],
+        "categories_total": len(labels),
+        "topology": _topology_ref(resolved["level"], spec["zoom"]),
+    }
+
+
+def timeseries_chart(keys: np.ndarray, values: np.ndarray, spec: Dict[str, Any]):
+    """(claves, valores) por fecha agregados, ordenados y reducidos a `width`."""
+    stats = _grouped(keys, values, spec["agg"])
+    x = stats.index.to_numpy(dtype=np.float64)
+    y = _value(stats, spec["agg"])
+    idx = downsample(x, y, spec["width"], spec["method"])
+    return x[idx], y[idx], len(x)
+
+
+def heatmap_chart(lat: np.ndarray, lon: np.ndarray, spec: Dict[str, Any], max_cells: int) -> Dict[str, Any]:
+    """
+    Puntos válidos tal cual si caben en `width`; si no, rejilla de celdas
+    cuadradas (~sqrt(width) en el eje más largo) con el nº de puntos de cada una.
+    """
+    ok = ~(np.isnan(lat) | np.isnan(lon)) & (np.abs(lat) <= 90) & (np.abs(lon) <= 180)
+    lat, lon = lat[ok], lon[ok]
+    if len(lat) <= spec["width"]:
+        points = np.column_stack([lat, lon, np.ones(len(lat))])
+        return {"points": points.tolist(), "points_total": len(lat), "cell_size": None}
+    cells = max(1, min(int(np.sqrt(spec["width"])), max_cells))
+    span = max(lat.max() - lat.min(), lon.max() - lon.min()) or 1e-9
+    size = span / cells
+    iy = np.minimum(np.floor((lat - lat.min()) / size).astype(np.int64), cells - 1)
+    ix = np.minimum(np.floor((lon - lon.min()) / size).astype(np.int64), cells - 1)
+    codes, counts = np.unique(iy * cells + ix, return_counts=True)
+    cy, cx = np.divmod(codes, cells)
+    points = np.column_stack([lat.min() + (cy + 0.5) * size, lon.min() + (cx + 0.5) * size, counts])
+    return {"points": points.tolist(), "points_total": len(lat), "cell_size": size}
+
+
+# -----------------------
+# Fuentes
+# -----------------------
+def chart_from_table(table: columnar_store.Table, spec: Dict[str, Any],
+                     conf: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    conf = conf or get_config()
+    chart = spec["type"]
+    if chart == "timeseries":
+        keys, kind = time_axis(table, spec["x"])
+        values = np.ones(table.num_rows) if spec["agg"] == "count" else numeric_column(table, spec["y"])
+        x, y, total = timeseries_chart(keys, values, spec)
+        series = {"name": spec["y"], "x": _format_keys(x, kind, table, spec["x"]), "y": _json_values(y)}
+        return {"x_type": kind, "points_total": total, "series": [series]}
+    if chart == "heatmap":
+        return heatmap_chart(numeric_column(table, spec["lat"]), numeric_column(table, spec["lon"]), spec, conf["HEATMAP_CELLS"])
+    keys = _column(table, spec["category" if chart != "choropleth" else "geo_name"])
+    values = np.ones(table.num_rows) if spec["agg"] == "count" else numeric_column(table, spec["value"])
+    if chart == "choropleth":
+        return choropleth_chart(keys, values, spec)
+    return categorical_chart(keys, values, spec)
+
+
+def _series_regions(names: List[str]) -> List[str]:
+    """
+    Región de cada serie del INE: el primer tramo del nombre ("Madrid. Hombres.
+    Total.") que es un nombre geográfico; si ninguno lo es, el nombre completo.
+    """
+    parts = [[p.strip() for p in name.split(". ") if p.strip()] or [name] for name in names]
+    flat = [p for segments in parts for p in segments]
+    known = iter(get_index().matches(flat).tolist())
+    regions = []
+    for name, segments in zip(names, parts):
+        hits = [p for p in segments if next(known)]
+        regions.append(hits[0] if hits else name)
+    return regions
+
+
+def chart_from_ine(url: str, spec: Dict[str, Any], filters: Optional[Dict[str, Any]] = None,
+                   conf: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Tablas del INE: la matriz de series ya está alineada por periodo, así que
+    timeseries reduce cada serie por separado y barchart/piechart/choropleth
+    comparan el último valor de cada serie (choropleth, por su región).
+    """
+    conf = conf or get_config()
+    data = get_series_matrix(url, filters)
+    labels, names, matrix = data["labels"], data["names"], data["matrix"]
+    if spec["type"] == "timeseries":
+        x = np.arange(len(labels), dtype=np.float64)
+        series = []
+        for name, row in zip(names[:conf["MAX_SERIES"]], matrix):
+            idx = downsample(x, row, spec["width"], spec["method"])
+            series.append({"name": name, "x": [labels[i] for i in idx], "y": _json_values(row[idx])})
+        return {"x_type": "label", "points_total": int(matrix.size), "series_total": len(names), "series": series}
+    if spec["type"] in ("barchart", "piechart", "choropleth"):
+        # último periodo con dato de cada serie
+        has = ~np.isnan(matrix)
+        last = np.where(has.any(axis=1), matrix.shape[1] - 1 - np.argmax(has[:, ::-1], axis=1), -1)
+        values = np.array([matrix[i, j] if j >= 0 else np.nan for i, j in enumerate(last)])
+        if spec["type"] == "choropleth":
+            return choropleth_chart(np.asarray(_series_regions(names), dtype=object), values, spec)
+        return categorical_chart(np.asarray(names, dtype=object), values, spec)
+    raise ChartDataError(f"El gráfico '{spec['type']}' no está disponible para tablas del INE")
+
+
+def build_chart_data(url: str, fmt: Optional[str], spec: Dict[str, Any],
+                     ine_filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    conf = get_config()
+    if is_ine_dataset(url):
+        data, source = chart_from_ine(url, spec, ine_filters, conf), {"source": "ine-api"}
+    else:
+        table = materialize_distribution(url, fmt or None)
+        data, source = chart_from_table(table, spec, conf), {"source": "columnar", "rows": table.num_rows}
+    return {**spec, **source, **data}
+
+
+def get_chart_data(url: str, fmt: Optional[str], spec: Dict[str, Any],
+                   ine_filters: Optional[Dict[str, Any]] = None, force: bool = False) -> Tuple[Dict[str, Any], str]:
+    """(datos, "hit" | "miss"). Peticiones iguales concurrentes se coalescen."""
+    key = dataset_cache.make_cache_key(NAMESPACE, {"url": url, "format": fmt or "", "filters": ine_filters or {}, **spec})
+    if not force:
+        data, state = dataset_cache.lookup(key)
+        if state == dataset_cache.FRESH:
+            return data, "hit"
+
+    def compute():
+        data = build_chart_data(url, fmt, spec, ine_filters)
+        dataset_cache.store(NAMESPACE, key, data)
+        return data
+
+    return single_flight.do(key, compute), "miss"
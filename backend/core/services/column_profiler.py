@@ -0,0 +1,343 @@
+# core/services/column_profiler.py
+# Perfilado de columnas sobre el recurso completo en una sola pasada y con
+# memoria acotada: las filas llegan por lotes y cada columna mantiene sólo
+# resúmenes fusionables (Welford, KLL, HyperLogLog, Misra-Gries).
+import math
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from core.services.geo_index import GeoIndex
+from core.services.schema_inference import classify_values, decide_type, distinct_text
+
+DEFAULTS = {
+    "BATCH_ROWS": 10000,                # filas por lote (DataFrame temporal)
+    "MAX_BYTES": 2 * 1024 ** 3,         # corte de seguridad de la descarga (None = sin límite)
+    "KLL_K": 200,                       # tamaño del compactor superior del sketch de cuantiles
+    "HLL_PRECISION": 14,                # 2^14 registros: ~0.8% de error típico
+    "TOP_K": 10,                        # valores más frecuentes a devolver
+    "TOP_K_CAPACITY": 100,              # contadores que mantiene Misra-Gries
+    "QUANTILES": (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99),
+}
+
+
+def get_config() -> Dict[str, Any]:
+    conf = dict(DEFAULTS)
+    conf.update(getattr(settings, "DATASET_PROFILE", {}) or {})
+    return conf
+
+
+# -----------------------
+# Momentos: Welford / Chan
+# -----------------------
+class RunningMoments:
+    """Media y varianza en una pasada; cada lote se fusiona con la fórmula de Chan."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def update(self, values: np.ndarray, weights: Optional[np.ndarray] = None):
+        if not len(values):
+            return
+        w = np.ones(len(values)) if weights is None else weights.astype(np.float64)
+        n_b = float(w.sum())
+        mean_b = float(np.dot(w, values) / n_b)
+        m2_b = float(np.dot(w, (values - mean_b) ** 2))
+        n_a = self.count
+        n = n_a + n_b
+        delta = mean_b - self.mean
+        self.mean += delta * n_b / n
+        self.m2 += m2_b + delta * delta * n_a * n_b / n
+        self.count = int(n)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    @property
+    def variance(self) -> Optional[float]:
+        # Varianza muestral (n - 1), como pandas
+        return self.m2 / (self.count - 1) if self.count > 1 else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        if not self.count:
+            return {"min": None, "max": None, "mean": None, "variance": None, "std": None}
+        var = self.variance
+        return {
+            "min": self.min,
+            "max": self.max,
+            "mean": self.mean,
+            "variance": var,
+            "std": math.sqrt(var) if var is not None else None,
+        }
+
+
+# -----------------------
+# Cuantiles: sketch KLL
+# -----------------------
+class KLLSketch:
+    """
+    Sketch KLL (Karnin, Lang, Liberty) simplificado: una pila de compactores en
+    la que el nivel h pesa 2^h. Cuando un nivel supera su capacidad se ordena y
+    sube la mitad de sus elementos (pares o impares al azar) al siguiente. La
+    memoria es O(k) independientemente del número de valores.
+    """
+
+    def __init__(self, k: int = 200, c: float = 2 / 3, seed: int = 0):
+        self.k = k
+        self.c = c
+        self.n = 0
+        self.levels: List[np.ndarray] = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)  # determinista: mismo fichero, mismo perfil
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(2, int(math.ceil(self.k * self.c ** depth)))
+
+    def update(self, values: np.ndarray):
+        if not len(values):
+            return
+        self.n += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values.astype(np.float64)])
+        self._compress()
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                # Con longitud impar se queda uno en el nivel para no perder peso
+                keep = items[-1:] if len(items) % 2 else items[:0]
+                even = items[: len(items) - len(keep)]
+                promoted = even[int(self._rng.integers(2))::2]
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+                self.levels[level] = keep
+            level += 1
+
+    def quantiles(self, qs: Iterable[float]) -> List[Optional[float]]:
+        qs = list(qs)
+        if not self.n:
+            return [None] * len(qs)
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(lv), 2.0 ** h) for h, lv in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        items, cum = items[order], np.cumsum(weights[order])
+        idx = np.searchsorted(cum, np.asarray(qs) * cum[-1], side="left")
+        return [float(v) for v in items[np.minimum(idx, len(items) - 1)]]
+
+    @property
+    def retained(self) -> int:
+        return sum(len(lv) for lv in self.levels)
+
+
+# -----------------------
+# Distintos: HyperLogLog
+# -----------------------
+class HyperLogLog:
+    """HyperLogLog sobre hashes de 64 bits, con linear counting para cardinalidades bajas."""
+
+    def __init__(self, p: int = 14):
+        self.p = p
+        self.m = 1 << p
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+
+    @staticmethod
+    def _bit_length(x: np.ndarray) -> np.ndarray:
+        # log2 exacto por mitades de 32 bits (float64 no representa todos los uint64)
+        hi = (x >> np.uint64(32)).astype(np.float64)
+        lo = (x & np.uint64(0xFFFFFFFF)).astype(np.float64)
+        with np.errstate(divide="ignore"):
+            bl_hi = np.floor(np.log2(hi)) + 33
+            bl_lo = np.where(lo > 0, np.floor(np.log2(lo)) + 1, 0)
+        return np.where(hi > 0, bl_hi, bl_lo).astype(np.int64)
+
+    def update_hashes(self, hashes: np.ndarray):
+        if not len(hashes):
+            return
+        hashes = hashes.astype(np.uint64, copy=False)
+        rest_bits = 64 - self.p
+        idx = (hashes >> np.uint64(rest_bits)).astype(np.int64)
+        rest = hashes & np.uint64((1 << rest_bits) - 1)
+        rank = (rest_bits - self._bit_length(rest) + 1).astype(np.uint8)
+        np.maximum.at(self.registers, idx, rank)
+
+    def update(self, values: List[str]):
+        if values:
+            self.update_hashes(pd.util.hash_array(np.asarray(values, dtype=object)))
+
+    def count(self) -> int:
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / float(np.sum(np.ldexp(1.0, -self.registers.astype(np.int64))))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+
+# -----------------------
+# Más frecuentes: Misra-Gries
+# -----------------------
+class HeavyHitters:
+    """
+    Resumen Misra-Gries fusionable por lotes: se suman los conteos del lote y, si
+    hay más de `capacity` contadores, se resta a todos el (capacity+1)-ésimo mayor.
+    Los conteos son cotas inferiores con error máximo `error`.
+    """
+
+    def __init__(self, capacity: int = 100):
+        self.capacity = capacity
+        self.counters: Dict[str, int] = {}
+        self.error = 0
+
+    def update(self, values: List[str], counts: np.ndarray):
+        counters = self.counters
+        for v, c in zip(values, counts.tolist()):
+            counters[v] = counters.get(v, 0) + c
+        if len(counters) > self.capacity:
+            cut = sorted(counters.values(), reverse=True)[self.capacity]
+            self.counters = {v: c - cut for v, c in counters.items() if c > cut}
+            self.error += cut
+
+    def top(self, k: int) -> List[Dict[str, Any]]:
+        items = sorted(self.counters.items(), key=lambda kv: (-kv[1], kv[0]))[:k]
+        return [{"value": v, "count": c} for v, c in items]
+
+
+# -----------------------
+# Perfil por columna / dataset
+# -----------------------
+class ColumnProfile:
+    def __init__(self, name: str, conf: Dict[str, Any], geo: GeoIndex):
+        self.name = name
+        self.geo = geo
+        self.quantile_levels = tuple(conf["QUANTILES"])
+        self.top_k = conf["TOP_K"]
+        self.values = 0             # filas con valor no vacío
+        self.numeric_count = 0
+        self.date_count = 0
+        self.geo_count = 0
+        self.moments = RunningMoments()
+        self.sketch = KLLSketch(k=conf["KLL_K"])
+        self.distinct = HyperLogLog(p=conf["HLL_PRECISION"])
+        self.heavy = HeavyHitters(capacity=conf["TOP_K_CAPACITY"])
+
+    def update(self, col: pd.Series):
+        _, text, counts = distinct_text(col)
+        keep = np.fromiter(map(len, text), dtype=np.int64, count=len(text)) > 0
+        values = [v for v, k in zip(text, keep) if k]
+        weights = counts[keep]
+        if not values:
+            return
+        c = classify_values(values, weights, self.geo)
+        self.values += c["n"]
+        self.numeric_count += c["numeric_count"]
+        self.date_count += c["date_count"]
+        self.geo_count += c["geo_count"]
+
+        numbers = c["numbers"]
+        is_num = ~np.isnan(numbers)
+        if is_num.any():
+            self.moments.update(numbers[is_num], weights[is_num])
+            self.sketch.update(np.repeat(numbers[is_num], weights[is_num]))
+        self.distinct.update(c["lowered"])
+        self.heavy.update(values, weights)
+
+    def inferred_type(self) -> str:
+        return decide_type(self.name, self.values, self.numeric_count, self.date_count, self.geo_count)
+
+    def to_dict(self, rows: int) -> Dict[str, Any]:
+        quantiles = self.sketch.quantiles(self.quantile_levels)
+        return {
+            "name": self.name,
+            "inferred_type": self.inferred_type(),
+            "count": self.values,
+            "nulls": rows - self.values,
+            "numeric_count": self.numeric_count,
+            "date_count": self.date_count,
+            "geo_count": self.geo_count,
+            **self.moments.to_dict(),
+            "quantiles": {str(q): v for q, v in zip(self.quantile_levels, quantiles)},
+            "distinct_estimate": self.distinct.count(),
+            "top_values": self.heavy.top(self.top_k),
+            "top_values_max_error": self.heavy.error,
+        }
+
+
+class DatasetProfiler:
+    """
+    Acumula lotes de filas (dicts) y mantiene un ColumnProfile por columna. Las
+    columnas que aparecen tarde (JSON heterogéneo) cuentan como nulas en las
+    filas anteriores.
+    """
+
+    def __init__(self, geo: GeoIndex, conf: Optional[Dict[str, Any]] = None,
+                 key_fn: Optional[Callable[[str], str]] = None):
+        self.conf = conf or get_config()
+        self.geo = geo
+        self.key_fn = key_fn            # normalización de nombres de columna (se cachea por nombre)
+        self._keys: Dict[Any, str] = {}
+        self.rows = 0
+        self.columns: Dict[str, ColumnProfile] = {}
+        self.sample: List[Dict[str, Any]] = []
+        self.meta: Dict[str, Any] = {}   # encoding, bytes descargados, etc. (lo rellena quien lee)
+
+    def _key(self, name: Any) -> str:
+        key = self._keys.get(name)
+        if key is None:
+            key = self._keys[name] = self.key_fn(name) if self.key_fn else str(name)
+        return key
+
+    def add_batch(self, rows: List[Dict[str, Any]]):
+        if not rows:
+            return
+        df = pd.DataFrame.from_records(rows)
+        self.rows += len(df)
+        df.columns = [self._key(c) for c in df.columns]
+        # Dos claves que normalizan igual: gana la última, como en flatten_row
+        df = df.loc[:, ~df.columns.duplicated(keep="last")]
+        for name in df.columns:
+            profile = self.columns.get(name)
+            if profile is None:
+                profile = self.columns[name] = ColumnProfile(name, self.conf, self.geo)
+            profile.update(df[name])
+
+    def consume(self, rows: Iterable[Dict[str, Any]]):
+        size = self.conf["BATCH_ROWS"]
+        batch: List[Dict[str, Any]] = []
+        try:
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= size:
+                    self.add_batch(batch)
+                    batch = []
+        finally:
+            # También si la lectura se corta: las filas ya leídas cuentan
+            self.add_batch(batch)
+
+    def schema(self, sample_schema: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+        """
+        Esquema con el formato de infer_schema, pero con tipo y distintos
+        calculados sobre todo el recurso. Los sample_values salen de la muestra.
+        """
+        samples = {c["name"]: c.get("sample_values", []) for c in sample_schema or []}
+        return [{
+            "name": name,
+            "inferred_type": col.inferred_type(),
+            "sample_values": samples.get(name) or [t["value"] for t in col.heavy.top(5)],
+            "unique_count_estimate": col.distinct.count(),
+        } for name, col in self.columns.items()]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            **self.meta,
+            "rows": self.rows,
+            "columns": [col.to_dict(self.rows) for col in self.columns.values()],
+        }
@@ -0,0 +1,372 @@
+# core/services/columnar_store.py
+# Almacén local de distribuciones materializadas en columnas tipadas: una
+# distribución descargada y parseada una vez se guarda como un directorio
+#   <DIRECTORY>/<clave>/meta.json      columnas, tipos, filas, origen
+#                       c<i>.npy       una columna (float64 / int64 / int32)
+#                       c<i>.cats.json categorías de una columna de texto
+#                       c<i>.mask.npy  nulos de una columna entera con huecos
+# Las columnas numéricas se abren con memory-map (np.load(mmap_mode="r")) y
+# las de texto van codificadas como diccionario (códigos int32 + categorías),
+# igual que un DictionaryArray de Arrow; así un análisis, un re-muestreo o una
+# agregación posteriores no vuelven a la red ni al parser.
+#
+# Tamaño acotado (MAX_BYTES / MAX_ENTRIES) con desalojo LRU por mtime de
+# meta.json, que se actualiza en cada apertura, como la caché en disco.
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from core.utils.dataset_cache import make_cache_key
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE = "columnar"
+
+DEFAULTS = {
+    "ENABLED": True,                    # usar las tablas ya materializadas
+    "AUTO": False,                      # materializar sin pedirlo si el análisis lee todo (profile, rows=-1)
+    "DIRECTORY": None,                  # por defecto BASE_DIR/core/data/columnar
+    "MAX_BYTES": 2 * 1024 ** 3,         # 2 GB en disco
+    "MAX_ENTRIES": 200,
+    "TTL": 24 * 60 * 60,                # pasado este tiempo se vuelve a descargar
+    "MAX_SOURCE_BYTES": 512 * 1024 ** 2,  # no se materializan recursos más grandes
+    "WRITE_BATCH_ROWS": 50000,          # filas que se codifican de una vez al materializar
+}
+
+_INT_LIMIT = 2 ** 53
+
+META = "meta.json"
+
+
+def get_config() -> Dict[str, Any]:
+    conf = dict(DEFAULTS)
+    conf.update(getattr(settings, "COLUMNAR_STORE", {}) or {})
+    if not conf["DIRECTORY"]:
+        conf["DIRECTORY"] = os.path.join(settings.BASE_DIR, "core", "data", "columnar")
+    return conf
+
+
+def table_key(url: str, fmt: Optional[str] = None) -> str:
+    return make_cache_key(NAMESPACE, {"url": url, "format": (fmt or "").lower()})
+
+
+# -----------------------
+# Codificación de columnas
+# -----------------------
+# Un valor sólo se guarda como número si al volver a formatearlo sale el
+# mismo texto ("2020", "2.5"); "1.50", "1e3", "007" o "2020.0" se quedan como
+# texto para que iter_rows devuelva exactamente lo que llegó del parser.
+def _format(kind: str, value: Any) -> str:
+    if kind == "float":
+        if value != value:
+            return ""   # NaN -> vacío
+        value = float(value)
+        return str(int(value)) if value.is_integer() and abs(value) < _INT_LIMIT else repr(value)
+    return str(value)
+
+
+def _encode_batch(values: List[Any]):
+    """
+    Un lote de una columna -> (kind, array, extra): "empty" (todo vacío, extra
+    = nº de filas), "int" (extra = máscara de nulos o None), "float" (NaN en
+    los vacíos) o "str" (códigos int32, extra = categorías).
+    """
+    s = pd.Series(values, dtype=object).fillna("").astype(str)
+    filled = (s != "").to_numpy()
+    n_filled = int(filled.sum())
+    if not n_filled:
+        return "empty", None, len(s)
+    text = s[filled]
+    nums = pd.to_numeric(text, errors="coerce").to_numpy(dtype="float64")
+    if np.all(np.isfinite(nums)):
+        if np.all(nums == np.floor(nums)) and np.all(np.abs(nums) < _INT_LIMIT):
+            ints = nums.astype("int64")
+            if (ints.astype(str) == text.to_numpy(dtype=str)).all():
+                arr = np.zeros(len(s), dtype="int64")
+                arr[filled] = ints
+                return "int", arr, (None if n_filled == len(s) else ~filled)
+        if [_format("float", v) for v in nums.tolist()] == text.tolist():
+            arr = np.full(len(s), np.nan)
+            arr[filled] = nums
+            return "float", arr, None
+    codes, categories = pd.factorize(s, sort=False)
+    return "str", codes.astype("int32"), [str(c) for c in categories]
+
+
+def _chunk_text(chunk) -> List[str]:
+    kind, arr, extra = chunk
+    if kind == "empty":
+        return [""] * extra
+    if kind == "int" and extra is not None:
+        return ["" if m else str(v) for v, m in zip(arr.tolist(), extra.tolist())]
+    return [_format(kind, v) for v in arr.tolist()]
+
+
+def _merge_chunks(chunks: List[Any]):
+    """
+    Une los lotes de una columna en (kind, array, mask, categories): si algún
+    lote es texto la columna entera lo es (los números se reescriben con
+    _format, sin pérdida); los códigos de cada lote se remapean a un único
+    diccionario de categorías.
+    """
+    kinds = {c[0] for c in chunks}
+    if "str" in kinds or kinds == {"empty"}:
+        index: Dict[str, int] = {}
+        parts = []
+        for chunk in chunks:
+            if chunk[0] == "str":
+                codes, cats = chunk[1], chunk[2]
+            else:
+                codes, uniques = pd.factorize(pd.Series(_chunk_text(chunk), dtype=object), sort=False)
+                cats = [str(c) for c in uniques]
+            lookup = np.array([index.setdefault(c, len(index)) for c in cats], dtype="int32")
+            parts.append(lookup[codes])
+        return "str", np.concatenate(parts).astype("int32", copy=False), None, list(index)
+    if "float" in kinds:
+        parts = []
+        for kind, arr, extra in chunks:
+            if kind == "empty":
+                arr = np.full(extra, np.nan)
+            elif kind == "int":
+                arr = arr.astype("float64")
+                if extra is not None:
+                    arr[extra] = np.nan
+            parts.append(arr)
+        return "float", np.concatenate(parts), None, None
+    parts, masks = [], []
+    for kind, arr, extra in chunks:
+        if kind == "empty":
+            parts.append(np.zeros(extra, dtype="int64"))
+            masks.append(np.ones(extra, dtype=bool))
+        else:
+            parts.append(arr)
+            masks.append(extra if extra is not None else np.zeros(len(arr), dtype=bool))
+    mask = np.concatenate(masks)
+    return "int", np.concatenate(parts), (mask if mask.any() else None), None
+
+
+# -----------------------
+# Tabla materializada
+# -----------------------
+class Table:
+    """Vista de solo lectura sobre una entrada del almacén."""
+
+    def __init__(self, path: str, meta: Dict[str, Any]):
+        self.path = path
+        self.meta = meta
+        self.num_rows: int = meta["rows"]
+        self.columns: List[str] = [c["name"] for c in meta["columns"]]
+        self._specs = {c["name"]: c for c in meta["columns"]}
+        self._arrays: Dict[str, Any] = {}
+
+    def _raw(self, name: str):
+        if name not in self._arrays:
+            spec = self._specs[name]
+            arr = np.load(os.path.join(self.path, spec["file"]), mmap_mode="r")
+            cats = mask = None
+            if spec["kind"] == "str":
+                with open(os.path.join(self.path, spec["categories"]), encoding="utf-8") as f:
+                    cats = json.load(f)
+            if spec.get("mask"):
+                mask = np.load(os.path.join(self.path, spec["mask"]), mmap_mode="r")
+            self._arrays[name] = (arr, cats, mask)
+        return self._arrays[name]
+
+    def kind(self, name: str) -> str:
+        return self._specs[name]["kind"]
+
+    def column(self, name: str):
+        """
+        ndarray memory-mapped (numéricas), IntegerArray (enteras con huecos) o
+        pd.Categorical sobre los códigos (texto).
+        """
+        arr, cats, mask = self._raw(name)
+        if mask is not None:
+            return pd.arrays.IntegerArray(np.asarray(arr), np.asarray(mask))
+        if cats is None:
+            return arr
+        return pd.Categorical.from_codes(np.asarray(arr), categories=pd.Index(cats, dtype=object), validate=False)
+
+    def to_frame(self, columns: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        names = list(columns) if columns is not None else self.columns
+        return pd.DataFrame({name: self.column(name) for name in names}, copy=False)
+
+    def iter_rows(self, start: int = 0, stop: Optional[int] = None, batch: int = 10000) -> Iterator[Dict[str, str]]:
+        """Filas como dicts de texto, con la forma de flatten_row (para perfilar / muestrear)."""
+        stop = self.num_rows if stop is None else min(stop, self.num_rows)
+        raws = []
+        for name in self.columns:
+            arr, cats, mask = self._raw(name)
+            raws.append((self.kind(name), arr, np.asarray(cats, dtype=object) if cats is not None else None, mask))
+        for lo in range(start, stop, batch):
+            hi = min(lo + batch, stop)
+            cols = []
+            for kind, arr, cats, mask in raws:
+                chunk = arr[lo:hi]
+                if cats is not None:
+                    cols.append(cats[chunk].tolist())
+                else:
+                    cols.append(_chunk_text((kind, chunk, None if mask is None else mask[lo:hi])))
+            for values in zip(*cols):
+                yield dict(zip(self.columns, values))
+
+    def head(self, n: int) -> List[Dict[str, str]]:
+        return list(self.iter_rows(0, n))
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "rows": self.num_rows,
+            "columns": [{"name": c["name"], "kind": c["kind"]} for c in self.meta["columns"]],
+            "bytes": self.meta.get("bytes"),
+            "materialized_at": self.meta.get("created_at"),
+            "source": self.meta.get("source", {}),
+        }
+
+
+# -----------------------
+# Almacén
+# -----------------------
+_lock = threading.Lock()
+
+
+def _entry_path(key: str, conf: Dict[str, Any]) -> str:
+    return os.path.join(conf["DIRECTORY"], key)
+
+
+def open_table(key: str) -> Optional[Table]:
+    conf = get_config()
+    path = _entry_path(key, conf)
+    meta_path = os.path.join(path, META)
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        logger.warning("Entrada columnar corrupta, se elimina: %s", path)
+        shutil.rmtree(path, ignore_errors=True)
+        return None
+    if conf["TTL"] and time.time() - meta.get("created_at", 0) > conf["TTL"]:
+        return None
+    try:
+        os.utime(meta_path, None)   # orden LRU
+    except FileNotFoundError:
+        return None
+    return Table(path, meta)
+
+
+def write_table(key: str, rows: Iterable[Dict[str, Any]], source: Dict[str, Any]) -> Table:
+    """
+    Materializa `rows` (dicts, como los de los parsers en streaming) y la
+    publica de forma atómica (directorio temporal + rename). Las filas se
+    codifican por lotes de WRITE_BATCH_ROWS, así que nunca hay más de un lote
+    como listas de Python.
+    """
+    conf = get_config()
+    batch_rows = max(1, int(conf["WRITE_BATCH_ROWS"]))
+    chunks: Dict[str, List[Any]] = {}   # columna -> lotes ya codificados
+    n = 0
+
+    def flush(batch: List[Dict[str, Any]]) -> None:
+        nonlocal n
+        names = dict.fromkeys(chunks)
+        for row in batch:
+            names.update(dict.fromkeys(row))
+        for name in names:
+            if name not in chunks:
+                chunks[name] = [("empty", None, n)] if n else []   # columna nueva: vacía en los lotes anteriores
+            chunks[name].append(_encode_batch([row.get(name, "") for row in batch]))
+        n += len(batch)
+
+    batch: List[Dict[str, Any]] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_rows:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+    final = _entry_path(key, conf)
+    tmp = f"{final}.{os.getpid()}.{threading.get_ident()}.tmp"
+    os.makedirs(tmp, exist_ok=True)
+    specs, size = [], 0
+    try:
+        for i, name in enumerate(list(chunks)):
+            kind, arr, mask, cats = _merge_chunks(chunks.pop(name))
+            spec = {"name": name, "kind": kind, "file": f"c{i}.npy"}
+            np.save(os.path.join(tmp, spec["file"]), arr, allow_pickle=False)
+            if mask is not None:
+                spec["mask"] = f"c{i}.mask.npy"
+                np.save(os.path.join(tmp, spec["mask"]), mask, allow_pickle=False)
+            if cats is not None:
+                spec["categories"] = f"c{i}.cats.json"
+                with open(os.path.join(tmp, spec["categories"]), "w", encoding="utf-8") as f:
+                    json.dump(cats, f, ensure_ascii=False)
+            specs.append(spec)
+        size = sum(e.stat().st_size for e in os.scandir(tmp))
+        meta = {"rows": n, "columns": specs, "bytes": size, "created_at": time.time(), "source": source}
+        with open(os.path.join(tmp, META), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        with _lock:
+            shutil.rmtree(final, ignore_errors=True)
+            os.replace(tmp, final)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    evict()
+    return Table(final, meta)
+
+
+def delete(key: str) -> None:
+    shutil.rmtree(_entry_path(key, get_config()), ignore_errors=True)
+
+
+def _entries(conf: Dict[str, Any]) -> List[Dict[str, Any]]:
+    out = []
+    try:
+        scan = list(os.scandir(conf["DIRECTORY"]))
+    except FileNotFoundError:
+        return out
+    for e in scan:
+        if not e.is_dir() or e.name.endswith(".tmp"):
+            continue
+        try:
+            mtime = os.stat(os.path.join(e.path, META)).st_mtime
+            size = sum(f.stat().st_size for f in os.scandir(e.path))
+        except FileNotFoundError:
+            continue
+        out.append({"key": e.name, "path": e.path, "last_used": mtime, "bytes": size})
+    return out
+
+
+def evict() -> int:
+    """Desaloja por LRU hasta el 90% de MAX_BYTES / MAX_ENTRIES. Devuelve las entradas borradas."""
+    conf = get_config()
+    entries = sorted(_entries(conf), key=lambda e: e["last_used"])
+    total, count = sum(e["bytes"] for e in entries), len(entries)
+    if total <= conf["MAX_BYTES"] and count <= conf["MAX_ENTRIES"]:
+        return 0
+    removed = 0
+    for e in entries:
+        if total <= conf["MAX_BYTES"] * 0.9 and count <= conf["MAX_ENTRIES"] * 0.9:
+            break
+        shutil.rmtree(e["path"], ignore_errors=True)
+        total -= e["bytes"]
+        count -= 1
+        removed += 1
+    return removed
+
+
+def stats() -> Dict[str, Any]:
+    conf = get_config()
+    entries = _entries(conf)
+    return {"entries": len(entries), "bytes": sum(e["bytes"] for e in entries),
+            "max_bytes": conf["MAX_BYTES"], "max_entries": conf["MAX_ENTRIES"]}
@@ -0,0 +1,385 @@
+# core/services/correlation.py
+# Correlación entre series de varias fuentes:
+#   - tablas del INE (todas sus series, o las que dejen los filtros tv)
+#   - distribuciones analizadas: columna de fecha x + columna numérica y,
+#     agregadas por periodo (tabla materializada en columnar_store)
+# Cada fuente se convierte en un bloque (periodos x series) a la frecuencia
+# común (la más gruesa de las fuentes si no se indica) y los bloques se unen
+# por periodo con un hash join (pd.factorize sobre todas las claves).
+# Pearson y Spearman (rangos) se calculan para todos los pares a la vez con
+# productos de matrices sobre los datos centrados y la máscara de presencia:
+# cada par usa sólo los periodos en los que ambas series tienen dato
+# (pairwise-complete), sin bucles por par. La correlación cruzada con
+# desfase repite ese cálculo una vez por desfase (no por par).
+# El resultado se cachea por conjunto de series en el namespace "correlation".
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from core.services.chart_data import numeric_column, time_axis
+from core.services.dataset_analyzer import materialize_distribution
+from core.services.ine_api_service import get_series_matrix, is_ine_dataset
+from core.utils import dataset_cache, single_flight
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE = "correlation"
+
+DEFAULTS = {
+    "MAX_SOURCES": 20,
+    "MAX_SERIES": 500,
+    "MAX_LAG": 24,
+    "MIN_PERIODS": 3,       # pares con menos periodos en común -> null
+    "LAG_DETAIL_SERIES": 10,  # hasta este nº de series se devuelve la matriz de cada desfase
+}
+
+FREQUENCIES = ("D", "W", "M", "Q", "Y")
+METHODS = ("pearson", "spearman")
+AGGREGATIONS = ("mean", "sum", "last", "min", "max")
+_TZ = "Europe/Madrid"   # las fechas del INE llegan en ms UTC de la medianoche peninsular
+
+
+class CorrelationError(ValueError):
+    """Petición que no se puede servir (fuente, parámetro o serie no válidos)."""
+
+
+def get_config() -> Dict[str, Any]:
+    conf = dict(DEFAULTS)
+    conf.update(getattr(settings, "CORRELATION", {}) or {})
+    return conf
+
+
+def parse_request(body: Dict[str, Any], conf: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    {"series": [url | {"url", "format", "x", "y", "agg", "tv", "name"}], "method",
+     "max_lag", "freq", "min_periods"} validado; las distribuciones que no son
+    del INE necesitan x (fecha) e y (valor).
+    """
+    conf = conf or get_config()
+    raw = body.get("series")
+    if not isinstance(raw, list) or not raw:
+        raise CorrelationError("'series' debe ser una lista no vacía de fuentes")
+    if len(raw) > conf["MAX_SOURCES"]:
+        raise CorrelationError(f"Como máximo {conf['MAX_SOURCES']} fuentes por petición")
+
+    sources = []
+    for item in raw:
+        item = {"url": item} if isinstance(item, str) else item
+        if not isinstance(item, dict) or not (item.get("url") or "").strip():
+            raise CorrelationError("Cada fuente necesita 'url'")
+        source = {"url": item["url"].strip(), "agg": (item.get("agg") or "mean").lower()}
+        if source["agg"] not in AGGREGATIONS:
+            raise CorrelationError(f"Agregación '{source['agg']}' no soportada (usa {', '.join(AGGREGATIONS)})")
+        if is_ine_dataset(source["url"]):
+            tv = item.get("tv") or []
+            source["tv"] = sorted([tv] if isinstance(tv, str) else tv)
+        else:
+            for field in ("x", "y"):
+                if not (item.get(field) or "").strip():
+                    raise CorrelationError(f"La distribución {source['url']} necesita '{field}' (columna de fecha y de valor)")
+                source[field] = item[field].strip()
+            source["format"] = (item.get("format") or "").lower()
+        if item.get("name"):
+            source["name"] = str(item["name"])
+        sources.append(source)
+
+    methods = body.get("method") or list(METHODS)
+    methods = [methods] if isinstance(methods, str) else methods
+    if not set(methods) <= set(METHODS):
+        raise CorrelationError(f"Método no soportado (usa {', '.join(METHODS)})")
+    freq = (body.get("freq") or "auto").upper()
+    if freq != "AUTO" and freq not in FREQUENCIES:
+        raise CorrelationError(f"Frecuencia '{freq}' no soportada (usa {', '.join(FREQUENCIES)} o auto)")
+    try:
+        max_lag = int(body.get("max_lag") or 0)
+        min_periods = int(body.get("min_periods") or conf["MIN_PERIODS"])
+    except (TypeError, ValueError):
+        raise CorrelationError("max_lag y min_periods deben ser enteros")
+    return {
+        "sources": sources,
+        "methods": [m for m in METHODS if m in methods],
+        "freq": freq.lower() if freq == "AUTO" else freq,
+        "max_lag": max(0, min(max_lag, conf["MAX_LAG"])),
+        "min_periods": max(2, min_periods),
+    }
+
+
+# -----------------------
+# Fuentes -> bloques (periodo x series)
+# -----------------------
+def ine_timestamps(labels: List[Any]) -> Optional[pd.DatetimeIndex]:
+    """Labels del INE (ms desde epoch o ISO con zona) a fechas locales; None si no son fechas."""
+    values = pd.Series(labels)
+    if pd.api.types.is_numeric_dtype(values):
+        stamps = pd.to_datetime(values, unit="ms", utc=True, errors="coerce")
+    else:
+        stamps = pd.to_datetime(values, utc=True, errors="coerce", format="ISO8601")
+    if stamps.isna().mean() > 0.2:
+        return None
+    return pd.DatetimeIndex(stamps.dt.tz_convert(_TZ).dt.tz_localize(None))
+
+
+def native_frequency(stamps: pd.DatetimeIndex) -> str:
+    """Frecuencia de una serie por la mediana de la distancia entre fechas distintas."""
+    days = np.diff(np.unique(stamps.dropna().to_numpy(dtype="datetime64[D]")).astype(np.int64))
+    if not len(days):
+        return "D"
+    step = float(np.median(days))
+    return "Y" if step >= 360 else "Q" if step >= 88 else "M" if step >= 28 else "W" if step >= 7 else "D"
+
+
+def _ine_block(source: Dict[str, Any]):
+    data = get_series_matrix(source["url"], {"tv": source["tv"]} if source.get("tv") else None)
+    if not data["names"]:
+        raise CorrelationError(f"La tabla {source['url']} no devolvió series")
+    stamps = ine_timestamps(data["labels"])
+    keys = stamps if stamps is not None else pd.Index([str(l) for l in data["labels"]])
+    names = [f"{source['name']} · {n}" if source.get("name") else n for n in data["names"]]
+    return keys, data["matrix"].T, names
+
+
+def _table_block(source: Dict[str, Any]):
+    table = materialize_distribution(source["url"], source["format"] or None)
+    keys, kind = time_axis(table, source["x"])
+    values = numeric_column(table, source["y"])
+    if kind == "datetime":
+        keys = pd.DatetimeIndex(keys.astype("datetime64[ns]"))   # NaN -> NaT
+    elif kind == "numeric" and np.nanmin(keys) >= 1000 and np.nanmax(keys) <= 3000 \
+            and np.all(np.nan_to_num(keys) == np.floor(np.nan_to_num(keys))):
+        keys = pd.to_datetime(pd.Series(keys).astype("Int64").astype(str), format="%Y", errors="coerce")
+        keys = pd.DatetimeIndex(keys)
+    else:
+        cats = np.asarray(table.column(source["x"]).categories, dtype=object) if kind == "label" else None
+        keys = pd.Index(cats[keys.astype(np.int64)] if cats is not None else keys)
+    return keys, values[:, None], [source.get("name") or source["y"]]
+
+
+def load_blocks(sources: List[Dict[str, Any]]) -> List[Tuple[pd.Index, np.ndarray, List[str]]]:
+    return [_ine_block(s) if is_ine_dataset(s["url"]) else _table_block(s) for s in sources]
+
+
+def _period_block(keys: pd.Index, values: np.ndarray, freq: Optional[str], agg: str):
+    """Claves a periodos de `freq` y una fila por periodo (agregando con `agg`), ordenadas."""
+    if freq and isinstance(keys, pd.DatetimeIndex):
+        keys = keys.to_period(freq)
+    frame = pd.DataFrame(values, index=keys)
+    frame = frame[frame.index.notna()]
+    grouped = frame.groupby(level=0, sort=True)
+    frame = grouped.last() if agg == "last" else grouped.agg(agg)
+    return frame.index, frame.to_numpy(dtype=np.float64)
+
+
+def align(blocks, freq: str, aggs: List[str]):
+    """
+    (índice de periodos común ordenado, matriz periodos x series con NaN).
+    Unión por hash de las claves de todos los bloques; cada bloque se
+    coloca en sus columnas con una asignación vectorizada.
+    """
+    dated = [k for k, _, _ in blocks if isinstance(k, pd.DatetimeIndex)]
+    if freq == "auto":
+        order = {f: i for i, f in enumerate(FREQUENCIES)}
+        freq = max((native_frequency(k) for k in dated), key=order.get, default=None)
+    periods = [_period_block(k, v, freq, agg) for (k, v, _), agg in zip(blocks, aggs)]
+
+    all_keys = periods[0][0].append([p[0] for p in periods[1:]]) if len(periods) > 1 else periods[0][0]
+    codes, uniques = pd.factorize(all_keys)
+    try:
+        order = uniques.argsort()
+    except TypeError:   # claves de tipos mezclados (fechas y etiquetas)
+        order = np.argsort(np.asarray([str(u) for u in uniques]), kind="stable")
+    rank = np.empty(len(uniques), dtype=np.int64)
+    rank[order] = np.arange(len(uniques))
+
+    width = sum(v.shape[1] for _, v in periods)
+    matrix = np.full((len(uniques), width), np.nan)
+    row_start, col = 0, 0
+    for keys, values in periods:
+        rows = rank[codes[row_start:row_start + len(keys)]]
+        matrix[rows, col:col + values.shape[1]] = values
+        row_start += len(keys)
+        col += values.shape[1]
+    return uniques[order], matrix, freq
+
+
+# -----------------------
+# Correlación vectorizada
+# -----------------------
+def _centered(values: np.ndarray, present: np.ndarray) -> np.ndarray:
+    filled = np.where(present, values, 0.0)
+    counts = present.sum(axis=0)
+    means = filled.sum(axis=0) / np.maximum(counts, 1)
+    return np.where(present, filled - means, 0.0)
+
+
+def pairwise_corr(a: np.ndarray, b: np.ndarray, min_periods: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pearson de cada columna de `a` con cada columna de `b` (filas = periodos,
+    NaN = sin dato) usando en cada par sólo las filas con dato en ambas.
+    Con M la máscara de presencia y X los valores centrados (0 donde falta):
+      n = MaᵀMb, Σx = XaᵀMb, Σy = MaᵀXb, Σxy = XaᵀXb, Σx² = (Xa²)ᵀMb, Σy² = Maᵀ(Xb²)
+    Devuelve (r, n).
+    """
+    ma, mb = ~np.isnan(a), ~np.isnan(b)
+    # centrar con la media propia de cada serie reduce la cancelación en Σxy - ΣxΣy/n
+    xa, xb = _centered(a, ma), _centered(b, mb)
+    ma, mb = ma.astype(np.float64), mb.astype(np.float64)
+    n = ma.T @ mb
+    sx, sy = xa.T @ mb, ma.T @ xb
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = xa.T @ xb - sx * sy / n
+        vx = (xa * xa).T @ mb - sx * sx / n
+        vy = ma.T @ (xb * xb) - sy * sy / n
+        r = cov / np.sqrt(vx * vy)
+    tol = 1e-12 * np.maximum(np.abs(vx), np.abs(vy)).max(initial=1.0)
+    r[(n < min_periods) | (vx <= tol) | (vy <= tol)] = np.nan
+    return np.clip(r, -1.0, 1.0), n
+
+
+def ranks(matrix: np.ndarray) -> np.ndarray:
+    """Rango medio de cada serie sobre sus propios datos (NaN se conserva)."""
+    return pd.DataFrame(matrix).rank(axis=0, method="average").to_numpy(dtype=np.float64)
+
+
+def lagged_corr(matrix: np.ndarray, max_lag: int, min_periods: int):
+    """
+    r[lag][i, j] = corr(serie_i(t), serie_j(t + lag)) para lag en -max_lag..max_lag
+    (lag > 0: i adelanta a j). Una llamada a pairwise_corr por desfase.
+    """
+    k = matrix.shape[1]
+    lags = np.arange(-max_lag, max_lag + 1)
+    stack = np.full((len(lags), k, k), np.nan)
+    for pos, lag in enumerate(lags):
+        if lag == 0:
+            stack[pos] = pairwise_corr(matrix, matrix, min_periods)[0]
+        elif lag > 0 and lag < len(matrix):
+            r = pairwise_corr(matrix[:-lag], matrix[lag:], min_periods)[0]
+            stack[pos] = r
+            stack[len(lags) - 1 - pos] = r.T   # -lag: la misma matriz traspuesta
+    return lags, stack
+
+
+def best_lags(lags: np.ndarray, stack: np.ndarray):
+    """Desfase con mayor |r| de cada par (NaN si ningún desfase tiene datos suficientes)."""
+    absolute = np.where(np.isnan(stack), -1.0, np.abs(stack))
+    best = absolute.argmax(axis=0)
+    r = np.take_along_axis(stack, best[None], axis=0)[0]
+    lag = lags[best].astype(np.float64)
+    lag[np.isnan(r)] = np.nan
+    return lag, r
+
+
+def _json_matrix(matrix: np.ndarray, digits: int = 6) -> List[List[Optional[float]]]:
+    out = np.round(matrix, digits).astype(object)
+    out[np.isnan(matrix)] = None
+    return out.tolist()
+
+
+# -----------------------
+# API
+# -----------------------
+def compute(request: Dict[str, Any], conf: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    conf = conf or get_config()
+    sources = request["sources"]
+    blocks = load_blocks(sources)
+    names = [n for _, _, block_names in blocks for n in block_names]
+    if len(names) > conf["MAX_SERIES"]:
+        raise CorrelationError(f"{len(names)} series: como máximo {conf['MAX_SERIES']} (filtra las tablas con tv)")
+    periods, matrix, freq = align(blocks, request["freq"], [s["agg"] for s in sources])
+
+    source_of = [i for i, (_, v, _) in enumerate(blocks) for _ in range(v.shape[1])]
+    present = ~np.isnan(matrix)
+    series = []
+    for j, name in enumerate(names):
+        rows = np.flatnonzero(present[:, j])
+        series.append({
+            "name": name, "source": source_of[j], "points": int(len(rows)),
+            "start": str(periods[rows[0]]) if len(rows) else None,
+            "end": str(periods[rows[-1]]) if len(rows) else None,
+        })
+
+    result: Dict[str, Any] = {
+        "series": series,
+        "periods": {"count": len(periods), "freq": freq,
+                    "start": str(periods[0]) if len(periods) else None,
+                    "end": str(periods[-1]) if len(periods) else None},
+        "min_periods": request["min_periods"],
+    }
+    r, n = pairwise_corr(matrix, matrix, request["min_periods"])
+    result["n_obs"] = n.astype(np.int64).tolist()
+    if "pearson" in request["methods"]:
+        result["pearson"] = _json_matrix(r)
+    if "spearman" in request["methods"]:
+        # Rangos por serie: exacto cuando las series comparten periodos; si no,
+        # aproximación (pandas re-rankea cada par, lo que exige un bucle por par)
+        result["spearman"] = _json_matrix(pairwise_corr(ranks(matrix), ranks(matrix), request["min_periods"])[0])
+        result["spearman_exact"] = bool((present == present[:, :1]).all())
+    if request["max_lag"]:
+        lags, stack = lagged_corr(matrix, request["max_lag"], request["min_periods"])
+        lag, best = best_lags(lags, stack)
+        best_lag = lag.astype(object)
+        best_lag[np.isnan(lag)] = None
+        best_lag[~np.isnan(lag)] = lag[~np.isnan(lag)].astype(np.int64)
+        result["lagged"] = {"max_lag": request["max_lag"], "best_lag": best_lag.tolist(), "best_r": _json_matrix(best)}
+        if len(names) <= conf["LAG_DETAIL_SERIES"]:
+            result["lagged"]["by_lag"] = {str(int(l)): _json_matrix(m) for l, m in zip(lags, stack)}
+    return result
+
+
+def _source_key(source: Dict[str, Any]) -> str:
+    return json.dumps(source, sort_keys=True, ensure_ascii=False)
+
+
+def _cache_params(request: Dict[str, Any]) -> Dict[str, Any]:
+    # El conjunto de series, no su orden, identifica el cálculo
+    return {**request, "sources": sorted(request["sources"], key=_source_key)}
+
+
+def _reorder(result: Dict[str, Any], canonical: List[Dict[str, Any]], requested: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Resultado calculado en orden canónico -> orden de fuentes pedido."""
+    position: Dict[str, List[int]] = {}
+    for i, s in enumerate(canonical):
+        position.setdefault(_source_key(s), []).append(i)
+    source_order = [position[_source_key(s)].pop(0) for s in requested]
+    cols = [j for src in source_order for j, s in enumerate(result["series"]) if s["source"] == src]
+    if cols == list(range(len(cols))):
+        return result
+    new_source = {old: new for new, old in enumerate(source_order)}
+    perm = np.asarray(cols)
+
+    def square(m):
+        if m is None:
+            return None
+        arr = np.asarray(m, dtype=object)
+        return arr[np.ix_(perm, perm)].tolist()
+
+    out = dict(result)
+    out["series"] = [{**result["series"][j], "source": new_source[result["series"][j]["source"]]} for j in cols]
+    for key in ("n_obs", "pearson", "spearman"):
+        if key in result:
+            out[key] = square(result[key])
+    if "lagged" in result:
+        lagged = dict(result["lagged"])
+        lagged["best_lag"], lagged["best_r"] = square(lagged["best_lag"]), square(lagged["best_r"])
+        if "by_lag" in lagged:
+            lagged["by_lag"] = {lag: square(m) for lag, m in lagged["by_lag"].items()}
+        out["lagged"] = lagged
+    return out
+
+
+def correlate(request: Dict[str, Any], force: bool = False) -> Tuple[Dict[str, Any], str]:
+    """(resultado, "hit" | "miss"). Cacheado por conjunto de series y parámetros."""
+    params = _cache_params(request)
+    key = dataset_cache.make_cache_key(NAMESPACE, params)
+    result, state = (None, dataset_cache.MISS) if force else dataset_cache.lookup(key)
+    cache = "hit"
+    if state != dataset_cache.FRESH:
+        def run():
+            data = compute(params)
+            dataset_cache.store(NAMESPACE, key, data)
+            return data
+        result, cache = single_flight.do(key, run), "miss"
+    return _reorder(result, params["sources"], request["sources"]), cache
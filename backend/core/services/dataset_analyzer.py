@@ -1,24 +1,34 @@
 # core/services/dataset_analyzer.py
-import requests
-import io
-import csv
+import itertools
 import json
+import logging
+import os
 import re
-import pyaxis  # soporte PC-Axis (si lo tienes instalado)
+import tempfile
+from functools import lru_cache
+from pyaxis import pyaxis  # soporte PC-Axis (si lo tienes instalado)
 from dateutil import parser as dateparser
-from typing import List, Dict, Any, Optional
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from asgiref.sync import sync_to_async
 
 # Importación del servicio INE (asegúrate de tener el archivo core/services/ine_api_service.py actualizado
 # para que get_dataset_from_ine devuelva labels y series — te lo indico más abajo si hace falta).
-from core.services.ine_api_service import is_ine_dataset, get_dataset_from_ine
-
-SPANISH_COMMUNITIES = [
-    "andalucía", "andalucia", "aragón", "aragon", "asturias", "islas baleares",
-    "baleares", "canarias", "cantabria", "castilla-la mancha", "castilla y león",
-    "castilla y leon", "cataluña", "cataluna", "comunidad valenciana", "valenciana",
-    "extremadura", "galicia", "la rioja", "madrid", "murcia", "navarra",
-    "país vasco", "pais vasco", "paisvasco", "ceuta", "melilla"
-]
+from core.services.ine_api_service import (
+    aget_dataset_from_ine, extract_ine_idtable, get_dataset_from_ine, is_ine_dataset,
+)
+from core.services.distribution_probe import ProbedDistribution, detect_format, probe_distribution
+from core.services import columnar_store
+from core.services.column_profiler import DatasetProfiler, get_config as get_profile_config
+from core.services.geo_index import get_index
+from core.services.schema_inference import infer_schema
+from core.services.stream_samplers import (
+    CHUNK_SIZE, CountingIterator, detect_encoding, iter_csv_rows, iter_json_records,
+    stream_csv_sample, stream_json_sample,
+)
+from core.utils import single_flight
+
+logger = logging.getLogger(__name__)
 
 # -----------------------
 # Utilidades básicas
@@ -66,7 +76,11 @@ def find_first_list_in_json(obj):
 def auto_normalize_key(key: str) -> str:
     if key is None:
         return ""
-    s = str(key)
+    return _normalize_key(str(key))
+
+@lru_cache(maxsize=4096)
+def _normalize_key(s: str) -> str:
+    # Cacheado: en el perfilado completo se repiten las mismas claves en cada registro
     s = re.sub(r'\bT\d+[_\-]?', ' ', s, flags=re.IGNORECASE)
     s = re.sub(r'[_\-]+', ' ', s)
     s = re.sub(r'([a-z])([A-Z])', r'\1 \2', s)
@@ -123,106 +137,261 @@ def normalize_rows(rows: List[Dict[str, Any]]) -> List[Dict[str, str]]:
 # -----------------------
 # Sampling CSV / JSON / PC-AXIS
 # -----------------------
-def sample_csv_from_url(url, max_rows=100, max_lines=1000, timeout=30):
-    resp = requests.get(url, stream=True, timeout=timeout)
-    resp.raise_for_status()
-    lines = []
-    it = resp.iter_lines(decode_unicode=True)
-    count_lines = 0
+def _sample_csv(res: ProbedDistribution, max_rows: int, info: Dict[str, Any]):
+    # Los bytes pasan del socket al decodificador incremental y a csv.reader;
+    # al tener `max_rows` filas se deja de leer.
+    sample = stream_csv_sample(res.iter_chunks(), max_rows=max_rows)
+    info.update({"encoding": sample["encoding"], "delimiter": sample["delimiter"], "complete": sample["complete"]})
+    return [{k: safe_text(v) for k, v in r.items()} for r in sample["rows"]]
+
+def _sample_json(res: ProbedDistribution, max_rows: int, info: Dict[str, Any]):
+    # Array de registros localizado con la heurística de find_first_list_in_json
+    sample = stream_json_sample(res.iter_chunks(), max_rows=max_rows)
+    info.update({
+        "encoding": sample["encoding"],
+        "json_path": sample["path"],
+        "peak_buffer_bytes": sample["peak_buffer_bytes"],
+        "complete": sample["complete"],
+    })
+    return sample["rows"]
+
+def _read_pcaxis(content: bytes):
+    # pyaxis sólo lee de ruta/URL, así que se vuelca a un temporal
+    encoding = "cp1252" if re.search(rb'CHARSET\s*=\s*"ANSI"', content[:4096]) else detect_encoding(content[:CHUNK_SIZE])
+    with tempfile.NamedTemporaryFile(suffix=".px", delete=False) as tmp:
+        tmp.write(content)
     try:
-        while count_lines < max_lines:
-            line = next(it)
-            if line is None:
-                continue
-            lines.append(line)
-            count_lines += 1
-            if len(lines) >= max_rows + 20 and count_lines >= 50:
-                break
-    except StopIteration:
-        pass
-    text = "\n".join(lines)
-    f = io.StringIO(text)
-    try:
-        reader = csv.DictReader(f)
-        rows = [{k: safe_text(v) for k, v in r.items()} for r in reader]
-        return rows[:max_rows]
-    except Exception:
-        return []
-
-def sample_json_from_url(url, max_rows=100, timeout=30):
-    resp = requests.get(url, timeout=timeout)
-    resp.raise_for_status()
-    data = resp.json()
-    arr = find_first_list_in_json(data)
-    if arr is None:
-        if isinstance(data, list):
-            arr = data
-        else:
-            return []
-    rows = []
-    for item in arr[:max_rows]:
-        rows.append(item if isinstance(item, dict) else {"value": item})
+        return pyaxis.parse(tmp.name, encoding=encoding)["DATA"], encoding
+    finally:
+        os.unlink(tmp.name)
+
+def _sample_pcaxis(res: ProbedDistribution, max_rows: int, info: Dict[str, Any]):
+    # PC-Axis guarda los datos al final: hace falta el fichero entero.
+    df, encoding = _read_pcaxis(res.read_all())
+    info.update({"encoding": encoding, "complete": True})
+    return df.head(max_rows).to_dict(orient="records")
+
+_SAMPLERS = {"csv": _sample_csv, "json": _sample_json, "pc-axis": _sample_pcaxis}
+
+def sample_distribution(res: ProbedDistribution, fmt: str, max_rows=100, info: Optional[Dict[str, Any]] = None):
+    """
+    Muestrea un recurso ya sondeado con el parser de `fmt`, reutilizando los
+    bytes del sondeo. Si se pasa `info` se rellena con encoding, bytes
+    descargados y peticiones al upstream.
+    """
+    sampler = _SAMPLERS.get(fmt)
+    if sampler is None:
+        raise ValueError(f"Formato no soportado para muestreo: {fmt}")
+    meta: Dict[str, Any] = {}
+    rows = sampler(res, max_rows, meta)
+    res.close()  # sin leer el resto: corta la descarga
+    if info is not None:
+        info.clear()
+        info.update(meta)
+        info.update({"bytes_downloaded": res.bytes_downloaded, "round_trips": res.round_trips})
     return rows
 
-def sample_pcaxis_from_url(url, max_rows=100, timeout=30):
-    resp = requests.get(url, timeout=timeout)
-    resp.raise_for_status()
-    # pyaxis.parse devuelve dataframe; convertir a records
-    df = pyaxis.parse(io.BytesIO(resp.content), encoding="utf-8")
-    return df.to_dict(orient="records")[:max_rows]
+def sample_csv_from_url(url, max_rows=100, timeout=30, info: Optional[Dict[str, Any]] = None):
+    with probe_distribution(url, timeout=timeout) as res:
+        return sample_distribution(res, "csv", max_rows, info)
+
+def sample_json_from_url(url, max_rows=100, timeout=30, info: Optional[Dict[str, Any]] = None):
+    with probe_distribution(url, timeout=timeout) as res:
+        return sample_distribution(res, "json", max_rows, info)
+
+def sample_pcaxis_from_url(url, max_rows=100, timeout=30, info: Optional[Dict[str, Any]] = None):
+    with probe_distribution(url, timeout=timeout) as res:
+        return sample_distribution(res, "pc-axis", max_rows, info)
+
+# -----------------------
+# Progreso (trabajos en segundo plano)
+# -----------------------
+class AnalysisProgress:
+    """
+    Bytes leídos y filas parseadas de un análisis en curso. callback(bytes_read,
+    rows_parsed, total_bytes) se llama en cada bloque leído y cada EVERY_ROWS
+    filas; si lanza una excepción el análisis se aborta (cancelación).
+    """
+    EVERY_ROWS = 1000
+
+    def __init__(self, callback: Callable[[int, int, Optional[int]], None]):
+        self.callback = callback
+        self.bytes_read = 0
+        self.rows_parsed = 0
+        self.total_bytes: Optional[int] = None
+
+    def attach(self, res: ProbedDistribution):
+        self.total_bytes = res.total_size
+        self.bytes_read = res.bytes_downloaded
+        res.on_read = self.read
+        self.emit()
+
+    def read(self, bytes_read: int):
+        self.bytes_read = bytes_read
+        self.emit()
+
+    def count(self, rows: Iterable[Any]) -> Iterator[Any]:
+        for row in rows:
+            self.rows_parsed += 1
+            if self.rows_parsed % self.EVERY_ROWS == 0:
+                self.emit()
+            yield row
+
+    def done(self, rows: int):
+        self.rows_parsed = max(self.rows_parsed, rows)
+        self.emit()
+
+    def emit(self):
+        self.callback(self.bytes_read, self.rows_parsed, self.total_bytes)
+
+# -----------------------
+# Perfilado completo (modo profile)
+# -----------------------
+class _ByteLimitReached(Exception):
+    pass
+
+def _limited(chunks, max_bytes: Optional[int]):
+    # Corte de seguridad: se deja de leer al superar max_bytes (el perfil queda incompleto)
+    read = 0
+    for data in chunks:
+        yield data
+        read += len(data)
+        if max_bytes and read >= max_bytes:
+            raise _ByteLimitReached()
+
+def _profile_rows_csv(chunks, meta: Dict[str, Any]):
+    state: Dict[str, Any] = {}
+    rows = iter_csv_rows(chunks, state=state)
+    for row in rows:
+        meta.setdefault("encoding", state["encoding"])
+        meta.setdefault("delimiter", state["delimiter"])
+        yield row
+
+def _profile_rows_json(chunks, meta: Dict[str, Any]):
+    counter = CountingIterator(chunks)
+    first = next(counter, b"")
+    encoding = detect_encoding(first)
+    if encoding == "utf-8":
+        encoding = "utf-8-sig"
+    meta["encoding"] = encoding
+    state: Dict[str, Any] = {}
+    # Sin clave preferida el array sólo se conoce al cerrar el objeto: en ese caso
+    # se perfilan como mucho BATCH_ROWS elementos
+    records = iter_json_records(itertools.chain([first], counter), encoding,
+                                max_fallback=get_profile_config()["BATCH_ROWS"], state=state)
+    for item in records:
+        meta["json_path"] = state.get("path")
+        yield flatten_row(item)
+
+def _profile_rows_pcaxis(chunks, meta: Dict[str, Any]):
+    # El formato no admite lectura por partes: el DataFrame se recorre por lotes
+    df, encoding = _read_pcaxis(b"".join(chunks))
+    meta["encoding"] = encoding
+    batch = get_profile_config()["BATCH_ROWS"]
+    for start in range(0, len(df), batch):
+        yield from df.iloc[start:start + batch].to_dict(orient="records")
+
+_PROFILERS = {"csv": _profile_rows_csv, "json": _profile_rows_json, "pc-axis": _profile_rows_pcaxis}
+
+def profile_distribution(res: ProbedDistribution, fmt: str, sample_rows: int = 0,
+                         progress: Optional[AnalysisProgress] = None) -> DatasetProfiler:
+    """
+    Recorre el recurso entero (reutilizando los bytes del sondeo) y devuelve el
+    perfil por columna; las primeras `sample_rows` filas quedan en
+    `profiler.sample`, así que la muestra no requiere otra descarga. La memoria
+    depende del tamaño de lote y de los sketches, no del fichero (salvo
+    PC-Axis, que pyaxis necesita completo).
+    """
+    rows_fn = _PROFILERS.get(fmt)
+    if rows_fn is None:
+        raise ValueError(f"Formato no soportado para perfilado: {fmt}")
+    conf = get_profile_config()
+    # Columnas con los mismos nombres que normalize_rows (flatten_row)
+    profiler = DatasetProfiler(get_index(), conf, key_fn=auto_normalize_key)
+    meta: Dict[str, Any] = {}
+    rows = rows_fn(_limited(res.iter_chunks(), conf["MAX_BYTES"]), meta)
+    if progress is not None:
+        rows = progress.count(rows)
+    complete = True
+    sample: List[Dict[str, Any]] = []
+    try:
+        # La muestra en memoria se limita a un lote aunque se pidan todas las filas;
+        # MAX_BYTES puede alcanzarse ya leyéndola
+        for row in itertools.islice(rows, min(sample_rows, conf["BATCH_ROWS"])):
+            sample.append(row)
+        profiler.consume(itertools.chain(sample, rows))
+    except _ByteLimitReached:
+        complete = False
+        if not profiler.rows:
+            profiler.consume(sample)
+    profiler.sample = sample
+    res.close()
+    profiler.meta.update({**meta, "complete": complete, "bytes_downloaded": res.bytes_downloaded,
+                          "round_trips": res.round_trips})
+    return profiler
+
+# -----------------------
+# Tablas materializadas (columnar_store)
+# -----------------------
+def _resolve_format(res: ProbedDistribution, format_override: Optional[str], url: str) -> str:
+    # El formato indicado por el frontend manda si hay parser para él
+    fmt = (format_override or "").lower()
+    if fmt not in _SAMPLERS:
+        fmt = detect_format(res.content_type, res.prefix, url)
+    if fmt is None and res.prefix:
+        fmt = "csv"  # texto sin formato reconocible: se intenta como CSV sobre el mismo flujo
+    if fmt not in _SAMPLERS:
+        raise RuntimeError(f"Formato '{fmt or 'desconocido'}' no soportado "
+                           f"(Content-Type: {res.content_type or '-'})")
+    return fmt
+
+def materialize_distribution(url: str, format_override: Optional[str] = None,
+                             force: bool = False) -> columnar_store.Table:
+    """
+    Descarga y parsea el recurso entero una vez y lo guarda en columnas tipadas
+    (columnar_store); si ya está materializado devuelve la tabla sin tocar la red.
+    """
+    conf = columnar_store.get_config()
+    key = columnar_store.table_key(url, format_override)
+    table = None if force else columnar_store.open_table(key)
+    if table is not None:
+        return table
+    with single_flight.interprocess_lock(f"columnar:{key}"):
+        table = None if force else columnar_store.open_table(key)  # otro proceso pudo terminarla mientras
+        if table is not None:
+            return table
+        with probe_distribution(url) as res:
+            fmt = _resolve_format(res, format_override, url)
+            source: Dict[str, Any] = {"url": url, "format": fmt, "content_type": res.content_type}
+
+            def rows():
+                yield from _PROFILERS[fmt](_limited(res.iter_chunks(), conf["MAX_SOURCE_BYTES"]), source)
+                source.update({"bytes_downloaded": res.bytes_downloaded, "round_trips": res.round_trips})
+
+            try:
+                return columnar_store.write_table(key, rows(), source)
+            except _ByteLimitReached:
+                raise RuntimeError(f"El recurso supera {conf['MAX_SOURCE_BYTES']} bytes: no se materializa")
+
+def _analyze_table(table: columnar_store.Table, sample_rows: int, profile: bool, info: Dict[str, Any]):
+    # Muestra y perfil desde la tabla local: sin red y sin volver a parsear
+    info.update({k: v for k, v in table.meta.get("source", {}).items() if k not in ("url", "format")})
+    info.update({"source": "columnar", "complete": True, "bytes_downloaded": 0, "round_trips": 0})
+    if not profile:
+        return table.head(sample_rows), None
+    conf = get_profile_config()
+    profiler = DatasetProfiler(get_index(), conf, key_fn=auto_normalize_key)
+    profiler.sample = table.head(min(sample_rows, conf["BATCH_ROWS"]))
+    profiler.consume(table.iter_rows(batch=conf["BATCH_ROWS"]))
+    profiler.meta.update(info)
+    return profiler.sample, profiler
 
 # -----------------------
 # Schema inference
 # -----------------------
 def infer_schema_from_rows(rows: List[Dict[str, str]], sample_limit=20):
-    schema = []
-    if not rows:
-        return schema
-    cols = list(rows[0].keys())
-    for col in cols:
-        values = [safe_text(r.get(col, "")) for r in rows[:sample_limit]]
-        non_empty = [v for v in values if v]
-        inferred = "string"
-        num_count = 0
-        date_count = 0
-        lat_count = 0
-        lon_count = 0
-        unique_vals = set()
-        for v in non_empty:
-            unique_vals.add(v.lower())
-            if try_parse_number(v) is not None:
-                num_count += 1
-                try:
-                    num = try_parse_number(v)
-                    if -90 <= num <= 90:
-                        lat_count += 1
-                    if -180 <= num <= 180:
-                        lon_count += 1
-                except Exception:
-                    pass
-            if looks_like_date(v):
-                date_count += 1
-        if non_empty:
-            if num_count / len(non_empty) >= 0.8:
-                inferred = "numeric"
-            elif date_count / len(non_empty) >= 0.6:
-                inferred = "datetime"
-        lowname = col.lower()
-        if any(k in lowname for k in ("lat", "latitude", "latitud")):
-            inferred = "latitude"
-        if any(k in lowname for k in ("lon", "lng", "longitude", "longitud")):
-            inferred = "longitude"
-        lower_vals = [v.lower() for v in non_empty[:min(30, len(non_empty))]]
-        matches = sum(1 for v in lower_vals for c in SPANISH_COMMUNITIES if c in v)
-        if non_empty and matches / len(lower_vals) >= 0.2:
-            inferred = "geo_name"
-        schema.append({
-            "name": col,
-            "inferred_type": inferred,
-            "sample_values": non_empty[:5],
-            "unique_count_estimate": len(unique_vals)
-        })
-    return schema
+    # Motor columnar (pandas): ver core/services/schema_inference.py
+    return infer_schema(rows, get_index(), sample_limit=sample_limit)
 
 # -----------------------
 # Suggestions builder
@@ -270,11 +439,19 @@ def choose_primary_suggestion(suggestions):
 # -----------------------
 # Analyze distribution url (con soporte INE)
 # -----------------------
-def analyze_distribution_url(url: str, format_override: str = None, sample_rows=80):
+def analyze_distribution_url(url: str, format_override: str = None, sample_rows=80, profile: bool = False,
+                             ine_filters: Optional[Dict[str, Any]] = None,
+                             progress: Optional[AnalysisProgress] = None, materialize: bool = False):
     """
     Descarga una muestra del recurso (PC-Axis prioritario, luego CSV, luego JSON)
     y devuelve esquema, muestra y sugerencias.
     En caso de detectar recurso INE (ine-api), usa get_dataset_from_ine para obtener labels/series.
+    Con profile=True se recorre además el recurso completo (ver column_profiler):
+    el resultado incluye "profile" y el esquema (tipos y distintos) sale de todos los datos.
+    `ine_filters` (nult, date_from, date_to, tip, tv) se reenvían a wstempus.
+    `progress` (AnalysisProgress) recibe los bytes leídos y las filas parseadas.
+    Si el recurso está materializado (columnar_store) se analiza la tabla local;
+    materialize=True la crea antes (también profile=True si COLUMNAR_STORE["AUTO"]).
     """
     # Si es INE -> usar su API (prioritario)
     try:
@@ -282,7 +459,7 @@ def analyze_distribution_url(url: str, format_override: str = None, sample_rows=
             # get_dataset_from_ine debe devolver al menos: schema, sample_rows, labels, series
             # sample_rows argument pasa el tamaño máximo de sample (o -1 para todo)
             try:
-                ine_data = get_dataset_from_ine(url, sample_rows=sample_rows)
+                ine_data = get_dataset_from_ine(url, sample_rows=sample_rows, filters=ine_filters)
             except Exception as e:
                 raise RuntimeError(f"Error al obtener datos INE: {e}")
 
@@ -311,6 +488,7 @@ def analyze_distribution_url(url: str, format_override: str = None, sample_rows=
                 "suggestions": suggestions,
                 "suggestion": primary,
                 "sample_rows_count": len(normalized_rows),
+                "upstream_round_trips": ine_data.get("upstream_round_trips", 0),
             }
             # añadir labels/series para que el frontend pinte directamente
             if labels:
@@ -326,76 +504,112 @@ def analyze_distribution_url(url: str, format_override: str = None, sample_rows=
         print(f"[analyze_distribution_url] fallo INE: {e}")
 
     # ---------------------------------------------------------
-    # Código no-INE: intentar detectar formato y samplear
+    # Código no-INE: una única petición de sondeo decide el formato y
+    # sus bytes se reutilizan como comienzo del parseo
     # ---------------------------------------------------------
-    fmt = None
-    if format_override:
-        fmt = format_override.lower()
+    sample_info: Dict[str, Any] = {}
+    table = None
+    store_conf = columnar_store.get_config()
+    if store_conf["ENABLED"]:
+        try:
+            if materialize or (store_conf["AUTO"] and profile):
+                table = materialize_distribution(url, format_override)
+            else:
+                table = columnar_store.open_table(columnar_store.table_key(url, format_override))
+        except Exception as e:
+            # Sin tabla se sigue por la ruta en streaming
+            logger.warning("analyze_distribution_url: sin tabla columnar para %s: %s", url, e)
+
+    if table is not None:
+        rows, profiler = _analyze_table(table, sample_rows, profile, sample_info)
+        last_format_used = table.meta["source"].get("format")
+        if progress is not None:
+            progress.done(table.num_rows if profile else len(rows))
     else:
-        if ".px" in url.lower() or "pc-axis" in url.lower() or "format=pc-axis" in url.lower():
-            fmt = "pc-axis"
-        elif url.lower().endswith(".csv") or "rows.csv" in url.lower() or "format=csv" in url.lower():
-            fmt = "csv"
-        elif url.lower().endswith(".json") or "rows.json" in url.lower() or "format=json" in url.lower():
-            fmt = "json"
-        elif "rdf" in url.lower() or "xml" in url.lower():
-            fmt = "rdf"
-        else:
-            fmt = None
-
-    rows = []
-    last_format_used = None
-
-    try:
-        if fmt == "pc-axis":
-            rows = sample_pcaxis_from_url(url, max_rows=sample_rows)
-            last_format_used = "pc-axis"
-
-        elif fmt == "csv":
-            rows = sample_csv_from_url(url, max_rows=sample_rows)
-            last_format_used = "csv"
-
-        elif fmt == "json":
-            rows = sample_json_from_url(url, max_rows=sample_rows)
-            last_format_used = "json"
-
-        else:
-            # fallback: pc-axis -> csv -> json
-            try:
-                rows = sample_pcaxis_from_url(url, max_rows=sample_rows)
-                if rows:
-                    last_format_used = "pc-axis"
+        try:
+            with probe_distribution(url) as res:
+                if progress is not None:
+                    progress.attach(res)
+                fmt = _resolve_format(res, format_override, url)
+                profiler = None
+                if profile:
+                    # Una sola lectura completa: de ella salen la muestra y el perfil
+                    profiler = profile_distribution(res, fmt, sample_rows=sample_rows, progress=progress)
+                    rows = profiler.sample
+                    sample_info.update(profiler.meta)
                 else:
-                    rows = sample_csv_from_url(url, max_rows=sample_rows)
-                    if rows:
-                        last_format_used = "csv"
-                    else:
-                        rows = sample_json_from_url(url, max_rows=sample_rows)
-                        last_format_used = "json"
-            except Exception:
-                try:
-                    rows = sample_csv_from_url(url, max_rows=sample_rows)
-                    if rows:
-                        last_format_used = "csv"
-                    else:
-                        rows = sample_json_from_url(url, max_rows=sample_rows)
-                        last_format_used = "json"
-                except Exception as e:
-                    raise RuntimeError(f"No se pudo obtener muestra en ningún formato: {e}")
-
-    except Exception as e:
-        raise RuntimeError(f"Error al procesar la URL {url}: {e}")
+                    rows = sample_distribution(res, fmt, max_rows=sample_rows, info=sample_info)
+                    if progress is not None:
+                        progress.done(len(rows))
+                last_format_used = fmt
+        except Exception as e:
+            raise RuntimeError(f"Error al procesar la URL {url}: {e}")
 
     normalized = normalize_rows(rows) if rows else []
-    schema = infer_schema_from_rows(normalized, sample_limit=30)
+    schema = infer_schema_from_rows(normalized, sample_limit=None)
+    if profiler is not None and profiler.rows:
+        schema = profiler.schema(schema)
     suggestions = build_suggestions(schema)
     primary = choose_primary_suggestion(suggestions)
 
-    return {
+    result = {
         "format_detected": last_format_used,
         "schema": schema,
         "sample_rows": normalized[:min(len(normalized), 200)],
         "suggestions": suggestions,
         "suggestion": primary,
-        "sample_rows_count": len(normalized)
-    }
\ No newline at end of file
+        "sample_rows_count": len(normalized),
+        "sample_info": sample_info,
+        "upstream_round_trips": sample_info.get("round_trips", 0),
+    }
+    if profiler is not None:
+        result["profile"] = profiler.to_dict()
+    if table is not None:
+        result["materialized"] = table.info()
+    return result
+
+
+def _ine_result(dataset_url: str, data: Dict[str, Any], progress: Optional[AnalysisProgress]) -> Dict[str, Any]:
+    suggestion = {"type": "table", "title": f"Tabla INE {extract_ine_idtable(dataset_url)}"}
+    if progress is not None:
+        progress.done(data.get("items_count") or len(data.get("sample_rows") or []))
+    return {
+        **data,
+        "suggestions": data.get("suggestions") or [suggestion],  # 🔹 de los metadatos si los hay
+        "format_detected": "ine-api",  # 🔹 para diferenciar
+    }
+
+
+def run_analysis(dataset_url: str, fmt: Optional[str], max_rows: Optional[int],
+                 options: Optional[Dict[str, Any]] = None, progress: Optional[AnalysisProgress] = None):
+    """
+    Análisis que sirven /dataset/analyze/, /process-datasets/ y los trabajos en
+    segundo plano. options: {"profile": bool, "ine_filters": dict}.
+    """
+    options = options or {}
+    # Si es dataset del INE -> usar wstempus via our service
+    if is_ine_dataset(dataset_url):
+        data = get_dataset_from_ine(dataset_url, sample_rows=max_rows, filters=options.get("ine_filters"))
+        return _ine_result(dataset_url, data, progress)
+
+    # Flujo "normal" para CSV/JSON/XML/PC-AXIS ya implementado
+    return analyze_distribution_url(
+        dataset_url,
+        format_override=fmt or None,  # usa el que venga del frontend si existe
+        sample_rows=max_rows if max_rows is not None else 999999,
+        profile=options.get("profile", False),
+        ine_filters=options.get("ine_filters"),
+        progress=progress,
+        materialize=options.get("materialize", False),
+    )
+
+
+async def arun_analysis(dataset_url: str, fmt: Optional[str], max_rows: Optional[int],
+                        options: Optional[Dict[str, Any]] = None, progress: Optional[AnalysisProgress] = None):
+    """Variante asíncrona de run_analysis para las vistas ASGI (mismo resultado)."""
+    options = options or {}
+    if is_ine_dataset(dataset_url):
+        data = await aget_dataset_from_ine(dataset_url, sample_rows=max_rows, filters=options.get("ine_filters"))
+        return _ine_result(dataset_url, data, progress)
+    # El muestreo CSV/JSON/PC-Axis sigue siendo síncrono: se ejecuta en un hilo
+    return await sync_to_async(run_analysis, thread_sensitive=False)(dataset_url, fmt, max_rows, options, progress)
@@ -0,0 +1,230 @@
+# core/services/distribution_probe.py
+# Sondeo de una distribución remota con una única petición: GET con
+# "Range: bytes=0-65535" (o el recurso entero si el servidor ignora el rango).
+# Con Content-Type, magic bytes y las primeras líneas se decide el formato, y el
+# prefijo descargado se reutiliza como comienzo del parseo real: ningún byte se
+# descarga dos veces.
+import re
+from typing import Callable, Iterator, Optional
+
+from core.services import http_client
+from core.services.stream_samplers import CHUNK_SIZE, CSV_DELIMITERS, detect_encoding
+
+PROBE_BYTES = 64 * 1024
+
+_PCAXIS_KEYWORDS = re.compile(
+    rb'^\s*(CHARSET|AXIS-VERSION|CODEPAGE|LANGUAGE|CREATION-DATE|DECIMALS|MATRIX|SUBJECT-AREA|CONTENTS)\s*[=(]',
+    re.IGNORECASE,
+)
+_CONTENT_RANGE_TOTAL = re.compile(r"/\s*(\d+)\s*$")
+
+
+class ProbedDistribution:
+    """
+    Recurso ya sondeado. `prefix` son los primeros bytes; `iter_chunks()` los
+    devuelve seguidos del resto, que sólo se pide si el parser lo necesita:
+
+    - 200 (el servidor ignora Range): se sigue leyendo la misma respuesta.
+    - 206: se abre una segunda petición "Range: bytes=<len(prefix)>-".
+
+    `round_trips` cuenta las peticiones HTTP realizadas contra el upstream.
+    `on_read(bytes_downloaded)`, si se asigna, se llama tras cada bloque leído.
+    """
+
+    def __init__(self, url: str, timeout: float):
+        self.url = url
+        self.timeout = timeout
+        self.round_trips = 0
+        self.bytes_downloaded = 0
+        self.status_code: Optional[int] = None
+        self.content_type = ""
+        self.total_size: Optional[int] = None
+        self.prefix = b""
+        self._resp = None
+        self._body: Optional[Iterator[bytes]] = None
+        self._exhausted = False
+        self.on_read: Optional[Callable[[int], None]] = None
+
+    # -----------------------
+    # Peticiones
+    # -----------------------
+    def _get(self, headers):
+        self.round_trips += 1
+        # identity: los offsets de Range deben referirse a los bytes reales del recurso
+        resp = http_client.get(self.url, stream=True, timeout=self.timeout,
+                               headers={"Accept-Encoding": "identity", **headers})
+        if resp.status_code != 416:  # 416: rango no satisfacible (recurso vacío)
+            resp.raise_for_status()
+        return resp
+
+    def _pull(self, body: Iterator[bytes]) -> Optional[bytes]:
+        data = next(body, None)
+        if data is not None:
+            self.bytes_downloaded += len(data)
+            if self.on_read is not None:
+                self.on_read(self.bytes_downloaded)
+        return data
+
+    def probe(self) -> "ProbedDistribution":
+        resp = self._get({"Range": f"bytes=0-{PROBE_BYTES - 1}"})
+        self._resp = resp
+        self.status_code = resp.status_code
+        self.content_type = (resp.headers.get("Content-Type") or "").split(";")[0].strip().lower()
+        if resp.status_code == 416:
+            self.total_size = 0
+            self._exhausted = True
+            self.close()
+            return self
+
+        body = resp.iter_content(chunk_size=CHUNK_SIZE)
+        parts = []
+        size = 0
+        while size < PROBE_BYTES:
+            data = self._pull(body)
+            if data is None:
+                self._exhausted = True
+                break
+            parts.append(data)
+            size += len(data)
+        self.prefix = b"".join(parts)
+
+        if resp.status_code == 206:
+            m = _CONTENT_RANGE_TOTAL.search(resp.headers.get("Content-Range", ""))
+            self.total_size = int(m.group(1)) if m else None
+            self._exhausted = self.total_size is not None and len(self.prefix) >= self.total_size
+            resp.close()
+            self._resp = None
+        else:
+            length = resp.headers.get("Content-Length")
+            self.total_size = int(length) if length and length.isdigit() else None
+            if self._exhausted:
+                resp.close()
+                self._resp = None
+            else:
+                self._body = body
+        return self
+
+    def _iter_rest(self) -> Iterator[bytes]:
+        if self._exhausted:
+            return
+        if self._body is None:
+            # 206: continuar donde terminó el sondeo
+            self._resp = self._get({"Range": f"bytes={len(self.prefix)}-"})
+            if self._resp.status_code not in (200, 206):
+                # 416 (el prefijo ya era todo el recurso, con total "*") u otro
+                # estado: fin del recurso; su cuerpo es un error, no datos
+                self._exhausted = True
+                self.close()
+                return
+            self._body = self._resp.iter_content(chunk_size=CHUNK_SIZE)
+            if self._resp.status_code == 200:
+                # El servidor ya no acepta el rango: descartar lo que ya tenemos
+                skip = len(self.prefix)
+                while skip > 0:
+                    data = self._pull(self._body)
+                    if data is None:
+                        return
+                    if len(data) > skip:
+                        yield data[skip:]
+                    skip -= len(data)
+        while True:
+            data = self._pull(self._body)
+            if data is None:
+                return
+            yield data
+
+    def iter_chunks(self) -> Iterator[bytes]:
+        if self.prefix:
+            yield self.prefix
+        yield from self._iter_rest()
+
+    def read_all(self) -> bytes:
+        return b"".join(self.iter_chunks())
+
+    def close(self):
+        if self._resp is not None:
+            self._resp.close()  # sin leer el resto: corta la descarga
+            self._resp = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def probe_distribution(url: str, timeout: float = 30) -> ProbedDistribution:
+    """Hace la petición de sondeo y devuelve el recurso listo para parsear."""
+    res = ProbedDistribution(url, timeout)
+    try:
+        return res.probe()
+    except Exception:
+        res.close()
+        raise
+
+
+# -----------------------
+# Detección de formato
+# -----------------------
+def _looks_like_csv(prefix: bytes) -> bool:
+    text = prefix.decode(detect_encoding(prefix), errors="replace")
+    lines = [l for l in text.splitlines()[:10] if l.strip()]
+    if len(lines) > 1:
+        lines = lines[:-1]  # la última puede estar cortada
+    if not lines:
+        return False
+    for d in CSV_DELIMITERS:
+        counts = {l.count(d) for l in lines}
+        if len(counts) == 1 and counts.pop() > 0:
+            return True
+    return False
+
+
+def format_from_url(url: str) -> Optional[str]:
+    u = url.lower()
+    if ".px" in u or "pc-axis" in u or "format=pc-axis" in u:
+        return "pc-axis"
+    if u.endswith(".csv") or "rows.csv" in u or "format=csv" in u:
+        return "csv"
+    if u.endswith(".json") or "rows.json" in u or "format=json" in u:
+        return "json"
+    if "rdf" in u or "xml" in u:
+        return "rdf"
+    return None
+
+
+def detect_format(content_type: str, prefix: bytes, url: str = "") -> Optional[str]:
+    """
+    Decide el formato con este orden de confianza: magic bytes y primeras líneas,
+    Content-Type (los portales a menudo sirven todo como text/plain u
+    octet-stream) y, por último, la URL.
+    """
+    head = prefix.lstrip(b"\xef\xbb\xbf").lstrip()
+    if head.startswith(b"PK\x03\x04"):
+        return "zip"
+    if head.startswith(b"\x1f\x8b"):
+        return "gzip"
+    if _PCAXIS_KEYWORDS.match(head):
+        return "pc-axis"
+    if head[:1] in (b"{", b"["):
+        return "json"
+    if head[:1] == b"<":
+        low = head[:512].lower()
+        return "html" if b"<html" in low or b"<!doctype html" in low else "rdf"
+
+    ct = content_type or ""
+    if "csv" in ct:
+        return "csv"
+    if "json" in ct:
+        return "json"
+    if "pc-axis" in ct or "pcaxis" in ct:
+        return "pc-axis"
+    if "xml" in ct or "rdf" in ct:
+        return "rdf"
+
+    hinted = format_from_url(url)
+    if hinted:
+        return hinted
+    if head and _looks_like_csv(head):
+        return "csv"
+    return None
@@ -0,0 +1,282 @@
+# core/services/distribution_resolver.py
+# De la URL de una distribución (a menudo la página HTML del portal que la
+# publica) a la lista de ficheros descargables [{format, url}]:
+#   - si la URL ya es un fichero (Content-Type no HTML) se devuelve ella misma
+#   - de la página sólo se miran los <a href> (lxml si está instalado; si no,
+#     un HTMLParser de la stdlib que no construye el árbol del documento)
+#   - el formato sale de la extensión o del parámetro format= de la URL, o de
+#     la palabra exacta en el texto del enlace ("px" suelto no basta)
+#   - los candidatos se validan con HEAD en paralelo (Content-Type)
+#   - la lista se cachea por URL junto a su ETag/Last-Modified: al caducar se
+#     revalida con una petición condicional y un 304 la reutiliza
+# resolve_many() resuelve varias páginas a la vez (/distribution/resolve/).
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urljoin, urlsplit
+
+from django.conf import settings
+
+from core.services import http_client
+from core.utils import dataset_cache
+
+try:
+    import lxml.html  # opcional: parser en C, bastante más rápido con páginas grandes
+except ImportError:  # pragma: no cover
+    lxml = None
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE = "distribution_links"
+
+DEFAULTS = {
+    "TIMEOUT": 15,
+    "MAX_PAGE_BYTES": 5 * 1024 * 1024,   # se deja de leer la página a partir de aquí
+    "MAX_URLS": 50,                      # URLs por petición
+    "CONCURRENCY": 8,                    # páginas resolviéndose a la vez
+    "VALIDATE": True,                    # HEAD sobre los candidatos
+    "HEAD_CONCURRENCY": 8,
+    "MAX_VALIDATE": 30,                  # candidatos validados por página
+}
+
+# extensión / valor de format= -> formato (mismo vocabulario que antes)
+_EXTENSIONS = {
+    "csv": "csv", "tsv": "csv", "json": "json", "geojson": "json", "xml": "xml", "rdf": "xml",
+    "xls": "xls", "xlsx": "xls", "px": "pc-axis", "pcaxis": "pc-axis", "pc-axis": "pc-axis",
+}
+_FORMAT_PARAMS = ("format", "formato", "type", "tipo", "f")
+_TEXT_FORMAT = re.compile(r"\b(csv|json|xml|xlsx?|pc-axis|pcaxis|px)\b")
+
+# Content-Type -> formato; text/plain, octet-stream, etc. no deciden nada
+_CONTENT_TYPES = (
+    ("csv", "csv"), ("json", "json"), ("pc-axis", "pc-axis"), ("pcaxis", "pc-axis"),
+    ("spreadsheetml", "xls"), ("ms-excel", "xls"), ("xml", "xml"),
+)
+_SKIP_HREF = ("#", "javascript:", "mailto:", "tel:")
+
+
+def get_config() -> Dict[str, Any]:
+    conf = dict(DEFAULTS)
+    conf.update(getattr(settings, "DISTRIBUTION_RESOLVER", {}) or {})
+    return conf
+
+
+# -----------------------
+# Clasificación
+# -----------------------
+def format_from_content_type(content_type: str) -> Optional[str]:
+    ct = (content_type or "").lower()
+    for hint, fmt in _CONTENT_TYPES:
+        if hint in ct:
+            return fmt
+    return None
+
+
+def classify_link(href: str, text: str = "") -> Optional[str]:
+    parts = urlsplit(href)
+    name = parts.path.rsplit("/", 1)[-1].lower()
+    if "." in name:
+        fmt = _EXTENSIONS.get(name.rsplit(".", 1)[-1])
+        if fmt:
+            return fmt
+    for key, value in parse_qsl(parts.query):
+        if key.lower() in _FORMAT_PARAMS and value.lower() in _EXTENSIONS:
+            return _EXTENSIONS[value.lower()]
+    m = _TEXT_FORMAT.search((text or "").lower())
+    return _EXTENSIONS[m.group(1)] if m else None
+
+
+# -----------------------
+# Extracción de enlaces
+# -----------------------
+class _LinkCollector(HTMLParser):
+    """Sólo <base> y <a href> (href, texto y title), sin construir el árbol."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.base: Optional[str] = None
+        self.links: List[Tuple[str, str]] = []
+        self._href: Optional[str] = None
+        self._text: List[str] = []
+
+    def _close_link(self):
+        if self._href is not None:
+            self.links.append((self._href, " ".join(self._text)))
+        self._href, self._text = None, []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "a":
+            self._close_link()   # <a> sin cerrar
+            attrs = dict(attrs)
+            if attrs.get("href"):
+                self._href, self._text = attrs["href"], [attrs.get("title") or ""]
+        elif tag == "base" and self.base is None:
+            self.base = dict(attrs).get("href")
+
+    def handle_data(self, data):
+        if self._href is not None:
+            self._text.append(data)
+
+    def handle_endtag(self, tag):
+        if tag == "a":
+            self._close_link()
+
+    def close(self):
+        super().close()
+        self._close_link()
+
+
+def extract_links(html: str, base_url: str) -> List[Tuple[str, str]]:
+    """[(URL absoluta, texto del enlace)] de todos los <a href> de la página."""
+    if lxml is not None:
+        doc = lxml.html.fromstring(html)
+        base = doc.find(".//base")
+        base_href = base.get("href") if base is not None else None
+        raw = [(a.get("href"), f"{a.get('title') or ''} {a.text_content()}") for a in doc.iter("a") if a.get("href")]
+    else:
+        collector = _LinkCollector()
+        collector.feed(html)
+        collector.close()
+        base_href, raw = collector.base, collector.links
+    base_url = urljoin(base_url, base_href) if base_href else base_url
+    return [(urljoin(base_url, href.strip()), " ".join(text.split()))
+            for href, text in raw if not href.strip().lower().startswith(_SKIP_HREF)]
+
+
+def files_from_links(links: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+    files, seen = [], set()
+    for href, text in links:
+        fmt = classify_link(href, text)
+        if fmt and href not in seen:
+            seen.add(href)
+            files.append({"format": fmt, "url": href})
+    return files
+
+
+# -----------------------
+# Descarga y validación
+# -----------------------
+def _read_limited(resp, max_bytes: int) -> bytes:
+    parts, size = [], 0
+    for data in resp.iter_content(chunk_size=64 * 1024):
+        parts.append(data)
+        size += len(data)
+        if size >= max_bytes:
+            break
+    return b"".join(parts)
+
+
+def _fetch_entry(url: str, cached: Optional[Dict[str, Any]], conf: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
+    """(entrada, no_modificada). Con entrada previa la petición es condicional."""
+    headers = {}
+    if cached and cached.get("etag"):
+        headers["If-None-Match"] = cached["etag"]
+    if cached and cached.get("last_modified"):
+        headers["If-Modified-Since"] = cached["last_modified"]
+
+    resp = http_client.get(url, stream=True, timeout=conf["TIMEOUT"], headers=headers)
+    try:
+        if resp.status_code == 304 and cached:
+            return cached, True
+        resp.raise_for_status()
+        content_type = (resp.headers.get("Content-Type") or "").split(";")[0].strip().lower()
+        if "html" in content_type:
+            html = _read_limited(resp, conf["MAX_PAGE_BYTES"]).decode(
+                resp.encoding if "charset" in (resp.headers.get("Content-Type") or "").lower() else "utf-8",
+                errors="replace")
+            files = files_from_links(extract_links(html, resp.url or url))
+            page = "html"
+        else:
+            # La URL ya es el fichero: no se lee el cuerpo
+            fmt = format_from_content_type(content_type) or classify_link(url)
+            files = [{"format": fmt or content_type or "desconocido", "url": url,
+                      "content_type": content_type, "verified": True}]
+            page = "file"
+    finally:
+        resp.close()
+    entry = {
+        "etag": resp.headers.get("ETag"),
+        "last_modified": resp.headers.get("Last-Modified"),
+        "page": page,
+        "files": files,
+        "validated": page == "file",
+    }
+    return entry, False
+
+
+def _head_content_type(url: str, timeout: float) -> Optional[str]:
+    try:
+        resp = http_client.head(url, timeout=timeout, allow_redirects=True)
+        if resp.status_code in (403, 405, 501):
+            # Hay servidores que no aceptan HEAD: GET sin leer el cuerpo
+            resp = http_client.get(url, stream=True, timeout=timeout)
+            resp.close()
+        if resp.status_code >= 400:
+            return None
+        return (resp.headers.get("Content-Type") or "").split(";")[0].strip().lower()
+    except Exception as e:
+        logger.info("HEAD %s falló: %s", url, e)
+        return None
+
+
+def validate_files(files: List[Dict[str, Any]], conf: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """
+    Content-Type de cada candidato con HEAD en paralelo. Un Content-Type
+    concreto corrige el formato; si es HTML el enlace era otra página y se
+    descarta. Los que no responden se conservan con verified=False.
+    """
+    conf = conf or get_config()
+    pending = [f for f in files if "verified" not in f][:conf["MAX_VALIDATE"]]
+    if not pending:
+        return files
+    with ThreadPoolExecutor(max_workers=min(conf["HEAD_CONCURRENCY"], len(pending)),
+                            thread_name_prefix="distribution-head") as pool:
+        types = list(pool.map(lambda f: _head_content_type(f["url"], conf["TIMEOUT"]), pending))
+    for f, content_type in zip(pending, types):
+        f["verified"] = content_type is not None
+        if content_type:
+            f["content_type"] = content_type
+            f["format"] = format_from_content_type(content_type) or f["format"]
+    return [f for f in files if "html" not in f.get("content_type", "")]
+
+
+# -----------------------
+# API
+# -----------------------
+def resolve(url: str, validate: Optional[bool] = None, force: bool = False) -> Dict[str, Any]:
+    """{"url", "files", "page", "cache"}; lanza la excepción de la descarga si falla."""
+    conf = get_config()
+    validate = conf["VALIDATE"] if validate is None else validate
+    key = dataset_cache.make_cache_key(NAMESPACE, {"url": url})
+    cached, state = (None, dataset_cache.MISS) if force else dataset_cache.lookup(key)
+
+    if state == dataset_cache.FRESH and (cached["validated"] or not validate):
+        entry, cache = cached, "hit"
+    else:
+        entry, not_modified = _fetch_entry(url, cached, conf)
+        cache = "revalidated" if not_modified else "miss"
+        if validate and not entry["validated"]:
+            entry = {**entry, "files": validate_files([dict(f) for f in entry["files"]], conf), "validated": True}
+        dataset_cache.store(NAMESPACE, key, entry)
+    return {"url": url, "page": entry["page"], "files": entry["files"], "cache": cache}
+
+
+def resolve_many(urls: List[str], validate: Optional[bool] = None, force: bool = False) -> List[Dict[str, Any]]:
+    """resolve() de varias URLs en paralelo, en el orden pedido; los fallos van por URL."""
+    conf = get_config()
+
+    def run(url):
+        try:
+            return {"success": True, **resolve(url, validate, force)}
+        except Exception as e:
+            logger.info("No se pudo resolver %s: %s", url, e)
+            return {"success": False, "url": url, "files": [], "message": str(e)}
+
+    urls = list(dict.fromkeys(urls))
+    if len(urls) == 1:
+        return [run(urls[0])]
+    with ThreadPoolExecutor(max_workers=min(conf["CONCURRENCY"], len(urls)) or 1,
+                            thread_name_prefix="distribution-resolve") as pool:
+        return list(pool.map(run, urls))
@@ -0,0 +1,153 @@
+# core/services/forecast_models.py
+# Ajuste y predicción de una serie (ETS, ARIMA o tendencia lineal) con
+# intervalos. Sin Django: lo importan los procesos del pool de
+# core/services/forecasting.py, que sólo reciben arrays y devuelven dicts.
+#
+# Un ajuste produce un "modelo" serializable en JSON ({"kind", "spec",
+# "params"}); con él la predicción se rehace sin volver a optimizar
+# (ETSModel.smooth / ARIMA.filter), que es lo que guarda la caché de modelos.
+import hashlib
+import warnings
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+MODELS = ("ets", "arima", "linear")
+MIN_POINTS = {"ets": 10, "arima": 12, "linear": 3}
+
+
+def data_hash(values: np.ndarray) -> str:
+    """Huella de los valores (NaN incluidos): si no cambia, el modelo ajustado sirve."""
+    return hashlib.sha1(np.ascontiguousarray(values, dtype=np.float64).tobytes()).hexdigest()
+
+
+def prepare(values: np.ndarray) -> np.ndarray:
+    """Sin los NaN de los extremos y con los huecos interiores interpolados linealmente."""
+    values = np.asarray(values, dtype=np.float64)
+    present = np.flatnonzero(~np.isnan(values))
+    if not len(present):
+        return values[:0]
+    values = values[present[0]:present[-1] + 1]
+    gaps = np.isnan(values)
+    if gaps.any():
+        idx = np.arange(len(values))
+        values = values.copy()
+        values[gaps] = np.interp(idx[gaps], idx[~gaps], values[~gaps])
+    return values
+
+
+def choose_kind(kind: str, n: int) -> str:
+    # Series demasiado cortas para el modelo pedido: tendencia lineal
+    return kind if n >= MIN_POINTS[kind] else "linear"
+
+
+def _spec(kind: str, n: int, season: Optional[int]) -> Dict[str, Any]:
+    seasonal = bool(season) and n >= 2 * season + 2
+    if kind == "ets":
+        return {"error": "add", "trend": "add", "damped_trend": True,
+                "seasonal": "add" if seasonal else None, "seasonal_periods": season if seasonal else None}
+    if kind == "arima":
+        return {"order": [1, 1, 1], "seasonal_order": [1, 0, 0, season] if seasonal else [0, 0, 0, 0]}
+    return {}
+
+
+# -----------------------
+# Modelos
+# -----------------------
+def _ets(y: pd.Series, spec: Dict[str, Any]):
+    from statsmodels.tsa.exponential_smoothing.ets import ETSModel
+    return ETSModel(y, **spec)
+
+
+def _arima(y: pd.Series, spec: Dict[str, Any]):
+    from statsmodels.tsa.arima.model import ARIMA
+    return ARIMA(y, order=tuple(spec["order"]), seasonal_order=tuple(spec["seasonal_order"]))
+
+
+def _linear_fit(y: np.ndarray) -> List[float]:
+    t = np.arange(len(y), dtype=np.float64)
+    slope, intercept = np.polyfit(t, y, 1)
+    resid = y - (intercept + slope * t)
+    dof = max(len(y) - 2, 1)
+    return [float(intercept), float(slope), float(np.sqrt(resid @ resid / dof)), float(len(y))]
+
+
+def _linear_forecast(params: List[float], horizon: int, alpha: float):
+    """OLS y = a + b·t: intervalo de predicción con t de Student."""
+    intercept, slope, sigma, n = params
+    t = np.arange(n, n + horizon)
+    tbar = (n - 1) / 2
+    sxx = n * (n * n - 1) / 12   # Σ(t - tbar)² para t = 0..n-1
+    mean = intercept + slope * t
+    se = sigma * np.sqrt(1 + 1 / n + (t - tbar) ** 2 / sxx)
+    q = stats.t.ppf(1 - alpha / 2, max(n - 2, 1))
+    return mean, mean - q * se, mean + q * se
+
+
+def _statsmodels_forecast(kind: str, results, n: int, horizon: int, alpha: float):
+    if kind == "ets":
+        frame = results.get_prediction(start=n, end=n + horizon - 1).summary_frame(alpha=alpha)
+        return frame["mean"].to_numpy(), frame["pi_lower"].to_numpy(), frame["pi_upper"].to_numpy()
+    frame = results.get_forecast(horizon).summary_frame(alpha=alpha)
+    return frame["mean"].to_numpy(), frame["mean_ci_lower"].to_numpy(), frame["mean_ci_upper"].to_numpy()
+
+
+def _results(kind: str, y: np.ndarray, spec: Dict[str, Any], params: Optional[List[float]] = None):
+    series = pd.Series(y)   # con ndarray, ETSResults.get_prediction falla (statsmodels 0.14)
+    model = _ets(series, spec) if kind == "ets" else _arima(series, spec)
+    if params is None:
+        return model.fit(disp=False) if kind == "ets" else model.fit()
+    return model.smooth(np.asarray(params)) if kind == "ets" else model.filter(np.asarray(params))
+
+
+def _json_values(values: np.ndarray) -> List[Optional[float]]:
+    return [float(v) if np.isfinite(v) else None for v in np.asarray(values, dtype=np.float64)]
+
+
+# -----------------------
+# API (funciones de nivel de módulo: se envían al pool por referencia)
+# -----------------------
+def fit_and_forecast(task: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    task: {"id", "values", "kind", "season", "horizon", "alpha", "model" (opcional)}.
+    Con "model" (de la caché) no se optimiza: se reconstruye con sus parámetros.
+    Devuelve {"id", "model", "refit", "mean", "lower", "upper", "aic"} o {"id", "error"}.
+    """
+    y = prepare(task["values"])
+    cached = task.get("model")
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")   # avisos de convergencia de statsmodels
+            if cached:
+                kind, spec, params = cached["kind"], cached["spec"], cached["params"]
+            else:
+                kind = choose_kind(task["kind"], len(y))
+                spec = _spec(kind, len(y), task.get("season"))
+            if len(y) < MIN_POINTS["linear"]:
+                raise ValueError(f"Serie con {len(y)} puntos: no se puede ajustar")
+
+            if kind == "linear":
+                params = params if cached else _linear_fit(y)
+                mean, lower, upper = _linear_forecast(params, task["horizon"], task["alpha"])
+                aic = None
+            else:
+                results = _results(kind, y, spec, params if cached else None)
+                params = params if cached else [float(p) for p in np.asarray(results.params)]
+                mean, lower, upper = _statsmodels_forecast(kind, results, len(y), task["horizon"], task["alpha"])
+                aic = float(results.aic) if np.isfinite(results.aic) else None
+    except Exception as e:
+        return {"id": task["id"], "error": f"{type(e).__name__}: {e}"}
+    return {
+        "id": task["id"],
+        "model": {"kind": kind, "spec": spec, "params": params},
+        "refit": not cached,
+        "mean": _json_values(mean), "lower": _json_values(lower), "upper": _json_values(upper),
+        "aic": aic,
+    }
+
+
+def run_chunk(tasks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # Un envío al pool por lote de series: menos serialización que una por serie
+    return [fit_and_forecast(t) for t in tasks]
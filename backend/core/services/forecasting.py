@@ -0,0 +1,215 @@
+# core/services/forecasting.py
+# Predicción de todas las series de una tabla del INE (labels/series de
+# normalize_ine_data) con ETS, ARIMA o tendencia lineal e intervalos:
+#   - los ajustes se reparten en lotes entre un pool de procesos persistente
+#     (spawn; el código del ajuste está en forecast_models, sin Django)
+#   - los modelos ajustados se cachean por tabla en "forecast_models":
+#     {serie: {"hash", "model"}}. Si los datos de la serie no han cambiado
+#     (misma huella) la predicción se rehace con los parámetros guardados, sin
+#     optimizar; sólo las series nuevas o con datos nuevos se reajustan.
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from core.services import forecast_models
+from core.services.correlation import ine_timestamps, native_frequency
+from core.services.ine_api_service import extract_ine_idtable, get_dataset_from_ine, is_ine_dataset
+from core.utils import dataset_cache
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE = "forecast_models"
+
+DEFAULTS = {
+    "PROCESSES": None,      # procesos del pool; por defecto os.cpu_count()
+    "MIN_PARALLEL": 8,      # con menos ajustes pendientes no se usa el pool
+    "CHUNK_SIZE": 8,        # series por envío al pool
+    "MAX_SERIES": 500,
+    "MAX_HORIZON": 60,
+    "LEVEL": 95,            # % del intervalo de predicción
+}
+
+SEASONS = {"M": 12, "Q": 4}
+_OFFSETS = {"D": "D", "W": "W", "M": "MS", "Q": "QS", "Y": "YS"}
+
+
+class ForecastError(ValueError):
+    """Petición que no se puede servir (tabla, modelo o parámetro no válido)."""
+
+
+def get_config() -> Dict[str, Any]:
+    conf = dict(DEFAULTS)
+    conf.update(getattr(settings, "FORECAST", {}) or {})
+    conf["PROCESSES"] = max(1, conf["PROCESSES"] or os.cpu_count() or 1)
+    return conf
+
+
+def normalize_options(model: Optional[str], horizon: Any, level: Any,
+                      conf: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    conf = conf or get_config()
+    model = (model or "ets").lower()
+    if model not in forecast_models.MODELS:
+        raise ForecastError(f"Modelo '{model}' no soportado (usa {', '.join(forecast_models.MODELS)})")
+    try:
+        horizon = int(horizon) if horizon not in (None, "") else None
+        level = float(level) if level not in (None, "") else float(conf["LEVEL"])
+    except (TypeError, ValueError):
+        raise ForecastError("horizon debe ser entero y level un número")
+    if horizon is not None and not 1 <= horizon <= conf["MAX_HORIZON"]:
+        raise ForecastError(f"horizon debe estar entre 1 y {conf['MAX_HORIZON']}")
+    if not 50 <= level < 100:
+        raise ForecastError("level debe estar entre 50 y 99.9")
+    return {"model": model, "horizon": horizon, "level": level}
+
+
+# -----------------------
+# Pool de procesos
+# -----------------------
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool(processes: int) -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None or getattr(_pool, "_broken", False):
+            _pool = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+@atexit.register
+def shutdown_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def run_tasks(tasks: List[Dict[str, Any]], conf: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Ajustes en el pool (por lotes) o en línea si son pocos o hay un solo proceso."""
+    conf = conf or get_config()
+    # Reconstruir desde la caché es barato: sólo los ajustes nuevos justifican el pool
+    refits = sum(1 for t in tasks if not t.get("model"))
+    if conf["PROCESSES"] == 1 or refits < conf["MIN_PARALLEL"]:
+        return forecast_models.run_chunk(tasks)
+    size = conf["CHUNK_SIZE"]
+    chunks = [tasks[i:i + size] for i in range(0, len(tasks), size)]
+    try:
+        results = _get_pool(conf["PROCESSES"]).map(forecast_models.run_chunk, chunks)
+        return [r for chunk in results for r in chunk]
+    except BrokenProcessPool:
+        logger.warning("Pool de predicción roto; se ajusta en este proceso")
+        return forecast_models.run_chunk(tasks)
+
+
+# -----------------------
+# Caché de modelos
+# -----------------------
+def _models_key(table_id: str, kind: str, season: Optional[int]) -> str:
+    return dataset_cache.make_cache_key(NAMESPACE, {"table": table_id, "kind": kind, "season": season})
+
+
+def _load_models(key: str) -> Dict[str, Any]:
+    data, state = dataset_cache.lookup(key)
+    return data if state != dataset_cache.MISS and isinstance(data, dict) else {}
+
+
+# -----------------------
+# Predicción
+# -----------------------
+def _future_labels(stamps: Optional[pd.DatetimeIndex], last: int, freq: Optional[str], horizon: int) -> List[str]:
+    if stamps is None or freq is None or pd.isna(stamps[last]):
+        return [f"t+{i}" for i in range(1, horizon + 1)]
+    future = pd.date_range(stamps[last], periods=horizon + 1, freq=_OFFSETS[freq])[1:]
+    return [d.strftime("%Y-%m-%d") for d in future]
+
+
+def forecast_series(table_id: str, labels: List[Any], series: List[Dict[str, Any]], options: Dict[str, Any],
+                    refit: bool = False, conf: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    labels/series con la forma de normalize_ine_data ({"name", "data"} alineadas
+    con labels). Devuelve la predicción de cada serie con su intervalo.
+    """
+    conf = conf or get_config()
+    if len(series) > conf["MAX_SERIES"]:
+        raise ForecastError(f"{len(series)} series: como máximo {conf['MAX_SERIES']} (filtra la tabla con tv)")
+    started = time.monotonic()
+    stamps = ine_timestamps(labels) if labels else None
+    freq = native_frequency(stamps) if stamps is not None else None
+    season = SEASONS.get(freq)
+    horizon = options["horizon"] or season or 12
+    alpha = 1 - options["level"] / 100
+
+    key = _models_key(table_id, options["model"], season)
+    models = _load_models(key)
+    tasks, hashes, last_index = [], {}, {}
+    for i, s in enumerate(series):
+        values = np.array([np.nan if v is None else v for v in s["data"]], dtype=np.float64)
+        present = np.flatnonzero(~np.isnan(values))
+        last_index[i] = int(present[-1]) if len(present) else -1
+        sid = s.get("name") or f"serie-{i}"
+        hashes[i] = forecast_models.data_hash(values)
+        entry = None if refit else models.get(sid)
+        tasks.append({
+            "id": i, "values": values, "kind": options["model"], "season": season,
+            "horizon": horizon, "alpha": alpha,
+            "model": entry["model"] if entry and entry.get("hash") == hashes[i] else None,
+        })
+
+    results = run_tasks(tasks, conf)
+
+    out, refitted = [], 0
+    for r in sorted(results, key=lambda r: r["id"]):
+        s = series[r["id"]]
+        sid = s.get("name") or f"serie-{r['id']}"
+        item = {"name": s.get("name"), "points": int(np.count_nonzero(~np.isnan(tasks[r["id"]]["values"])))}
+        if "error" in r:
+            out.append({**item, "error": r["error"]})
+            continue
+        if r["refit"]:
+            refitted += 1
+            models[sid] = {"hash": hashes[r["id"]], "model": r["model"]}
+        last = last_index[r["id"]]
+        out.append({
+            **item,
+            "model": r["model"]["kind"],
+            "cached_model": not r["refit"],
+            "aic": r["aic"],
+            "last_label": labels[last] if last >= 0 else None,
+            "forecast": {"labels": _future_labels(stamps, last, freq, horizon),
+                         "mean": r["mean"], "lower": r["lower"], "upper": r["upper"]},
+        })
+    if refitted:
+        dataset_cache.store(NAMESPACE, key, models)
+
+    return {
+        "model": options["model"], "horizon": horizon, "level": options["level"],
+        "freq": freq, "season": season, "series": out,
+        "stats": {"series": len(out), "refitted": refitted, "from_cache": len(out) - refitted,
+                  "errors": sum(1 for o in out if "error" in o),
+                  "processes": conf["PROCESSES"] if refitted >= conf["MIN_PARALLEL"] else 1,
+                  "elapsed_ms": round((time.monotonic() - started) * 1000)},
+    }
+
+
+def forecast_ine_table(url: str, options: Dict[str, Any], filters: Optional[Dict[str, Any]] = None,
+                       refit: bool = False) -> Dict[str, Any]:
+    table_id = extract_ine_idtable(url) if is_ine_dataset(url) else None
+    if not table_id:
+        raise ForecastError("Sólo se admiten tablas del INE (url o id de tabla)")
+    data = get_dataset_from_ine(url, sample_rows=None, filters=filters)
+    if not data.get("series"):
+        raise ForecastError(f"La tabla INE {table_id} no devolvió series")
+    result = forecast_series(table_id, data["labels"], data["series"], options, refit=refit)
+    return {"table": table_id, **result}
@@ -0,0 +1,343 @@
+# core/services/geo_index.py
+# Índice de nombres y códigos INE de comunidades, provincias y municipios a
+# identificadores canónicos ("ccaa:13", "prov:28", "mun:28079").
+#
+# Las claves se guardan plegadas (sin tildes ni mayúsculas, puntuación como
+# espacio salvo , / y paréntesis), así que reconocer un valor es una búsqueda en un dict: la detección
+# de columnas geográficas y el cruce con las geometrías (geo_shapes) son
+# O(valores distintos). El plegado de toda una columna se hace en una sola
+# llamada sobre el texto unido por '\n', como en schema_inference.Lines.
+#
+# Comunidades y provincias van en el código; los municipios se añaden al
+# construir el índice desde un fichero de límites (manage.py build_geo_index)
+# y se guardan en <DIRECTORY>/index.json.
+import json
+import logging
+import os
+import re
+import threading
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "DIRECTORY": None,      # por defecto BASE_DIR/core/data/geo
+    "ZOOMS": [4, 6, 8, 10],
+    "DEFAULT_ZOOM": 6,
+    "QUANTIZATION": 100000,     # rejilla de la topología base (≈ 10 m en la península)
+    "PIXEL_TOLERANCE": 0.5,     # error de simplificación admitido, en píxeles de cada zoom
+}
+
+LEVELS = ("ccaa", "prov", "mun")
+INDEX_FILE = "index.json"
+
+# (código INE, nombre, variantes)
+COMMUNITIES = [
+    ("01", "Andalucía", []),
+    ("02", "Aragón", []),
+    ("03", "Principado de Asturias", ["Asturias", "Asturias, Principado de", "P. de Asturias"]),
+    ("04", "Illes Balears", ["Islas Baleares", "Baleares", "Balears, Illes", "Balears"]),
+    ("05", "Canarias", ["Islas Canarias"]),
+    ("06", "Cantabria", []),
+    ("07", "Castilla y León", []),
+    ("08", "Castilla-La Mancha", ["Castilla - La Mancha"]),
+    ("09", "Cataluña", ["Catalunya"]),
+    ("10", "Comunitat Valenciana", ["Comunidad Valenciana", "Valenciana", "C. Valenciana", "Com. Valenciana"]),
+    ("11", "Extremadura", []),
+    ("12", "Galicia", []),
+    ("13", "Comunidad de Madrid", ["Madrid", "Madrid, Comunidad de", "Com. de Madrid", "C. de Madrid", "C. Madrid"]),
+    ("14", "Región de Murcia", ["Murcia", "Murcia, Región de", "R. de Murcia"]),
+    ("15", "Comunidad Foral de Navarra", ["Navarra", "Navarra, Comunidad Foral de", "Nafarroa",
+                                         "C. Foral de Navarra", "C. F. de Navarra"]),
+    ("16", "País Vasco", ["Euskadi", "PaisVasco"]),
+    ("17", "La Rioja", ["Rioja, La"]),
+    ("18", "Ceuta", ["Ciudad Autónoma de Ceuta"]),
+    ("19", "Melilla", ["Ciudad Autónoma de Melilla"]),
+]
+
+# (código INE, nombre, comunidad, variantes)
+PROVINCES = [
+    ("01", "Araba/Álava", "16", ["Álava", "Araba"]),
+    ("02", "Albacete", "08", []),
+    ("03", "Alicante/Alacant", "10", ["Alicante", "Alacant"]),
+    ("04", "Almería", "01", []),
+    ("05", "Ávila", "07", []),
+    ("06", "Badajoz", "11", []),
+    ("07", "Illes Balears", "04", ["Islas Baleares", "Baleares", "Balears, Illes"]),
+    ("08", "Barcelona", "09", []),
+    ("09", "Burgos", "07", []),
+    ("10", "Cáceres", "11", []),
+    ("11", "Cádiz", "01", []),
+    ("12", "Castellón/Castelló", "10", ["Castellón", "Castelló", "Castellón de la Plana"]),
+    ("13", "Ciudad Real", "08", []),
+    ("14", "Córdoba", "01", []),
+    ("15", "A Coruña", "12", ["La Coruña", "Coruña, A", "Coruña"]),
+    ("16", "Cuenca", "08", []),
+    ("17", "Girona", "09", ["Gerona"]),
+    ("18", "Granada", "01", []),
+    ("19", "Guadalajara", "08", []),
+    ("20", "Gipuzkoa", "16", ["Guipúzcoa"]),
+    ("21", "Huelva", "01", []),
+    ("22", "Huesca", "02", []),
+    ("23", "Jaén", "01", []),
+    ("24", "León", "07", []),
+    ("25", "Lleida", "09", ["Lérida"]),
+    ("26", "La Rioja", "17", ["Rioja, La"]),
+    ("27", "Lugo", "12", []),
+    ("28", "Madrid", "13", []),
+    ("29", "Málaga", "01", []),
+    ("30", "Murcia", "14", []),
+    ("31", "Navarra", "15", ["Nafarroa"]),
+    ("32", "Ourense", "12", ["Orense"]),
+    ("33", "Asturias", "03", []),
+    ("34", "Palencia", "07", []),
+    ("35", "Las Palmas", "05", ["Palmas, Las"]),
+    ("36", "Pontevedra", "12", []),
+    ("37", "Salamanca", "07", []),
+    ("38", "Santa Cruz de Tenerife", "05", []),
+    ("39", "Cantabria", "06", []),
+    ("40", "Segovia", "07", []),
+    ("41", "Sevilla", "01", []),
+    ("42", "Soria", "07", []),
+    ("43", "Tarragona", "09", []),
+    ("44", "Teruel", "02", []),
+    ("45", "Toledo", "08", []),
+    ("46", "Valencia/València", "10", ["Valencia", "València"]),
+    ("47", "Valladolid", "07", []),
+    ("48", "Bizkaia", "16", ["Vizcaya"]),
+    ("49", "Zamora", "07", []),
+    ("50", "Zaragoza", "02", []),
+    ("51", "Ceuta", "18", []),
+    ("52", "Melilla", "19", []),
+]
+
+CODE_WIDTH = {"ccaa": 2, "prov": 2, "mun": 5}
+
+_SEPARATORS = re.compile(r"[^a-z0-9,/()\n]+")
+_AROUND = re.compile(r" *([,/()\n]) *")
+_CODE_PREFIX = re.compile(r"^(\d{1,5}) (.+)$")
+_QUALIFIER = re.compile(r"\(([^()]*)\)")
+# formas oficiales largas que el índice guarda sin el prefijo ("Ciudad Autónoma de Ceuta" -> "ceuta")
+_PREFIXES = ("comunidad autonoma de la ", "comunidad autonoma del ", "comunidad autonoma de ",
+             "ciudad autonoma de ")
+# claves que pueden tener otras formas en variants(): código delante, coma, barra, paréntesis o prefijo
+_HAS_FORMS = re.compile(r"^\d|[,/()]|^(comunidad|ciudad) autonoma ")
+
+
+def get_config() -> Dict[str, Any]:
+    conf = dict(DEFAULTS)
+    conf.update(getattr(settings, "GEO", {}) or {})
+    if not conf["DIRECTORY"]:
+        conf["DIRECTORY"] = os.path.join(settings.BASE_DIR, "core", "data", "geo")
+    return conf
+
+
+# -----------------------
+# Plegado de nombres
+# -----------------------
+def fold_many(values: List[str]) -> List[str]:
+    """
+    Claves plegadas de todos los valores con una única normalización sobre el
+    texto unido: "Coruña, A" -> "coruna,a", "Castilla-La Mancha" -> "castilla la mancha",
+    "Madrid (Comunidad de)" -> "madrid(comunidad de)".
+    """
+    if not values:
+        return []
+    text = "\n".join(str(v).replace("\n", " ") for v in values)
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii").casefold()
+    text = _AROUND.sub(r"\1", _SEPARATORS.sub(" ", text))
+    return [line.strip(" ,/") for line in text.split("\n")]
+
+
+def fold(value: Any) -> str:
+    return fold_many([value])[0]
+
+
+def variants(key: str) -> Iterable[str]:
+    """
+    Formas de una clave plegada, en orden: tal cual, sin código INE delante
+    ("28 madrid"), con el artículo/forma oficial invertidos al estilo del INE
+    ("coruna,a" -> "a coruna", "madrid(comunidad de)" -> "comunidad de madrid"),
+    sin el calificativo entre paréntesis ("canarias(las palmas)" -> "canarias",
+    y luego "las palmas"), sin el prefijo "comunidad/ciudad autonoma de" y
+    cada parte de los nombres bilingües ("alicante/alacant").
+    """
+    yield key
+    m = _CODE_PREFIX.match(key)
+    if m:
+        key = m.group(2)
+        yield key
+    if "," in key:
+        head, _, tail = key.partition(",")
+        yield f"{tail} {head}".strip()
+    if "(" in key or ")" in key:
+        qualifiers = [q.strip() for q in _QUALIFIER.findall(key) if q.strip()]
+        rest = " ".join(_QUALIFIER.sub(" ", key).split())
+        if len(qualifiers) == 1 and rest:
+            yield f"{qualifiers[0]} {rest}"
+        if rest and rest != key:
+            yield from variants(rest)
+        for q in qualifiers:
+            yield from variants(q)
+        yield " ".join(key.replace("(", " ").replace(")", " ").split())   # claves plegadas sin paréntesis
+    for prefix in _PREFIXES:
+        if key.startswith(prefix):
+            yield from variants(key[len(prefix):])
+            break
+    if "/" in key:
+        for part in key.split("/"):
+            if part:
+                yield from variants(part)
+
+
+def is_code(key: str) -> bool:
+    return key.isdigit() and len(key) <= 5
+
+
+def code_id(key: str, level: str) -> str:
+    return f"{level}:{key.zfill(CODE_WIDTH[level])}"
+
+
+# -----------------------
+# Índice
+# -----------------------
+class GeoIndex:
+    """
+    records: id -> {"name", "level", "parent"}; names: clave plegada -> ids
+    (varios si el nombre es ambiguo: "madrid" es comunidad, provincia y municipio).
+    """
+
+    def __init__(self, records: Dict[str, Dict[str, Any]], names: Dict[str, List[str]]):
+        self.records = records
+        self.names = names
+
+    @classmethod
+    def seed(cls) -> "GeoIndex":
+        index = cls({}, {})
+        for code, name, aliases in COMMUNITIES:
+            index.add(f"ccaa:{code}", name, "ccaa", None, aliases)
+        for code, name, ccaa, aliases in PROVINCES:
+            index.add(f"prov:{code}", name, "prov", f"ccaa:{ccaa}", aliases)
+        return index
+
+    def add(self, geo_id: str, name: str, level: str, parent: Optional[str] = None,
+            aliases: Iterable[str] = ()) -> None:
+        self.records[geo_id] = {"name": name, "level": level, "parent": parent}
+        for key in fold_many([name, *aliases]):
+            ids = self.names.setdefault(key, []) if key else None
+            if ids is not None and geo_id not in ids:
+                ids.append(geo_id)
+
+    def candidates(self, key: str, level: Optional[str] = None) -> List[str]:
+        """Ids de la primera forma de la clave que esté en el índice (con ids de `level`, si se indica)."""
+        for form in variants(key):
+            ids = self.names.get(form)
+            if ids and level:
+                ids = [i for i in ids if self.records[i]["level"] == level]
+            if ids:
+                return ids
+        return []
+
+    def matches(self, values: List[str]) -> np.ndarray:
+        """Máscara de los valores que son un nombre conocido (los códigos no cuentan)."""
+        keys = fold_many(values)
+        names = self.names
+        mask = np.fromiter((k in names for k in keys), dtype=bool, count=len(keys))
+        # Sólo las claves con código delante, coma, barra, paréntesis o prefijo tienen otras formas
+        for i in np.flatnonzero(~mask):
+            k = keys[i]
+            if _HAS_FORMS.search(k):
+                mask[i] = bool(self.candidates(k))
+        return mask
+
+    def _resolve_key(self, key: str, level: str) -> Tuple[Optional[str], bool]:
+        """(id, ambiguo) de una clave plegada en un nivel; los códigos se rellenan con ceros."""
+        if is_code(key):
+            geo_id = code_id(key, level)
+            return (geo_id if geo_id in self.records else None), False
+        ids = self.candidates(key, level)
+        if len(ids) == 1:
+            return ids[0], False
+        return None, len(ids) > 1
+
+    def resolve(self, values: List[str], level: str = "auto") -> Dict[str, Any]:
+        """
+        Valores distintos -> {"level", "ids" (id o None por valor), "ambiguous"}.
+        level="auto" elige el nivel que resuelve más valores (a igualdad, el más general).
+        """
+        keys = fold_many(values)
+        levels = [lv for lv in LEVELS if lv != "mun" or self.has_municipalities] if level == "auto" else [level]
+        best = None
+        for lv in levels:
+            resolved = [self._resolve_key(k, lv) for k in keys]
+            hits = sum(1 for geo_id, _ in resolved if geo_id)
+            if best is None or hits > best[0]:
+                best = (hits, lv, resolved)
+        _, lv, resolved = best
+        return {"level": lv, "ids": [geo_id for geo_id, _ in resolved],
+                "ambiguous": [v for v, (_, amb) in zip(values, resolved) if amb]}
+
+    @property
+    def has_municipalities(self) -> bool:
+        return any(i.startswith("mun:") for i in self.records)
+
+    def name(self, geo_id: str) -> Optional[str]:
+        record = self.records.get(geo_id)
+        return record["name"] if record else None
+
+    def to_json(self) -> Dict[str, Any]:
+        return {"records": self.records, "names": self.names}
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "GeoIndex":
+        return cls(data["records"], data["names"])
+
+
+def build_index(municipalities: Iterable[Tuple[str, str]] = ()) -> GeoIndex:
+    """Índice de comunidades y provincias más los municipios (código INE de 5 cifras, nombre)."""
+    index = GeoIndex.seed()
+    for code, name in municipalities:
+        code = str(code).strip().zfill(5)
+        index.add(f"mun:{code}", name, "mun", f"prov:{code[:2]}")
+    return index
+
+
+def save_index(index: GeoIndex, directory: Optional[str] = None) -> str:
+    directory = directory or get_config()["DIRECTORY"]
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, INDEX_FILE)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index.to_json(), f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+    return path
+
+
+_index_cache: Dict[str, Any] = {}
+_index_lock = threading.Lock()
+
+
+def get_index() -> GeoIndex:
+    """Índice guardado (con municipios) si existe; si no, el de comunidades y provincias."""
+    path = os.path.join(get_config()["DIRECTORY"], INDEX_FILE)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        mtime = None
+    with _index_lock:
+        cached = _index_cache.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        index = GeoIndex.seed()
+        if mtime is not None:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    index = GeoIndex.from_json(json.load(f))
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning("Índice geográfico %s no válido, se usa el básico: %s", path, e)
+        _index_cache[path] = (mtime, index)
+        return index
@@ -0,0 +1,334 @@
+# core/services/geo_shapes.py
+# Geometrías de comunidades, provincias y municipios simplificadas por nivel
+# de zoom y guardadas como TopoJSON:
+#   <DIRECTORY>/shapes.json            manifiesto (capas, zooms, tamaños)
+#   <DIRECTORY>/<nivel>.z<zoom>.json   una topología por capa y zoom
+#
+# La topología se calcula una vez sobre coordenadas cuantizadas: los anillos
+# se cortan en los puntos donde cambian los vecinos y cada frontera compartida
+# es un único arco (delta-codificado), así que al simplificar por zoom las
+# regiones vecinas siguen encajando sin huecos ni solapes. En cada zoom los
+# arcos se simplifican (Douglas-Peucker, shapely vectorizado) con un error de
+# PIXEL_TOLERANCE píxeles y se re-cuantizan a la rejilla que ese zoom distingue.
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import shapely
+from shapely.geometry.polygon import orient
+
+from core.services.geo_index import CODE_WIDTH, LEVELS, GeoIndex, get_config
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "shapes.json"
+TILE_SIZE = 256     # píxeles del mundo en el zoom 0 (Web Mercator)
+
+
+class GeoShapesError(ValueError):
+    """Capa o zoom no disponibles, o geometrías no válidas."""
+
+
+def tolerance_degrees(zoom: int, pixels: float) -> float:
+    """Grados de longitud que ocupa `pixels` en el zoom indicado."""
+    return pixels * 360.0 / (TILE_SIZE * 2 ** zoom)
+
+
+# -----------------------
+# Topología
+# -----------------------
+def _rings(features: List[Tuple[str, str, Any]]):
+    """Anillos (exterior en sentido horario, huecos antihorario) por polígono de cada feature."""
+    rings, layout = [], []
+    for geo_id, name, geom in features:
+        polygons = []
+        for part in shapely.get_parts(shapely.make_valid(geom)):
+            if part.geom_type != "Polygon" or part.is_empty:
+                continue
+            part = orient(part, sign=-1.0)
+            refs = []
+            for ring in (part.exterior, *part.interiors):
+                refs.append(len(rings))
+                rings.append(np.asarray(ring.coords)[:-1, :2])
+            polygons.append(refs)
+        layout.append((geo_id, name, polygons))
+    return rings, layout
+
+
+def _quantize(rings: List[np.ndarray], q: int):
+    points = np.concatenate(rings)
+    x0, y0 = points.min(axis=0)
+    x1, y1 = points.max(axis=0)
+    scale = np.array([(x1 - x0) / (q - 1) or 1.0, (y1 - y0) / (q - 1) or 1.0])
+    out = []
+    for ring in rings:
+        r = np.rint((ring - (x0, y0)) / scale).astype(np.int64)
+        keep = np.any(r != np.roll(r, 1, axis=0), axis=1)   # sin puntos repetidos seguidos (ni el cierre)
+        out.append(r[keep] if keep.any() else r[:1])
+    return out, scale, np.array([x0, y0])
+
+
+def _junctions(rings: List[np.ndarray], q: int) -> Tuple[np.ndarray, List[np.ndarray]]:
+    """
+    (es_unión por punto distinto, ids de punto por anillo). Un punto es unión si
+    aparece con más de un par de vecinos distinto: ahí empieza o acaba una frontera.
+    """
+    lengths = np.array([len(r) for r in rings])
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    points = np.concatenate(rings)
+    _, pid = np.unique(points[:, 0] * (q + 1) + points[:, 1], return_inverse=True)
+    idx = np.arange(len(points))
+    ring_of = np.repeat(np.arange(len(rings)), lengths)
+    first, last = starts[ring_of], starts[ring_of] + lengths[ring_of] - 1
+    prev = np.where(idx == first, last, idx - 1)
+    nxt = np.where(idx == last, first, idx + 1)
+    lo, hi = np.minimum(pid[prev], pid[nxt]), np.maximum(pid[prev], pid[nxt])
+    order = np.lexsort((hi, lo, pid))
+    p, l, h = pid[order], lo[order], hi[order]
+    distinct = np.r_[True, (p[1:] != p[:-1]) | (l[1:] != l[:-1]) | (h[1:] != h[:-1])]
+    junction = np.bincount(p[distinct], minlength=pid.max() + 1) > 1
+    return junction, [pid[s:s + n] for s, n in zip(starts, lengths)]
+
+
+def build_topology(features: List[Tuple[str, str, Any]], quantization: int) -> Dict[str, Any]:
+    """
+    features: (id, nombre, geometría en lon/lat). Devuelve la topología base:
+    {"arcs" (arrays de puntos cuantizados), "geometries", "scale", "translate"}.
+    """
+    rings, layout = _rings(features)
+    if not rings:
+        raise GeoShapesError("No hay polígonos que guardar")
+    rings, scale, translate = _quantize(rings, quantization)
+    # Anillos que a esta resolución son un punto o una línea: fuera (y el polígono, si es su exterior)
+    valid = [len(r) >= 3 for r in rings]
+    rings = [r if ok else r[:0] for r, ok in zip(rings, valid)]
+    layout = [(geo_id, name, [[r for r in refs if valid[r]] for refs in polygons if valid[refs[0]]])
+              for geo_id, name, polygons in layout]
+    junction, ring_pids = _junctions(rings, quantization)
+
+    arcs: List[np.ndarray] = []
+    arc_ids: Dict[bytes, int] = {}
+
+    def arc_ref(seq_pids: np.ndarray, seq_points: np.ndarray) -> int:
+        key = seq_pids.tobytes()
+        if key in arc_ids:
+            return arc_ids[key]
+        rev = seq_pids[::-1].tobytes()
+        if rev in arc_ids:
+            return ~arc_ids[rev]
+        arc_ids[key] = len(arcs)
+        arcs.append(seq_points)
+        return arc_ids[key]
+
+    ring_arcs = []
+    for points, pids, ok in zip(rings, ring_pids, valid):
+        if not ok:
+            ring_arcs.append(None)
+            continue
+        cuts = np.flatnonzero(junction[pids])
+        # Sin uniones (isla, enclave): se empieza por el punto de menor id para
+        # que el mismo anillo recorrido por dos regiones dé el mismo arco
+        shift = cuts[0] if len(cuts) else int(np.argmin(pids))
+        points, pids = np.roll(points, -shift, axis=0), np.roll(pids, -shift)
+        points, pids = np.vstack([points, points[:1]]), np.append(pids, pids[0])
+        bounds = np.append(cuts - shift, len(pids) - 1) if len(cuts) else np.array([0, len(pids) - 1])
+        ring_arcs.append([arc_ref(pids[a:b + 1], points[a:b + 1]) for a, b in zip(bounds[:-1], bounds[1:])])
+
+    geometries = [{"id": geo_id, "name": name, "polygons": [[ring_arcs[r] for r in refs] for refs in polygons]}
+                  for geo_id, name, polygons in layout]
+    return {"arcs": arcs, "geometries": geometries, "scale": scale, "translate": translate}
+
+
+# -----------------------
+# Simplificación por zoom
+# -----------------------
+def _simplify_arcs(arcs: List[np.ndarray], tolerance: float) -> List[np.ndarray]:
+    """Douglas-Peucker sobre todos los arcos a la vez; los extremos (uniones) no se mueven."""
+    lines = shapely.linestrings(np.concatenate(arcs).astype(np.float64),
+                                indices=np.repeat(np.arange(len(arcs)), [len(a) for a in arcs]))
+    coords, index = shapely.get_coordinates(shapely.simplify(lines, tolerance, preserve_topology=False),
+                                            return_index=True)
+    bounds = np.searchsorted(index, np.arange(len(arcs) + 1))
+    out = []
+    for arc, a, b in zip(arcs, bounds[:-1], bounds[1:]):
+        simple = coords[a:b]
+        if len(arc) >= 4 and np.array_equal(arc[0], arc[-1]) and len(simple) < 4:
+            # anillo cerrado en un solo arco: al menos un triángulo
+            simple = arc[np.linspace(0, len(arc) - 1, 4).round().astype(int)].astype(np.float64)
+        out.append(simple)
+    return out
+
+
+def _encode_arcs(arcs: List[np.ndarray], step: int) -> List[List[List[int]]]:
+    """Re-cuantizados a `step` unidades de la rejilla base y delta-codificados (TopoJSON)."""
+    encoded = []
+    for arc in arcs:
+        q = np.rint(arc / step).astype(np.int64)
+        keep = np.r_[True, np.any(q[1:] != q[:-1], axis=1)]
+        q = q[keep]
+        if len(q) == 1:
+            q = np.vstack([q, q])   # arco colapsado: sigue siendo un arco válido
+        q[1:] = np.diff(q, axis=0)
+        encoded.append(q.tolist())
+    return encoded
+
+
+def _geometry(g: Dict[str, Any]) -> Dict[str, Any]:
+    polygons = g["polygons"]
+    base = {"id": g["id"], "properties": {"name": g["name"]}}
+    if len(polygons) == 1:
+        return {"type": "Polygon", "arcs": polygons[0], **base}
+    return {"type": "MultiPolygon", "arcs": polygons, **base}
+
+
+def topology_for_zoom(base: Dict[str, Any], layer: str, zoom: int, pixel_tolerance: float) -> Dict[str, Any]:
+    """TopoJSON de la capa con el detalle que se distingue en `zoom`."""
+    scale, translate = base["scale"], base["translate"]
+    tolerance = tolerance_degrees(zoom, pixel_tolerance) / scale.min()     # en unidades de la rejilla base
+    step = max(1, int(tolerance // 2))
+    arcs = _encode_arcs(_simplify_arcs(base["arcs"], tolerance), step)
+    x0, y0 = translate
+    x1, y1 = translate + scale * np.concatenate(base["arcs"]).max(axis=0)
+    return {
+        "type": "Topology",
+        "bbox": [float(x0), float(y0), float(x1), float(y1)],
+        "transform": {"scale": [float(s) for s in scale * step], "translate": [float(t) for t in translate]},
+        "objects": {layer: {"type": "GeometryCollection", "geometries": [_geometry(g) for g in base["geometries"]]}},
+        "arcs": arcs,
+    }
+
+
+# -----------------------
+# Ficheros de límites
+# -----------------------
+def read_boundaries(path: str):
+    """GeoDataFrame en lon/lat (EPSG:4326) de un GeoJSON, shapefile, GeoPackage..."""
+    try:
+        import geopandas
+    except ImportError:
+        raise GeoShapesError("Leer ficheros de límites necesita geopandas (requirements.txt)")
+    frame = geopandas.read_file(path)
+    if frame.crs is not None and frame.crs.to_epsg() != 4326:
+        frame = frame.to_crs(epsg=4326)
+    return frame
+
+
+def _code(value: Any, level: str) -> Optional[str]:
+    digits = "".join(ch for ch in str(value) if ch.isdigit()) if value is not None else ""
+    if not digits:
+        return None
+    width = CODE_WIDTH[level]
+    return digits[-width:] if len(digits) > width else digits.zfill(width)
+
+
+def features_from_frame(frame, level: str, index: GeoIndex, code_field: Optional[str] = None,
+                        name_field: Optional[str] = None) -> Tuple[List[Tuple[str, str, Any]], List[str]]:
+    """
+    (features (id, nombre, geometría), nombres sin resolver). El id sale del
+    código INE (`code_field`, se toman sus últimas cifras) o, si no hay, del
+    nombre buscado en el índice. Varias filas con el mismo id se unen.
+    """
+    for field in (code_field, name_field):
+        if field and field not in frame.columns:
+            raise GeoShapesError(f"La columna '{field}' no existe (columnas: {', '.join(map(str, frame.columns))})")
+    names = frame[name_field].astype(str).tolist() if name_field else [None] * len(frame)
+    if code_field:
+        codes = [_code(v, level) for v in frame[code_field].tolist()]
+        ids = [f"{level}:{c}" if c else None for c in codes]
+    else:
+        ids = index.resolve(names, level)["ids"]
+    parts: Dict[str, List[Any]] = {}
+    labels: Dict[str, str] = {}
+    unresolved = []
+    for geo_id, name, geom in zip(ids, names, frame.geometry.values):
+        if geo_id is None or geom is None or geom.is_empty:
+            unresolved.append(name)
+            continue
+        parts.setdefault(geo_id, []).append(geom)
+        labels.setdefault(geo_id, name or index.name(geo_id) or geo_id)
+    features = [(geo_id, labels[geo_id], geoms[0] if len(geoms) == 1 else shapely.union_all(geoms))
+                for geo_id, geoms in parts.items()]
+    return features, unresolved
+
+
+def parent_features(features: List[Tuple[str, str, Any]], index: GeoIndex) -> List[Tuple[str, str, Any]]:
+    """Capa del nivel superior (municipios -> provincias -> comunidades) uniendo las geometrías."""
+    groups: Dict[str, List[Any]] = {}
+    for geo_id, _, geom in features:
+        level, code = geo_id.split(":", 1)
+        parent = (index.records.get(geo_id) or {}).get("parent") or (f"prov:{code[:2]}" if level == "mun" else None)
+        if parent:
+            groups.setdefault(parent, []).append(geom)
+    return [(geo_id, index.name(geo_id) or geo_id, shapely.union_all(geoms)) for geo_id, geoms in groups.items()]
+
+
+# -----------------------
+# Almacén
+# -----------------------
+def _path(directory: str, layer: str, zoom: int) -> str:
+    return os.path.join(directory, f"{layer}.z{zoom}.json")
+
+
+def read_manifest(directory: Optional[str] = None) -> Dict[str, Any]:
+    directory = directory or get_config()["DIRECTORY"]
+    try:
+        with open(os.path.join(directory, MANIFEST), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"layers": {}}
+
+
+def write_layer(layer: str, features: List[Tuple[str, str, Any]], source: Dict[str, Any],
+                zooms: Optional[Iterable[int]] = None, conf: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Topología base de la capa y un fichero por zoom; actualiza el manifiesto."""
+    conf = conf or get_config()
+    if layer not in LEVELS:
+        raise GeoShapesError(f"Capa '{layer}' no soportada (usa {', '.join(LEVELS)})")
+    directory = conf["DIRECTORY"]
+    os.makedirs(directory, exist_ok=True)
+    started = time.monotonic()
+    base = build_topology(features, conf["QUANTIZATION"])
+    entry = {"features": len(base["geometries"]), "arcs": len(base["arcs"]),
+             "points": int(sum(len(a) for a in base["arcs"])), "source": source, "zooms": {}}
+    for zoom in sorted(set(zooms or conf["ZOOMS"])):
+        topology = topology_for_zoom(base, layer, zoom, conf["PIXEL_TOLERANCE"])
+        body = json.dumps(topology, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        path = _path(directory, layer, zoom)
+        with open(f"{path}.tmp", "wb") as f:
+            f.write(body)
+        os.replace(f"{path}.tmp", path)
+        entry["zooms"][str(zoom)] = {"bytes": len(body), "points": sum(len(a) for a in topology["arcs"]),
+                                     "etag": hashlib.sha1(body).hexdigest()[:16]}
+    entry["built_at"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    entry["elapsed_s"] = round(time.monotonic() - started, 2)
+
+    manifest = read_manifest(directory)
+    manifest["layers"][layer] = entry
+    with open(os.path.join(directory, f"{MANIFEST}.tmp"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(os.path.join(directory, f"{MANIFEST}.tmp"), os.path.join(directory, MANIFEST))
+    return entry
+
+
+def pick_zoom(layer: str, zoom: Optional[int] = None, manifest: Optional[Dict[str, Any]] = None) -> Optional[int]:
+    """El zoom guardado más detallado que no pasa de `zoom` (o el menor de todos); None si no hay capa."""
+    manifest = manifest or read_manifest()
+    built = sorted(int(z) for z in manifest["layers"].get(layer, {}).get("zooms", {}))
+    if not built:
+        return None
+    zoom = get_config()["DEFAULT_ZOOM"] if zoom is None else zoom
+    lower = [z for z in built if z <= zoom]
+    return lower[-1] if lower else built[0]
+
+
+def layer_file(layer: str, zoom: Optional[int] = None) -> Tuple[str, int, Dict[str, Any]]:
+    """(ruta, zoom, info del manifiesto) del TopoJSON a servir."""
+    manifest = read_manifest()
+    chosen = pick_zoom(layer, zoom, manifest)
+    if chosen is None:
+        raise GeoShapesError(f"La capa '{layer}' no está construida (python manage.py build_geo_index)")
+    return _path(get_config()["DIRECTORY"], layer, chosen), chosen, manifest["layers"][layer]["zooms"][str(chosen)]
@@ -0,0 +1,273 @@
+# core/services/http_client.py
+# Cliente HTTP compartido por todos los servicios que salen a internet
+# (datos.gob.es, SPARQL de Virtuoso, wstempus del INE, distribuciones).
+import logging
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util import make_headers
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "POOL_CONNECTIONS": 10,     # nº de hosts con pool propio dentro de cada adapter
+    "POOL_MAXSIZE": 20,         # conexiones keep-alive por host
+    "POOL_BLOCK": False,        # si True, espera a que haya conexión libre en vez de abrir otra
+    "CONNECT_TIMEOUT": 5,       # segundos
+    "READ_TIMEOUT": 30,         # segundos
+    "RETRIES": 3,
+    "BACKOFF_FACTOR": 0.5,      # 0.5s, 1s, 2s...
+    "STATUS_FORCELIST": (429, 500, 502, 503, 504),
+    "USER_AGENT": "TFG Buscador de Datos - Estudiante",
+    "LATENCY_WINDOW": 1000,     # nº de muestras de latencia guardadas por host
+    "ASYNC_MAX_CONNECTIONS": 500,  # total de conexiones del cliente asíncrono (vistas ASGI)
+    "ASYNC_LIMIT_PER_HOST": 200,   # conexiones simultáneas por host en el cliente asíncrono
+    "HOSTS": {},                # overrides por host, p.ej. {"servicios.ine.es": {"POOL_MAXSIZE": 40}}
+}
+
+
+def get_config() -> Dict[str, Any]:
+    conf = dict(DEFAULTS)
+    conf.update(getattr(settings, "HTTP_CLIENT", {}) or {})
+    return conf
+
+
+# -----------------------
+# Métricas por host
+# -----------------------
+class _HostMetrics:
+    # Se actualizan desde muchos hilos a la vez: `+= 1` no es atómico
+    def __init__(self, window: int):
+        self.requests = 0
+        self.exchanges = 0
+        self.connections_opened = 0
+        self.errors = 0
+        self.latencies_ms = deque(maxlen=window)
+        self.lock = threading.Lock()
+
+    def incr(self, field: str) -> None:
+        with self.lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def add_latency(self, ms: float) -> None:
+        with self.lock:
+            self.latencies_ms.append(ms)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {"requests": self.requests, "exchanges": self.exchanges,
+                    "connections_opened": self.connections_opened, "errors": self.errors,
+                    "latencies_ms": sorted(self.latencies_ms)}
+
+
+_metrics_lock = threading.Lock()
+_metrics: Dict[str, _HostMetrics] = {}
+
+
+def host_metrics(host: str) -> _HostMetrics:
+    m = _metrics.get(host)
+    if m is None:
+        with _metrics_lock:
+            m = _metrics.get(host)
+            if m is None:
+                m = _HostMetrics(get_config()["LATENCY_WINDOW"])
+                _metrics[host] = m
+    return m
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    # nearest-rank
+    idx = min(len(sorted_values) - 1, max(0, math.ceil(pct / 100.0 * len(sorted_values)) - 1))
+    return round(sorted_values[idx], 2)
+
+
+def get_metrics() -> Dict[str, Dict[str, Any]]:
+    """
+    Devuelve métricas por host: peticiones, conexiones abiertas vs reutilizadas
+    y percentiles de latencia (ms hasta recibir cabeceras, incluidos reintentos).
+    """
+    out = {}
+    with _metrics_lock:
+        items = list(_metrics.items())
+    for host, m in items:
+        snap = m.snapshot()
+        lat = snap["latencies_ms"]
+        out[host] = {
+            "requests": snap["requests"],
+            "errors": snap["errors"],
+            "connections_opened": snap["connections_opened"],
+            "connections_reused": max(0, snap["exchanges"] - snap["connections_opened"]),
+            "latency_ms": {
+                "samples": len(lat),
+                "p50": _percentile(lat, 50),
+                "p90": _percentile(lat, 90),
+                "p99": _percentile(lat, 99),
+                "max": round(lat[-1], 2) if lat else None,
+            },
+        }
+    return out
+
+
+def reset_metrics():
+    with _metrics_lock:
+        _metrics.clear()
+
+
+# -----------------------
+# Pools instrumentados
+# -----------------------
+# connect() sólo se llama cuando se abre un socket nuevo (también al reconectar
+# una conexión caída), así que cuenta exactamente los handshakes TCP/TLS.
+class _CountingHTTPConnection(HTTPConnection):
+    def connect(self):
+        host_metrics(self.host).incr("connections_opened")
+        return super().connect()
+
+
+class _CountingHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        host_metrics(self.host).incr("connections_opened")
+        return super().connect()
+
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _CountingHTTPConnection
+
+    def _make_request(self, conn, *args, **kwargs):
+        host_metrics(self.host).incr("exchanges")
+        return super()._make_request(conn, *args, **kwargs)
+
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _CountingHTTPSConnection
+
+    def _make_request(self, conn, *args, **kwargs):
+        host_metrics(self.host).incr("exchanges")
+        return super()._make_request(conn, *args, **kwargs)
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter con reintentos, pools por host y conteo de conexiones."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _CountingHTTPConnectionPool,
+            "https": _CountingHTTPSConnectionPool,
+        }
+
+
+def _build_adapter(conf: Dict[str, Any]) -> PooledHTTPAdapter:
+    retry = Retry(
+        total=conf["RETRIES"],
+        connect=conf["RETRIES"],
+        read=conf["RETRIES"],
+        status=conf["RETRIES"],
+        backoff_factor=conf["BACKOFF_FACTOR"],
+        status_forcelist=tuple(conf["STATUS_FORCELIST"]),
+        allowed_methods=frozenset({"GET", "HEAD", "OPTIONS"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,  # el llamador decide con raise_for_status()
+    )
+    return PooledHTTPAdapter(
+        pool_connections=conf["POOL_CONNECTIONS"],
+        pool_maxsize=conf["POOL_MAXSIZE"],
+        pool_block=conf["POOL_BLOCK"],
+        max_retries=retry,
+    )
+
+
+def _build_session() -> requests.Session:
+    conf = get_config()
+    session = requests.Session()
+    session.headers.update({
+        "User-Agent": conf["USER_AGENT"],
+        "Accept-Encoding": make_headers(accept_encoding=True)["accept-encoding"],
+        "Connection": "keep-alive",
+    })
+    default_adapter = _build_adapter(conf)
+    session.mount("http://", default_adapter)
+    session.mount("https://", default_adapter)
+    for host, overrides in (conf.get("HOSTS") or {}).items():
+        host_conf = dict(conf)
+        host_conf.update(overrides)
+        adapter = _build_adapter(host_conf)
+        session.mount(f"http://{host}", adapter)
+        session.mount(f"https://{host}", adapter)
+    return session
+
+
+_session_lock = threading.Lock()
+_session: Optional[requests.Session] = None
+
+
+def get_session() -> requests.Session:
+    """Sesión única por proceso (lazy, thread-safe)."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def close_session():
+    """Cierra todas las conexiones del pool (útil en tests o tras un fork)."""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+
+
+# -----------------------
+# API pública
+# -----------------------
+def request(method: str, url: str, **kwargs) -> requests.Response:
+    """
+    Igual que requests.request pero usando la sesión compartida.
+    Si no se indica timeout se aplica (CONNECT_TIMEOUT, READ_TIMEOUT).
+    Un timeout numérico se interpreta como timeout de lectura.
+    """
+    conf = get_config()
+    timeout = kwargs.pop("timeout", None)
+    if timeout is None:
+        timeout = (conf["CONNECT_TIMEOUT"], conf["READ_TIMEOUT"])
+    elif isinstance(timeout, (int, float)):
+        timeout = (min(conf["CONNECT_TIMEOUT"], timeout), timeout)
+
+    host = urlsplit(url).hostname or ""
+    metrics = host_metrics(host)
+    metrics.incr("requests")
+    start = time.perf_counter()
+    try:
+        response = get_session().request(method, url, timeout=timeout, **kwargs)
+    except requests.RequestException:
+        metrics.incr("errors")
+        raise
+    finally:
+        metrics.add_latency((time.perf_counter() - start) * 1000.0)
+    if response.status_code >= 500:
+        metrics.incr("errors")
+    return response
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+
+def head(url: str, **kwargs) -> requests.Response:
+    kwargs.setdefault("allow_redirects", True)
+    return request("HEAD", url, **kwargs)
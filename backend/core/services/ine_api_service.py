@@ -1,10 +1,25 @@
 # core/services/ine_api_service.py
+import asyncio
+import logging
+import math
 import re
-import requests
+import unicodedata
+from collections import Counter
+from datetime import datetime
 from urllib.parse import urlparse, parse_qs
-from typing import List, Dict, Any, Optional
+from typing import Iterator, List, Dict, Any, Optional
+
+import numpy as np
 from dateutil import parser as dateparser
 
+from django.conf import settings
+
+from core.services import async_http_client, http_client
+from core.utils import dataset_cache
+from core.utils.file_utils import ahandle_dataset_file, handle_dataset_file
+
+logger = logging.getLogger(__name__)
+
 BASE_WSTEMPUS = "https://servicios.ine.es/wstempus/js/es"
 
 class INEApiError(Exception):
@@ -64,18 +79,78 @@ def extract_ine_idtable(url_or_id: str) -> Optional[str]:
 
     return None
 
-def fetch_table_data(table_id: str, sample_rows: Optional[int] = None) -> List[Dict[str, Any]]:
+def _table_data_url(table_id: str) -> str:
     if not table_id:
         raise INEApiError("table_id vacío para consultar INE")
+    return f"{BASE_WSTEMPUS}/DATOS_TABLA/{table_id}"
 
-    url = f"{BASE_WSTEMPUS}/DATOS_TABLA/{table_id}"
-    resp = requests.get(url, timeout=30)
-    resp.raise_for_status()
-    j = resp.json()
+# -----------------------
+# Filtros en el servidor (parámetros de wstempus)
+# -----------------------
+INE_TIP_VALUES = ("A", "M", "AM")
+_INE_DATE = re.compile(r"^(\d{4})-?(\d{2})-?(\d{2})$")
+_INE_TV = re.compile(r"^\d+:\d+$")
+
+def _ine_date(value: str, name: str) -> str:
+    m = _INE_DATE.match(str(value).strip())
+    if not m:
+        raise INEApiError(f"Fecha '{value}' no válida en {name} (usa AAAA-MM-DD o AAAAMMDD)")
+    return "".join(m.groups())
+
+def ine_query_params(nult: Optional[int] = None, date_from: Optional[str] = None, date_to: Optional[str] = None,
+                     tip: Optional[str] = None, tv: Optional[List[str]] = None) -> List[tuple]:
+    """
+    Parámetros de DATOS_TABLA para que el INE recorte la respuesta:
+    - nult: últimos n periodos de cada serie
+    - date: rango "aaaammdd:aaaammdd" (un extremo abierto se completa con hoy / 1900)
+    - tip: A (amigable), M (metadatos) o AM
+    - tv: filtros "idVariable:idValor" (se pueden repetir)
+    Devuelve una lista de pares (admite claves repetidas) o lanza INEApiError.
+    """
+    params: List[tuple] = []
+    if nult is not None:
+        try:
+            nult = int(nult)
+        except (TypeError, ValueError):
+            raise INEApiError(f"nult '{nult}' no es un entero")
+        if nult < 1:
+            raise INEApiError("nult debe ser mayor que 0")
+        params.append(("nult", nult))
+    if date_from or date_to:
+        start = _ine_date(date_from, "date_from") if date_from else "19000101"
+        end = _ine_date(date_to, "date_to") if date_to else datetime.now().strftime("%Y%m%d")
+        if start > end:
+            raise INEApiError("date_from es posterior a date_to")
+        params.append(("date", f"{start}:{end}"))
+    if tip:
+        tip = str(tip).upper()
+        if tip not in INE_TIP_VALUES:
+            raise INEApiError(f"tip '{tip}' no válido (A, M o AM)")
+        params.append(("tip", tip))
+    for f in tv or []:
+        f = str(f).strip()
+        if not _INE_TV.match(f):
+            raise INEApiError(f"Filtro tv '{f}' no válido (usa idVariable:idValor)")
+        params.append(("tv", f))
+    return params
 
+def _count_request(stats: Optional[Dict[str, int]]) -> None:
+    # `stats` (opcional) acumula las peticiones reales al INE de un análisis
+    if stats is not None:
+        stats["round_trips"] = stats.get("round_trips", 0) + 1
+
+def _request_params(sample_rows: Optional[int], filters: Optional[Dict[str, Any]]) -> List[tuple]:
+    filters = dict(filters or {})
+    # Una muestra de las últimas N observaciones es justo lo que pide nult=N
+    if sample_rows and not filters.get("nult") and not (filters.get("date_from") or filters.get("date_to")):
+        filters["nult"] = sample_rows
+    return ine_query_params(**{k: v for k, v in filters.items() if v not in (None, "", [])})
+
+def _check_table_data(j: Any, sample_rows: Optional[int]) -> List[Dict[str, Any]]:
     if not isinstance(j, list):
         raise INEApiError("Respuesta inesperada de la API del INE")
 
+    # Por si el servidor ignora nult: el recorte local sigue aplicándose
     if sample_rows:
         for serie in j:
             if "Data" in serie and isinstance(serie["Data"], list):
@@ -83,6 +158,327 @@ def fetch_table_data(table_id: str, sample_rows: Optional[int] = None) -> List[D
 
     return j
 
+def fetch_table_data(table_id: str, sample_rows: Optional[int] = None,
+                     filters: Optional[Dict[str, Any]] = None,
+                     stats: Optional[Dict[str, int]] = None) -> List[Dict[str, Any]]:
+    """
+    DATOS_TABLA con los recortes hechos en el servidor. `filters` admite las
+    claves de ine_query_params (nult, date_from, date_to, tip, tv).
+    """
+    url = _table_data_url(table_id)
+    params = _request_params(sample_rows, filters)
+    _count_request(stats)
+    resp = http_client.get(url, params=params, timeout=30)
+    resp.raise_for_status()
+    return _check_table_data(resp.json(), sample_rows)
+
+async def afetch_table_data(table_id: str, sample_rows: Optional[int] = None,
+                            filters: Optional[Dict[str, Any]] = None,
+                            stats: Optional[Dict[str, int]] = None) -> List[Dict[str, Any]]:
+    url = _table_data_url(table_id)
+    params = _request_params(sample_rows, filters)
+    _count_request(stats)
+    resp = await async_http_client.get(url, params=params, timeout=30)
+    resp.raise_for_status()
+    return _check_table_data(resp.json(), sample_rows)
+
+# -----------------------
+# Metadatos de tabla (catálogo local con TTL)
+# -----------------------
+# Estructura de la tabla (variables, valores, series y periodicidad) sacada de
+# SERIES_TABLA (tip=M) y el nombre de TABLAS_OPERACION. Se guarda en la caché
+# de datasets (namespace "ine_metadata", TTL de días) y permite validar y
+# resolver filtros y sugerir gráficos sin descargar datos.
+METADATA_NAMESPACE = "ine_metadata"
+# Tablas cuyos metadatos no se pudieron obtener: se recuerda durante un TTL corto
+# (DATASET_CACHE["TTLS"]) para no repetir SERIES_TABLA en cada análisis
+METADATA_MISS_NAMESPACE = "ine_metadata_miss"
+
+METADATA_DEFAULTS = {
+    "ENABLED": True,
+    "TIMEOUT": 30,
+}
+
+def get_metadata_config() -> Dict[str, Any]:
+    conf = dict(METADATA_DEFAULTS)
+    conf.update(getattr(settings, "INE_METADATA", {}) or {})
+    return conf
+
+def _ref(obj: Any) -> Optional[Dict[str, Any]]:
+    # Con det=2 las FK vienen como objeto {Id, Nombre, Codigo|Cod}; si no, sólo el id
+    if obj is None or obj == "":
+        return None
+    if isinstance(obj, dict):
+        return {"id": obj.get("Id"), "name": obj.get("Nombre"), "code": obj.get("Codigo") or obj.get("Cod")}
+    return {"id": obj, "name": None, "code": None}
+
+def _series_metadata_url(table_id: str) -> str:
+    if not table_id:
+        raise INEApiError("table_id vacío para consultar INE")
+    return f"{BASE_WSTEMPUS}/SERIES_TABLA/{table_id}"
+
+_SERIES_METADATA_PARAMS = [("det", 2), ("tip", "M")]
+
+def build_table_metadata(table_id: str, raw_series: Any, tables: Any = None) -> Dict[str, Any]:
+    """Metadatos compactos a partir de SERIES_TABLA (y TABLAS_OPERACION para el nombre)."""
+    if not isinstance(raw_series, list):
+        raise INEApiError("Respuesta inesperada de SERIES_TABLA")
+
+    variables: Dict[Any, Dict[str, Any]] = {}
+    series = []
+    periodicities: Counter = Counter()
+    refs: Dict[Any, Dict[str, Any]] = {}
+    operation = None
+    for s in raw_series:
+        keys = []
+        for m in s.get("MetaData") or []:
+            var = _ref(m.get("Variable") or m.get("FK_Variable"))
+            if not var or m.get("Id") is None:
+                continue
+            entry = variables.setdefault(var["id"], {**var, "values": {}})
+            entry["values"].setdefault(m["Id"], {"id": m["Id"], "name": m.get("Nombre"), "code": m.get("Codigo")})
+            keys.append(f"{var['id']}:{m['Id']}")
+        per = _ref(s.get("FK_Periodicidad"))
+        if per:
+            periodicities[per["id"]] += 1
+            refs[per["id"]] = per
+        operation = operation or _ref(s.get("FK_Operacion"))
+        series.append({"cod": s.get("COD"), "name": s.get("Nombre"), "values": keys})
+
+    name = None
+    for t in tables if isinstance(tables, list) else []:
+        if str(t.get("Id")) == str(table_id) or str(t.get("Codigo")) == str(table_id):
+            name = t.get("Nombre")
+            break
+
+    return {
+        "table_id": str(table_id),
+        "name": name,
+        "operation": operation,
+        "periodicity": refs[periodicities.most_common(1)[0][0]] if periodicities else None,
+        "variables": [{**v, "values": list(v["values"].values())} for v in variables.values()],
+        "series": series,
+    }
+
+def _operation_tables_url(operation: Optional[Dict[str, Any]]) -> Optional[str]:
+    if not operation or operation.get("id") is None:
+        return None
+    return f"{BASE_WSTEMPUS}/TABLAS_OPERACION/{operation['id']}"
+
+def fetch_table_metadata(table_id: str, stats: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+    timeout = get_metadata_config()["TIMEOUT"]
+    _count_request(stats)
+    resp = http_client.get(_series_metadata_url(table_id), params=_SERIES_METADATA_PARAMS, timeout=timeout)
+    resp.raise_for_status()
+    meta = build_table_metadata(table_id, resp.json())
+
+    # El nombre es opcional: si TABLAS_OPERACION falla se guarda sin él
+    tables_url = _operation_tables_url(meta["operation"])
+    if tables_url:
+        try:
+            _count_request(stats)
+            resp = http_client.get(tables_url, timeout=timeout)
+            resp.raise_for_status()
+            meta["name"] = build_table_metadata(table_id, [], resp.json())["name"]
+        except Exception as e:
+            logger.warning("Sin nombre para la tabla INE %s: %s", table_id, e)
+    return meta
+
+async def afetch_table_metadata(table_id: str, stats: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+    timeout = get_metadata_config()["TIMEOUT"]
+    _count_request(stats)
+    resp = await async_http_client.get(_series_metadata_url(table_id), params=_SERIES_METADATA_PARAMS, timeout=timeout)
+    resp.raise_for_status()
+    meta = build_table_metadata(table_id, resp.json())
+
+    tables_url = _operation_tables_url(meta["operation"])
+    if tables_url:
+        try:
+            _count_request(stats)
+            resp = await async_http_client.get(tables_url, timeout=timeout)
+            resp.raise_for_status()
+            meta["name"] = build_table_metadata(table_id, [], resp.json())["name"]
+        except Exception as e:
+            logger.warning("Sin nombre para la tabla INE %s: %s", table_id, e)
+    return meta
+
+def _metadata_miss_key(table_id: str) -> str:
+    return dataset_cache.make_cache_key(METADATA_MISS_NAMESPACE, {"table": str(table_id)})
+
+def _known_miss(miss_key: str) -> bool:
+    return dataset_cache.lookup(miss_key)[1] == dataset_cache.FRESH
+
+def _remember_miss(miss_key: str, table_id: str, message: str) -> None:
+    logger.warning("Metadatos INE de %s no disponibles: %s", table_id, message)
+    try:
+        dataset_cache.store(METADATA_MISS_NAMESPACE, miss_key, {"table": str(table_id), "message": message})
+    except Exception:
+        logger.exception("No se pudo guardar el fallo de metadatos de %s", table_id)
+
+def get_table_metadata(table_id: str, force_download: bool = False,
+                       stats: Optional[Dict[str, int]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Metadatos de la tabla desde la caché local (se descargan una vez); None si
+    no hay. Un fallo reciente también se recuerda y no se vuelve a pedir.
+    `stats` cuenta las peticiones al INE que se hagan.
+    """
+    if not get_metadata_config()["ENABLED"]:
+        return None
+    miss_key = _metadata_miss_key(table_id)
+    if not force_download and _known_miss(miss_key):
+        return None
+    data, message, status = handle_dataset_file(
+        namespace=METADATA_NAMESPACE,
+        params={"table": str(table_id)},
+        fetch_function=fetch_table_metadata,
+        fetch_args=(table_id, stats),
+        force_download=force_download,
+    )
+    if status != 200:
+        _remember_miss(miss_key, table_id, message)
+    return data
+
+async def aget_table_metadata(table_id: str, force_download: bool = False,
+                              stats: Optional[Dict[str, int]] = None) -> Optional[Dict[str, Any]]:
+    if not get_metadata_config()["ENABLED"]:
+        return None
+    miss_key = _metadata_miss_key(table_id)
+    if not force_download and await asyncio.to_thread(_known_miss, miss_key):
+        return None
+    data, message, status = await ahandle_dataset_file(
+        namespace=METADATA_NAMESPACE,
+        params={"table": str(table_id)},
+        afetch_function=afetch_table_metadata,
+        fetch_args=(table_id, stats),
+        force_download=force_download,
+    )
+    if status != 200:
+        await asyncio.to_thread(_remember_miss, miss_key, table_id, message)
+    return data
+
+def _fold(s: Any) -> str:
+    s = unicodedata.normalize("NFKD", str(s)).encode("ascii", "ignore").decode("ascii")
+    return " ".join(s.casefold().split())
+
+def _match(items: List[Dict[str, Any]], key: str) -> Optional[Dict[str, Any]]:
+    # Por id, código o nombre (sin mayúsculas ni tildes)
+    folded = _fold(key)
+    for field in ("id", "code", "name"):
+        for it in items:
+            if it.get(field) is not None and _fold(it[field]) == folded:
+                return it
+    return None
+
+def resolve_tv_filters(metadata: Dict[str, Any], tv: List[str]) -> List[str]:
+    """
+    Traduce filtros tv escritos como "idVariable:idValor" o por nombre/código
+    ("Provincias:Madrid", "Sexo:mujeres") a ids y comprueba que existen en la
+    tabla. Lanza INEApiError con las opciones válidas si alguno no encaja.
+    """
+    resolved = []
+    for f in tv or []:
+        var_key, sep, val_key = str(f).partition(":")
+        if not sep or not var_key.strip() or not val_key.strip():
+            raise INEApiError(f"Filtro tv '{f}' no válido (usa variable:valor)")
+        var = _match(metadata["variables"], var_key.strip())
+        if var is None:
+            options = ", ".join(f"{v['id']} ({v['name']})" for v in metadata["variables"])
+            raise INEApiError(f"La tabla {metadata['table_id']} no tiene la variable '{var_key}'. Variables: {options}")
+        val = _match(var["values"], val_key.strip())
+        if val is None:
+            options = ", ".join(f"{v['id']} ({v['name']})" for v in var["values"][:10])
+            more = "…" if len(var["values"]) > 10 else ""
+            raise INEApiError(f"'{val_key}' no es un valor de {var['name']}. Valores: {options}{more}")
+        resolved.append(f"{var['id']}:{val['id']}")
+    return resolved
+
+def select_series(metadata: Dict[str, Any], tv: List[str]) -> List[Dict[str, Any]]:
+    """Series que cumplen los filtros ya resueltos (OR dentro de una variable, AND entre variables)."""
+    wanted: Dict[str, set] = {}
+    for f in tv or []:
+        wanted.setdefault(f.split(":", 1)[0], set()).add(f)
+    return [
+        s for s in metadata["series"]
+        if all(keys & set(s["values"]) for keys in wanted.values())
+    ]
+
+def describe_table(metadata: Dict[str, Any], selected: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """Resumen para la respuesta del análisis (sin la lista completa de series)."""
+    selected = metadata["series"] if selected is None else selected
+    varying = _varying_variables(metadata, selected)
+    return {
+        "table_id": metadata["table_id"],
+        "name": metadata.get("name"),
+        "periodicity": metadata.get("periodicity"),
+        "series_count": len(metadata["series"]),
+        "series_selected": len(selected),
+        "variables": [
+            {"id": v["id"], "name": v["name"], "code": v["code"], "values_count": len(v["values"]),
+             "varies": v["id"] in varying}
+            for v in metadata["variables"]
+        ],
+    }
+
+def _varying_variables(metadata: Dict[str, Any], selected: List[Dict[str, Any]]) -> set:
+    # Variables con más de un valor entre las series seleccionadas
+    seen: Dict[str, set] = {}
+    for s in selected:
+        for key in s["values"]:
+            var_id = key.split(":", 1)[0]
+            seen.setdefault(var_id, set()).add(key)
+    return {v["id"] for v in metadata["variables"] if len(seen.get(str(v["id"]), ())) > 1}
+
+_GEO_VARIABLES = ("provincia", "comunidad", "ccaa", "municipio", "isla", "territorio")
+
+def suggest_from_metadata(metadata: Dict[str, Any], selected: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+    """Sugerencias de gráfico a partir de la estructura de la tabla, sin mirar los datos."""
+    selected = metadata["series"] if selected is None else selected
+    title = metadata.get("name") or f"Tabla INE {metadata['table_id']}"
+    varying = _varying_variables(metadata, selected)
+    suggestions = []
+    if selected:
+        per = (metadata.get("periodicity") or {}).get("name")
+        suggestions.append({"type": "timeseries", "title": f"{title} ({per})" if per else title,
+                            "x": "Fecha", "y": "Valor", "series": len(selected)})
+    for v in metadata["variables"]:
+        if v["id"] not in varying:
+            continue
+        if any(g in _fold(v["name"] or "") for g in _GEO_VARIABLES):
+            suggestions.append({"type": "choropleth", "title": f"{title} por {v['name']}",
+                                "geo_name": v["name"], "value": "Valor"})
+        suggestions.append({"type": "barchart", "title": f"{title} por {v['name']}",
+                            "category": v["name"], "value": "Valor"})
+    suggestions.append({"type": "table", "title": title})
+    return suggestions
+
+def _prepare_filters(metadata: Optional[Dict[str, Any]], filters: Optional[Dict[str, Any]]):
+    """(filtros con tv resuelto, series seleccionadas o None). Sin metadatos, tv debe venir en ids."""
+    filters = dict(filters or {})
+    if not metadata or not filters.get("tv"):
+        return filters, None
+    filters["tv"] = resolve_tv_filters(metadata, filters["tv"])
+    selected = select_series(metadata, filters["tv"])
+    if not selected:
+        raise INEApiError("Ninguna serie de la tabla cumple los filtros tv indicados")
+    return filters, selected
+
+def resolve_ine_filters(url_or_id: str, filters: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Filtros con tv traducido a ids usando los metadatos en caché (las vistas lo
+    llaman antes de la caché de análisis: nombres e ids comparten entrada y un
+    filtro inexistente es un 400 sin tocar DATOS_TABLA).
+    """
+    if not (filters or {}).get("tv"):
+        return dict(filters or {})
+    table_id = extract_ine_idtable(url_or_id)
+    return _prepare_filters(get_table_metadata(table_id) if table_id else None, filters)[0]
+
+async def aresolve_ine_filters(url_or_id: str, filters: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    if not (filters or {}).get("tv"):
+        return dict(filters or {})
+    table_id = extract_ine_idtable(url_or_id)
+    return _prepare_filters(await aget_table_metadata(table_id) if table_id else None, filters)[0]
+
 def _infer_type(val: Any) -> str:
     """Detecta si un valor parece numérico o fecha."""
     if val is None or val == "":
@@ -101,7 +497,133 @@ def _infer_type(val: Any) -> str:
         pass
     return "string"
 
-def normalize_ine_data(raw_series: List[Dict[str, Any]]) -> Dict[str, Any]:
+# -----------------------
+# Normalización (una pasada, columnar)
+# -----------------------
+INFER_SAMPLE_VALUES = 20   # valores no vacíos por columna para inferir el tipo
+
+def _to_float(val: Any) -> float:
+    # Mismo criterio que antes: número o texto con coma decimal; lo demás, NaN
+    if val is None or val == "" or isinstance(val, bool):
+        return math.nan
+    if isinstance(val, (int, float)):
+        return float(val)
+    try:
+        return float(str(val).replace(",", "."))
+    except Exception:
+        return math.nan
+
+def _is_number(x: Any) -> bool:
+    return isinstance(x, (int, float)) and not isinstance(x, bool)
+
+def _sorted_labels(labels: List[Any], periods: Dict[Any, Any]) -> List[Any]:
+    """
+    Orden cronológico sin dateutil:
+    - Fecha del INE en epoch-ms (lo habitual en wstempus) -> orden numérico
+    - si no, (Anyo, FK_Periodo) de los puntos
+    - si no, fechas ISO (datetime.fromisoformat) y, en último caso, texto
+    """
+    if all(_is_number(l) for l in labels):
+        return sorted(labels)
+    if periods and len(periods) == len(labels):
+        return sorted(labels, key=lambda l: periods[l])
+    try:
+        return sorted(labels, key=lambda l: datetime.fromisoformat(str(l).replace("Z", "+00:00")))
+    except (TypeError, ValueError):
+        return sorted(labels, key=str)
+
+def _cell(v: Any) -> Any:
+    return ", ".join(map(str, v)) if isinstance(v, list) else v
+
+def iter_ine_rows(raw_series: List[Dict[str, Any]], cols: List[str],
+                  per_series: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """Filas (un dict por punto de cada serie, sólo los `per_series` últimos si se indica) bajo demanda."""
+    for serie in raw_series:
+        data = serie.get("Data", []) or []
+        for p in (data[-per_series:] if per_series else data):
+            if isinstance(p, dict):
+                yield {c: _cell(p.get(c, "")) for c in cols}
+
+def _values_array(vals: List[Any]) -> np.ndarray:
+    # Camino rápido: floats/ints/None (None -> NaN) convertidos en C
+    if bool not in set(map(type, vals)):
+        try:
+            return np.array(vals, dtype=np.float64)
+        except (TypeError, ValueError):
+            pass
+    return np.fromiter(map(_to_float, vals), dtype=np.float64, count=len(vals))
+
+def _series_matrix(raw_series: List[Dict[str, Any]]):
+    """
+    Una pasada sobre todos los puntos: índice de labels (hash), columnas en
+    orden de aparición, muestras para inferir tipos y la matriz
+    series x labels (float64, NaN = sin valor) en orden cronológico.
+    """
+    label_index: Dict[Any, int] = {}
+    periods: Dict[Any, Any] = {}
+    cols: Dict[str, None] = {}
+    samples: Dict[str, List[Any]] = {}
+    positions, values = [], []
+    n_points = 0
+
+    for serie in raw_series:
+        data = serie.get("Data", []) or []
+        if set(map(type, data)) - {dict}:
+            data = [p for p in data if isinstance(p, dict)]
+        n_points += len(data)
+
+        # Columnas nuevas (normalmente sólo en la primera serie), en orden de
+        # aparición, y sus muestras para inferir el tipo
+        if set().union(*data) - cols.keys():
+            for p in data:
+                for k in p:
+                    if k not in cols:
+                        cols[k] = None
+                        samples[k] = []
+            for k, muestras in samples.items():
+                if len(muestras) >= INFER_SAMPLE_VALUES:
+                    continue
+                for p in data:
+                    v = p.get(k)
+                    if v not in (None, ""):
+                        muestras.append(v)
+                        if len(muestras) >= INFER_SAMPLE_VALUES:
+                            break
+
+        fechas = [p.get("Fecha") for p in data]
+        if not label_index.keys() >= set(fechas):
+            for p, fecha in zip(data, fechas):
+                if fecha not in label_index:
+                    label_index[fecha] = len(label_index)
+                    if "Anyo" in p:
+                        periods[fecha] = (_to_float(p.get("Anyo")), _to_float(p.get("FK_Periodo")))
+        positions.append(np.fromiter(map(label_index.__getitem__, fechas), dtype=np.int64, count=len(fechas)))
+        values.append(_values_array([p.get("Valor") for p in data]))
+
+    labels = list(label_index)
+    ordered = _sorted_labels(labels, periods)
+    # posición de aparición -> columna cronológica
+    rank = np.empty(len(labels), dtype=np.int64)
+    rank[[label_index[l] for l in ordered]] = np.arange(len(labels))
+
+    matrix = np.full((len(raw_series), len(labels)), np.nan)
+    for i, (pos, vals) in enumerate(zip(positions, values)):
+        matrix[i, rank[pos]] = vals   # Fecha repetida en una serie: gana el último punto
+    return ordered, matrix, list(cols), samples, n_points
+
+def _nan_to_none(matrix: np.ndarray) -> List[List[Optional[float]]]:
+    out = matrix.astype(object)
+    out[np.isnan(matrix)] = None
+    return out.tolist()
+
+def normalize_ine_data(raw_series: List[Dict[str, Any]], max_rows: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Convierte la respuesta de DATOS_TABLA en labels (periodos ordenados), series
+    alineadas con ellos, esquema de columnas y filas de muestra. Coste lineal
+    en el número de puntos. `max_rows` limita sample_rows a los últimos
+    max_rows puntos de cada serie, como nult (items_count, labels y series
+    siguen siendo los de todos los puntos).
+    """
     if not raw_series:
         return {
             "schema": [],
@@ -111,85 +633,90 @@ def normalize_ine_data(raw_series: List[Dict[str, Any]]) -> Dict[str, Any]:
             "series": []
         }
 
-    # === Construir labels ===
-    labels = []
-    for serie in raw_series:
-        for punto in serie.get("Data", []):
-            fecha = punto.get("Fecha")
-            if fecha not in labels:
-                labels.append(fecha)
+    labels, matrix, cols, samples, n_points = _series_matrix(raw_series)
 
-    # Ordenar labels cronológicamente si parecen fechas
-    try:
-        labels.sort(key=lambda x: dateparser.parse(str(x)))
-    except Exception:
-        labels.sort()
-
-    # === Construir series ===
-    series_data = []
-    for serie in raw_series:
-        nombre = serie.get("Nombre", "Sin nombre")
-        valores_map = {}
-        for p in serie.get("Data", []):
-            val = p.get("Valor")
-            try:
-                val = float(str(val).replace(",", ".")) if val not in (None, "") else None
-            except Exception:
-                val = None
-            valores_map[p.get("Fecha")] = val
-        valores_ordenados = [valores_map.get(f, None) for f in labels]
-        series_data.append({"name": nombre, "data": valores_ordenados})
-
-    # === Construir tabla ===
-    cols: List[str] = []
-    for serie in raw_series:
-        for p in serie.get("Data", []):
-            if isinstance(p, dict):
-                for k in p.keys():
-                    if k not in cols:
-                        cols.append(k)
+    series_data = [
+        {"name": serie.get("Nombre", "Sin nombre"), "data": data}
+        for serie, data in zip(raw_series, _nan_to_none(matrix))
+    ]
 
-    # Inferir tipos de columna
+    # Inferir tipos de columna con los primeros valores no vacíos
     schema = []
     for c in cols:
-        muestras = []
-        for serie in raw_series:
-            for p in serie.get("Data", []):
-                muestras.append(p.get(c, ""))
-        # quitar vacíos
-        muestras_no_vacias = [m for m in muestras if m not in (None, "")]
         tipo = "string"
-        if muestras_no_vacias:
-            tipos_detectados = [_infer_type(v) for v in muestras_no_vacias[:20]]
+        muestras = samples[c]
+        if muestras:
+            tipos_detectados = [_infer_type(v) for v in muestras]
             if tipos_detectados.count("numeric") / len(tipos_detectados) > 0.8:
                 tipo = "numeric"
             elif tipos_detectados.count("datetime") / len(tipos_detectados) > 0.8:
                 tipo = "datetime"
         schema.append({"name": c, "inferred_type": tipo})
 
-    rows: List[Dict[str, Any]] = []
-    for serie in raw_series:
-        for p in serie.get("Data", []):
-            row = {}
-            for c in cols:
-                v = p.get(c, "")
-                if isinstance(v, list):
-                    v = ", ".join(map(str, v))
-                row[c] = v
-            rows.append(row)
-
     return {
         "schema": schema,
-        "sample_rows": rows,
-        "items_count": len(rows),
+        "sample_rows": list(iter_ine_rows(raw_series, cols, max_rows)),
+        "items_count": n_points,
         "labels": labels,
         "series": series_data
     }
 
-def get_dataset_from_ine(url_or_id: str, sample_rows: Optional[int] = None) -> Dict[str, Any]:
+def get_dataset_from_ine(url_or_id: str, sample_rows: Optional[int] = None,
+                         filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Datos de la tabla normalizados. Con los metadatos en caché los filtros tv
+    se validan (y admiten nombres) antes de llamar a DATOS_TABLA, que sólo
+    devuelve las series seleccionadas; el resumen va en "metadata".
+    "upstream_round_trips" son las peticiones hechas al INE (metadatos incluidos).
+    """
+    table_id = extract_ine_idtable(url_or_id)
+    if not table_id:
+        raise INEApiError("No se pudo extraer idTable de la URL/ID proporcionada")
+
+    stats = {"round_trips": 0}
+    metadata = get_table_metadata(table_id, stats=stats)
+    filters, selected = _prepare_filters(metadata, filters)
+    # sample_rows ya recorta cada serie a sus últimos puntos (nult); aquí no se recorta más
+    raw = fetch_table_data(table_id, sample_rows=sample_rows, filters=filters, stats=stats)
+    data = normalize_ine_data(raw)
+    if metadata:
+        data["metadata"] = describe_table(metadata, selected)
+        data["suggestions"] = suggest_from_metadata(metadata, selected)
+    data["upstream_round_trips"] = stats["round_trips"]
+    return data
+
+async def aget_dataset_from_ine(url_or_id: str, sample_rows: Optional[int] = None,
+                                filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Variante asíncrona: la descarga no bloquea el event loop; la normalización (CPU) va a un hilo."""
+    table_id = extract_ine_idtable(url_or_id)
+    if not table_id:
+        raise INEApiError("No se pudo extraer idTable de la URL/ID proporcionada")
+
+    stats = {"round_trips": 0}
+    metadata = await aget_table_metadata(table_id, stats=stats)
+    filters, selected = _prepare_filters(metadata, filters)
+    raw = await afetch_table_data(table_id, sample_rows=sample_rows, filters=filters, stats=stats)
+    data = await asyncio.to_thread(normalize_ine_data, raw)
+    if metadata:
+        data["metadata"] = describe_table(metadata, selected)
+        data["suggestions"] = suggest_from_metadata(metadata, selected)
+    data["upstream_round_trips"] = stats["round_trips"]
+    return data
+
+def get_series_matrix(url_or_id: str, filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Series completas (sin recorte de muestra) como matriz series x labels
+    (float64, NaN = sin valor) para agregar o reducir en el servidor
+    (ver core/services/chart_data.py).
+    """
     table_id = extract_ine_idtable(url_or_id)
     if not table_id:
         raise INEApiError("No se pudo extraer idTable de la URL/ID proporcionada")
 
-    raw = fetch_table_data(table_id, sample_rows=sample_rows)
-    return normalize_ine_data(raw)
+    metadata = get_table_metadata(table_id)
+    filters, _ = _prepare_filters(metadata, filters)
+    raw = fetch_table_data(table_id, filters=filters)
+    if not raw:
+        return {"labels": [], "names": [], "matrix": np.empty((0, 0))}
+    labels, matrix, _, _, _ = _series_matrix(raw)
+    return {"labels": labels, "names": [s.get("Nombre", "Sin nombre") for s in raw], "matrix": matrix}
@@ -0,0 +1,272 @@
+# core/services/schema_inference.py
+# Inferencia de esquema por columnas, vectorizada con pandas/NumPy.
+# Sustituye el bucle valor a valor de dataset_analyzer.infer_schema_from_rows
+# (regex + float dos veces por valor, dateutil en todos los valores y un
+# recorrido de SPANISH_COMMUNITIES por cada valor).
+#
+# Cada columna se codifica como diccionario (pd.factorize): las comprobaciones
+# se hacen una vez por valor distinto y se ponderan con su frecuencia. Las
+# expresiones regulares se pasan en una sola llamada sobre los valores distintos
+# unidos por '\n' (re.MULTILINE), en lugar de una llamada Python por valor.
+# Los nombres geográficos se buscan en el índice plegado de geo_index (un
+# acceso a dict por valor distinto).
+import itertools
+import re
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+from dateutil import parser as dateparser
+
+from core.services.geo_index import GeoIndex
+
+NUMERIC_THRESHOLD = 0.8
+DATE_THRESHOLD = 0.6
+GEO_THRESHOLD = 0.2
+SAMPLE_VALUES = 5
+DATEUTIL_MAX_VALUES = 50  # valores distintos que, como mucho, se pasan a dateutil por columna
+
+# Mismo criterio que try_parse_number: se eliminan símbolos/unidades y la coma
+# decimal se acepta cuando no hay puntos.
+_NUMERIC_BYTES = b"0123456789-.,eE\n"
+_NON_NUMERIC_BYTES = bytes(b for b in range(256) if b not in _NUMERIC_BYTES)
+_NUMBER_LITERAL_BYTES = b"0123456789+-.eE"
+
+# Fechas habituales en portales españoles; lo que no encaje pasa por dateutil
+_FAST_DATE = re.compile(
+    r"^(?:"
+    r"\d{4}-\d{1,2}-\d{1,2}(?:[T ]\d{1,2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}:?\d{2})?)?"  # ISO 8601
+    r"|\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4}(?: \d{1,2}:\d{2}(?::\d{2})?)?"                          # dd/mm/yyyy
+    r"|\d{4}[/.]\d{1,2}[/.]\d{1,2}"                                                              # yyyy/mm/dd
+    r"|\d{4}-\d{2}"                                                                              # yyyy-mm
+    r"|\d{4} ?(?:M\d{2}|[TQ][1-4]|S[12]|A\d{2}|W\d{2})"                                         # INE: 2023M04, 2023T1...
+    r")$",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+_LAT_NAMES = ("lat", "latitude", "latitud")
+_LON_NAMES = ("lon", "lng", "longitude", "longitud")
+
+class Lines:
+    """Valores (sin '\\n') unidos en un único texto para aplicarles regex de una vez."""
+
+    def __init__(self, values: List[str]):
+        self.values = values
+        self.text = "\n".join(values)
+        lengths = np.fromiter(map(len, values), dtype=np.int64, count=len(values))
+        self.starts = np.concatenate(([0], np.cumsum(lengths + 1)[:-1])) if len(values) else lengths
+
+    def matches(self, pattern: "re.Pattern") -> np.ndarray:
+        """Máscara de los valores con (al menos) una coincidencia de `pattern`."""
+        mask = np.zeros(len(self.values), dtype=bool)
+        positions = [m.start() for m in pattern.finditer(self.text)]
+        if positions:
+            mask[np.searchsorted(self.starts, positions, side="right") - 1] = True
+        return mask
+
+    def lower(self) -> List[str]:
+        return self.text.lower().split("\n") if self.values else []
+
+
+def to_frame(rows: Union[pd.DataFrame, List[Dict[str, Any]]], sample_limit: Optional[int] = None) -> pd.DataFrame:
+    if isinstance(rows, pd.DataFrame):
+        df = rows
+    else:
+        df = pd.DataFrame.from_records(rows, columns=list(rows[0].keys()) if rows else None)
+    return df.head(sample_limit) if sample_limit else df
+
+
+def _to_float(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return np.nan
+
+
+def parse_plain_numbers(values: List[str]) -> np.ndarray:
+    """float64 de los valores que ya son un número literal; NaN en el resto."""
+    try:
+        # Caso habitual (columna numérica limpia): una sola pasada sin regex
+        numbers = np.fromiter(map(float, values), dtype=np.float64, count=len(values))
+    except ValueError:
+        # Sólo se intenta float() en los valores formados únicamente por
+        # [0-9+-.eE]; el filtrado se hace con bytes.translate sobre toda la columna
+        residue = "\n".join(values).encode("utf-8").translate(None, _NUMBER_LITERAL_BYTES).split(b"\n")
+        candidate = np.fromiter(map(len, residue), dtype=np.int64, count=len(values)) == 0
+        numbers = np.full(len(values), np.nan)
+        if candidate.any():
+            numbers[candidate] = np.fromiter(map(_to_float, itertools.compress(values, candidate)), dtype=np.float64)
+    # float() acepta "nan"/"inf", que try_parse_number no considera números
+    numbers[~np.isfinite(numbers)] = np.nan
+    return numbers
+
+
+def coerce_numeric(values: List[str], direct: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Vectorización de try_parse_number: float64 con NaN donde no es número.
+    Los números literales se convierten directamente (`direct`, si ya se
+    calculó); sólo los demás pasan por la limpieza con expresión regular.
+    """
+    numbers = parse_plain_numbers(values) if direct is None else direct.copy()
+    pending = np.flatnonzero(np.isnan(numbers))
+    if len(pending):
+        # Borrado de todo lo que no sea [0-9-.,eE] con bytes.translate (en C): los
+        # caracteres no ASCII en UTF-8 sólo tienen bytes >= 0x80 y desaparecen enteros.
+        # Cambiar todas las comas por puntos equivale a la regla de try_parse_number:
+        # si ya había un punto, el resultado ("1.234.5") tampoco es un número.
+        raw = "\n".join(values[i] for i in pending).encode("utf-8")
+        cleaned = raw.translate(None, _NON_NUMERIC_BYTES).replace(b",", b".")
+        numbers[pending] = parse_plain_numbers(cleaned.decode("ascii").split("\n"))
+    return numbers
+
+
+def _dateutil_ok(value: str) -> bool:
+    try:
+        dateparser.parse(value)
+        return True
+    except Exception:
+        return False
+
+
+def count_dates(values: List[str], weights: np.ndarray, fast: Optional[np.ndarray] = None) -> int:
+    """
+    Nº de valores (ponderados por `weights`) con pinta de fecha. Primero la
+    expresión regular rápida; los restantes pasan por dateutil sólo si aún pueden
+    alcanzar DATE_THRESHOLD, empezando por los más frecuentes.
+    """
+    n = int(weights.sum())
+    if n == 0:
+        return 0
+    if fast is None:
+        fast = Lines(values).matches(_FAST_DATE)
+    count = int(weights[fast].sum())
+    if count >= DATE_THRESHOLD * n:
+        return count
+    rest = np.flatnonzero(~fast)
+    if count + int(weights[rest].sum()) < DATE_THRESHOLD * n:
+        return count
+    rest = rest[np.argsort(-weights[rest], kind="stable")]
+    checked = rest[:DATEUTIL_MAX_VALUES]
+    ok = np.zeros(len(checked), dtype=bool)
+    for j, i in enumerate(checked):
+        ok[j] = _dateutil_ok(values[i])
+        if j == 9 and not ok[:10].any():
+            checked = checked[:10]  # ninguno de los 10 más frecuentes es fecha: no insistir
+            ok = ok[:10]
+            break
+    parsed = int(weights[checked][ok].sum())
+    if len(rest) > len(checked):
+        # Demasiados valores distintos: los revisados cuentan tal cual y al peso de
+        # los no revisados (la cola de valores poco frecuentes) se le aplica la
+        # proporción de valores distintos revisados que son fecha
+        unchecked = int(weights[rest].sum()) - int(weights[checked].sum())
+        parsed += int(round(unchecked * ok.mean()))
+    return count + parsed
+
+
+def distinct_text(col: Union[pd.Series, np.ndarray, List[Any]]):
+    """
+    (codes, values, counts): códigos por fila (-1 = nulo), valores distintos como
+    texto sin espacios en los extremos (equivalente a safe_text) y su frecuencia.
+    """
+    codes, uniques = pd.factorize(np.asarray(col, dtype=object), use_na_sentinel=True)
+    counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+    values = [u.strip() if type(u) is str else str(u).strip() for u in uniques.tolist()]
+    if "\n" in "".join(values):
+        values = [v.replace("\n", " ") for v in values]
+    return codes, values, counts
+
+
+def classify_values(values: List[str], weights: np.ndarray, geo: GeoIndex) -> Dict[str, Any]:
+    """
+    Comprobaciones de tipo sobre valores distintos no vacíos con su frecuencia.
+    Devuelve {"n", "numbers" (float64, NaN si no es número), "numeric_count",
+    "date_count", "geo_count", "lowered"}. Lo usan infer_column y el perfilado
+    por lotes (column_profiler).
+    """
+    n = int(weights.sum())
+    # Números literales (conversión en C): no pueden ser fechas del patrón rápido
+    # ni contener nombres, así que el resto de comprobaciones se los saltan
+    direct = parse_plain_numbers(values)
+    plain = ~np.isnan(direct)
+    other_idx = np.flatnonzero(~plain)
+    other = Lines([values[i] for i in other_idx])
+    other_lower = Lines(other.lower())
+
+    # Las fechas tipo 2023M04 o 01/02/2020 también "parecen" números tras limpiar
+    fast_date = np.zeros(len(values), dtype=bool)
+    fast_date[other_idx] = other.matches(_FAST_DATE)
+    numbers = coerce_numeric(values, direct)
+    numbers[fast_date] = np.nan
+    numeric_count = int(weights[~np.isnan(numbers)].sum())
+
+    if not n or numeric_count >= NUMERIC_THRESHOLD * n:
+        date_count = int(weights[fast_date].sum())
+    else:
+        date_count = count_dates(values, weights, fast_date)
+
+    known = np.zeros(len(values), dtype=bool)
+    known[other_idx] = geo.matches(other.values)
+
+    lowered = list(values)
+    for j, i in enumerate(other_idx):
+        lowered[i] = other_lower.values[j]
+    return {
+        "n": n,
+        "numbers": numbers,
+        "numeric_count": numeric_count,
+        "date_count": date_count,
+        "geo_count": int(weights[known].sum()),
+        "lowered": lowered,
+    }
+
+
+def decide_type(name: str, n: int, numeric_count: int, date_count: int, geo_count: int) -> str:
+    """Mismos umbrales y precedencia que la inferencia original."""
+    inferred = "string"
+    if n:
+        if numeric_count / n >= NUMERIC_THRESHOLD:
+            inferred = "numeric"
+        elif date_count / n >= DATE_THRESHOLD:
+            inferred = "datetime"
+    lowname = name.lower()
+    if any(k in lowname for k in _LAT_NAMES):
+        inferred = "latitude"
+    if any(k in lowname for k in _LON_NAMES):
+        inferred = "longitude"
+    if n and geo_count / n >= GEO_THRESHOLD:
+        inferred = "geo_name"
+    return inferred
+
+
+def infer_column(name: str, col: pd.Series, geo: GeoIndex) -> Dict[str, Any]:
+    codes, text, counts = distinct_text(col)
+    keep = np.fromiter(map(len, text), dtype=np.int64, count=len(text)) > 0
+    values = [v for v, k in zip(text, keep) if k]
+    c = classify_values(values, counts[keep], geo)
+
+    # Primeros valores no vacíos en el orden de las filas
+    row_keep = np.zeros(len(codes), dtype=bool)
+    valid = codes >= 0
+    row_keep[valid] = keep[codes[valid]]
+    first_rows = np.flatnonzero(row_keep)[:SAMPLE_VALUES]
+
+    return {
+        "name": name,
+        "inferred_type": decide_type(name, c["n"], c["numeric_count"], c["date_count"], c["geo_count"]),
+        "sample_values": [text[i] for i in codes[first_rows]],
+        # Distintos exactos (tabla hash) en toda la muestra, sin distinguir mayúsculas
+        "unique_count_estimate": len(set(c["lowered"])),
+    }
+
+
+def infer_schema(rows: Union[pd.DataFrame, List[Dict[str, Any]]], geo: GeoIndex,
+                 sample_limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Esquema por columna: {"name", "inferred_type", "sample_values", "unique_count_estimate"}.
+    `rows` puede ser una lista de dicts o un DataFrame; sample_limit=None usa todas las filas.
+    """
+    if rows is None or len(rows) == 0:
+        return []
+    df = to_frame(rows, sample_limit)
+    return [infer_column(str(c), df[c], geo) for c in df.columns]
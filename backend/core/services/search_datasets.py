@@ -1,69 +1,107 @@
 import os
 import json
-import requests
+
+from asgiref.sync import sync_to_async
+
+from core.services import async_http_client, catalog_search, http_client
 
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATA_DIR = os.path.join(BASE_DIR, "core", "data")
 
-def search_by_title(title, page=0, page_size=200):
-    """Consulta la API de datos.gob.es buscando datasets por título con paginación"""
-    url = f"https://datos.gob.es/apidata/catalog/dataset/title/{title}?_sort=title&_pageSize={page_size}&_page={page}"
-    headers = {
-        "Accept": "application/json",
-        "User-Agent": "TFG Buscador de Datos - Estudiante"
-    }
+API_BASE = "https://datos.gob.es/apidata/catalog/dataset"
+PAGE_SIZE = 200
+
+HEADERS = {
+    "Accept": "application/json",
+    "User-Agent": "TFG Buscador de Datos - Estudiante"
+}
+
+
+def _search_url(path, page, page_size):
+    return f"{API_BASE}/{path}?_sort=title&_pageSize={page_size}&_page={page}"
+
+
+def _fetch(path, page, page_size, label):
     try:
-        response = requests.get(url, headers=headers)
+        response = http_client.get(_search_url(path, page, page_size), headers=HEADERS)
         response.raise_for_status()
         return response.json()
     except Exception as e:
-        print("Error en search_by_title:", e)
+        print(f"Error en {label}:", e)
         return None
 
 
-def search_by_keyword(keyword, page=0, page_size=200):
-    """Consulta la API de datos.gob.es buscando datasets por keyword con paginación"""
-    url = f"https://datos.gob.es/apidata/catalog/dataset/keyword/{keyword}?_sort=title&_pageSize={page_size}&_page={page}"
-    headers = {
-        "Accept": "application/json",
-        "User-Agent": "TFG Buscador de Datos - Estudiante"
-    }
+async def _afetch(path, page, page_size, label):
     try:
-        response = requests.get(url, headers=headers)
+        response = await async_http_client.get(_search_url(path, page, page_size), headers=HEADERS)
         response.raise_for_status()
         return response.json()
     except Exception as e:
-        print("Error en search_by_keyword:", e)
+        print(f"Error en {label}:", e)
         return None
 
 
-def search_by_spatial(spatial_type, spatial_value, page=0, page_size=200):
+# Con el catálogo volcado en PostgreSQL (manage.py harvest_catalog) las búsquedas
+# se resuelven en local (core/services/catalog_search.py); si no, contra la API.
+def search_by_title(title, page=0, page_size=PAGE_SIZE):
+    """Consulta la API de datos.gob.es buscando datasets por título con paginación"""
+    local = catalog_search.search_by_title(title, page, page_size)
+    if local is not None:
+        return local
+    return _fetch(f"title/{title}", page, page_size, "search_by_title")
+
+
+def search_by_keyword(keyword, page=0, page_size=PAGE_SIZE):
+    """Consulta la API de datos.gob.es buscando datasets por keyword con paginación"""
+    local = catalog_search.search_by_keyword(keyword, page, page_size)
+    if local is not None:
+        return local
+    return _fetch(f"keyword/{keyword}", page, page_size, "search_by_keyword")
+
+
+def search_by_spatial(spatial_type, spatial_value, page=0, page_size=PAGE_SIZE):
     """Consulta la API de datos.gob.es buscando datasets por tipo y valor espacial con paginación"""
-    url = f"https://datos.gob.es/apidata/catalog/dataset/spatial/{spatial_type}/{spatial_value}?_sort=title&_pageSize={page_size}&_page={page}"
-    headers = {
-        "Accept": "application/json",
-        "User-Agent": "TFG Buscador de Datos - Estudiante"
-    }
-    try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        return response.json()
-    except Exception as e:
-        print("Error en search_by_spatial:", e)
-        return None
+    local = catalog_search.search_by_spatial(spatial_type, spatial_value, page, page_size)
+    if local is not None:
+        return local
+    return _fetch(f"spatial/{spatial_type}/{spatial_value}", page, page_size, "search_by_spatial")
 
-def search_by_category(category, page=0, page_size=200):
+
+def search_by_category(category, page=0, page_size=PAGE_SIZE):
     """Consulta la API de datos.gob.es buscando datasets por categoría con paginación"""
-    url = f"https://datos.gob.es/apidata/catalog/dataset/theme/{category}?_sort=title&_pageSize={page_size}&_page={page}"
-    headers = {
-        "Accept": "application/json",
-        "User-Agent": "TFG Buscador de Datos - Estudiante"
-    }
-    try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        return response.json()
-    except Exception as e:
-        print("Error en search_by_category:", e)
-        return None
+    local = catalog_search.search_by_category(category, page, page_size)
+    if local is not None:
+        return local
+    return _fetch(f"theme/{category}", page, page_size, "search_by_category")
+
+
+# -----------------------
+# Variantes asíncronas (vistas ASGI)
+# -----------------------
+async def asearch_by_title(title, page=0, page_size=PAGE_SIZE):
+    local = await sync_to_async(catalog_search.search_by_title)(title, page, page_size)
+    if local is not None:
+        return local
+    return await _afetch(f"title/{title}", page, page_size, "asearch_by_title")
+
+
+async def asearch_by_keyword(keyword, page=0, page_size=PAGE_SIZE):
+    local = await sync_to_async(catalog_search.search_by_keyword)(keyword, page, page_size)
+    if local is not None:
+        return local
+    return await _afetch(f"keyword/{keyword}", page, page_size, "asearch_by_keyword")
+
+
+async def asearch_by_spatial(spatial_type, spatial_value, page=0, page_size=PAGE_SIZE):
+    local = await sync_to_async(catalog_search.search_by_spatial)(spatial_type, spatial_value, page, page_size)
+    if local is not None:
+        return local
+    return await _afetch(f"spatial/{spatial_type}/{spatial_value}", page, page_size, "asearch_by_spatial")
+
+
+async def asearch_by_category(category, page=0, page_size=PAGE_SIZE):
+    local = await sync_to_async(catalog_search.search_by_category)(category, page, page_size)
+    if local is not None:
+        return local
+    return await _afetch(f"theme/{category}", page, page_size, "asearch_by_category")
@@ -0,0 +1,235 @@
+# core/services/search_fanout.py
+# Modo "todas las páginas" de las búsquedas: pide las páginas de la API en
+# paralelo (concurrencia acotada y un ritmo máximo de peticiones compartido por
+# todo el proceso), elimina duplicados por _about y va devolviendo los items en
+# NDJSON a medida que llega cada página, sin esperar a la más lenta.
+#
+# La API no dice cuántas páginas hay: se lanzan CONCURRENCY páginas y cada una
+# que vuelve llena encarga la siguiente; la primera página incompleta marca el
+# final. Una página que falla no encarga ninguna: si falla la primera o
+# MAX_FAILURES seguidas, no se piden más (la API está caída o limitando) y el
+# resumen lo indica con "stopped": "failures".
+# Cada página pasa por la misma caché que las peticiones página a página.
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from django.conf import settings
+
+DEFAULTS = {
+    "CONCURRENCY": 4,       # páginas en vuelo por petición
+    "RATE": 5.0,            # peticiones/segundo como máximo hacia la API (todo el proceso)
+    "MAX_PAGES": 50,        # tope de páginas por petición
+    "MAX_FAILURES": 2,      # páginas fallidas seguidas tras las que se deja de pedir
+}
+
+
+def get_config() -> Dict[str, Any]:
+    conf = dict(DEFAULTS)
+    conf.update(getattr(settings, "SEARCH_FANOUT", {}) or {})
+    return conf
+
+
+class RateLimiter:
+    """
+    Espaciado mínimo entre peticiones. reserve() devuelve cuántos segundos hay
+    que esperar antes de lanzar la siguiente; sirve tanto a hilos (time.sleep)
+    como a corrutinas (asyncio.sleep).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def reserve(self, rate: float) -> float:
+        if rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + 1.0 / rate
+            return start - now
+
+
+_limiter = RateLimiter()
+
+
+class _PagePlan:
+    """Qué página pedir después y cuándo parar."""
+
+    def __init__(self, start_page: int, page_size: int, max_pages: int, max_failures: int):
+        self.page_size = page_size
+        self.start_page = start_page
+        self.next_page = start_page
+        self.end_page = start_page + max_pages   # exclusivo
+        self.last_page: Optional[int] = None
+        self.max_failures = max(1, max_failures)
+        self.failures = 0           # fallos seguidos
+        self.stopped = False        # demasiados fallos: no se piden más páginas
+
+    def take(self) -> Optional[int]:
+        limit = self.end_page if self.last_page is None else min(self.end_page, self.last_page + 1)
+        if self.stopped or self.next_page >= limit:
+            return None
+        page = self.next_page
+        self.next_page += 1
+        return page
+
+    def done(self, page: int, data: Any):
+        if not data:
+            self.failures += 1
+            if page == self.start_page or self.failures >= self.max_failures:
+                self.stopped = True
+            return
+        self.failures = 0
+        if len(_page_items(data)) < self.page_size:
+            self.last_page = page if self.last_page is None else min(self.last_page, page)
+
+
+class _Merger:
+    """Deduplica por _about y produce las líneas NDJSON."""
+
+    def __init__(self, transform: Optional[Callable[[Dict[str, Any]], Any]] = None):
+        self.transform = transform
+        self.seen = set()
+        self.items = 0
+        self.duplicates = 0
+        self.pages: List[int] = []
+        self.failed_pages: List[int] = []
+        self.started = time.perf_counter()
+
+    def lines(self, page: int, data: Any) -> List[bytes]:
+        if not data:
+            self.failed_pages.append(page)
+            return []
+        self.pages.append(page)
+        out = []
+        for item in _page_items(data):
+            about = item.get("_about") if isinstance(item, dict) else None
+            if about is not None:
+                if about in self.seen:
+                    self.duplicates += 1
+                    continue
+                self.seen.add(about)
+            self.items += 1
+            out.append(_line(self.transform(item) if self.transform and isinstance(item, dict) else item))
+        return out
+
+    def summary(self, plan: _PagePlan) -> bytes:
+        meta = {
+            "items": self.items,
+            "duplicates": self.duplicates,
+            "pages": sorted(self.pages),
+            "failed_pages": sorted(self.failed_pages),
+            "elapsed_ms": round((time.perf_counter() - self.started) * 1000),
+        }
+        if plan.stopped:
+            meta["stopped"] = "failures"
+        return _line({"_meta": meta})
+
+
+def _page_items(data: Any) -> List[Any]:
+    result = data.get("result", {}) if isinstance(data, dict) else {}
+    items = result.get("items") if isinstance(result, dict) else None
+    return items if isinstance(items, list) else []
+
+
+def _max_pages(requested: Optional[int], conf: Dict[str, Any]) -> int:
+    return min(requested, conf["MAX_PAGES"]) if requested and requested > 0 else conf["MAX_PAGES"]
+
+
+def _line(obj: Any) -> bytes:
+    return json.dumps(obj, ensure_ascii=False).encode("utf-8") + b"\n"
+
+
+# -----------------------
+# Síncrono (WSGI): hilos
+# -----------------------
+def stream_all_pages(fetch_page: Callable[[int], Any], page_size: int, start_page: int = 0,
+                     max_pages: Optional[int] = None, transform: Optional[Callable] = None) -> Iterator[bytes]:
+    """
+    NDJSON con los items de todas las páginas. fetch_page(page) devuelve la
+    respuesta de la API (o None si falla); transform(item), si se da, se aplica
+    a cada item ya deduplicado. La última línea es {"_meta": {...}}.
+    """
+    conf = get_config()
+    plan = _PagePlan(start_page, page_size, _max_pages(max_pages, conf), conf["MAX_FAILURES"])
+    merger = _Merger(transform)
+
+    def run(page):
+        time.sleep(_limiter.reserve(conf["RATE"]))
+        return fetch_page(page)
+
+    with ThreadPoolExecutor(max_workers=conf["CONCURRENCY"], thread_name_prefix="search-fanout") as pool:
+        pending = {}
+
+        def submit():
+            while len(pending) < conf["CONCURRENCY"]:
+                page = plan.take()
+                if page is None:
+                    return
+                pending[pool.submit(run, page)] = page
+
+        try:
+            submit()
+            while pending:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    page = pending.pop(future)
+                    try:
+                        data = future.result()
+                    except Exception:
+                        data = None
+                    plan.done(page, data)
+                    yield from merger.lines(page, data)
+                submit()
+        finally:
+            for future in pending:
+                future.cancel()
+    yield merger.summary(plan)
+
+
+# -----------------------
+# Asíncrono (ASGI): tareas
+# -----------------------
+async def astream_all_pages(afetch_page: Callable[[int], Any], page_size: int, start_page: int = 0,
+                            max_pages: Optional[int] = None, transform: Optional[Callable] = None) -> AsyncIterator[bytes]:
+    conf = get_config()
+    plan = _PagePlan(start_page, page_size, _max_pages(max_pages, conf), conf["MAX_FAILURES"])
+    merger = _Merger(transform)
+
+    async def run(page):
+        await asyncio.sleep(_limiter.reserve(conf["RATE"]))
+        return await afetch_page(page)
+
+    pending: Dict[asyncio.Task, int] = {}
+
+    def submit():
+        while len(pending) < conf["CONCURRENCY"]:
+            page = plan.take()
+            if page is None:
+                return
+            pending[asyncio.ensure_future(run(page))] = page
+
+    try:
+        submit()
+        while pending:
+            finished, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                page = pending.pop(task)
+                try:
+                    data = task.result()
+                except Exception:
+                    data = None
+                plan.done(page, data)
+                for line in merger.lines(page, data):
+                    yield line
+            submit()
+        yield merger.summary(plan)
+    finally:
+        # Cliente desconectado: no dejar páginas huérfanas en vuelo
+        for task in pending:
+            task.cancel()
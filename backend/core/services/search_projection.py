@@ -0,0 +1,140 @@
+# core/services/search_projection.py
+# Proyección de los resultados de búsqueda: de los items linked-data-api
+# completos (todos los idiomas, todas las distribuciones y keywords) a una
+# representación compacta con sólo los campos pedidos:
+#   ?view=compact                        -> todos los campos compactos
+#   ?fields=title,distributions          -> sólo esos (implica compact; "id" siempre va)
+#   ?lang=en                             -> idioma preferido del título/descripción
+# Sin view ni fields la respuesta no cambia (es lo que consume el frontend).
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+
+DEFAULTS = {
+    "DESCRIPTION_CHARS": 300,
+    "LANGS": ["es", "en"],       # orden de preferencia si el pedido no está
+}
+
+COMPACT_FIELDS = (
+    "id", "title", "description", "distributions", "keywords", "themes",
+    "publisher", "issued", "modified", "spatial",
+)
+
+
+class ProjectionError(ValueError):
+    pass
+
+
+def get_config() -> Dict[str, Any]:
+    conf = dict(DEFAULTS)
+    conf.update(getattr(settings, "SEARCH_PROJECTION", {}) or {})
+    return conf
+
+
+def parse_projection(view: str = "", fields: str = "", lang: str = "") -> Optional[Dict[str, Any]]:
+    """None (respuesta completa) o {"fields", "langs", "description_chars"}; ProjectionError si no es válida."""
+    view, fields = (view or "").strip().lower(), (fields or "").strip()
+    if view not in ("", "full", "compact"):
+        raise ProjectionError(f"view '{view}' no válido (full o compact)")
+    if not fields and view != "compact":
+        return None
+
+    conf = get_config()
+    selected = list(COMPACT_FIELDS)
+    if fields:
+        requested = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = [f for f in requested if f not in COMPACT_FIELDS]
+        if unknown:
+            raise ProjectionError(f"Campos desconocidos: {', '.join(unknown)}. Disponibles: {', '.join(COMPACT_FIELDS)}")
+        selected = ["id"] + [f for f in dict.fromkeys(requested) if f != "id"]
+    lang = (lang or "").strip().lower()
+    return {
+        "fields": selected,
+        "langs": ([lang] if lang else []) + [l for l in conf["LANGS"] if l != lang],
+        "description_chars": conf["DESCRIPTION_CHARS"],
+    }
+
+
+# -----------------------
+# Valores de la API (literal, {"_value", "_lang"}, {"_about"} o listas)
+# -----------------------
+def _as_list(value: Any) -> List[Any]:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _scalar(value: Any) -> str:
+    if isinstance(value, dict):
+        value = value.get("_value") or value.get("value") or value.get("_about") or ""
+    return "" if value is None else str(value)
+
+
+def _text(value: Any, langs: List[str]) -> str:
+    texts = [(v.get("_lang") or "", _scalar(v)) if isinstance(v, dict) else ("", _scalar(v))
+             for v in _as_list(value)]
+    texts = [(lang, text) for lang, text in texts if text]
+    for wanted in langs:
+        for lang, text in texts:
+            if lang == wanted:
+                return text
+    return texts[0][1] if texts else ""
+
+
+def _shorten(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    if limit <= 0 or len(text) <= limit:
+        return text
+    cut = text[:limit].rsplit(" ", 1)[0] or text[:limit]
+    return cut + "…"
+
+
+def _distributions(value: Any) -> List[Dict[str, str]]:
+    out = []
+    for d in _as_list(value):
+        if not isinstance(d, dict):
+            if d:
+                out.append({"url": str(d), "format": ""})
+            continue
+        url = _scalar(_as_list(d.get("accessURL"))[0] if d.get("accessURL") else "")
+        if url:
+            out.append({"url": url, "format": _scalar(d.get("format"))})
+    return out
+
+
+def _keywords(value: Any, langs: List[str]) -> List[str]:
+    # Las del primer idioma preferido que tenga alguna (más las que no indican idioma)
+    pairs = [((k.get("_lang") or "") if isinstance(k, dict) else "", _scalar(k)) for k in _as_list(value)]
+    present = {lang for lang, _ in pairs}
+    chosen = next((l for l in langs if l in present), None)
+    return list(dict.fromkeys(text for lang, text in pairs if text and lang in ("", chosen)))
+
+
+_EXTRACTORS = {
+    "id": lambda item, p: item.get("_about", ""),
+    "title": lambda item, p: _text(item.get("title"), p["langs"]),
+    "description": lambda item, p: _shorten(_text(item.get("description"), p["langs"]), p["description_chars"]),
+    "distributions": lambda item, p: _distributions(item.get("distribution")),
+    "keywords": lambda item, p: _keywords(item.get("keyword"), p["langs"]),
+    "themes": lambda item, p: [_scalar(t) for t in _as_list(item.get("theme"))],
+    "publisher": lambda item, p: _scalar(item.get("publisher")),
+    "issued": lambda item, p: _scalar(item.get("issued")),
+    "modified": lambda item, p: _scalar(item.get("modified")),
+    "spatial": lambda item, p: [_scalar(s) for s in _as_list(item.get("spatial"))],
+}
+
+
+def project_item(item: Dict[str, Any], projection: Dict[str, Any]) -> Dict[str, Any]:
+    return {f: _EXTRACTORS[f](item, projection) for f in projection["fields"]}
+
+
+def project_result(result: Dict[str, Any], projection: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Copia de result con los items proyectados (el original, que está en caché, no se toca)."""
+    if not projection or not isinstance(result, dict) or not isinstance(result.get("items"), list):
+        return result
+    return {
+        **result,
+        "items": [project_item(i, projection) for i in result["items"] if isinstance(i, dict)],
+        "view": "compact",
+        "fields": projection["fields"],
+    }
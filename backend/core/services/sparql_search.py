@@ -0,0 +1,201 @@
+# core/services/sparql_search.py
+# Búsqueda de datasets por SPARQL con paginación por cursor (keyset).
+# En dos fases:
+#   1. claves de la página: (título, URI) ordenados, filtrando por temática /
+#      texto y por "después del último de la página anterior" (sin OFFSET, así
+#      que las páginas profundas cuestan lo mismo que la primera)
+#   2. detalle de esos datasets con un bloque VALUES (catalog_harvest): una
+#      fila por dataset con todas sus distribuciones agrupadas
+# El cursor es opaco (firmado con SECRET_KEY) y va ligado a la consulta.
+# Tras servir una página, la siguiente se precarga en segundo plano en la caché.
+import hashlib
+import json
+import logging
+import re
+from typing import Any, Dict, Optional, Tuple
+
+from django.conf import settings
+from django.core import signing
+
+from core.services import catalog_harvest
+from core.services.catalog_harvest import api_item_from_record
+from core.services.sparql_service import run_sparql_query
+from core.utils import dataset_cache
+from core.utils.file_utils import handle_dataset_file
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE = "search_sparql"
+THEME_BASE = "http://datos.gob.es/kos/sector-publico/sector/"
+
+DEFAULTS = {
+    "PAGE_SIZE": 50,
+    "MAX_PAGE_SIZE": 500,
+    "TIMEOUT": 30,
+    "PREFETCH": True,
+    "FACETS": ["titles", "descriptions", "keywords", "themes"],
+}
+
+_CURSOR_SALT = "core.sparql_search.cursor"
+
+_KEYS_QUERY = """
+    PREFIX dcat: <http://www.w3.org/ns/dcat#>
+    PREFIX dct: <http://purl.org/dc/terms/>
+    SELECT ?dataset ?title WHERE {{
+      {{ SELECT ?dataset (MIN(STR(?t)) AS ?title) WHERE {{
+          ?dataset a dcat:Dataset ;
+                   dct:title ?t .
+          {where}
+        }} GROUP BY ?dataset }}
+      {after}
+    }}
+    ORDER BY ?title STR(?dataset)
+    LIMIT {limit}
+"""
+
+_IRI = re.compile(r'^[^\s<>"{}|^`\\]+$')
+
+
+class SparqlSearchError(ValueError):
+    """Parámetros o cursor no válidos (las vistas responden 400)."""
+
+
+def get_config() -> Dict[str, Any]:
+    conf = dict(DEFAULTS)
+    conf.update(getattr(settings, "SPARQL_SEARCH", {}) or {})
+    return conf
+
+
+# -----------------------
+# Construcción de la consulta
+# -----------------------
+def _literal(value: str) -> str:
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"')
+               .replace("\n", "\\n").replace("\r", "\\r"))
+    return f'"{escaped}"'
+
+
+def _iri(value: str) -> str:
+    if not value or not _IRI.match(value):
+        raise SparqlSearchError(f"URI no válida: {value!r}")
+    return f"<{value}>"
+
+
+def theme_uri(theme: str) -> str:
+    # Se acepta el código ("economia") o la URI completa, como en search_by_category
+    return theme if theme.startswith("http") else THEME_BASE + theme
+
+
+def keys_query(theme: Optional[str], q: Optional[str], limit: int,
+               after: Optional[Tuple[str, str]] = None) -> str:
+    where = []
+    if theme:
+        where.append(f"?dataset dcat:theme {_iri(theme_uri(theme))} .")
+    if q:
+        where.append(f"FILTER(CONTAINS(LCASE(STR(?t)), LCASE({_literal(q)})))")
+    after_filter = ""
+    if after:
+        title, uri = (_literal(v) for v in after)
+        after_filter = f"FILTER(?title > {title} || (?title = {title} && STR(?dataset) > {uri}))"
+    return _KEYS_QUERY.format(where="\n          ".join(where), after=after_filter, limit=limit)
+
+
+# -----------------------
+# Cursores
+# -----------------------
+def _fingerprint(theme: Optional[str], q: Optional[str]) -> str:
+    raw = json.dumps([theme or "", q or ""], ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
+
+
+def encode_cursor(theme: Optional[str], q: Optional[str], title: str, uri: str) -> str:
+    return signing.dumps({"f": _fingerprint(theme, q), "t": title, "u": uri}, salt=_CURSOR_SALT, compress=True)
+
+
+def decode_cursor(cursor: str, theme: Optional[str], q: Optional[str]) -> Tuple[str, str]:
+    try:
+        data = signing.loads(cursor, salt=_CURSOR_SALT)
+    except signing.BadSignature:
+        raise SparqlSearchError("Cursor no válido")
+    if data.get("f") != _fingerprint(theme, q):
+        raise SparqlSearchError("El cursor pertenece a otra búsqueda")
+    return data["t"], data["u"]
+
+
+# -----------------------
+# Búsqueda
+# -----------------------
+def normalize_limit(limit: Any) -> int:
+    conf = get_config()
+    try:
+        limit = int(limit or conf["PAGE_SIZE"])
+    except (TypeError, ValueError):
+        raise SparqlSearchError(f"limit '{limit}' no es un entero")
+    return min(max(limit, 1), conf["MAX_PAGE_SIZE"])
+
+
+def validate_params(theme: Optional[str], q: Optional[str], limit: Any,
+                    cursor: Optional[str]) -> Tuple[Optional[str], Optional[str], int, Optional[str]]:
+    """Parámetros normalizados (theme, q, limit, cursor) o SparqlSearchError, antes de tocar la caché."""
+    if theme:
+        _iri(theme_uri(theme))
+    if cursor:
+        decode_cursor(cursor, theme, q)
+    return theme or None, q or None, normalize_limit(limit), cursor or None
+
+
+def search_page(theme: Optional[str] = None, q: Optional[str] = None, limit: Optional[int] = None,
+                cursor: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Una página de datasets con la forma de la API ({"result": {"items": [...]}})
+    más next_cursor/has_more. Lanza SparqlSearchError con parámetros no válidos.
+    """
+    conf = get_config()
+    limit = normalize_limit(limit)
+    after = decode_cursor(cursor, theme, q) if cursor else None
+
+    # Fase 1: claves de la página (+1 para saber si hay más)
+    data = run_sparql_query(keys_query(theme, q, limit + 1, after), timeout=conf["TIMEOUT"])
+    keys = [(b["title"]["value"], b["dataset"]["value"])
+            for b in data.get("results", {}).get("bindings", [])
+            if "title" in b and "dataset" in b]
+    has_more = len(keys) > limit
+    keys = keys[:limit]
+
+    # Fase 2: detalle agrupado por dataset
+    items = []
+    if keys:
+        values = "VALUES ?dataset { " + " ".join(_iri(uri) for _, uri in keys) + " }"
+        records = {r["uri"]: r for r in catalog_harvest.fetch_sparql_records(values, conf["TIMEOUT"], conf["FACETS"])}
+        items = [api_item_from_record(records[uri]) for _, uri in keys if uri in records]
+
+    return {
+        "result": {
+            "items": items,
+            "itemsPerPage": limit,
+            "next_cursor": encode_cursor(theme, q, *keys[-1]) if has_more else None,
+            "has_more": has_more,
+            "source": "sparql",
+        }
+    }
+
+
+def cache_params(theme: Optional[str], q: Optional[str], limit: Optional[int],
+                 cursor: Optional[str]) -> Dict[str, Any]:
+    return {"theme": theme or "", "q": q or "", "limit": normalize_limit(limit), "cursor": cursor or ""}
+
+
+def prefetch_next(theme: Optional[str], q: Optional[str], limit: Optional[int], data: Any) -> bool:
+    """Precarga en la caché la página siguiente a `data` (en un hilo, una vez por clave)."""
+    next_cursor = (data or {}).get("result", {}).get("next_cursor")
+    if not (next_cursor and get_config()["PREFETCH"]):
+        return False
+    params = cache_params(theme, q, limit, next_cursor)
+    key = dataset_cache.make_cache_key(NAMESPACE, params)
+
+    def refresh():
+        _, message, status = handle_dataset_file(NAMESPACE, params, search_page, (theme, q, limit, next_cursor))
+        if status != 200:
+            logger.warning("Precarga de %s fallida: %s", key, message)
+
+    return dataset_cache.schedule_revalidation(key, refresh)
@@ -1,6 +1,8 @@
 import requests
 import logging
 
+from core.services import async_http_client, http_client
+
 SPARQL_ENDPOINT = "http://datos.gob.es/virtuoso/sparql"
 logger = logging.getLogger(__name__)
 
@@ -13,7 +15,7 @@ def run_sparql_query(query, timeout=DEFAULT_TIMEOUT):
     """
     headers = {"Accept": "application/sparql-results+json"}
     try:
-        response = requests.get(
+        response = http_client.get(
             SPARQL_ENDPOINT,
             params={"query": query},
             headers=headers,
@@ -30,21 +32,34 @@ def run_sparql_query(query, timeout=DEFAULT_TIMEOUT):
         logger.error("Respuesta SPARQL no es JSON válido")
         raise RuntimeError(f"Respuesta no es JSON válido: {e}")
 
-def get_total_datasets():
-    query = """
+async def arun_sparql_query(query, timeout=DEFAULT_TIMEOUT):
+    """Variante asíncrona de run_sparql_query (mismas excepciones)."""
+    headers = {"Accept": "application/sparql-results+json"}
+    try:
+        response = await async_http_client.get(
+            SPARQL_ENDPOINT,
+            params={"query": query},
+            headers=headers,
+            timeout=timeout
+        )
+        response.raise_for_status()
+    except async_http_client.AsyncHTTPError as e:
+        logger.exception("Error de red al consultar SPARQL")
+        raise RuntimeError(f"Error al conectar con SPARQL endpoint: {e}")
+
+    try:
+        return response.json()
+    except ValueError as e:
+        logger.error("Respuesta SPARQL no es JSON válido")
+        raise RuntimeError(f"Respuesta no es JSON válido: {e}")
+
+TOTAL_DATASETS_QUERY = """
     SELECT (COUNT(?dataset) AS ?total) WHERE {
       ?dataset a <http://www.w3.org/ns/dcat#Dataset> .
     }
     """
-    data = run_sparql_query(query)
-    try:
-        total_str = data["results"]["bindings"][0]["total"]["value"]
-        return int(total_str)
-    except (KeyError, IndexError, ValueError) as e:
-        raise RuntimeError(f"No se pudo extraer 'total' del resultado SPARQL: {e}")
 
-def get_all_themes():
-    query = """
+ALL_THEMES_QUERY = """
     PREFIX dcat: <http://www.w3.org/ns/dcat#>
     PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
     SELECT DISTINCT ?themeURI ?themeLabel WHERE {
@@ -57,16 +72,8 @@ def get_all_themes():
     }
     ORDER BY ?themeLabel
     """
-    data = run_sparql_query(query, timeout=30)
-    themes = []
-    for b in data.get("results", {}).get("bindings", []):
-        uri = b.get("themeURI", {}).get("value")
-        label = b.get("themeLabel", {}).get("value", uri)
-        themes.append({"uri": uri, "label": label})
-    return themes
 
-def get_dataset_counts_by_theme():
-    query = """
+DATASET_COUNTS_BY_THEME_QUERY = """
     PREFIX dcat: <http://www.w3.org/ns/dcat#>
     PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
     SELECT ?theme ?themeLabel (COUNT(?dataset) AS ?datasetCount)
@@ -79,7 +86,23 @@ def get_dataset_counts_by_theme():
     GROUP BY ?theme ?themeLabel
     ORDER BY DESC(?datasetCount)
     """
-    data = run_sparql_query(query, timeout=30)
+
+def _parse_total_datasets(data):
+    try:
+        total_str = data["results"]["bindings"][0]["total"]["value"]
+        return int(total_str)
+    except (KeyError, IndexError, ValueError) as e:
+        raise RuntimeError(f"No se pudo extraer 'total' del resultado SPARQL: {e}")
+
+def _parse_all_themes(data):
+    themes = []
+    for b in data.get("results", {}).get("bindings", []):
+        uri = b.get("themeURI", {}).get("value")
+        label = b.get("themeLabel", {}).get("value", uri)
+        themes.append({"uri": uri, "label": label})
+    return themes
+
+def _parse_dataset_counts_by_theme(data):
     results = []
     for b in data.get("results", {}).get("bindings", []):
         try:
@@ -92,6 +115,24 @@ def get_dataset_counts_by_theme():
             continue
     return results
 
+def get_total_datasets():
+    return _parse_total_datasets(run_sparql_query(TOTAL_DATASETS_QUERY))
+
+def get_all_themes():
+    return _parse_all_themes(run_sparql_query(ALL_THEMES_QUERY, timeout=30))
+
+def get_dataset_counts_by_theme():
+    return _parse_dataset_counts_by_theme(run_sparql_query(DATASET_COUNTS_BY_THEME_QUERY, timeout=30))
+
+async def aget_total_datasets():
+    return _parse_total_datasets(await arun_sparql_query(TOTAL_DATASETS_QUERY))
+
+async def aget_all_themes():
+    return _parse_all_themes(await arun_sparql_query(ALL_THEMES_QUERY, timeout=30))
+
+async def aget_dataset_counts_by_theme():
+    return _parse_dataset_counts_by_theme(await arun_sparql_query(DATASET_COUNTS_BY_THEME_QUERY, timeout=30))
+
 def search_datasets_by_theme_sparql(theme_uri, search_type="", value="", page=0):
     query = f"""
     PREFIX dcat: <http://www.w3.org/ns/dcat#>
@@ -0,0 +1,173 @@
+# core/services/stats_snapshot.py
+# Instantánea local de las estadísticas del catálogo (total de datasets,
+# temáticas y datasets por temática). Las agregaciones SPARQL sobre todo el
+# catálogo tardan hasta 30 s; aquí se ejecutan en segundo plano
+# (manage.py refresh_stats_snapshot o el planificador en proceso) y las vistas
+# leen la última versión guardada en StatsSnapshot.
+import hashlib
+import json
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from core.models import StatsSnapshot
+from core.services.sparql_service import get_all_themes, get_dataset_counts_by_theme, get_total_datasets
+from core.utils import single_flight
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "ENABLED": True,
+    "SCHEDULER": True,          # refresco en segundo plano dentro de los workers web
+    "INTERVAL": 15 * 60,        # segundos entre refrescos
+    "MEMO_TTL": 30,             # segundos que cada proceso recuerda la instantánea leída
+}
+
+# clave -> función que ejecuta la agregación SPARQL
+SNAPSHOTS: Dict[str, Callable[[], Any]] = {
+    "total_datasets": get_total_datasets,
+    "all_themes": get_all_themes,
+    "dataset_counts_by_theme": get_dataset_counts_by_theme,
+}
+
+_memo: Dict[str, tuple] = {}
+_memo_lock = threading.Lock()
+_scheduler = {"thread": None}
+_scheduler_lock = threading.Lock()
+
+
+def get_config() -> Dict[str, Any]:
+    conf = dict(DEFAULTS)
+    conf.update(getattr(settings, "STATS_SNAPSHOT", {}) or {})
+    return conf
+
+
+def _etag(data: Any) -> str:
+    return hashlib.sha1(json.dumps(data, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def _as_dict(row: StatsSnapshot) -> Dict[str, Any]:
+    return {
+        "key": row.key,
+        "data": row.data,
+        "version": row.version,
+        "etag": row.etag,
+        "changed_at": row.changed_at,
+        "refreshed_at": row.refreshed_at,
+    }
+
+
+# -----------------------
+# Refresco
+# -----------------------
+def refresh_snapshot(key: str) -> Dict[str, Any]:
+    """
+    Ejecuta la agregación y la guarda. La versión sólo sube si el resultado
+    cambia; si SPARQL falla se conserva la instantánea anterior y se anota el error.
+    """
+    row, _ = StatsSnapshot.objects.get_or_create(key=key)
+    now = timezone.now()
+    try:
+        data = SNAPSHOTS[key]()
+    except Exception as e:
+        logger.warning("No se pudo refrescar la instantánea %s: %s", key, e)
+        row.last_error = str(e)
+        row.save(update_fields=["last_error"])
+        raise
+
+    etag = _etag(data)
+    if etag != row.etag:
+        row.data, row.etag, row.changed_at = data, etag, now
+        row.version += 1
+    row.refreshed_at, row.last_error = now, ""
+    row.save()
+
+    snapshot = _as_dict(row)
+    with _memo_lock:
+        _memo[key] = (snapshot, time.monotonic())
+    return snapshot
+
+
+def refresh_all(keys: Optional[List[str]] = None, only_stale: bool = False) -> Dict[str, str]:
+    """Refresca las instantáneas indicadas (todas por defecto). Devuelve {clave: resultado}."""
+    interval = get_config()["INTERVAL"]
+    results = {}
+    for key in keys or list(SNAPSHOTS):
+        if only_stale:
+            refreshed = StatsSnapshot.objects.filter(key=key).values_list("refreshed_at", flat=True).first()
+            if refreshed and (timezone.now() - refreshed).total_seconds() < interval:
+                results[key] = "fresca"
+                continue
+        # Un solo proceso refresca cada clave; el resto la lee de la BD
+        with single_flight.interprocess_lock(f"stats_snapshot:{key}", timeout=0) as acquired:
+            if not acquired:
+                results[key] = "en curso en otro proceso"
+                continue
+            try:
+                snapshot = refresh_snapshot(key)
+                results[key] = f"v{snapshot['version']}"
+            except Exception as e:
+                results[key] = f"error: {e}"
+    return results
+
+
+# -----------------------
+# Lectura
+# -----------------------
+def get_snapshot(key: str) -> Optional[Dict[str, Any]]:
+    """
+    Última instantánea de `key` o None (desactivado, aún sin datos o BD no
+    disponible). Cada proceso la recuerda MEMO_TTL segundos.
+    """
+    conf = get_config()
+    if not conf["ENABLED"]:
+        return None
+    now = time.monotonic()
+    with _memo_lock:
+        cached = _memo.get(key)
+        if cached and now - cached[1] < conf["MEMO_TTL"]:
+            return cached[0]
+    try:
+        row = StatsSnapshot.objects.filter(key=key, data__isnull=False).first()
+    except Exception as e:
+        logger.warning("Instantánea de estadísticas no disponible: %s", e)
+        row = None
+    snapshot = _as_dict(row) if row else None
+    with _memo_lock:
+        _memo[key] = (snapshot, now)
+    return snapshot
+
+
+# -----------------------
+# Planificador en proceso
+# -----------------------
+def _scheduler_loop():
+    while True:
+        close_old_connections()
+        try:
+            results = refresh_all(only_stale=True)
+            logger.info("Instantáneas de estadísticas: %s", results)
+        except Exception:
+            logger.exception("Fallo refrescando las instantáneas de estadísticas")
+        time.sleep(get_config()["INTERVAL"])
+
+
+def ensure_scheduler() -> bool:
+    """
+    Arranca (una vez por proceso) el hilo que mantiene las instantáneas al día.
+    Lo llaman las vistas de estadísticas, así que sólo corre en los workers web
+    y no en migrate u otros comandos.
+    """
+    conf = get_config()
+    if not (conf["ENABLED"] and conf["SCHEDULER"]):
+        return False
+    with _scheduler_lock:
+        if _scheduler["thread"] is None:
+            _scheduler["thread"] = threading.Thread(target=_scheduler_loop, name="stats-snapshot", daemon=True)
+            _scheduler["thread"].start()
+    return True
@@ -0,0 +1,410 @@
+# core/services/stream_samplers.py
+# Muestreo incremental de distribuciones (CSV y JSON): se consumen los bytes tal y como llegan
+# de la red y se deja de descargar en cuanto la muestra está completa. La memoria
+# queda acotada por el tamaño de chunk y de línea, no por el del fichero.
+import codecs
+import csv
+import itertools
+import json
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+CHUNK_SIZE = 64 * 1024
+MAX_LINE_CHARS = 8 * 1024 * 1024     # una "línea" CSV más larga se considera corrupta
+CSV_DELIMITERS = ";,\t|"              # ';' es habitual en portales españoles
+
+
+class SampleTooLargeError(Exception):
+    pass
+
+
+class CountingIterator:
+    """Envuelve un iterador de bytes contando lo consumido."""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._it = iter(chunks)
+        self.bytes_read = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> bytes:
+        chunk = next(self._it)
+        self.bytes_read += len(chunk)
+        return chunk
+
+
+# -----------------------
+# Detección de codificación / delimitador
+# -----------------------
+def detect_encoding(prefix: bytes) -> str:
+    if prefix.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    if prefix.startswith(codecs.BOM_UTF16_LE) or prefix.startswith(codecs.BOM_UTF16_BE):
+        return "utf-16"
+    try:
+        prefix.decode("utf-8")
+        return "utf-8"
+    except UnicodeDecodeError as e:
+        # Un carácter multibyte cortado al final del chunk no invalida UTF-8
+        if e.start >= len(prefix) - 3 and e.reason == "unexpected end of data":
+            return "utf-8"
+        return "cp1252"  # Windows-1252/Latin-1: lo habitual en CSV exportados desde Excel
+
+
+def sniff_delimiter(text: str, delimiters: str = CSV_DELIMITERS) -> str:
+    lines = [l for l in text.splitlines()[:20] if l.strip()]
+    if not lines:
+        return ","
+    sample = "\n".join(lines)
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=delimiters).delimiter
+    except csv.Error:
+        pass
+    # Fallback: el candidato más frecuente en la cabecera
+    header = lines[0]
+    best = max(delimiters, key=header.count)
+    return best if header.count(best) > 0 else ","
+
+
+# -----------------------
+# CSV
+# -----------------------
+def _split_lines(pending: str):
+    """Separa las líneas completas (con su '\n') del resto pendiente."""
+    lines = []
+    start = 0
+    while True:
+        idx = pending.find("\n", start)
+        if idx < 0:
+            break
+        lines.append(pending[start:idx + 1])
+        start = idx + 1
+    return lines, pending[start:]
+
+
+def _iter_text_lines(chunks: Iterable[bytes], encoding: str) -> Iterator[str]:
+    """
+    Decodifica incrementalmente y corta sólo por '\n' conservando el salto,
+    de modo que csv.reader pueda continuar campos entrecomillados multilínea.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    pending = ""
+    for data in chunks:
+        lines, pending = _split_lines(pending + decoder.decode(data))
+        yield from lines
+        if len(pending) > MAX_LINE_CHARS:
+            raise SampleTooLargeError("Línea CSV demasiado larga")
+    lines, pending = _split_lines(pending + decoder.decode(b"", final=True))
+    yield from lines
+    if pending:
+        yield pending
+
+
+def _read_prefix(chunks: Iterator[bytes], size: int = CHUNK_SIZE) -> bytes:
+    """Acumula al menos `size` bytes (o hasta el final) para las detecciones."""
+    parts = []
+    total = 0
+    for data in chunks:
+        parts.append(data)
+        total += len(data)
+        if total >= size:
+            break
+    return b"".join(parts)
+
+
+def iter_csv_rows(chunks: Iterable[bytes], encoding: Optional[str] = None, delimiter: Optional[str] = None,
+                  state: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, str]]:
+    """
+    Itera las filas (dicts por cabecera) de un CSV a partir de un iterador de
+    bytes, sin acumularlas. Codificación y delimitador se detectan con el primer
+    chunk si no se indican. `state` (opcional) se rellena con "encoding",
+    "delimiter", "columns" y el contador de bytes ("counter").
+    """
+    state = state if state is not None else {}
+    counter = CountingIterator(chunks)
+    state["counter"] = counter
+    first = _read_prefix(counter)
+    encoding = encoding or detect_encoding(first)
+    if delimiter is None:
+        delimiter = sniff_delimiter(first.decode(encoding, errors="replace"))
+    state.update({"encoding": encoding, "delimiter": delimiter, "columns": []})
+
+    reader = csv.reader(_iter_text_lines(itertools.chain([first], counter), encoding), delimiter=delimiter)
+    header: Optional[List[str]] = None
+    for record in reader:
+        if not record or all(not c.strip() for c in record):
+            continue
+        if header is None:
+            header = [(h or "").strip() or f"Columna {i + 1}" for i, h in enumerate(record)]
+            state["columns"] = header
+            continue
+        yield {h: (record[i].strip() if i < len(record) else "") for i, h in enumerate(header)}
+
+
+def stream_csv_sample(chunks: Iterable[bytes], max_rows: int = 100,
+                      encoding: Optional[str] = None, delimiter: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Parsea un CSV a partir de un iterador de bytes y se detiene tras `max_rows` filas.
+
+    Devuelve {"rows", "columns", "encoding", "delimiter", "bytes_read", "complete"}
+    donde complete=False indica que se dejó de leer antes del final del recurso.
+    """
+    state: Dict[str, Any] = {}
+    records = iter_csv_rows(chunks, encoding, delimiter, state)
+    rows: List[Dict[str, str]] = []
+    complete = True
+    for row in records:
+        if len(rows) >= max_rows:
+            complete = False
+            break
+        rows.append(row)
+    records.close()
+
+    return {
+        "rows": rows,
+        "columns": state.get("columns", []),
+        "encoding": state.get("encoding"),
+        "delimiter": state.get("delimiter"),
+        "bytes_read": state["counter"].bytes_read if "counter" in state else 0,
+        "complete": complete,
+    }
+
+
+# -----------------------
+# JSON
+# -----------------------
+# Claves preferidas para localizar el array de registros (mismo orden que
+# dataset_analyzer.find_first_list_in_json).
+JSON_RECORD_KEYS = ("data", "rows", "result", "results", "records", "items")
+MAX_VALUE_CHARS = 64 * 1024 * 1024   # un único registro JSON mayor se considera corrupto
+
+_JSON_WS = " \t\r\n"
+_JSON_STRING = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"', re.S)
+_JSON_SKIP_RUN = re.compile(r'(?:[^"{}\[\]]+|"[^"\\]*(?:\\.[^"\\]*)*")*', re.S)
+_JSON_SCALAR_END = re.compile(r'[,\]}\s]')
+
+
+class _JsonCursor:
+    """
+    Cursor sobre el texto decodificado de un iterador de bytes. Sólo conserva en
+    memoria desde la marca actual (el valor que se está leyendo) en adelante.
+    """
+
+    def __init__(self, chunks: Iterable[bytes], encoding: str):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        self._eof = False
+        self.buf = ""
+        self.pos = 0
+        self.mark: Optional[int] = None
+        self.peak_buffer_chars = 0
+
+    def fill(self) -> bool:
+        """Añade texto al buffer descartando lo ya consumido. False si no hay más."""
+        while not self._eof:
+            data = next(self._chunks, None)
+            if data is None:
+                self._eof = True
+                text = self._decoder.decode(b"", final=True)
+            else:
+                text = self._decoder.decode(data)
+            if not text:
+                continue
+            keep = self.pos if self.mark is None else self.mark
+            self.buf = self.buf[keep:] + text
+            self.pos -= keep
+            if self.mark is not None:
+                self.mark = 0
+            if len(self.buf) > MAX_VALUE_CHARS:
+                raise SampleTooLargeError("Valor JSON demasiado grande")
+            self.peak_buffer_chars = max(self.peak_buffer_chars, len(self.buf))
+            return True
+        return False
+
+    def peek(self) -> str:
+        """Siguiente carácter no blanco sin consumirlo ('' al final)."""
+        while True:
+            while self.pos < len(self.buf):
+                if self.buf[self.pos] not in _JSON_WS:
+                    return self.buf[self.pos]
+                self.pos += 1
+            if not self.fill():
+                return ""
+
+    def expect(self, chars: str) -> str:
+        c = self.peek()
+        if not c or c not in chars:
+            raise ValueError(f"JSON inválido: se esperaba {chars!r} y llegó {c!r}")
+        self.pos += 1
+        return c
+
+    def skip_value(self, depth: int = 0):
+        """
+        Avanza hasta el final del valor que empieza en pos (o, con depth > 0, hasta
+        cerrar los contenedores ya abiertos). Las cadenas y el texto entre
+        corchetes/llaves se saltan con una sola expresión regular, sin construir
+        objetos Python.
+        """
+        if depth == 0:
+            c = self.peek()
+            if not c:
+                raise ValueError("JSON truncado")
+            if c == '"':
+                while True:
+                    m = _JSON_STRING.match(self.buf, self.pos)
+                    if m:
+                        self.pos = m.end()
+                        return
+                    if not self.fill():
+                        raise ValueError("JSON truncado")
+            if c not in "{[":
+                while True:
+                    m = _JSON_SCALAR_END.search(self.buf, self.pos)
+                    if m:
+                        self.pos = m.start()
+                        return
+                    self.pos = len(self.buf)
+                    if not self.fill():
+                        return
+            depth = 1
+            self.pos += 1
+
+        while True:
+            self.pos = _JSON_SKIP_RUN.match(self.buf, self.pos).end()
+            if self.pos >= len(self.buf) or self.buf[self.pos] == '"':
+                # Fin del buffer o cadena cortada entre chunks
+                if not self.fill():
+                    raise ValueError("JSON truncado")
+                continue
+            depth += 1 if self.buf[self.pos] in "{[" else -1
+            self.pos += 1
+            if depth == 0:
+                return
+
+    def read_value(self) -> Any:
+        """Lee y decodifica (json.loads) el valor que empieza en pos."""
+        self.peek()
+        self.mark = self.pos
+        try:
+            self.skip_value()
+            return json.loads(self.buf[self.mark:self.pos])
+        finally:
+            self.mark = None
+
+
+def _iter_array(cur: _JsonCursor) -> Iterator[Any]:
+    """Itera los elementos de un array cuyo '[' ya se ha consumido."""
+    if cur.peek() == "]":
+        cur.pos += 1
+        return
+    while True:
+        yield cur.read_value()
+        if cur.expect(",]") == "]":
+            return
+
+
+def iter_json_records(chunks: Iterable[bytes], encoding: str = "utf-8",
+                      max_fallback: int = 100, state: Optional[Dict[str, Any]] = None) -> Iterator[Any]:
+    """
+    Localiza el primer array de registros con la heurística de
+    find_first_list_in_json y va emitiendo sus elementos según llegan:
+
+    - raíz de tipo lista -> sus elementos
+    - raíz objeto -> la primera clave de JSON_RECORD_KEYS cuyo valor es lista
+      (en orden de aparición en el documento, ya que no se puede mirar adelante)
+    - si no hay ninguna, la primera lista de cualquier clave. Como sólo se sabe
+      al terminar el objeto, se guardan hasta `max_fallback` elementos de ella.
+
+    `state` (opcional) se rellena con "path" y el cursor, para estadísticas.
+    """
+    cur = _JsonCursor(chunks, encoding)
+    state = state if state is not None else {}
+    state["cursor"] = cur
+    root = cur.peek()
+    if root == "[":
+        cur.pos += 1
+        state["path"] = "$"
+        yield from _iter_array(cur)
+        return
+    if root != "{":
+        return
+
+    cur.pos += 1
+    fallback: Optional[List[Any]] = None
+    fallback_key = None
+    if cur.peek() == "}":
+        return
+    while True:
+        cur.peek()
+        cur.mark = cur.pos
+        cur.skip_value()
+        key = json.loads(cur.buf[cur.mark:cur.pos])
+        cur.mark = None
+        cur.expect(":")
+        if cur.peek() == "[":
+            cur.pos += 1
+            if key in JSON_RECORD_KEYS:
+                state["path"] = f"$.{key}"
+                yield from _iter_array(cur)
+                return
+            if fallback is None:
+                fallback, fallback_key = [], key
+                items = _iter_array(cur)
+                for item in items:
+                    fallback.append(item)
+                    if len(fallback) >= max_fallback:
+                        break
+                else:
+                    items = None
+                if items is not None:
+                    cur.skip_value(depth=1)  # resto del array sin decodificar
+            else:
+                cur.skip_value(depth=1)
+        else:
+            cur.skip_value()
+        if cur.expect(",}") == "}":
+            break
+
+    if fallback is not None:
+        state["path"] = f"$.{fallback_key}"
+        yield from fallback
+
+
+def stream_json_sample(chunks: Iterable[bytes], max_rows: int = 100,
+                       encoding: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Muestra de un JSON a partir de un iterador de bytes; deja de consumir en
+    cuanto hay `max_rows` registros del array elegido.
+
+    Devuelve {"rows", "path", "encoding", "bytes_read", "complete", "peak_buffer_bytes"}.
+    peak_buffer_bytes es el mayor tamaño que llegó a tener el buffer de texto
+    (aprox. bytes en UTF-8): la memoria del muestreo no depende del fichero.
+    """
+    counter = CountingIterator(chunks)
+    first = _read_prefix(counter)
+    encoding = encoding or detect_encoding(first)
+    if encoding == "utf-8":
+        encoding = "utf-8-sig"  # tolera BOM
+
+    state: Dict[str, Any] = {}
+    records = iter_json_records(itertools.chain([first], counter), encoding,
+                                max_fallback=max_rows + 1, state=state)
+    rows: List[Dict[str, Any]] = []
+    complete = True
+    for item in records:
+        if len(rows) >= max_rows:
+            complete = False
+            break
+        rows.append(item if isinstance(item, dict) else {"value": item})
+    records.close()
+
+    cur = state.get("cursor")
+    return {
+        "rows": rows,
+        "path": state.get("path"),
+        "encoding": encoding,
+        "bytes_read": counter.bytes_read,
+        "complete": complete,
+        "peak_buffer_bytes": cur.peak_buffer_chars if cur else 0,
+    }
@@ -0,0 +1,138 @@
+# core/tests/test_analysis_jobs.py
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core.models import AnalysisJob
+from core.services import analysis_jobs
+from core.utils import dataset_cache
+
+PARAMS = {"url": "https://x.es/d.csv", "format": "csv", "rows": -1, "profile": True, "ine_filters": {}}
+
+
+class AnalysisJobsTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        override = override_settings(
+            DATASET_CACHE={"BACKEND": "locmem"},
+            SINGLE_FLIGHT={"LOCK_DIR": tmp.name},
+            ANALYSIS_JOBS={"STALE_AFTER": 60, "MAX_ATTEMPTS": 2, "HEARTBEAT_INTERVAL": 0.05},
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        dataset_cache._backend = None
+        self.addCleanup(setattr, dataset_cache, "_backend", None)
+
+    def test_submit_reuses_pending_job(self):
+        job, created = analysis_jobs.submit(PARAMS)
+        self.assertTrue(created)
+        self.assertEqual(job.status, AnalysisJob.QUEUED)
+        again, created = analysis_jobs.submit(dict(reversed(list(PARAMS.items()))))
+        self.assertFalse(created)
+        self.assertEqual(again.pk, job.pk)
+        other, created = analysis_jobs.submit({**PARAMS, "profile": False})
+        self.assertTrue(created)
+        self.assertNotEqual(other.pk, job.pk)
+
+    def test_submit_served_from_cache(self):
+        key = dataset_cache.make_cache_key(analysis_jobs.NAMESPACE, PARAMS)
+        dataset_cache.store(analysis_jobs.NAMESPACE, key, {"schema": [], "sample_rows_count": 42})
+        job, created = analysis_jobs.submit(PARAMS)
+        self.assertTrue(created)
+        self.assertEqual((job.status, job.rows_parsed), (AnalysisJob.DONE, 42))
+        self.assertIsNotNone(job.finished_at)
+        self.assertIsNone(analysis_jobs.claim_next("w1"))
+
+    def test_claim_next_fifo_and_exclusive(self):
+        first, _ = analysis_jobs.submit(PARAMS)
+        second, _ = analysis_jobs.submit({**PARAMS, "url": "https://x.es/otro.csv"})
+        claimed = analysis_jobs.claim_next("w1")
+        self.assertEqual(claimed.pk, first.pk)
+        self.assertEqual((claimed.status, claimed.worker, claimed.attempts), (AnalysisJob.RUNNING, "w1", 1))
+        self.assertEqual(analysis_jobs.claim_next("w2").pk, second.pk)
+        self.assertIsNone(analysis_jobs.claim_next("w3"))
+
+    def test_claim_skips_job_taken_by_another_worker(self):
+        first, _ = analysis_jobs.submit(PARAMS)
+        second, _ = analysis_jobs.submit({**PARAMS, "url": "https://x.es/otro.csv"})
+        real_filter = AnalysisJob.objects.filter
+
+        def racing_filter(*args, **kwargs):
+            # Otro worker se adelanta justo entre la lectura de candidatos y el UPDATE
+            if kwargs.get("pk") == first.pk and kwargs.get("status") == AnalysisJob.QUEUED:
+                real_filter(pk=first.pk).update(status=AnalysisJob.RUNNING, worker="otro")
+            return real_filter(*args, **kwargs)
+
+        with mock.patch.object(AnalysisJob.objects, "filter", side_effect=racing_filter):
+            claimed = analysis_jobs.claim_next("w1")
+        self.assertEqual(claimed.pk, second.pk)
+        self.assertEqual(AnalysisJob.objects.get(pk=first.pk).worker, "otro")
+
+    def test_recover_stale(self):
+        old = timezone.now() - timedelta(seconds=300)
+        requeue, _ = analysis_jobs.submit({**PARAMS, "url": "https://x.es/1.csv"})
+        exhausted, _ = analysis_jobs.submit({**PARAMS, "url": "https://x.es/2.csv"})
+        cancelled, _ = analysis_jobs.submit({**PARAMS, "url": "https://x.es/3.csv"})
+        alive, _ = analysis_jobs.submit({**PARAMS, "url": "https://x.es/4.csv"})
+        running = dict(status=AnalysisJob.RUNNING, worker="muerto", heartbeat_at=old)
+        AnalysisJob.objects.filter(pk=requeue.pk).update(attempts=1, **running)
+        AnalysisJob.objects.filter(pk=exhausted.pk).update(attempts=2, **running)
+        AnalysisJob.objects.filter(pk=cancelled.pk).update(attempts=1, cancel_requested=True, **running)
+        AnalysisJob.objects.filter(pk=alive.pk).update(status=AnalysisJob.RUNNING, attempts=1,
+                                                       heartbeat_at=timezone.now())
+
+        self.assertEqual(analysis_jobs.recover_stale(), {"cancelled": 1, "failed": 1, "requeued": 1})
+        status = dict(AnalysisJob.objects.values_list("pk", "status"))
+        self.assertEqual(status[requeue.pk], AnalysisJob.QUEUED)
+        self.assertEqual(status[exhausted.pk], AnalysisJob.FAILED)
+        self.assertEqual(status[cancelled.pk], AnalysisJob.CANCELLED)
+        self.assertEqual(status[alive.pk], AnalysisJob.RUNNING)
+        self.assertEqual(AnalysisJob.objects.get(pk=requeue.pk).worker, "")
+        self.assertEqual(analysis_jobs.recover_stale(), {"cancelled": 0, "failed": 0, "requeued": 0})
+
+    def test_cancel_queued_and_running(self):
+        queued, _ = analysis_jobs.submit(PARAMS)
+        job = analysis_jobs.cancel(queued.pk)
+        self.assertEqual(job.status, AnalysisJob.CANCELLED)
+        self.assertIsNone(analysis_jobs.claim_next("w1"))
+
+        running, _ = analysis_jobs.submit({**PARAMS, "url": "https://x.es/otro.csv"})
+        analysis_jobs.claim_next("w1")
+        job = analysis_jobs.cancel(running.pk)
+        self.assertEqual((job.status, job.cancel_requested), (AnalysisJob.RUNNING, True))
+        self.assertIsNone(analysis_jobs.cancel("00000000-0000-0000-0000-000000000000"))
+
+    def test_run_job_done_is_cached(self):
+        analysis_jobs.submit(PARAMS)
+        job = analysis_jobs.claim_next("w1")
+        with mock.patch.object(analysis_jobs, "run_analysis", return_value={"schema": [], "sample_rows_count": 3}):
+            self.assertEqual(analysis_jobs.run_job(job), AnalysisJob.DONE)
+        job.refresh_from_db()
+        self.assertEqual(job.result, {"schema": [], "sample_rows_count": 3})
+        self.assertEqual(dataset_cache.lookup(job.params_key), (job.result, dataset_cache.FRESH))
+
+    def test_run_job_cancelled_while_running(self):
+        analysis_jobs.submit(PARAMS)
+        job = analysis_jobs.claim_next("w1")
+
+        def analysis(*args, progress=None, **kwargs):
+            analysis_jobs.cancel(job.pk)
+            return {"schema": []}
+
+        with mock.patch.object(analysis_jobs, "run_analysis", side_effect=analysis):
+            self.assertEqual(analysis_jobs.run_job(job), AnalysisJob.CANCELLED)
+        job.refresh_from_db()
+        self.assertIsNone(job.result)
+        self.assertEqual(dataset_cache.lookup(job.params_key)[1], dataset_cache.MISS)
+
+    def test_run_job_failure(self):
+        analysis_jobs.submit(PARAMS)
+        job = analysis_jobs.claim_next("w1")
+        with mock.patch.object(analysis_jobs, "run_analysis", side_effect=RuntimeError("404")):
+            self.assertEqual(analysis_jobs.run_job(job), AnalysisJob.FAILED)
+        job.refresh_from_db()
+        self.assertEqual(job.error, "404")
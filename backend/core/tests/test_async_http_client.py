@@ -0,0 +1,143 @@
+# core/tests/test_async_http_client.py
+import asyncio
+import tempfile
+from unittest import mock
+
+import aiohttp
+from django.test import SimpleTestCase, override_settings
+
+from core.services import async_http_client, dataset_analyzer, search_datasets, sparql_service
+from core.services.async_http_client import AsyncHTTPError
+from core.services.http_client import host_metrics
+from core.utils import dataset_cache
+
+
+class FakeResponse:
+    def __init__(self, status=200, body=b"{}"):
+        self.status = status
+        self.headers = {}
+        self.url = "https://example.org/x"
+        self.charset = "utf-8"
+        self._body = body
+
+    async def read(self):
+        if isinstance(self._body, Exception):
+            raise self._body
+        return self._body
+
+
+class FakeSession:
+    """Sesión aiohttp falsa: cada petición consume el siguiente resultado (excepción o FakeResponse)."""
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def request(self, method, url, **kwargs):
+        session = self
+
+        class _Ctx:
+            async def __aenter__(self):
+                session.calls += 1
+                outcome = session.outcomes.pop(0) if len(session.outcomes) > 1 else session.outcomes[0]
+                if isinstance(outcome, Exception):
+                    raise outcome
+                return outcome
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return _Ctx()
+
+
+@override_settings(HTTP_CLIENT={"RETRIES": 2, "BACKOFF_FACTOR": 0})
+class AsyncRequestErrorTests(SimpleTestCase):
+    def _run(self, outcomes, url="https://errors.example.org/x"):
+        session = FakeSession(outcomes)
+        with mock.patch.object(async_http_client, "get_session", return_value=session):
+            try:
+                return asyncio.run(async_http_client.get(url)), session
+            except AsyncHTTPError as e:
+                return e, session
+
+    def test_client_errors_are_wrapped_without_retry(self):
+        for error in (aiohttp.InvalidURL("nope"), aiohttp.ClientPayloadError("cuerpo cortado"),
+                      aiohttp.TooManyRedirects(mock.Mock(real_url="https://x"), ())):
+            result, session = self._run([error])
+            self.assertIsInstance(result, AsyncHTTPError, type(error).__name__)
+            self.assertIsInstance(result.__cause__, type(error))
+            self.assertEqual(session.calls, 1)
+
+    def test_payload_error_while_reading_body(self):
+        result, _ = self._run([FakeResponse(body=aiohttp.ClientPayloadError("truncado"))])
+        self.assertIsInstance(result, AsyncHTTPError)
+
+    def test_connection_errors_are_retried(self):
+        before = host_metrics("retry.example.org").snapshot()["errors"]
+        result, session = self._run([aiohttp.ClientConnectionError("reset")], "https://retry.example.org/x")
+        self.assertIsInstance(result, AsyncHTTPError)
+        self.assertEqual(session.calls, 3)
+        self.assertEqual(host_metrics("retry.example.org").snapshot()["errors"], before + 1)
+
+        result, session = self._run([asyncio.TimeoutError(), FakeResponse(body=b'{"ok": 1}')])
+        self.assertEqual(result.json(), {"ok": 1})
+        self.assertEqual(session.calls, 2)
+
+    def test_sparql_query_maps_to_runtime_error(self):
+        session = FakeSession([aiohttp.ClientPayloadError("x")])
+        with mock.patch.object(async_http_client, "get_session", return_value=session):
+            with self.assertRaises(RuntimeError):
+                asyncio.run(sparql_service.arun_sparql_query("SELECT 1"))
+
+
+class AsyncViewErrorTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        override = override_settings(
+            DATASET_CACHE={"BACKEND": "locmem"},
+            SINGLE_FLIGHT={"LOCK_DIR": tmp.name},
+            HTTP_CLIENT={"RETRIES": 0, "BACKOFF_FACTOR": 0},
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        dataset_cache._backend = None
+        self.addCleanup(setattr, dataset_cache, "_backend", None)
+
+    def test_search_upstream_error_gives_json_body(self):
+        session = FakeSession([aiohttp.TooManyRedirects(mock.Mock(real_url="https://x"), ())])
+        with mock.patch.object(async_http_client, "get_session", return_value=session), \
+                mock.patch.object(search_datasets.catalog_search, "search_by_title", return_value=None):
+            response = self.async_client.get("/api/async/search/title/", {"title": "paro"})
+            response = asyncio.run(response)
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.json()["success"], False)
+        self.assertIn("message", response.json())
+
+    def test_analyze_ine_uses_shared_analysis(self):
+        data = {"labels": ["2020"], "series": [{"name": "s", "data": [1]}], "sample_rows": [{"a": 1}]}
+        url = "https://servicios.ine.es/wstempus/js/ES/DATOS_TABLA/2852"
+        with mock.patch.object(dataset_analyzer, "aget_dataset_from_ine", return_value=data) as fetch, \
+                mock.patch("core.views.aresolve_ine_filters", return_value={}):
+            body = asyncio.run(self.async_client.get("/api/async/dataset/analyze/", {"url": url, "rows": 5})).json()
+        fetch.assert_awaited_once_with(url, sample_rows=5, filters={})
+        self.assertTrue(body["success"])
+        self.assertEqual(body["format_detected"], "ine-api")
+        self.assertEqual(body["suggestions"], [{"type": "table", "title": "Tabla INE 2852"}])
+
+    def test_analyze_ine_upstream_error(self):
+        url = "https://servicios.ine.es/wstempus/js/ES/DATOS_TABLA/2853"
+        with mock.patch.object(dataset_analyzer, "aget_dataset_from_ine", side_effect=AsyncHTTPError("caído")), \
+                mock.patch("core.views.aresolve_ine_filters", return_value={}):
+            response = asyncio.run(self.async_client.get("/api/async/dataset/analyze/", {"url": url}))
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.json(), {"success": False, "message": "Error al obtener datos: caído"})
+
+    def test_analyze_distribution_runs_sync_analysis_in_thread(self):
+        result = {"format_detected": "csv", "sample_rows": []}
+        with mock.patch.object(dataset_analyzer, "analyze_distribution_url", return_value=result) as analyze:
+            body = asyncio.run(self.async_client.get(
+                "/api/async/dataset/analyze/", {"url": "https://example.org/a.csv", "format": "csv", "rows": 3})).json()
+        self.assertEqual(body, {"success": True, **result})
+        self.assertEqual(analyze.call_args.kwargs["sample_rows"], 3)
+        self.assertEqual(analyze.call_args.kwargs["format_override"], "csv")
@@ -0,0 +1,199 @@
+# core/tests/test_batch_analysis.py
+import asyncio
+import json
+import tempfile
+import threading
+import time
+import zlib
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from core.services.batch_analysis import BatchError, parse_items
+from core.utils import dataset_cache
+
+
+class ParseItemsTests(SimpleTestCase):
+    def test_urls_objects_and_search_items(self):
+        search_item = {
+            "title": "Paro registrado",
+            "distribution": [
+                {"accessURL": "https://x.org/paro"},                                   # sin formato
+                {"accessURL": ["https://x.org/paro.px"], "format": {"value": "text/pc-axis"}},
+            ],
+        }
+        items = parse_items([" https://x.org/a.csv ", {"url": "https://x.org/b", "format": "JSON"},
+                             {"accessURL": "https://x.org/c"}, search_item,
+                             {"distribution": "https://x.org/d.xml"}])
+        self.assertEqual(items, [
+            {"index": 0, "url": "https://x.org/a.csv", "format": None},
+            {"index": 1, "url": "https://x.org/b", "format": "json"},
+            {"index": 2, "url": "https://x.org/c", "format": None},
+            {"index": 3, "url": "https://x.org/paro.px", "format": "pc-axis"},   # la primera con formato conocido
+            {"index": 4, "url": "https://x.org/d.xml", "format": None},
+        ])
+
+    def test_invalid_input(self):
+        for datasets in (None, [], "https://x.org/a.csv", ["https://x.org/a", 3],
+                         [{"title": "sin distribuciones"}], [{"url": "https://x.org/a", "format": "xlsx"}]):
+            with self.assertRaises(BatchError, msg=repr(datasets)):
+                parse_items(datasets)
+
+    @override_settings(BATCH_ANALYSIS={"MAX_ITEMS": 2})
+    def test_max_items(self):
+        with self.assertRaisesMessage(BatchError, "Como máximo 2"):
+            parse_items(["https://x.org/1", "https://x.org/2", "https://x.org/3"])
+
+
+class FakeAnalysis:
+    """
+    Sustituye a run_analysis / arun_analysis: la ruta de la URL indica el
+    comportamiento (".../slow": no termina hasta el final del test, "...fail":
+    sin datos, ".../wait-<ms>...": tarda esos milisegundos).
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.release = threading.Event()
+
+    def _delay(self, url):
+        name = url.rsplit("/", 1)[1]
+        return int(name.split("-")[1]) / 1000 if name.startswith("wait-") else 0
+
+    def _result(self, url, fmt, max_rows):
+        if url.endswith("fail"):
+            return None
+        return {"format_detected": fmt or "csv", "rows": max_rows, "sample_rows": [{"url": url}]}
+
+    def __call__(self, url, fmt, max_rows, options=None, progress=None):
+        self.calls.append((url, fmt, max_rows))
+        if url.endswith("/slow"):
+            self.release.wait(5)
+            return None
+        time.sleep(self._delay(url))
+        return self._result(url, fmt, max_rows)
+
+    async def acall(self, url, fmt, max_rows, options=None, progress=None):
+        self.calls.append((url, fmt, max_rows))
+        await asyncio.sleep(60 if url.endswith("/slow") else self._delay(url))
+        return self._result(url, fmt, max_rows)
+
+
+class ProcessDatasetsViewTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory(ignore_cleanup_errors=True)
+        self.addCleanup(tmp.cleanup)
+        override = override_settings(
+            DATASET_CACHE={"BACKEND": "locmem"},
+            SINGLE_FLIGHT={"LOCK_DIR": tmp.name},
+            BATCH_ANALYSIS={"MAX_ITEMS": 10, "CONCURRENCY": 4, "ITEM_TIMEOUT": 0.3},
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        dataset_cache._backend = None
+        self.addCleanup(setattr, dataset_cache, "_backend", None)
+
+        self.fake = FakeAnalysis()
+        self.addCleanup(self.fake.release.set)   # antes de borrar el directorio de locks
+        for name, target in (("run_analysis", self.fake), ("arun_analysis", self.fake.acall)):
+            patcher = mock.patch(f"core.views.{name}", target)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _post(self, body, path="/api/process-datasets/", **extra):
+        return self.client.post(path, json.dumps(body), content_type="application/json", **extra)
+
+    def _apost(self, body, headers=None):
+        async def run():
+            response = await self.async_client.post("/api/async/process-datasets/", json.dumps(body),
+                                                    content_type="application/json", headers=headers)
+            chunks = [c async for c in response.streaming_content] if response.streaming else None
+            return response, chunks
+        return asyncio.run(run())
+
+    def _assert_batch_shape(self, body):
+        self.assertEqual(set(body), {"success", "processed_datasets", "errors", "elapsed_ms"})
+        self.assertTrue(body["success"])
+        done = body["processed_datasets"] + body["errors"]
+        for r in done:
+            self.assertLessEqual({"index", "url", "success", "elapsed_ms"}, set(r))
+        self.assertEqual([r["index"] for r in body["processed_datasets"]],
+                         sorted(r["index"] for r in body["processed_datasets"]))
+
+    def test_normalised_items_reach_the_analysis(self):
+        datasets = ["https://x.org/a", {"url": "https://x.org/b", "format": "csv"},
+                    {"title": "T", "distribution": [{"accessURL": "https://x.org/c", "format": "application/json"}]}]
+        body = self._post({"datasets": datasets, "rows": 5}).json()
+        self._assert_batch_shape(body)
+        self.assertEqual(sorted(self.fake.calls), [("https://x.org/a", "", 5), ("https://x.org/b", "csv", 5),
+                                                   ("https://x.org/c", "json", 5)])
+        self.assertEqual([r["data"]["format_detected"] for r in body["processed_datasets"]], ["csv", "csv", "json"])
+
+        self.fake.calls = []
+        self._post({"datasets": ["https://x.org/all"], "rows": -1})
+        self.assertEqual(self.fake.calls, [("https://x.org/all", "", None)])
+
+    def test_bad_requests(self):
+        for body in ({"datasets": []}, {"datasets": [{"url": "https://x.org/a", "format": "xlsx"}]}, ["x"]):
+            response = self._post(body)
+            self.assertEqual(response.status_code, 400, body)
+            self.assertFalse(response.json()["success"])
+        response = self.client.post("/api/process-datasets/", b"{nope", content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_per_item_deadline_and_errors(self):
+        started = time.monotonic()
+        body = self._post({"datasets": ["https://x.org/ok", "https://x.org/slow", "https://x.org/fail"]}).json()
+        self.assertLess(time.monotonic() - started, 2)   # no espera a la lenta
+        self._assert_batch_shape(body)
+        self.assertEqual([r["url"] for r in body["processed_datasets"]], ["https://x.org/ok"])
+        errors = {r["url"]: r for r in body["errors"]}
+        self.assertEqual(errors["https://x.org/slow"]["status"], 504)
+        self.assertEqual(errors["https://x.org/slow"]["message"], "Tiempo agotado (0.3s)")
+        self.assertEqual(errors["https://x.org/fail"]["status"], 500)
+
+    def test_async_per_item_deadline(self):
+        started = time.monotonic()
+        response, _ = self._apost({"datasets": ["https://x.org/ok", "https://x.org/slow", "https://x.org/fail"]})
+        self.assertLess(time.monotonic() - started, 2)
+        body = response.json()
+        self._assert_batch_shape(body)
+        self.assertEqual([r["url"] for r in body["processed_datasets"]], ["https://x.org/ok"])
+        self.assertEqual({r["url"]: r["status"] for r in body["errors"]},
+                         {"https://x.org/slow": 504, "https://x.org/fail": 500})
+
+    def _assert_stream(self, response, chunks, gzipped):
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertEqual(response.get("Content-Encoding"), "gzip" if gzipped else None)
+        if gzipped:
+            d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            chunks = [d.decompress(c) for c in chunks]
+            self.assertTrue(d.eof)
+        lines = [c for c in chunks if c]
+        # una línea completa por trozo, en orden de finalización
+        self.assertTrue(all(c.endswith(b"\n") and c.count(b"\n") == 1 for c in lines), lines)
+        results = [json.loads(c) for c in lines]
+        self.assertEqual([r["index"] for r in results], [1, 2, 0])
+        self.assertEqual([r["success"] for r in results], [True, False, True])
+        self.assertEqual(results[0]["data"]["sample_rows"], [{"url": "https://x.org/wait-0"}])
+
+    def test_stream_is_incremental(self):
+        datasets = ["https://x.org/wait-200", "https://x.org/wait-0", "https://x.org/wait-100-fail"]
+        for encoding in ("", "gzip"):
+            dataset_cache._backend = None
+            response = self._post({"datasets": datasets, "stream": True}, HTTP_ACCEPT_ENCODING=encoding)
+            self._assert_stream(response, list(response.streaming_content), bool(encoding))
+        # también con ?stream=1 y con Accept: application/x-ndjson
+        response = self.client.post("/api/process-datasets/?stream=1", json.dumps({"datasets": datasets}),
+                                    content_type="application/json")
+        self.assertTrue(response.streaming)
+        response = self._post({"datasets": datasets}, HTTP_ACCEPT="application/x-ndjson")
+        self.assertTrue(response.streaming)
+
+    def test_async_stream_is_incremental(self):
+        datasets = ["https://x.org/wait-200", "https://x.org/wait-0", "https://x.org/wait-100-fail"]
+        for encoding in ("", "gzip"):
+            dataset_cache._backend = None
+            response, chunks = self._apost({"datasets": datasets, "stream": True},
+                                          headers={"Accept-Encoding": encoding})
+            self._assert_stream(response, chunks, bool(encoding))
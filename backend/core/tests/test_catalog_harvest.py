@@ -0,0 +1,61 @@
+# core/tests/test_catalog_harvest.py
+import re
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from core.services import catalog_harvest
+
+
+def _literal(value, lang=""):
+    return {"type": "literal", "value": value, **({"xml:lang": lang} if lang else {})}
+
+
+class FakeSparql:
+    """Responde con las filas de cada consulta respetando LIMIT/OFFSET, como Virtuoso."""
+
+    def __init__(self, keywords_per_dataset: int, datasets: int = 3):
+        self.datasets = [f"http://datos.gob.es/catalogo/d{i}" for i in range(datasets)]
+        self.keywords = keywords_per_dataset
+        self.queries = []
+
+    def rows(self, query):
+        if "dcat:keyword" in query:
+            return [{"dataset": _literal(d), "value": _literal(f"k{j:05d}"), "lang": _literal("")}
+                    for d in self.datasets for j in range(self.keywords)]
+        if "?identifier" in query:
+            return [{"dataset": _literal(d), "identifier": _literal(d[-2:])} for d in self.datasets]
+        return []
+
+    def __call__(self, query, timeout=None):
+        self.queries.append(query)
+        limit = int(re.search(r"LIMIT (\d+) OFFSET", query).group(1))
+        offset = int(re.search(r"OFFSET (\d+)\s*$", query).group(1))
+        return {"results": {"bindings": self.rows(query)[offset:offset + limit]}}
+
+
+class BindingsPagingTests(SimpleTestCase):
+    def test_facets_beyond_max_rows_are_paged(self):
+        server = FakeSparql(keywords_per_dataset=4000)     # 12.000 filas > SPARQL_MAX_ROWS
+        with mock.patch.object(catalog_harvest, "run_sparql_query", side_effect=server):
+            records = catalog_harvest.fetch_sparql_records("VALUES ?dataset { }", facets=["keywords"])
+        self.assertEqual(len(records), 3)
+        self.assertTrue(all(len(r["keywords"]) == 4000 for r in records))
+        keyword_queries = [q for q in server.queries if "dcat:keyword" in q]
+        self.assertEqual(len(keyword_queries), 2)
+        self.assertIn("ORDER BY ?dataset ?value", keyword_queries[0])
+
+    def test_exact_multiple_needs_one_extra_page(self):
+        server = FakeSparql(keywords_per_dataset=catalog_harvest.SPARQL_MAX_ROWS // 2, datasets=2)
+        with mock.patch.object(catalog_harvest, "run_sparql_query", side_effect=server):
+            rows = catalog_harvest._bindings("SELECT ?dataset ?value WHERE { ?dataset dcat:keyword ?value }",
+                                             60, "?dataset ?value")
+        self.assertEqual(len(rows), catalog_harvest.SPARQL_MAX_ROWS)
+        self.assertEqual(len(server.queries), 2)
+
+    def test_small_facet_single_query(self):
+        server = FakeSparql(keywords_per_dataset=3)
+        with mock.patch.object(catalog_harvest, "run_sparql_query", side_effect=server):
+            records = catalog_harvest.fetch_sparql_records("VALUES ?dataset { }", facets=["keywords"])
+        self.assertEqual([r["identifier"] for r in records], ["d0", "d1", "d2"])
+        self.assertEqual(len([q for q in server.queries if "dcat:keyword" in q]), 1)
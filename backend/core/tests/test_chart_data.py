@@ -0,0 +1,123 @@
+# core/tests/test_chart_data.py
+import math
+
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase
+
+from core.services import chart_data
+from core.services.chart_data import OTHERS_LABEL, categorical_chart, lttb_indices, minmax_indices
+
+
+def reference_lttb(x, y, n_out):
+    # LTTB punto a punto, tal cual el algoritmo original (Steinarsson, 2013);
+    # la última cubeta acaba siempre en n - 1 aunque el redondeo diga otra cosa
+    n = len(x)
+    every = (n - 2) / (n_out - 2)
+
+    def bound(k):
+        return {n_out - 2: n - 1, n_out - 1: n}.get(k, math.floor(k * every) + 1)
+
+    out, a = [0], 0
+    for i in range(n_out - 2):
+        lo, hi = bound(i + 1), bound(i + 2)
+        avg_x = sum(x[lo:hi]) / (hi - lo)
+        avg_y = sum(y[lo:hi]) / (hi - lo)
+        best, best_area = None, -1.0
+        for j in range(bound(i), bound(i + 1)):
+            area = abs((x[a] - avg_x) * (y[j] - y[a]) - (x[a] - x[j]) * (avg_y - y[a]))
+            if area > best_area:
+                best, best_area = j, area
+        out.append(best)
+        a = best
+    out.append(n - 1)
+    return out
+
+
+class LttbTests(SimpleTestCase):
+    def test_matches_reference(self):
+        rng = np.random.default_rng(7)
+        for n, n_out in ((1000, 50), (997, 100), (50, 3), (200, 199)):
+            x = np.sort(rng.uniform(0, 1000, n))
+            y = np.cumsum(rng.normal(size=n))
+            self.assertEqual(lttb_indices(x, y, n_out).tolist(), reference_lttb(x.tolist(), y.tolist(), n_out),
+                             (n, n_out))
+
+    def test_keeps_ends_and_spike(self):
+        x = np.arange(1000, dtype=float)
+        y = np.zeros(1000)
+        y[437] = 100.0
+        idx = lttb_indices(x, y, 20)
+        self.assertEqual(len(idx), 20)
+        self.assertEqual((idx[0], idx[-1]), (0, 999))
+        self.assertIn(437, idx)
+        self.assertTrue(np.all(np.diff(idx) > 0))
+
+    def test_short_series_untouched(self):
+        x = np.arange(10, dtype=float)
+        self.assertEqual(lttb_indices(x, x, 10).tolist(), list(range(10)))
+        self.assertEqual(lttb_indices(x, x, 2).tolist(), list(range(10)))
+
+
+class MinMaxTests(SimpleTestCase):
+    def test_bucket_extremes(self):
+        rng = np.random.default_rng(3)
+        y = rng.normal(size=1000)
+        n_out = 40
+        idx = minmax_indices(y, n_out)
+        buckets = np.arange(1000) * (n_out // 2) // 1000
+        expected = {0, 999}
+        for b in range(n_out // 2):
+            members = np.flatnonzero(buckets == b)
+            expected.update((int(members[np.argmin(y[members])]), int(members[np.argmax(y[members])])))
+        self.assertEqual(idx.tolist(), sorted(expected))
+        self.assertLessEqual(len(idx), n_out + 2)
+
+    def test_short_series_untouched(self):
+        y = np.arange(5, dtype=float)
+        self.assertEqual(minmax_indices(y, 10).tolist(), list(range(5)))
+
+    def test_downsample_drops_nan(self):
+        y = np.arange(100, dtype=float)
+        y[::10] = np.nan
+        idx = chart_data.downsample(np.arange(100, dtype=float), y, 20, "minmax")
+        self.assertFalse(np.isnan(y[idx]).any())
+        self.assertEqual(chart_data.downsample(np.arange(100, dtype=float), y, 20, "none").tolist(),
+                         np.flatnonzero(~np.isnan(y)).tolist())
+
+
+class CategoricalChartTests(SimpleTestCase):
+    keys = pd.Categorical(["a", "b", "c", "d", "a", "c", "d", "d", "e"])
+    values = np.array([5.0, 1.0, 2.0, 1.0, 5.0, 2.0, 1.0, 1.0, np.nan])
+
+    def _chart(self, agg, top):
+        return categorical_chart(self.keys, self.values, {"agg": agg, "top": top})
+
+    def test_top_and_others_sum(self):
+        chart = self._chart("sum", 2)
+        self.assertEqual(chart["labels"], ["a", "c", OTHERS_LABEL])
+        self.assertEqual(chart["values"], [10.0, 4.0, 4.0])
+        self.assertEqual(chart["categories_total"], 5)
+        self.assertEqual(chart["others"], {"label": OTHERS_LABEL, "categories": 3, "value": 4.0})
+
+    def test_others_mean_uses_rows_not_means(self):
+        # b = 1 (1 fila), d = 1 (3 filas), e sin valor: la media de "Otros" es 4 / 4
+        chart = self._chart("mean", 2)
+        self.assertEqual(chart["labels"][-1], OTHERS_LABEL)
+        self.assertEqual(chart["others"]["value"], 1.0)
+        chart = categorical_chart(pd.Categorical(["a", "b", "b", "c"]), np.array([9.0, 1.0, 3.0, 8.0]),
+                                  {"agg": "mean", "top": 1})
+        self.assertEqual(chart["labels"], ["a", OTHERS_LABEL])
+        self.assertEqual(chart["others"]["value"], 4.0)
+
+    def test_others_count_min_max(self):
+        self.assertEqual(self._chart("count", 1)["others"]["value"], 6.0)   # todo menos las 3 filas de "d"
+        self.assertEqual(self._chart("min", 1)["others"]["value"], 1.0)
+        self.assertEqual(self._chart("max", 1)["others"]["value"], 2.0)
+
+    def test_no_others_when_top_covers_all(self):
+        for top in (0, 5, 10):
+            chart = self._chart("sum", top)
+            self.assertIsNone(chart["others"])
+            self.assertNotIn(OTHERS_LABEL, chart["labels"])
+        self.assertIsNone(self._chart("sum", 0)["values"][-1])   # "e" sólo tiene NaN
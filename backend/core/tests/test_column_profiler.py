@@ -0,0 +1,164 @@
+# core/tests/test_column_profiler.py
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+
+from core.services import column_profiler, dataset_analyzer
+from core.services.column_profiler import DatasetProfiler, HeavyHitters, HyperLogLog, KLLSketch, RunningMoments
+from core.services.geo_index import GeoIndex
+
+
+class RunningMomentsTests(SimpleTestCase):
+    def test_batches_match_numpy(self):
+        rng = np.random.default_rng(0)
+        values = rng.normal(50, 12, 10_000)
+        moments = RunningMoments()
+        for batch in np.array_split(values, 17):
+            moments.update(batch)
+        self.assertEqual(moments.count, len(values))
+        self.assertAlmostEqual(moments.mean, values.mean(), places=9)
+        self.assertAlmostEqual(moments.variance, values.var(ddof=1), places=6)
+        self.assertEqual((moments.min, moments.max), (values.min(), values.max()))
+
+    def test_weights_equal_repetition(self):
+        values, weights = np.array([1.0, 2.0, 10.0]), np.array([3, 1, 2])
+        weighted, repeated = RunningMoments(), RunningMoments()
+        weighted.update(values, weights)
+        repeated.update(np.repeat(values, weights))
+        self.assertAlmostEqual(weighted.mean, repeated.mean)
+        self.assertAlmostEqual(weighted.variance, repeated.variance)
+
+    def test_empty_and_single(self):
+        moments = RunningMoments()
+        self.assertIsNone(moments.to_dict()["mean"])
+        moments.update(np.array([4.0]))
+        self.assertEqual((moments.mean, moments.variance), (4.0, None))
+
+
+class KLLSketchTests(SimpleTestCase):
+    def test_rank_error_is_small(self):
+        rng = np.random.default_rng(1)
+        values = rng.lognormal(3, 1, 200_000)
+        sketch = KLLSketch(k=200)
+        for batch in np.array_split(values, 20):
+            sketch.update(batch)
+        self.assertEqual(sketch.n, len(values))
+        self.assertLess(sketch.retained, 2_000)
+        ordered = np.sort(values)
+        qs = [0.01, 0.25, 0.5, 0.75, 0.99]
+        for q, estimate in zip(qs, sketch.quantiles(qs)):
+            rank = np.searchsorted(ordered, estimate) / len(values)
+            self.assertLess(abs(rank - q), 0.02, q)
+
+    def test_small_input_is_exact(self):
+        sketch = KLLSketch(k=200)
+        sketch.update(np.arange(1, 101, dtype=float))
+        self.assertEqual(sketch.quantiles([0.0, 0.5, 1.0]), [1.0, 50.0, 100.0])
+        self.assertEqual(KLLSketch().quantiles([0.5]), [None])
+
+    def test_deterministic(self):
+        values = np.random.default_rng(2).random(50_000)
+        a, b = KLLSketch(), KLLSketch()
+        a.update(values)
+        b.update(values)
+        self.assertEqual(a.quantiles([0.1, 0.9]), b.quantiles([0.1, 0.9]))
+
+
+class HyperLogLogTests(SimpleTestCase):
+    def test_large_cardinality(self):
+        hll = HyperLogLog(p=14)
+        for start in range(0, 200_000, 50_000):
+            hll.update([f"id-{i}" for i in range(start, start + 50_000)])
+        hll.update([f"id-{i}" for i in range(1_000)])     # repetidos: no cuentan
+        self.assertLess(abs(hll.count() - 200_000) / 200_000, 0.03)
+
+    def test_small_cardinality_linear_counting(self):
+        hll = HyperLogLog(p=14)
+        hll.update(["a", "b", "c", "a", "b"] * 100)
+        self.assertEqual(hll.count(), 3)
+        self.assertEqual(HyperLogLog().count(), 0)
+
+    def test_bit_length(self):
+        x = np.array([0, 1, 2, 3, 2 ** 32 - 1, 2 ** 32, 2 ** 63], dtype=np.uint64)
+        self.assertEqual(HyperLogLog._bit_length(x).tolist(), [0, 1, 2, 2, 32, 33, 64])
+
+
+class HeavyHittersTests(SimpleTestCase):
+    def test_frequent_values_survive(self):
+        rng = np.random.default_rng(3)
+        stream = np.concatenate([np.repeat(["madrid", "sevilla", "bilbao"], [5000, 3000, 2000]),
+                                 np.array([f"raro-{i}" for i in rng.integers(0, 50_000, 20_000)])])
+        rng.shuffle(stream)
+        hh = HeavyHitters(capacity=20)
+        for batch in np.array_split(stream, 30):
+            values, counts = np.unique(batch, return_counts=True)
+            hh.update(values.tolist(), counts)
+        top = hh.top(3)
+        self.assertEqual([t["value"] for t in top], ["madrid", "sevilla", "bilbao"])
+        exact = {"madrid": 5000, "sevilla": 3000, "bilbao": 2000}
+        for t in top:
+            # cota inferior con error como mucho `error`, y error <= n / (capacity + 1)
+            self.assertLessEqual(t["count"], exact[t["value"]])
+            self.assertGreaterEqual(t["count"], exact[t["value"]] - hh.error)
+        self.assertLessEqual(hh.error, len(stream) / 21)
+        self.assertLessEqual(len(hh.counters), 20)
+
+
+class DatasetProfilerTests(SimpleTestCase):
+    def test_profile_in_batches(self):
+        conf = {**column_profiler.DEFAULTS, "BATCH_ROWS": 100}
+        rows = [{"Provincia": ["Madrid", "Sevilla", "Valencia"][i % 3], "Valor": str(i),
+                 **({"Tarde": "x"} if i >= 250 else {})} for i in range(1000)]
+        profiler = DatasetProfiler(GeoIndex.seed(), conf)
+        profiler.consume(iter(rows))
+        profile = {c["name"]: c for c in profiler.to_dict()["columns"]}
+        self.assertEqual(profiler.rows, 1000)
+        self.assertEqual(profile["Valor"]["inferred_type"], "numeric")
+        self.assertAlmostEqual(profile["Valor"]["mean"], 499.5)
+        self.assertAlmostEqual(profile["Valor"]["distinct_estimate"], 1000, delta=20)
+        self.assertEqual(profile["Provincia"]["inferred_type"], "geo_name")
+        self.assertEqual(profile["Provincia"]["top_values"][0], {"value": "Madrid", "count": 334})
+        self.assertEqual((profile["Tarde"]["count"], profile["Tarde"]["nulls"]), (750, 250))
+
+
+class _FakeProbe:
+    """Lo mínimo de ProbedDistribution que usa profile_distribution."""
+
+    def __init__(self, body: bytes, chunk: int = 256):
+        self.body = body
+        self.chunk = chunk
+        self.bytes_downloaded = 0
+        self.round_trips = 1
+
+    def iter_chunks(self):
+        for i in range(0, len(self.body), self.chunk):
+            self.bytes_downloaded += len(self.body[i:i + self.chunk])
+            yield self.body[i:i + self.chunk]
+
+    def close(self):
+        pass
+
+
+class ProfileDistributionTests(SimpleTestCase):
+    body = b"id;valor\n" + b"".join(b"%d;%d\n" % (i, i * 2) for i in range(50_000))
+
+    def test_complete(self):
+        profiler = dataset_analyzer.profile_distribution(_FakeProbe(self.body), "csv", sample_rows=10)
+        self.assertTrue(profiler.meta["complete"])
+        self.assertEqual(profiler.rows, 50_000)
+        self.assertEqual(len(profiler.sample), 10)
+
+    def test_byte_limit_while_reading_sample(self):
+        with override_settings(DATASET_PROFILE={"MAX_BYTES": 100_000, "BATCH_ROWS": 20_000}):
+            # El límite salta antes de completar la muestra (unas 8.000 filas)
+            profiler = dataset_analyzer.profile_distribution(_FakeProbe(self.body, 4096), "csv", sample_rows=20_000)
+        self.assertFalse(profiler.meta["complete"])
+        self.assertGreater(len(profiler.sample), 0)
+        self.assertEqual(profiler.rows, len(profiler.sample))
+
+    def test_byte_limit_after_sample(self):
+        with override_settings(DATASET_PROFILE={"MAX_BYTES": 200_000, "BATCH_ROWS": 100}):
+            profiler = dataset_analyzer.profile_distribution(_FakeProbe(self.body, 4096), "csv", sample_rows=10)
+        self.assertFalse(profiler.meta["complete"])
+        self.assertEqual(len(profiler.sample), 10)
+        self.assertGreater(profiler.rows, 10)
+        self.assertLess(profiler.rows, 50_000)
@@ -0,0 +1,72 @@
+# core/tests/test_columnar_store.py
+import tempfile
+
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase, override_settings
+
+from core.services import columnar_store
+
+
+def _rows():
+    rows = []
+    for i in range(23):
+        rows.append({
+            "anio": str(2000 + i),
+            "valor": ["1.50", "2.5", "1e3", ""][i % 4],
+            "ratio": ["0.25", "3", "", "-7.125"][i % 4],
+            "total": "" if i % 5 == 0 else str(i * 10),
+            "cp": f"{i:05d}",
+            "provincia": ["Madrid", "Sevilla", "Ávila"][i % 3],
+        })
+    rows[17]["extra"] = "tarde"   # columna que aparece en un lote posterior
+    return rows
+
+
+class ColumnarRoundTripTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        settings = override_settings(COLUMNAR_STORE={"DIRECTORY": tmp.name, "WRITE_BATCH_ROWS": 4})
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def _write(self, rows):
+        key = columnar_store.table_key("https://example.org/datos.csv")
+        columnar_store.write_table(key, rows, {"format": "csv"})
+        return columnar_store.open_table(key)
+
+    def test_rows_come_back_unchanged(self):
+        rows = _rows()
+        table = self._write(rows)
+        self.assertEqual(table.num_rows, len(rows))
+        expected = [{name: row.get(name, "") for name in table.columns} for row in rows]
+        self.assertEqual(list(table.iter_rows(batch=5)), expected)
+        self.assertEqual(table.head(2), expected[:2])
+
+    def test_column_kinds(self):
+        table = self._write(_rows())
+        kinds = {name: table.kind(name) for name in table.columns}
+        self.assertEqual(kinds, {"anio": "int", "valor": "str", "ratio": "float", "total": "int",
+                                 "cp": "str", "provincia": "str", "extra": "str"})
+        self.assertEqual(table.column("anio").dtype, np.int64)
+        total = table.column("total")
+        self.assertIsInstance(total, pd.arrays.IntegerArray)
+        self.assertTrue(pd.isna(total[0]))
+        self.assertEqual(int(total[1]), 10)
+        provincia = table.column("provincia")
+        self.assertEqual(list(provincia.categories), ["Madrid", "Sevilla", "Ávila"])
+        self.assertEqual(list(provincia[:4]), ["Madrid", "Sevilla", "Ávila", "Madrid"])
+
+    def test_numbers_that_do_not_round_trip_stay_text(self):
+        for values in (["2020", "2020.0"], ["1.50"], ["1e3"], ["007"], ["nan"], [" 5"]):
+            rows = [{"x": v} for v in values]
+            table = self._write(rows)
+            self.assertEqual(table.kind("x"), "str", values)
+            self.assertEqual([r["x"] for r in table.iter_rows()], values)
+
+    def test_later_text_batch_turns_numeric_column_into_text(self):
+        rows = [{"x": str(i)} for i in range(9)] + [{"x": "n/d"}]
+        table = self._write(rows)
+        self.assertEqual(table.kind("x"), "str")
+        self.assertEqual([r["x"] for r in table.iter_rows()], [r["x"] for r in rows])
@@ -0,0 +1,91 @@
+# core/tests/test_correlation.py
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase
+
+from core.services import correlation
+from core.services.correlation import lagged_corr, pairwise_corr
+
+
+def _matrix(seed=11, rows=60, cols=5):
+    rng = np.random.default_rng(seed)
+    base = rng.normal(size=(rows, 1))
+    m = base + rng.normal(scale=[0.2, 0.5, 1.0, 3.0, 0.1][:cols], size=(rows, cols))
+    m[rng.random((rows, cols)) < 0.2] = np.nan   # huecos distintos en cada serie
+    m[:50, -1] = np.nan                           # la última, con sólo 10 datos
+    return m
+
+
+class PairwiseCorrTests(SimpleTestCase):
+    def test_matches_dataframe_corr(self):
+        m = _matrix()
+        for min_periods in (2, 12):
+            r, n = pairwise_corr(m, m, min_periods)
+            frame = pd.DataFrame(m)
+            np.testing.assert_allclose(r, frame.corr(min_periods=min_periods).to_numpy(), atol=1e-10, equal_nan=True)
+            present = frame.notna().astype(int).to_numpy()
+            np.testing.assert_array_equal(n, present.T @ present)
+
+    def test_rectangular_blocks(self):
+        m = _matrix(cols=4)
+        r, _ = pairwise_corr(m[:, :1], m[:, 1:], 2)
+        expected = [pd.Series(m[:, 0]).corr(pd.Series(m[:, j])) for j in (1, 2, 3)]
+        np.testing.assert_allclose(r[0], expected, atol=1e-10)
+
+    def test_constant_and_large_offset(self):
+        m = _matrix(cols=3)
+        m[:, 1] = 7.0
+        m[:, 2] = m[:, 0] * 1e-3 + 1e9   # relación lineal exacta con un desplazamiento enorme
+        r, _ = pairwise_corr(m, m, 2)
+        self.assertTrue(np.isnan(r[0, 1]) and np.isnan(r[1, 1]))
+        self.assertAlmostEqual(r[0, 2], 1.0, places=8)   # DataFrame.corr da 1.0000037 aquí
+
+    def test_lagged_against_shifted_frame(self):
+        m = _matrix(cols=3)
+        lags, stack = lagged_corr(m, 2, 5)
+        self.assertEqual(lags.tolist(), [-2, -1, 0, 1, 2])
+        frame = pd.DataFrame(m)
+        for pos, lag in enumerate(lags):
+            for i in range(3):
+                for j in range(3):
+                    expected = frame[i].corr(frame[j].shift(-lag), min_periods=5)
+                    self.assertTrue(np.isclose(stack[pos, i, j], expected, atol=1e-10, equal_nan=True), (lag, i, j))
+
+
+def _fake_blocks(sources):
+    # Cada url da un bloque mensual con tantas series como indica su nombre
+    blocks = []
+    for s in sources:
+        seed, width = (int(p) for p in s["url"].rsplit("/", 1)[1].split("-"))
+        rng = np.random.default_rng(seed)
+        keys = pd.date_range("2015-01-01", periods=36 + seed, freq="MS")
+        values = rng.normal(size=(len(keys), width)).cumsum(axis=0)
+        blocks.append((keys, values, [f"{s['url']}#{k}" for k in range(width)]))
+    return blocks
+
+
+class ReorderTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(correlation, "load_blocks", side_effect=_fake_blocks)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _request(self, urls):
+        return correlation.parse_request({"series": [{"url": u, "x": "fecha", "y": "valor"} for u in urls],
+                                          "max_lag": 2, "min_periods": 3})
+
+    def test_reordered_result_equals_direct_computation(self):
+        for urls in (["https://x.org/3-1", "https://x.org/1-2", "https://x.org/2-1"],
+                     ["https://x.org/2-1", "https://x.org/3-1", "https://x.org/2-1"]):   # fuente repetida
+            request = self._request(urls)
+            canonical = correlation._cache_params(request)
+            result = correlation._reorder(correlation.compute(canonical), canonical["sources"], request["sources"])
+            self.assertEqual(result, correlation.compute(request), urls)
+
+    def test_canonical_order_returns_same_object(self):
+        request = self._request(["https://x.org/1-2", "https://x.org/2-1"])
+        canonical = correlation._cache_params(request)
+        result = correlation.compute(canonical)
+        self.assertIs(correlation._reorder(result, canonical["sources"], canonical["sources"]), result)
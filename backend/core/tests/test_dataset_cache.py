@@ -0,0 +1,138 @@
+# core/tests/test_dataset_cache.py
+import os
+import tempfile
+import time
+
+from django.test import SimpleTestCase, override_settings
+
+from core.utils import dataset_cache
+from core.utils.dataset_cache import (
+    FRESH, MISS, STALE, CacheEntry, FileSystemBackend, LocMemLRUBackend,
+)
+
+
+def _entry(payload: bytes = b"x", created_at: float = None, ttl: int = 60, stale_ttl: int = 60) -> CacheEntry:
+    return CacheEntry(payload, time.time() if created_at is None else created_at, ttl, stale_ttl)
+
+
+class CacheKeyTests(SimpleTestCase):
+    def test_stable_and_distinct(self):
+        a = dataset_cache.make_cache_key("search", {"q": "a b", "page": 1})
+        self.assertEqual(a, dataset_cache.make_cache_key("search", {"page": 1, "q": "a b"}))
+        self.assertNotEqual(a, dataset_cache.make_cache_key("search", {"q": "a-b", "page": 1}))
+        self.assertNotEqual(dataset_cache.make_cache_key("search", "Málaga"),
+                            dataset_cache.make_cache_key("search", "malaga"))
+        self.assertTrue(a.startswith("search-"))
+
+    def test_serialization_round_trip(self):
+        data = {"a": [1, 2.5, None], "b": "ñ"}
+        for compress in (True, False):
+            self.assertEqual(dataset_cache.loads(dataset_cache.dumps(data, "json", compress)), data)
+
+
+class CacheEntryTests(SimpleTestCase):
+    def test_states(self):
+        now = time.time()
+        self.assertEqual(_entry(created_at=now - 10).state(now), FRESH)
+        self.assertEqual(_entry(created_at=now - 90).state(now), STALE)
+        self.assertEqual(_entry(created_at=now - 130).state(now), MISS)
+
+    def test_bytes_round_trip(self):
+        entry = _entry(b"line1\nline2")
+        again = CacheEntry.from_bytes(entry.to_bytes())
+        self.assertEqual((again.blob, again.created_at, again.ttl, again.stale_ttl),
+                         (entry.blob, entry.created_at, entry.ttl, entry.stale_ttl))
+
+
+class LocMemBackendTests(SimpleTestCase):
+    def test_lru_eviction_by_entries(self):
+        backend = LocMemLRUBackend(max_entries=2, max_bytes=1000)
+        backend.set("a", _entry())
+        backend.set("b", _entry())
+        backend.get("a")                # "a" pasa a ser la más reciente
+        backend.set("c", _entry())
+        self.assertIsNotNone(backend.get("a"))
+        self.assertIsNone(backend.get("b"))
+        self.assertIsNotNone(backend.get("c"))
+
+    def test_byte_accounting_on_overwrite(self):
+        backend = LocMemLRUBackend(max_entries=10, max_bytes=10)
+        backend.set("a", _entry(b"12345678"))
+        backend.set("a", _entry(b"12345678"))
+        self.assertIsNotNone(backend.get("a"))
+        self.assertEqual(backend._bytes, 8)
+        backend.delete("a")
+        self.assertEqual(backend._bytes, 0)
+
+
+class FileSystemBackendTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_get_set_delete(self):
+        backend = FileSystemBackend(self.tmp.name, 10, 10_000)
+        self.assertIsNone(backend.get("k"))
+        backend.set("k", _entry(b"payload"))
+        self.assertEqual(backend.get("k").blob, b"payload")
+        backend.delete("k")
+        self.assertIsNone(backend.get("k"))
+
+    def test_overwrite_does_not_inflate_counters(self):
+        backend = FileSystemBackend(self.tmp.name, 10, 10_000)
+        backend.set("k", _entry(b"a" * 100))
+        for _ in range(20):
+            backend.set("k", _entry(b"a" * 100))
+        backend.set("k", _entry(b"a" * 50))
+        size = os.path.getsize(backend._path("k"))
+        self.assertEqual(backend._approx_entries, 1)
+        self.assertEqual(backend._approx_bytes, size)
+        self.assertEqual(len(os.listdir(self.tmp.name)), 1)
+
+    def test_eviction_by_entries(self):
+        backend = FileSystemBackend(self.tmp.name, 5, 10_000)
+        for i in range(6):
+            backend.set(f"k{i}", _entry())
+        self.assertLessEqual(len(os.listdir(self.tmp.name)), 5)
+        self.assertEqual(backend._approx_entries, len(os.listdir(self.tmp.name)))
+
+    def test_corrupt_entry_is_removed(self):
+        backend = FileSystemBackend(self.tmp.name, 10, 10_000)
+        with open(backend._path("bad"), "wb") as f:
+            f.write(b"sin cabecera")
+        with self.assertLogs("core.utils.dataset_cache", "WARNING"):
+            self.assertIsNone(backend.get("bad"))
+        self.assertFalse(os.path.exists(backend._path("bad")))
+
+
+class LookupTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        conf = {"BACKEND": "locmem", "DIRECTORY": self.tmp.name, "DEFAULT_TTL": 60, "STALE_TTL": 60,
+                "TTLS": {"short": {"TTL": 1, "STALE_TTL": 0}}}
+        self.override = override_settings(DATASET_CACHE=conf)
+        self.override.enable()
+        self.addCleanup(self.override.disable)
+        dataset_cache._backend = None
+        self.addCleanup(setattr, dataset_cache, "_backend", None)
+
+    def test_miss_then_fresh(self):
+        key = dataset_cache.make_cache_key("ns", {"q": 1})
+        self.assertEqual(dataset_cache.lookup(key), (None, MISS))
+        dataset_cache.store("ns", key, {"rows": [1, 2]})
+        self.assertEqual(dataset_cache.lookup(key), ({"rows": [1, 2]}, FRESH))
+
+    def test_stale_and_expired(self):
+        key = dataset_cache.make_cache_key("ns", {"q": 2})
+        dataset_cache.store("ns", key, [1])
+        entry = dataset_cache.get_backend().get(key)
+        entry.created_at -= 90
+        self.assertEqual(dataset_cache.lookup(key), ([1], STALE))
+        entry.created_at -= 60
+        self.assertEqual(dataset_cache.lookup(key), (None, MISS))
+        self.assertIsNone(dataset_cache.get_backend().get(key))
+
+    def test_namespace_ttl_override(self):
+        self.assertEqual(dataset_cache.get_ttls("short"), (1, 0))
+        self.assertEqual(dataset_cache.get_ttls("other"), (60, 60))
@@ -0,0 +1,196 @@
+# core/tests/test_distribution_probe.py
+from unittest import mock
+
+import requests
+from django.test import SimpleTestCase
+
+from core.services import distribution_probe
+from core.services.distribution_probe import PROBE_BYTES, detect_format, probe_distribution
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=b"", headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self._body = body
+        self.closed = False
+        self.read = 0
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code}")
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self._body), chunk_size):
+            if self.closed:
+                return
+            self.read += len(self._body[i:i + chunk_size])
+            yield self._body[i:i + chunk_size]
+
+    def close(self):
+        self.closed = True
+
+
+class FakeServer:
+    """Simula un servidor que respeta (206) o ignora (200) la cabecera Range."""
+
+    def __init__(self, body: bytes, ranges: bool = True, content_type: str = "text/csv", known_total: bool = True):
+        self.body = body
+        self.ranges = ranges
+        self.known_total = known_total
+        self.content_type = content_type
+        self.requests = []
+        self.responses = []
+
+    def get(self, url, stream=True, timeout=None, headers=None):
+        headers = headers or {}
+        self.requests.append(headers.get("Range"))
+        rng = headers.get("Range")
+        if rng and self.ranges:
+            start, _, end = rng[len("bytes="):].partition("-")
+            start = int(start)
+            if start >= len(self.body):
+                resp = FakeResponse(416, b"<html>416 Range Not Satisfiable</html>",
+                                    {"Content-Type": "text/html", "Content-Range": f"bytes */{len(self.body)}"})
+            else:
+                end = min(int(end), len(self.body) - 1) if end else len(self.body) - 1
+                resp = FakeResponse(206, self.body[start:end + 1], {
+                    "Content-Type": self.content_type,
+                    "Content-Range": f"bytes {start}-{end}/{len(self.body) if self.known_total else '*'}",
+                })
+        else:
+            resp = FakeResponse(200, self.body, {"Content-Type": self.content_type,
+                                                 "Content-Length": str(len(self.body))})
+        self.responses.append(resp)
+        return resp
+
+
+def _patch(server):
+    return mock.patch.object(distribution_probe.http_client, "get", side_effect=server.get)
+
+
+class DetectFormatTests(SimpleTestCase):
+    def test_magic_bytes_win_over_content_type(self):
+        self.assertEqual(detect_format("text/csv", b"PK\x03\x04rest"), "zip")
+        self.assertEqual(detect_format("text/plain", b"\x1f\x8b\x08"), "gzip")
+        self.assertEqual(detect_format("text/csv", b'\xef\xbb\xbf  [{"a": 1}]'), "json")
+        self.assertEqual(detect_format("application/octet-stream", b'CHARSET="ANSI";\nMATRIX="x";'), "pc-axis")
+        self.assertEqual(detect_format("application/json", b"<!DOCTYPE html><html>"), "html")
+        self.assertEqual(detect_format("", b'<?xml version="1.0"?><rdf:RDF>'), "rdf")
+
+    def test_content_type_then_url(self):
+        self.assertEqual(detect_format("text/csv", b"a b c"), "csv")
+        self.assertEqual(detect_format("application/ld+json", b"a b c"), "json")
+        self.assertEqual(detect_format("text/plain", b"a b c", "https://x.es/datos.json"), "json")
+        self.assertEqual(detect_format("", b"a b c", "https://x.es/tabla.px"), "pc-axis")
+
+    def test_csv_sniffing(self):
+        self.assertEqual(detect_format("text/plain", b"a;b;c\n1;2;3\n4;5;6\n7;8"), "csv")
+        self.assertIsNone(detect_format("text/plain", b"texto libre sin separadores\notra linea\n"))
+        self.assertIsNone(detect_format("", b""))
+
+
+class ProbeTests(SimpleTestCase):
+    def _body(self, size):
+        line = b"id;valor\n" + b"".join(b"%06d;x\n" % i for i in range(size // 9 + 1))
+        return line[:size]
+
+    def test_small_resource_single_round_trip(self):
+        server = FakeServer(b"a;b\n1;2\n")
+        with _patch(server):
+            res = probe_distribution("https://x.es/d.csv")
+            self.assertEqual(res.status_code, 206)
+            self.assertEqual(res.read_all(), server.body)
+        self.assertEqual(res.round_trips, 1)
+        self.assertEqual(res.total_size, len(server.body))
+        self.assertEqual(server.requests, [f"bytes=0-{PROBE_BYTES - 1}"])
+
+    def test_206_continues_with_second_range(self):
+        body = self._body(PROBE_BYTES * 3 + 123)
+        server = FakeServer(body)
+        with _patch(server):
+            res = probe_distribution("https://x.es/d.csv")
+            self.assertEqual(res.prefix, body[:PROBE_BYTES])
+            self.assertEqual(res.read_all(), body)
+        self.assertEqual(res.round_trips, 2)
+        self.assertEqual(server.requests[1], f"bytes={PROBE_BYTES}-")
+        self.assertEqual(res.bytes_downloaded, len(body))   # ningún byte se descarga dos veces
+
+    def test_206_prefix_only_when_parser_stops(self):
+        server = FakeServer(self._body(PROBE_BYTES * 3))
+        with _patch(server):
+            with probe_distribution("https://x.es/d.csv") as res:
+                next(res.iter_chunks())
+        self.assertEqual(res.round_trips, 1)
+
+    def test_200_keeps_reading_same_response(self):
+        body = self._body(PROBE_BYTES * 3 + 7)
+        server = FakeServer(body, ranges=False)
+        with _patch(server):
+            res = probe_distribution("https://x.es/d.csv")
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(res.total_size, len(body))
+            self.assertEqual(res.read_all(), body)
+        self.assertEqual(res.round_trips, 1)
+        self.assertEqual(res.bytes_downloaded, len(body))
+
+    def test_200_close_stops_download(self):
+        server = FakeServer(self._body(PROBE_BYTES * 10), ranges=False)
+        with _patch(server):
+            with probe_distribution("https://x.es/d.csv"):
+                pass
+        self.assertTrue(server.responses[0].closed)
+        self.assertLess(server.responses[0].read, len(server.body))
+
+    def test_range_dropped_on_second_request(self):
+        body = self._body(PROBE_BYTES * 2 + 50)
+        server = FakeServer(body)
+        original = server.get
+
+        def flaky(url, **kwargs):
+            if len(server.requests) == 1:
+                server.ranges = False   # la segunda petición responde 200 con el recurso entero
+            return original(url, **kwargs)
+
+        with mock.patch.object(distribution_probe.http_client, "get", side_effect=flaky):
+            self.assertEqual(probe_distribution("https://x.es/d.csv").read_all(), body)
+
+    def test_empty_resource_416(self):
+        server = FakeServer(b"")
+        with _patch(server):
+            res = probe_distribution("https://x.es/vacio.csv")
+        self.assertEqual((res.total_size, res.read_all(), res.round_trips), (0, b"", 1))
+
+    def test_unknown_total_ends_on_416(self):
+        for size in (PROBE_BYTES, PROBE_BYTES + 10):
+            body = self._body(size)
+            server = FakeServer(body, known_total=False)
+            with _patch(server):
+                res = probe_distribution("https://x.es/d.csv")
+                self.assertIsNone(res.total_size)
+                self.assertEqual(res.read_all(), body)
+            self.assertEqual(len(server.requests), 2)
+            if size == PROBE_BYTES:   # el segundo rango ya no existe: 416 cerrado sin leer
+                self.assertEqual(server.responses[-1].status_code, 416)
+                self.assertTrue(server.responses[-1].closed)
+
+    def test_error_status_on_second_request_ends_stream(self):
+        body = self._body(PROBE_BYTES * 2)
+        server = FakeServer(body, known_total=False)
+        original = server.get
+
+        def failing(url, **kwargs):
+            if server.requests:
+                server.requests.append(kwargs["headers"].get("Range"))
+                return FakeResponse(503, b"Service Unavailable")
+            return original(url, **kwargs)
+
+        with mock.patch.object(distribution_probe.http_client, "get", side_effect=failing), \
+                mock.patch.object(FakeResponse, "raise_for_status"):
+            self.assertEqual(probe_distribution("https://x.es/d.csv").read_all(), body[:PROBE_BYTES])
+
+    def test_http_error_is_raised(self):
+        with mock.patch.object(distribution_probe.http_client, "get",
+                               return_value=FakeResponse(404)):
+            with self.assertRaises(requests.HTTPError):
+                probe_distribution("https://x.es/no.csv")
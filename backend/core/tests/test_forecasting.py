@@ -0,0 +1,80 @@
+# core/tests/test_forecasting.py
+import tempfile
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase, override_settings
+
+from core.services import forecast_models, forecasting
+from core.utils import dataset_cache
+
+
+def _table(n_series=3, points=48, seed=5):
+    rng = np.random.default_rng(seed)
+    stamps = pd.date_range("2018-01-01", periods=points, freq="MS", tz="Europe/Madrid")
+    labels = [int(s.tz_convert("UTC").timestamp() * 1000) for s in stamps]   # como las fechas del INE
+    t = np.arange(points)
+    series = []
+    for k in range(n_series):
+        values = 100 + k * 10 + 0.5 * t + 5 * np.sin(2 * np.pi * t / 12) + rng.normal(scale=0.5, size=points)
+        series.append({"name": f"Serie {k}", "data": [round(float(v), 3) for v in values]})
+    return labels, series
+
+
+class ForecastCacheTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        override = override_settings(
+            DATASET_CACHE={"BACKEND": "locmem"},
+            SINGLE_FLIGHT={"LOCK_DIR": tmp.name},
+            FORECAST={"PROCESSES": 1},
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        dataset_cache._backend = None
+        self.addCleanup(setattr, dataset_cache, "_backend", None)
+        self.options = forecasting.normalize_options("ets", 6, 90)
+        patcher = mock.patch.object(forecast_models, "_results", wraps=forecast_models._results)
+        self.results = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _fits(self):
+        # _results(kind, y, spec, params): params None = optimizar
+        return sum(1 for call in self.results.call_args_list if call.args[3] is None)
+
+    def test_second_call_reuses_cached_models(self):
+        labels, series = _table()
+        first = forecasting.forecast_series("t1", labels, series, self.options)
+        self.assertEqual(first["stats"]["refitted"], 3)
+        self.assertEqual(self._fits(), 3)
+        self.assertEqual((first["freq"], first["season"], first["horizon"]), ("M", 12, 6))
+
+        second = forecasting.forecast_series("t1", labels, series, self.options)
+        self.assertEqual(self._fits(), 3)   # ningún ajuste nuevo
+        self.assertEqual(second["stats"]["refitted"], 0)
+        self.assertEqual(second["stats"]["from_cache"], 3)
+        for a, b in zip(first["series"], second["series"]):
+            self.assertFalse(a["cached_model"])
+            self.assertTrue(b["cached_model"])
+            self.assertEqual(a["forecast"]["labels"], b["forecast"]["labels"])
+            np.testing.assert_allclose(b["forecast"]["mean"], a["forecast"]["mean"], rtol=1e-9)
+            np.testing.assert_allclose(b["forecast"]["upper"], a["forecast"]["upper"], rtol=1e-9)
+        self.assertEqual(second["series"][0]["forecast"]["labels"][0], "2022-01-01")
+
+    def test_only_changed_series_are_refitted(self):
+        labels, series = _table()
+        forecasting.forecast_series("t1", labels, series, self.options)
+        series[1] = {**series[1], "data": series[1]["data"][:-1] + [series[1]["data"][-1] + 3]}
+        result = forecasting.forecast_series("t1", labels, series, self.options)
+        self.assertEqual(result["stats"]["refitted"], 1)
+        self.assertEqual([s["cached_model"] for s in result["series"]], [True, False, True])
+        self.assertEqual(self._fits(), 4)
+
+    def test_refit_flag_and_other_tables_ignore_cache(self):
+        labels, series = _table()
+        forecasting.forecast_series("t1", labels, series, self.options)
+        self.assertEqual(forecasting.forecast_series("t1", labels, series, self.options, refit=True)["stats"]["refitted"], 3)
+        self.assertEqual(forecasting.forecast_series("t2", labels, series, self.options)["stats"]["refitted"], 3)
+        self.assertEqual(self._fits(), 9)
@@ -0,0 +1,63 @@
+# core/tests/test_geo_index.py
+from django.test import SimpleTestCase
+
+from core.services.geo_index import GeoIndex, build_index, fold, variants
+
+
+class FoldTests(SimpleTestCase):
+    def test_fold(self):
+        self.assertEqual(fold("Coruña, A"), "coruna,a")
+        self.assertEqual(fold("Castilla-La Mancha"), "castilla la mancha")
+        self.assertEqual(fold("  Madrid ( Comunidad de ) "), "madrid(comunidad de)")
+
+    def test_variants(self):
+        self.assertEqual(list(variants("coruna,a"))[:2], ["coruna,a", "a coruna"])
+        forms = list(variants("canarias(las palmas)"))
+        self.assertLess(forms.index("canarias"), forms.index("las palmas"))
+        self.assertIn("ceuta", variants("ciudad autonoma de ceuta"))
+        self.assertIn("madrid", variants("28 madrid"))
+
+
+class GeoIndexMatchesTests(SimpleTestCase):
+    def setUp(self):
+        self.index = GeoIndex.seed()
+
+    def test_official_names_and_variants(self):
+        values = ["Madrid (Comunidad de)", "Comunidad Autónoma de Madrid", "Canarias (Las Palmas)",
+                  "C. Valenciana", "Com. de Madrid", "Ciudad Autónoma de Melilla", "Coruña, A",
+                  "Alicante/Alacant", "28 Madrid", "ANDALUCÍA", "Comunidad Autónoma del País Vasco"]
+        self.assertEqual(self.index.matches(values).tolist(), [True] * len(values))
+
+    def test_unknown_values_and_codes(self):
+        mask = self.index.matches(["Atlántida (Sur)", "Total Nacional", "28", "", "Comunidad Autónoma de Narnia"])
+        self.assertEqual(mask.tolist(), [False] * 5)
+
+
+class GeoIndexResolveTests(SimpleTestCase):
+    def setUp(self):
+        self.index = build_index([("28079", "Madrid"), ("35016", "Palmas de Gran Canaria, Las")])
+
+    def test_communities(self):
+        values = ["Madrid (Comunidad de)", "Comunidad Autónoma de Madrid", "C. Valenciana",
+                  "Canarias (Las Palmas)", "Ceuta", "Desconocida"]
+        result = self.index.resolve(values, "ccaa")
+        self.assertEqual(result["ids"], ["ccaa:13", "ccaa:13", "ccaa:10", "ccaa:05", "ccaa:18", None])
+        self.assertEqual(result["ambiguous"], [])
+
+    def test_auto_level(self):
+        self.assertEqual(self.index.resolve(["Madrid (Comunidad de)", "Andalucía", "Canarias"])["level"], "ccaa")
+        result = self.index.resolve(["Sevilla", "Girona", "Las Palmas", "Canarias (Las Palmas)"])
+        self.assertEqual(result["level"], "prov")
+        # a nivel de provincia se usa el calificativo entre paréntesis
+        self.assertEqual(result["ids"], ["prov:41", "prov:17", "prov:35", "prov:35"])
+
+    def test_codes_and_municipalities(self):
+        result = self.index.resolve(["28079", "35016", "Palmas de Gran Canaria, Las", "99999"], "mun")
+        self.assertEqual(result["ids"], ["mun:28079", "mun:35016", "mun:35016", None])
+        self.assertEqual(self.index.resolve(["8", "08", "Barcelona"], "prov")["ids"], ["prov:08"] * 3)
+
+    def test_ambiguous_names(self):
+        index = build_index([("05001", "Villanueva"), ("09001", "Villanueva")])
+        result = index.resolve(["Villanueva", "Madrid"], "mun")
+        self.assertEqual(result["ids"], [None, None])
+        self.assertEqual(result["ambiguous"], ["Villanueva"])
@@ -0,0 +1,129 @@
+# core/tests/test_ine_metadata.py
+import asyncio
+import tempfile
+from unittest import mock
+
+import requests
+from django.test import SimpleTestCase, override_settings
+
+from core.services import ine_api_service
+from core.services.ine_api_service import INEApiError, _prepare_filters
+from core.utils import dataset_cache
+
+SERIES_TABLA = [
+    {"COD": "S1", "Nombre": "Madrid. Hombres.", "FK_Operacion": {"Id": 22, "Nombre": "Padrón"},
+     "FK_Periodicidad": {"Id": 12, "Nombre": "Anual"},
+     "MetaData": [{"Id": 28, "Nombre": "Madrid", "Variable": {"Id": 115, "Nombre": "Provincias"}},
+                  {"Id": 1, "Nombre": "Hombres", "Variable": {"Id": 18, "Nombre": "Sexo"}}]},
+    {"COD": "S2", "Nombre": "Madrid. Mujeres.", "FK_Operacion": {"Id": 22, "Nombre": "Padrón"},
+     "FK_Periodicidad": {"Id": 12, "Nombre": "Anual"},
+     "MetaData": [{"Id": 28, "Nombre": "Madrid", "Variable": {"Id": 115, "Nombre": "Provincias"}},
+                  {"Id": 2, "Nombre": "Mujeres", "Variable": {"Id": 18, "Nombre": "Sexo"}}]},
+]
+TABLAS_OPERACION = [{"Id": 2852, "Nombre": "Población por provincias y sexo"}]
+DATOS_TABLA = [{"COD": "S1", "Nombre": "Madrid. Hombres.", "Data": [{"Fecha": 1, "Anyo": 2020, "Valor": 10}]}]
+
+
+class FakeIne:
+    def __init__(self, fail_metadata=False):
+        self.fail_metadata = fail_metadata
+        self.calls = []
+
+    def get(self, url, params=None, timeout=None, **kwargs):
+        endpoint = url.split("/")[-2]
+        self.calls.append(endpoint)
+        if endpoint == "SERIES_TABLA" and self.fail_metadata:
+            raise requests.ConnectionError("INE caído")
+        payload = {"SERIES_TABLA": SERIES_TABLA, "TABLAS_OPERACION": TABLAS_OPERACION,
+                   "DATOS_TABLA": DATOS_TABLA}[endpoint]
+        resp = mock.Mock()
+        resp.json.return_value = payload
+        resp.raise_for_status.return_value = None
+        return resp
+
+    async def aget(self, url, **kwargs):
+        return self.get(url, **kwargs)
+
+
+class IneMetadataTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        override = override_settings(
+            DATASET_CACHE={"BACKEND": "locmem", "TTLS": {"ine_metadata_miss": {"TTL": 300, "STALE_TTL": 0}}},
+            SINGLE_FLIGHT={"LOCK_DIR": tmp.name},
+            INE_METADATA={"ENABLED": True, "TIMEOUT": 5},
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        dataset_cache._backend = None
+        self.addCleanup(setattr, dataset_cache, "_backend", None)
+        self.ine = FakeIne()
+        for target, fn in ((ine_api_service.http_client, self.ine.get),
+                           (ine_api_service.async_http_client, self.ine.aget)):
+            patcher = mock.patch.object(target, "get", side_effect=fn)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_round_trips_cold_then_warm(self):
+        cold = ine_api_service.get_dataset_from_ine("2852", sample_rows=5)
+        self.assertEqual(cold["upstream_round_trips"], 3)
+        self.assertEqual(self.ine.calls, ["SERIES_TABLA", "TABLAS_OPERACION", "DATOS_TABLA"])
+        self.assertEqual(cold["metadata"]["name"], "Población por provincias y sexo")
+        warm = ine_api_service.get_dataset_from_ine("2852", sample_rows=5)
+        self.assertEqual(warm["upstream_round_trips"], 1)
+
+    def test_round_trips_async(self):
+        cold = asyncio.run(ine_api_service.aget_dataset_from_ine("2852", sample_rows=5))
+        self.assertEqual(cold["upstream_round_trips"], 3)
+        warm = asyncio.run(ine_api_service.aget_dataset_from_ine("2852", sample_rows=5))
+        self.assertEqual(warm["upstream_round_trips"], 1)
+
+    def test_metadata_miss_is_cached(self):
+        self.ine.fail_metadata = True
+        with self.assertLogs("core.services.ine_api_service", "WARNING"), \
+                self.assertLogs("core.utils.file_utils", "ERROR"):
+            first = ine_api_service.get_dataset_from_ine("2852")
+        self.assertNotIn("metadata", first)
+        self.assertEqual(first["upstream_round_trips"], 2)
+        second = ine_api_service.get_dataset_from_ine("2852")
+        self.assertEqual(second["upstream_round_trips"], 1)
+        self.assertEqual(self.ine.calls, ["SERIES_TABLA", "DATOS_TABLA", "DATOS_TABLA"])
+
+        # force_download ignora el fallo recordado
+        self.ine.fail_metadata = False
+        self.assertIsNotNone(ine_api_service.get_table_metadata("2852", force_download=True))
+
+    def test_metadata_miss_is_cached_async(self):
+        self.ine.fail_metadata = True
+        with self.assertLogs("core.services.ine_api_service", "WARNING"), \
+                self.assertLogs("core.utils.file_utils", "ERROR"):
+            self.assertIsNone(asyncio.run(ine_api_service.aget_table_metadata("2852")))
+        self.assertIsNone(asyncio.run(ine_api_service.aget_table_metadata("2852")))
+        self.assertEqual(self.ine.calls, ["SERIES_TABLA"])
+
+
+class PrepareFiltersTests(SimpleTestCase):
+    def setUp(self):
+        self.metadata = ine_api_service.build_table_metadata("2852", SERIES_TABLA, TABLAS_OPERACION)
+
+    def test_without_tv_no_selection(self):
+        self.assertEqual(_prepare_filters(self.metadata, {"nult": 3}), ({"nult": 3}, None))
+        self.assertEqual(_prepare_filters(None, {"nult": 3}), ({"nult": 3}, None))
+        # Tabla sin series en los metadatos y sin tv: no es un error
+        empty = {**self.metadata, "series": []}
+        self.assertEqual(_prepare_filters(empty, {}), ({}, None))
+
+    def test_tv_by_name_is_resolved(self):
+        filters, selected = _prepare_filters(self.metadata, {"tv": ["provincias:madrid", "Sexo:MUJERES"]})
+        self.assertEqual(filters["tv"], ["115:28", "18:2"])
+        self.assertEqual([s["cod"] for s in selected], ["S2"])
+
+    def test_tv_errors(self):
+        with self.assertRaises(INEApiError):
+            _prepare_filters(self.metadata, {"tv": ["Edad:30"]})
+        with self.assertRaises(INEApiError):
+            _prepare_filters(self.metadata, {"tv": ["Sexo:Otro"]})
+        no_match = {**self.metadata, "series": [{"cod": "S1", "values": ["115:28"]}]}
+        with self.assertRaises(INEApiError):
+            _prepare_filters(no_match, {"tv": ["18:1"]})
@@ -0,0 +1,84 @@
+# core/tests/test_ine_normalizer.py
+import asyncio
+import json
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from core.management.commands.bench_ine_normalizer import legacy_normalize, synthetic_table
+from core.services import ine_api_service
+from core.services.ine_api_service import normalize_ine_data
+
+
+class NormalizeIneDataTests(SimpleTestCase):
+    def assertSameAsLegacy(self, raw):
+        expected = json.dumps(legacy_normalize(raw), sort_keys=True)
+        self.assertEqual(json.dumps(normalize_ine_data(raw), sort_keys=True), expected)
+
+    def test_synthetic_tables(self):
+        for n_series, n_periods, seed in ((1, 12, 0), (20, 60, 1), (150, 40, 2)):
+            with self.subTest(shape=f"{n_series}x{n_periods}"):
+                self.assertSameAsLegacy(synthetic_table(n_series, n_periods, seed=seed, missing=0.1))
+
+    def test_series_with_disjoint_and_unordered_periods(self):
+        # Periodos desordenados y que sólo aparecen en algunas series
+        raw = synthetic_table(3, 24, seed=3)
+        raw[0]["Data"] = raw[0]["Data"][12:] + raw[0]["Data"][:6]
+        raw[1]["Data"] = list(reversed(raw[1]["Data"]))
+        raw[2]["Data"] = []
+        self.assertSameAsLegacy(raw)
+
+    def test_iso_dates_text_values_and_lists(self):
+        raw = [
+            {"Nombre": "A", "Data": [
+                {"Fecha": "2021-03-01T00:00:00", "Valor": "1,5", "Notas": ["p", "r"]},
+                {"Fecha": "2020-12-01T00:00:00", "Valor": "", "Notas": []},
+                {"Fecha": "2021-01-01T00:00:00", "Valor": "n/d"},
+            ]},
+            {"Data": [
+                {"Fecha": "2021-01-01T00:00:00", "Valor": 3, "Extra": "x"},
+                {"Fecha": "2019-06-01T00:00:00", "Valor": None},
+                {"Fecha": "2019-06-01T00:00:00", "Valor": 4.25},   # repetida: gana la última
+            ]},
+        ]
+        self.assertSameAsLegacy(raw)
+        out = normalize_ine_data(raw)
+        self.assertEqual(out["series"][1], {"name": "Sin nombre", "data": [4.25, None, 3.0, None]})
+        self.assertEqual(out["sample_rows"][0]["Notas"], "p, r")
+
+    def test_max_rows_is_per_series(self):
+        raw = synthetic_table(10, 30, seed=4)
+        full = normalize_ine_data(raw)
+        limited = normalize_ine_data(raw, max_rows=7)
+        expected = normalize_ine_data([{**s, "Data": s["Data"][-7:]} for s in raw])["sample_rows"]
+        self.assertEqual(limited["sample_rows"], expected)
+        self.assertEqual(len(limited["sample_rows"]), 70)
+        self.assertEqual(limited["items_count"], full["items_count"])
+        self.assertEqual((limited["labels"], limited["series"]), (full["labels"], full["series"]))
+
+    def test_empty(self):
+        self.assertSameAsLegacy([])
+        self.assertSameAsLegacy([{"Nombre": "vacía", "Data": []}])
+
+
+class IneSampleTests(SimpleTestCase):
+    """rows=N son los N últimos puntos de cada serie (nult), no N filas en total."""
+
+    def _fetch(self, table_id, sample_rows=None, filters=None, stats=None):
+        raw = synthetic_table(50, 36, seed=6, missing=0)
+        return [{**s, "Data": s["Data"][-sample_rows:]} for s in raw] if sample_rows else raw
+
+    async def _afetch(self, *args, **kwargs):
+        return self._fetch(*args, **kwargs)
+
+    def test_sample_covers_every_series(self):
+        with mock.patch.object(ine_api_service, "get_table_metadata", return_value={}), \
+                mock.patch.object(ine_api_service, "aget_table_metadata", return_value={}), \
+                mock.patch.object(ine_api_service, "fetch_table_data", side_effect=self._fetch), \
+                mock.patch.object(ine_api_service, "afetch_table_data", side_effect=self._afetch):
+            data = ine_api_service.get_dataset_from_ine("2852", sample_rows=12)
+            adata = asyncio.run(ine_api_service.aget_dataset_from_ine("2852", sample_rows=12))
+        self.assertEqual(len(data["series"]), 50)
+        self.assertEqual(len(data["sample_rows"]), 50 * 12)
+        self.assertEqual(len(data["labels"]), 12)
+        self.assertEqual(adata["sample_rows"], data["sample_rows"])
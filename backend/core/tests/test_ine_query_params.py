@@ -0,0 +1,77 @@
+# core/tests/test_ine_query_params.py
+from datetime import datetime
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from core.services import ine_api_service
+from core.services.ine_api_service import INEApiError, fetch_table_data, ine_query_params
+
+
+class IneQueryParamsTests(SimpleTestCase):
+    def test_all_params(self):
+        self.assertEqual(
+            ine_query_params(nult="12", date_from="2020-01-01", date_to="20231231", tip="am",
+                             tv=[" 115:29 ", "3:84"]),
+            [("nult", 12), ("date", "20200101:20231231"), ("tip", "AM"), ("tv", "115:29"), ("tv", "3:84")],
+        )
+
+    def test_empty(self):
+        self.assertEqual(ine_query_params(), [])
+
+    def test_open_date_ranges(self):
+        today = datetime.now().strftime("%Y%m%d")
+        self.assertEqual(ine_query_params(date_from="2020-05-01"), [("date", f"20200501:{today}")])
+        self.assertEqual(ine_query_params(date_to="2020-05-01"), [("date", "19000101:20200501")])
+
+    def test_invalid_values(self):
+        invalid = [
+            {"nult": "doce"},
+            {"nult": 0},
+            {"nult": -3},
+            {"date_from": "01/02/2020"},
+            {"date_to": "2020-1-1"},
+            {"date_from": "2023-01-01", "date_to": "2020-01-01"},
+            {"tip": "X"},
+            {"tv": ["115"]},
+            {"tv": ["sexo:hombres"]},
+            {"tv": ["115:29", "1:2:3"]},
+        ]
+        for kwargs in invalid:
+            with self.subTest(**{k: str(v) for k, v in kwargs.items()}):
+                with self.assertRaises(INEApiError):
+                    ine_query_params(**kwargs)
+
+
+class FetchTableDataTests(SimpleTestCase):
+    def _response(self, payload):
+        resp = mock.Mock()
+        resp.json.return_value = payload
+        resp.raise_for_status.return_value = None
+        return resp
+
+    def test_sample_rows_becomes_nult(self):
+        payload = [{"Nombre": "A", "Data": [{"Valor": i} for i in range(10)]}]
+        with mock.patch.object(ine_api_service.http_client, "get", return_value=self._response(payload)) as get:
+            out = fetch_table_data("2852", sample_rows=3)
+        self.assertEqual(get.call_args.kwargs["params"], [("nult", 3)])
+        self.assertTrue(get.call_args.args[0].endswith("/DATOS_TABLA/2852"))
+        # Recorte local por si el servidor ignora nult
+        self.assertEqual([p["Valor"] for p in out[0]["Data"]], [7, 8, 9])
+
+    def test_explicit_filters_win_over_sample_rows(self):
+        with mock.patch.object(ine_api_service.http_client, "get", return_value=self._response([])) as get:
+            fetch_table_data("2852", sample_rows=3, filters={"date_from": "2020-01-01", "date_to": "2020-12-31",
+                                                            "tv": ["115:29"], "tip": None})
+        self.assertEqual(get.call_args.kwargs["params"], [("date", "20200101:20201231"), ("tv", "115:29")])
+
+    def test_invalid_filter_makes_no_request(self):
+        with mock.patch.object(ine_api_service.http_client, "get") as get:
+            with self.assertRaises(INEApiError):
+                fetch_table_data("2852", filters={"nult": "x"})
+        get.assert_not_called()
+
+    def test_unexpected_payload(self):
+        with mock.patch.object(ine_api_service.http_client, "get", return_value=self._response({"error": 1})):
+            with self.assertRaises(INEApiError):
+                fetch_table_data("2852")
@@ -0,0 +1,80 @@
+# core/tests/test_middleware.py
+import asyncio
+import gzip
+import json
+import zlib
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase
+
+from core.middleware import CompressionMiddleware
+
+LINES = [json.dumps({"i": i, "title": f"Dataset {i}"}).encode() + b"\n" for i in range(20)]
+
+
+def _middleware():
+    return CompressionMiddleware(lambda request: None)
+
+
+class StreamingCompressionTests(SimpleTestCase):
+    def setUp(self):
+        self.request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING="gzip, deflate, br")
+        self.produced = 0
+
+    def _lines(self):
+        for line in LINES:
+            self.produced += 1
+            yield line
+
+    async def _alines(self):
+        for line in LINES:
+            self.produced += 1
+            yield line
+
+    def _assert_incremental(self, chunks):
+        # cada trozo comprimido se descomprime entero sin esperar a los siguientes
+        d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        out = []
+        for n, chunk in enumerate(chunks):
+            if n < len(LINES):
+                self.assertEqual(self.produced, n + 1)   # no se ha pedido más del generador
+                self.assertEqual(d.decompress(chunk), LINES[n])
+            else:
+                out.append(d.decompress(chunk) + d.flush())
+        self.assertEqual(out, [b""])
+        self.assertTrue(d.eof)
+
+    def test_sync_stream_is_flushed_per_chunk(self):
+        response = _middleware().process_response(self.request, StreamingHttpResponse(self._lines()))
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self._assert_incremental(response.streaming_content)
+
+    def test_async_stream_is_flushed_per_chunk(self):
+        response = _middleware().process_response(self.request, StreamingHttpResponse(self._alines()))
+        self.assertEqual(response["Content-Encoding"], "gzip")
+
+        async def collect():
+            return [chunk async for chunk in response.streaming_content]
+
+        chunks = asyncio.run(collect())
+        self.assertEqual(gzip.decompress(b"".join(chunks)), b"".join(LINES))
+        self.produced = 0
+
+        response = _middleware().process_response(self.request, StreamingHttpResponse(self._alines()))
+        iterator = response.streaming_content.__aiter__()
+        first = asyncio.run(iterator.__anext__())
+        self.assertEqual(self.produced, 1)
+        self.assertEqual(zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(first), LINES[0])
+
+    def test_stream_without_gzip_is_untouched(self):
+        request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING="identity")
+        response = _middleware().process_response(request, StreamingHttpResponse(self._lines()))
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(b"".join(response.streaming_content), b"".join(LINES))
+
+    def test_regular_response_still_gzipped(self):
+        request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING="gzip")
+        response = _middleware().process_response(request, HttpResponse(b"".join(LINES)))
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.content), b"".join(LINES))
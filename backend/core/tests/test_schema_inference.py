@@ -0,0 +1,111 @@
+# core/tests/test_schema_inference.py
+import random
+
+import pandas as pd
+from django.test import SimpleTestCase
+
+from core.services.dataset_analyzer import looks_like_date, safe_text, try_parse_number
+from core.services.geo_index import GeoIndex
+from core.services.schema_inference import infer_schema
+
+# Lista y bucle de dataset_analyzer.infer_schema_from_rows antes del motor columnar
+OLD_COMMUNITIES = [
+    "andalucía", "andalucia", "aragón", "aragon", "asturias", "islas baleares",
+    "baleares", "canarias", "cantabria", "castilla-la mancha", "castilla y león",
+    "castilla y leon", "cataluña", "cataluna", "comunidad valenciana", "valenciana",
+    "extremadura", "galicia", "la rioja", "madrid", "murcia", "navarra",
+    "país vasco", "pais vasco", "paisvasco", "ceuta", "melilla"
+]
+
+
+def old_infer_schema(rows, sample_limit=20):
+    schema = []
+    if not rows:
+        return schema
+    for col in list(rows[0].keys()):
+        values = [safe_text(r.get(col, "")) for r in rows[:sample_limit]]
+        non_empty = [v for v in values if v]
+        inferred = "string"
+        num_count = 0
+        date_count = 0
+        unique_vals = set()
+        for v in non_empty:
+            unique_vals.add(v.lower())
+            if try_parse_number(v) is not None:
+                num_count += 1
+            if looks_like_date(v):
+                date_count += 1
+        if non_empty:
+            if num_count / len(non_empty) >= 0.8:
+                inferred = "numeric"
+            elif date_count / len(non_empty) >= 0.6:
+                inferred = "datetime"
+        lowname = col.lower()
+        if any(k in lowname for k in ("lat", "latitude", "latitud")):
+            inferred = "latitude"
+        if any(k in lowname for k in ("lon", "lng", "longitude", "longitud")):
+            inferred = "longitude"
+        lower_vals = [v.lower() for v in non_empty[:min(30, len(non_empty))]]
+        matches = sum(1 for v in lower_vals for c in OLD_COMMUNITIES if c in v)
+        if non_empty and matches / len(lower_vals) >= 0.2:
+            inferred = "geo_name"
+        schema.append({
+            "name": col,
+            "inferred_type": inferred,
+            "sample_values": non_empty[:5],
+            "unique_count_estimate": len(unique_vals),
+        })
+    return schema
+
+
+def sample_rows(n=200, seed=1):
+    rnd = random.Random(seed)
+    regions = ["Andalucía", "Madrid", "Cataluña", "Galicia", "Aragón", "Castilla y León", "Ceuta"]
+    words = ["alfa", "beta", "gamma", "delta", "sin dato"]
+    rows = []
+    for i in range(n):
+        rows.append({
+            "Id": str(i),
+            "Importe": f"{rnd.uniform(-1000, 1000):.2f}".replace(".", ","),
+            "Total": f"{rnd.randint(0, 10**6)} €",
+            "Fecha": f"20{rnd.randint(10, 23)}-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}",
+            "Comunidad": rnd.choice(regions),
+            "Descripción": rnd.choice(words) + (" " + rnd.choice(words) if i % 3 else ""),
+            "Latitud": f"{rnd.uniform(36, 43):.5f}",
+            "Longitud": f"{rnd.uniform(-9, 3):.5f}",
+            "Casi vacía": "" if i % 10 else "  x  ",
+            "Mixta": str(i) if i % 4 else "n/d",
+        })
+    return rows
+
+
+class InferSchemaTests(SimpleTestCase):
+    def setUp(self):
+        self.geo = GeoIndex.seed()
+
+    def test_matches_old_loop(self):
+        for seed, limit in ((1, 20), (2, 30), (3, 200), (4, 200)):
+            rows = sample_rows(seed=seed)
+            with self.subTest(seed=seed, sample_limit=limit):
+                self.assertEqual(infer_schema(rows, self.geo, sample_limit=limit),
+                                 old_infer_schema(rows, sample_limit=limit))
+
+    def test_dataframe_input_equals_rows(self):
+        rows = sample_rows(50)
+        self.assertEqual(infer_schema(pd.DataFrame(rows), self.geo), infer_schema(rows, self.geo))
+
+    def test_ine_periods_are_dates_not_numbers(self):
+        rows = [{"Periodo": f"2023M{m:02d}", "Trimestre": f"2022T{m % 4 + 1}", "Dia": f"{m:02d}/02/2020"}
+                for m in range(1, 13)]
+        self.assertEqual([c["inferred_type"] for c in infer_schema(rows, self.geo)],
+                         ["datetime", "datetime", "datetime"])
+
+    def test_unique_count_covers_whole_sample(self):
+        rows = [{"Codigo": f"C{i}"} for i in range(500)]
+        self.assertEqual(infer_schema(rows, self.geo)[0]["unique_count_estimate"], 500)
+
+    def test_empty(self):
+        self.assertEqual(infer_schema([], self.geo), [])
+        schema = infer_schema([{"a": ""}, {"a": None}], self.geo)
+        self.assertEqual(schema, [{"name": "a", "inferred_type": "string", "sample_values": [],
+                                   "unique_count_estimate": 0}])
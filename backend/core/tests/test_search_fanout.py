@@ -0,0 +1,142 @@
+# core/tests/test_search_fanout.py
+import asyncio
+import json
+import threading
+import time
+
+from django.test import SimpleTestCase, override_settings
+
+from core.services import search_fanout
+
+PAGE_SIZE = 10
+
+
+class FakeApi:
+    """
+    Páginas de `total` items (los _about de cada página solapan uno con la
+    anterior, como cuando el catálogo cambia entre peticiones). `failing`:
+    páginas que devuelven None al momento; `delay`: segundos por página buena.
+    """
+
+    def __init__(self, total, failing=(), delay=0.01):
+        self.total = total
+        self.failing = set(failing)
+        self.delay = delay
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def _page(self, page):
+        if page in self.failing:
+            return None
+        start = page * (PAGE_SIZE - 1)   # cada página empieza con el último item de la anterior
+        ids = range(start, min(start + PAGE_SIZE, self.total)) if start < self.total else []
+        return {"result": {"items": [{"_about": f"https://datos.gob.es/d/{i}", "title": f"D{i}"} for i in ids]}}
+
+    def _enter(self, page):
+        with self._lock:
+            self.calls.append(page)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def _leave(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def fetch(self, page):
+        self._enter(page)
+        try:
+            if page not in self.failing:
+                time.sleep(self.delay)
+            return self._page(page)
+        finally:
+            self._leave()
+
+    async def afetch(self, page):
+        self._enter(page)
+        try:
+            if page not in self.failing:
+                await asyncio.sleep(self.delay)
+            return self._page(page)
+        finally:
+            self._leave()
+
+
+def _parse(lines):
+    rows = [json.loads(line) for line in lines]
+    return rows[:-1], rows[-1]["_meta"]
+
+
+@override_settings(SEARCH_FANOUT={"CONCURRENCY": 3, "RATE": 0, "MAX_PAGES": 20, "MAX_FAILURES": 2})
+class StreamAllPagesTests(SimpleTestCase):
+    def _run(self, api, **kwargs):
+        sync = _parse(search_fanout.stream_all_pages(api.fetch, PAGE_SIZE, **kwargs))
+        sync_calls = sorted(api.calls)
+        api.calls = []
+
+        async def collect():
+            return [line async for line in search_fanout.astream_all_pages(api.afetch, PAGE_SIZE, **kwargs)]
+
+        # las páginas en vuelo al llegar al final dependen del reparto: se comparan los items
+        async_result = _parse(asyncio.run(collect()))
+        self.assertEqual(sorted(i["_about"] for i in async_result[0]), sorted(i["_about"] for i in sync[0]))
+        return sync, sync_calls
+
+    def test_dedup_by_about_and_end_of_results(self):
+        api = FakeApi(total=45)
+        (items, meta), calls = self._run(api)
+        abouts = [i["_about"] for i in items]
+        self.assertEqual(len(abouts), len(set(abouts)))
+        self.assertEqual(sorted(abouts), sorted(f"https://datos.gob.es/d/{i}" for i in range(45)))
+        self.assertEqual(meta["items"], 45)
+        self.assertEqual(meta["duplicates"], 4)   # páginas 1-4 repiten el último item de la anterior
+        self.assertEqual(meta["pages"][:5], [0, 1, 2, 3, 4])
+        # la página 4 viene incompleta: como mucho las CONCURRENCY - 1 siguientes ya estaban en vuelo
+        self.assertLessEqual(max(calls), 4 + 2)
+        self.assertEqual(meta["failed_pages"], [])
+        self.assertNotIn("stopped", meta)
+
+    def test_concurrency_bound_and_max_pages(self):
+        api = FakeApi(total=10 ** 6, delay=0.02)
+        (_, meta), calls = self._run(api, max_pages=8, start_page=2)
+        self.assertEqual(calls, list(range(2, 10)))
+        self.assertEqual(meta["pages"], list(range(2, 10)))
+        self.assertEqual(api.max_in_flight, 3)
+
+    def test_transform_after_dedup(self):
+        api = FakeApi(total=15)
+        items, _ = _parse(search_fanout.stream_all_pages(api.fetch, PAGE_SIZE, transform=lambda i: {"t": i["title"]}))
+        self.assertEqual(sorted(i["t"] for i in items), sorted(f"D{i}" for i in range(15)))
+
+    def test_first_page_failure_stops(self):
+        api = FakeApi(total=10 ** 6, failing={0}, delay=0.05)
+        (items, meta), calls = self._run(api)
+        self.assertLessEqual(len(calls), 3)   # sólo las que ya estaban en vuelo
+        self.assertIn(0, meta["failed_pages"])
+        self.assertEqual(meta["stopped"], "failures")
+
+    def test_upstream_down_stops_after_consecutive_failures(self):
+        api = FakeApi(total=10 ** 6, failing=set(range(20)), delay=0.0)
+        (items, meta), calls = self._run(api)
+        self.assertEqual(items, [])
+        self.assertLess(len(calls), 20)
+        self.assertLessEqual(len(calls), 3 + 1)
+        self.assertEqual(meta["failed_pages"], calls)
+        self.assertEqual(meta["stopped"], "failures")
+
+    def test_isolated_failure_does_not_stop(self):
+        api = FakeApi(total=50, failing={2})
+        (items, meta), _ = self._run(api)
+        self.assertEqual(meta["failed_pages"], [2])
+        self.assertEqual(meta["pages"][:5], [0, 1, 3, 4, 5])
+        self.assertEqual(meta["items"], 50 - 8)   # la página 2 comparte su primer item con la 1 y el último con la 3
+        self.assertNotIn("stopped", meta)
+
+    def test_exceptions_count_as_failures(self):
+        def boom(page):
+            raise RuntimeError("caído")
+        items, meta = _parse(search_fanout.stream_all_pages(boom, PAGE_SIZE))
+        self.assertEqual(items, [])
+        self.assertEqual(meta["stopped"], "failures")
+        self.assertLessEqual(len(meta["failed_pages"]), 3)
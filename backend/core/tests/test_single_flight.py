@@ -0,0 +1,105 @@
+# core/tests/test_single_flight.py
+import asyncio
+import tempfile
+import threading
+import time
+
+from django.test import SimpleTestCase, override_settings
+
+from core.utils import single_flight
+
+
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.override = override_settings(SINGLE_FLIGHT={"LOCK_DIR": self.tmp.name, "WAIT_TIMEOUT": 5})
+        self.override.enable()
+        self.addCleanup(self.override.disable)
+
+    def _run_concurrently(self, n, target):
+        results, errors = [], []
+        barrier = threading.Barrier(n)
+
+        def worker():
+            barrier.wait()
+            try:
+                results.append(target())
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker) for _ in range(n)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(10)
+        return results, errors
+
+    def test_concurrent_calls_are_coalesced(self):
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            time.sleep(0.2)     # deja tiempo a que el resto se sume a la llamada en curso
+            return {"ok": True}
+
+        results, errors = self._run_concurrently(8, lambda: single_flight.do("k", fetch))
+        self.assertEqual(errors, [])
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{"ok": True}] * 8)
+        self.assertEqual(single_flight.get_stats()["in_flight"], 0)
+
+    def test_error_is_shared_by_waiters(self):
+        calls = []
+
+        def fail():
+            calls.append(1)
+            time.sleep(0.2)
+            raise ValueError("upstream caído")
+
+        results, errors = self._run_concurrently(4, lambda: single_flight.do("err", fail))
+        self.assertEqual(results, [])
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(errors), 4)
+        self.assertTrue(all(isinstance(e, ValueError) for e in errors))
+
+    def test_sequential_calls_run_again(self):
+        calls = []
+        fetch = lambda: calls.append(1) or len(calls)
+        self.assertEqual(single_flight.do("seq", fetch), 1)
+        self.assertEqual(single_flight.do("seq", fetch), 2)
+
+    def test_distinct_keys_do_not_wait(self):
+        calls = []
+        keys = iter(range(100))
+        lock = threading.Lock()
+
+        def target():
+            with lock:
+                key = f"key-{next(keys)}"
+            return single_flight.do(key, lambda: calls.append(1) or time.sleep(0.05) or key)
+
+        results, errors = self._run_concurrently(4, target)
+        self.assertEqual(errors, [])
+        self.assertEqual(len(calls), 4)
+        self.assertEqual(len(set(results)), 4)
+
+    def test_recheck_skips_fetch(self):
+        fetch_calls = []
+        result = single_flight.do("rc", lambda: fetch_calls.append(1), recheck=lambda: "desde caché")
+        self.assertEqual(result, "desde caché")
+        self.assertEqual(fetch_calls, [])
+
+    def test_async_coalescing(self):
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.1)
+            return 42
+
+        async def main():
+            return await asyncio.gather(*(single_flight.ado("ak", fetch) for _ in range(5)))
+
+        self.assertEqual(asyncio.run(main()), [42] * 5)
+        self.assertEqual(len(calls), 1)
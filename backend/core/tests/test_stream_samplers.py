@@ -0,0 +1,143 @@
+# core/tests/test_stream_samplers.py
+import codecs
+import json
+
+from django.test import SimpleTestCase
+
+from core.services import stream_samplers
+from core.services.stream_samplers import stream_csv_sample, stream_json_sample
+
+
+def chunked(data: bytes, size: int):
+    """Trocea en chunks de `size` bytes (para cortar caracteres y líneas entre chunks)."""
+    return (data[i:i + size] for i in range(0, len(data), size))
+
+
+class CsvSamplerTests(SimpleTestCase):
+    def test_semicolon_utf8(self):
+        body = "provincia;valor\nMálaga;1\nCádiz;2\n".encode("utf-8")
+        sample = stream_csv_sample(chunked(body, 3))
+        self.assertEqual(sample["delimiter"], ";")
+        self.assertEqual(sample["encoding"], "utf-8")
+        self.assertEqual(sample["columns"], ["provincia", "valor"])
+        self.assertEqual(sample["rows"], [{"provincia": "Málaga", "valor": "1"},
+                                          {"provincia": "Cádiz", "valor": "2"}])
+        self.assertTrue(sample["complete"])
+
+    def test_cp1252(self):
+        body = "municipio;año\nA Coruña;2020\nÁvila;2021\n".encode("cp1252")
+        sample = stream_csv_sample(chunked(body, 5))
+        self.assertEqual(sample["encoding"], "cp1252")
+        self.assertEqual(sample["columns"], ["municipio", "año"])
+        self.assertEqual([r["municipio"] for r in sample["rows"]], ["A Coruña", "Ávila"])
+
+    def test_utf8_bom_and_split_multibyte(self):
+        body = codecs.BOM_UTF8 + "nombre,valor\nÑandú,1\n".encode("utf-8")
+        self.assertEqual(stream_samplers.detect_encoding("ñ".encode("utf-8")[:1]), "utf-8")
+        sample = stream_csv_sample(chunked(body, 1))
+        self.assertEqual(sample["columns"], ["nombre", "valor"])
+        self.assertEqual(sample["rows"], [{"nombre": "Ñandú", "valor": "1"}])
+
+    def test_quoted_newlines_across_chunks(self):
+        body = b'id,texto\n1,"linea uno\nlinea dos"\n2,"con ""comillas"", y coma"\n3,fin\n'
+        sample = stream_csv_sample(chunked(body, 4))
+        self.assertEqual([r["texto"] for r in sample["rows"]],
+                         ["linea uno\nlinea dos", 'con "comillas", y coma', "fin"])
+
+    def test_crlf_blank_lines_and_ragged_rows(self):
+        body = b"a,b,c\r\n\r\n1,2\r\n3,4,5\r\n"
+        sample = stream_csv_sample(chunked(body, 7))
+        self.assertEqual(sample["rows"], [{"a": "1", "b": "2", "c": ""}, {"a": "3", "b": "4", "c": "5"}])
+
+    def test_blank_header_names(self):
+        sample = stream_csv_sample([b"x,,\n1,2,3\n"])
+        self.assertEqual(sample["columns"], ["x", "Columna 2", "Columna 3"])
+
+    def test_missing_final_newline(self):
+        sample = stream_csv_sample([b"a;b\n1;2\n3;4"])
+        self.assertEqual(sample["rows"][-1], {"a": "3", "b": "4"})
+
+    def test_early_cutoff(self):
+        body = b"n,v\n" + b"".join(b"%d,x\n" % i for i in range(200_000))
+        consumed = []
+
+        def source():
+            for chunk in chunked(body, 16 * 1024):
+                consumed.append(len(chunk))
+                yield chunk
+
+        sample = stream_csv_sample(source(), max_rows=10)
+        self.assertEqual(len(sample["rows"]), 10)
+        self.assertFalse(sample["complete"])
+        self.assertLess(sum(consumed), len(body) // 4)
+        self.assertEqual(sample["bytes_read"], sum(consumed))
+
+    def test_line_too_long(self):
+        big = b'a\n"' + b"x" * (stream_samplers.MAX_LINE_CHARS + 10)
+        with self.assertRaises(stream_samplers.SampleTooLargeError):
+            stream_csv_sample(chunked(big, 1024 * 1024))
+
+    def test_empty_input(self):
+        sample = stream_csv_sample([])
+        self.assertEqual((sample["rows"], sample["columns"]), ([], []))
+
+
+class JsonSamplerTests(SimpleTestCase):
+    def test_root_list(self):
+        body = json.dumps([{"a": 1}, {"a": 2}, 3]).encode()
+        sample = stream_json_sample(chunked(body, 2))
+        self.assertEqual(sample["path"], "$")
+        self.assertEqual(sample["rows"], [{"a": 1}, {"a": 2}, {"value": 3}])
+        self.assertTrue(sample["complete"])
+
+    def test_brackets_and_escapes_inside_strings(self):
+        records = [{"t": "a ] b", "u": "{ [ \\\" ] }"}, {"t": "]]]", "u": "\\"}, {"t": "ñ\u00e1", "u": ","}]
+        body = json.dumps({"meta": {"x": "]", "y": ["[", "}"]}, "data": records}, ensure_ascii=False).encode()
+        for size in (1, 3, 7, len(body)):
+            sample = stream_json_sample(chunked(body, size))
+            self.assertEqual(sample["path"], "$.data")
+            self.assertEqual(sample["rows"], json.loads(body)["data"])
+
+    def test_preferred_key_in_document_order(self):
+        body = json.dumps({"items": [{"i": 1}], "data": [{"d": 1}]}).encode()
+        self.assertEqual(stream_json_sample([body])["path"], "$.items")
+
+    def test_fallback_first_list(self):
+        body = json.dumps({"otros": [{"o": i} for i in range(5)], "mas": [{"m": 1}], "fin": "]"}).encode()
+        sample = stream_json_sample(chunked(body, 5), max_rows=3)
+        self.assertEqual(sample["path"], "$.otros")
+        self.assertEqual(sample["rows"], [{"o": 0}, {"o": 1}, {"o": 2}])
+        self.assertFalse(sample["complete"])
+
+    def test_no_list(self):
+        sample = stream_json_sample([b'{"a": {"b": 1}, "c": "x"}'])
+        self.assertEqual((sample["rows"], sample["path"]), ([], None))
+
+    def test_empty_array_and_bom(self):
+        sample = stream_json_sample([codecs.BOM_UTF8 + b'{"data": []}'])
+        self.assertEqual((sample["rows"], sample["path"]), ([], "$.data"))
+
+    def test_cp1252(self):
+        body = '[{"municipio": "A Coruña"}]'.encode("cp1252")
+        sample = stream_json_sample([body])
+        self.assertEqual(sample["encoding"], "cp1252")
+        self.assertEqual(sample["rows"], [{"municipio": "A Coruña"}])
+
+    def test_early_cutoff_bounded_buffer(self):
+        body = json.dumps({"data": [{"id": i, "texto": "x" * 50} for i in range(100_000)]}).encode()
+        consumed = []
+
+        def source():
+            for chunk in chunked(body, 16 * 1024):
+                consumed.append(len(chunk))
+                yield chunk
+
+        sample = stream_json_sample(source(), max_rows=10)
+        self.assertEqual([r["id"] for r in sample["rows"]], list(range(10)))
+        self.assertFalse(sample["complete"])
+        self.assertLess(sum(consumed), len(body) // 10)
+        self.assertLess(sample["peak_buffer_bytes"], 4 * stream_samplers.CHUNK_SIZE)
+
+    def test_truncated_document(self):
+        with self.assertRaises(ValueError):
+            stream_json_sample([b'{"data": [{"a": "sin cerrar'])
@@ -10,11 +10,45 @@ urlpatterns = [
     path('search/keyword/', views.search_by_keyword_view, name='search_by_keyword_view'),
     path('search/spatial/', views.search_by_spatial_view, name='search_by_spatial_view'),
     path('search/category/', views.search_by_category_view, name='search_by_category_view'),
+    path('search/sparql/', views.search_sparql_view, name='search_sparql_view'),
 
     # Estadísticas
     path("stats/total-datasets/", views.total_datasets_view, name="total_datasets_view"),
     path("stats/themes/", views.all_themes_view, name="all_themes_view"),
     path("stats/dataset-counts-by-theme/", views.dataset_counts_by_theme_view, name="dataset_counts_by_theme_view"),
+    path("stats/http-client/", views.http_client_metrics_view, name="http_client_metrics_view"),
 
     path("dataset/analyze/", views.analyze_dataset_view, name="analyze_dataset_view"),
+    path("dataset/materialize/", views.materialize_dataset_view, name="materialize_dataset_view"),
+    path("dataset/chart-data/", views.chart_data_view, name="chart_data_view"),
+    path("correlation/", views.correlation_view, name="correlation_view"),
+    path("forecast/", views.forecast_view, name="forecast_view"),
+    path("geo/layers/", views.geo_layers_view, name="geo_layers_view"),
+    path("geo/shapes/<str:level>/", views.geo_shapes_view, name="geo_shapes_view"),
+    path("dataset/ine/metadata/", views.ine_table_metadata_view, name="ine_table_metadata_view"),
+    path("distribution/resolve/", views.resolve_distributions_view, name="resolve_distributions_view"),
+    path("process-datasets/", views.process_datasets_view, name="process_datasets_view"),
+
+    # Análisis en segundo plano (python manage.py run_analysis_worker)
+    path("jobs/analyze/", views.submit_analysis_job_view, name="submit_analysis_job_view"),
+    path("jobs/<uuid:job_id>/", views.analysis_job_view, name="analysis_job_view"),
+    path("jobs/<uuid:job_id>/result/", views.analysis_job_result_view, name="analysis_job_result_view"),
+    path("jobs/<uuid:job_id>/cancel/", views.cancel_analysis_job_view, name="cancel_analysis_job_view"),
+
+    # Variantes async (ASGI): mismos parámetros y respuesta que las anteriores
+    path('async/search/title/', views.search_by_title_async_view, name='search_by_title_async_view'),
+    path('async/search/keyword/', views.search_by_keyword_async_view, name='search_by_keyword_async_view'),
+    path('async/search/spatial/', views.search_by_spatial_async_view, name='search_by_spatial_async_view'),
+    path('async/search/category/', views.search_by_category_async_view, name='search_by_category_async_view'),
+    path('async/search/sparql/', views.search_sparql_async_view, name='search_sparql_async_view'),
+    path("async/stats/total-datasets/", views.total_datasets_async_view, name="total_datasets_async_view"),
+    path("async/stats/themes/", views.all_themes_async_view, name="all_themes_async_view"),
+    path("async/stats/dataset-counts-by-theme/", views.dataset_counts_by_theme_async_view, name="dataset_counts_by_theme_async_view"),
+    path("async/dataset/analyze/", views.analyze_dataset_async_view, name="analyze_dataset_async_view"),
+    path("async/dataset/chart-data/", views.chart_data_async_view, name="chart_data_async_view"),
+    path("async/correlation/", views.correlation_async_view, name="correlation_async_view"),
+    path("async/forecast/", views.forecast_async_view, name="forecast_async_view"),
+    path("async/dataset/ine/metadata/", views.ine_table_metadata_async_view, name="ine_table_metadata_async_view"),
+    path("async/distribution/resolve/", views.resolve_distributions_async_view, name="resolve_distributions_async_view"),
+    path("async/process-datasets/", views.process_datasets_async_view, name="process_datasets_async_view"),
     ]
\ No newline at end of file
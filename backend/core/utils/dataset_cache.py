@@ -0,0 +1,398 @@
+# core/utils/dataset_cache.py
+# Caché de respuestas remotas (búsquedas en datos.gob.es, etc.) con TTL,
+# stale-while-revalidate, tamaño acotado y backends intercambiables.
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from django.conf import settings
+
+try:
+    import msgpack  # opcional: serialización binaria más compacta
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "BACKEND": "filesystem",            # "locmem" | "filesystem" | "django"
+    "DIRECTORY": None,                  # por defecto BASE_DIR/core/data/cache
+    "DJANGO_CACHE_ALIAS": "default",
+    "MAX_ENTRIES": 2000,
+    "MAX_BYTES": 256 * 1024 * 1024,     # 256 MB
+    "SERIALIZER": "json",               # "json" | "msgpack"
+    "COMPRESS": True,                   # zlib sobre el payload serializado
+    "DEFAULT_TTL": 60 * 60,             # segundos en los que la entrada es "fresca"
+    "STALE_TTL": 24 * 60 * 60,          # segundos extra en los que se sirve stale y se revalida
+    "TTLS": {},                         # TTL por endpoint/namespace
+}
+
+FRESH = "fresh"
+STALE = "stale"
+MISS = "miss"
+
+
+def get_config() -> Dict[str, Any]:
+    conf = dict(DEFAULTS)
+    conf.update(getattr(settings, "DATASET_CACHE", {}) or {})
+    if not conf["DIRECTORY"]:
+        conf["DIRECTORY"] = os.path.join(settings.BASE_DIR, "core", "data", "cache")
+    return conf
+
+
+# -----------------------
+# Claves
+# -----------------------
+def make_cache_key(namespace: str, params: Any) -> str:
+    """
+    Clave estable y sin colisiones prácticas: sha256 de la representación JSON
+    canónica (claves ordenadas, sin espacios) de los parámetros.
+    A diferencia de slugify, "a b" y "a-b" o "Málaga" y "malaga" dan claves distintas.
+    """
+    canonical = json.dumps(params, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    digest = hashlib.sha256(f"{namespace}\x00{canonical}".encode("utf-8")).hexdigest()
+    return f"{namespace}-{digest[:40]}"
+
+
+# -----------------------
+# Serialización
+# -----------------------
+# Formato: 1 byte de formato (J=json, M=msgpack) + 1 byte de compresión (z/-) + payload.
+# Así las entradas antiguas siguen siendo legibles si cambia la configuración.
+def dumps(data: Any, serializer: str = "json", compress: bool = True) -> bytes:
+    if serializer == "msgpack" and msgpack is not None:
+        fmt, payload = b"M", msgpack.packb(data, use_bin_type=True)
+    else:
+        fmt, payload = b"J", json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if compress:
+        return fmt + b"z" + zlib.compress(payload, 6)
+    return fmt + b"-" + payload
+
+
+def loads(blob: bytes) -> Any:
+    fmt, comp, payload = blob[:1], blob[1:2], blob[2:]
+    if comp == b"z":
+        payload = zlib.decompress(payload)
+    if fmt == b"M":
+        if msgpack is None:
+            raise ValueError("Entrada msgpack en caché pero msgpack no está instalado")
+        return msgpack.unpackb(payload, raw=False)
+    return json.loads(payload)
+
+
+class CacheEntry:
+    __slots__ = ("blob", "created_at", "ttl", "stale_ttl")
+
+    def __init__(self, blob: bytes, created_at: float, ttl: int, stale_ttl: int):
+        self.blob = blob
+        self.created_at = created_at
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+
+    def state(self, now: Optional[float] = None) -> str:
+        age = (now or time.time()) - self.created_at
+        if age < self.ttl:
+            return FRESH
+        if age < self.ttl + self.stale_ttl:
+            return STALE
+        return MISS
+
+    def to_bytes(self) -> bytes:
+        header = json.dumps([self.created_at, self.ttl, self.stale_ttl]).encode("ascii")
+        return header + b"\n" + self.blob
+
+    @classmethod
+    def from_bytes(cls, raw: bytes) -> "CacheEntry":
+        header, blob = raw.split(b"\n", 1)
+        created_at, ttl, stale_ttl = json.loads(header)
+        return cls(blob, created_at, ttl, stale_ttl)
+
+
+# -----------------------
+# Backends
+# -----------------------
+class BaseCacheBackend:
+    def get(self, key: str) -> Optional[CacheEntry]:
+        raise NotImplementedError
+
+    def set(self, key: str, entry: CacheEntry) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+
+class LocMemLRUBackend(BaseCacheBackend):
+    """LRU en memoria del proceso, acotado por nº de entradas y bytes."""
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old.blob)
+            self._data[key] = entry
+            self._bytes += len(entry.blob)
+            while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+                _, evicted = self._data.popitem(last=False)
+                self._bytes -= len(evicted.blob)
+
+    def delete(self, key):
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old.blob)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+
+class FileSystemBackend(BaseCacheBackend):
+    """
+    Un fichero por clave en DIRECTORY. Escritura atómica (tmp + os.replace).
+    El mtime se actualiza en cada lectura y se usa como orden LRU al desalojar
+    cuando se superan MAX_BYTES o MAX_ENTRIES.
+    """
+
+    SUFFIX = ".cache"
+
+    def __init__(self, directory: str, max_entries: int, max_bytes: int):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._approx_bytes: Optional[int] = None
+        self._approx_entries: Optional[int] = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}{self.SUFFIX}")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                raw = f.read()
+            os.utime(path, None)
+            return CacheEntry.from_bytes(raw)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            logger.warning("Entrada de caché corrupta, se elimina: %s", path)
+            self.delete(key)
+            return None
+
+    def set(self, key, entry):
+        path = self._path(key)
+        raw = entry.to_bytes()
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(raw)
+        with self._lock:
+            # Al sobrescribir se descuenta el fichero anterior y no cuenta como entrada nueva
+            try:
+                old_size = os.stat(path).st_size
+            except FileNotFoundError:
+                old_size = None
+            os.replace(tmp, path)
+            if self._approx_bytes is None:
+                self._rescan()
+            else:
+                self._approx_bytes += len(raw) - (old_size or 0)
+                self._approx_entries += old_size is None
+            if self._approx_bytes > self.max_bytes or self._approx_entries > self.max_entries:
+                self._evict()
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        for e in self._scan():
+            try:
+                os.remove(e.path)
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self._approx_bytes = 0
+            self._approx_entries = 0
+
+    def _scan(self):
+        try:
+            return [e for e in os.scandir(self.directory) if e.name.endswith(self.SUFFIX)]
+        except FileNotFoundError:
+            return []
+
+    def _rescan(self):
+        entries = self._scan()
+        self._approx_bytes = sum(e.stat().st_size for e in entries)
+        self._approx_entries = len(entries)
+
+    def _evict(self):
+        # Desalojar hasta el 90% de los límites para no escanear en cada set()
+        entries = []
+        for e in self._scan():
+            try:
+                st = e.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, e.path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        count = len(entries)
+        target_bytes = int(self.max_bytes * 0.9)
+        target_entries = int(self.max_entries * 0.9)
+        for _, size, path in entries:
+            if total <= target_bytes and count <= target_entries:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            count -= 1
+        self._approx_bytes = total
+        self._approx_entries = count
+
+
+class DjangoCacheBackend(BaseCacheBackend):
+    """Delega en el framework de caché de Django (settings.CACHES[alias])."""
+
+    def __init__(self, alias: str, max_timeout: int):
+        from django.core.cache import caches
+        self.cache = caches[alias]
+        self.max_timeout = max_timeout
+
+    def get(self, key):
+        raw = self.cache.get(key)
+        if raw is None:
+            return None
+        try:
+            return CacheEntry.from_bytes(raw)
+        except Exception:
+            return None
+
+    def set(self, key, entry):
+        self.cache.set(key, entry.to_bytes(), timeout=int(entry.ttl + entry.stale_ttl) or self.max_timeout)
+
+    def delete(self, key):
+        self.cache.delete(key)
+
+    def clear(self):
+        self.cache.clear()
+
+
+def build_backend(conf: Dict[str, Any]) -> BaseCacheBackend:
+    name = conf["BACKEND"]
+    if name == "locmem":
+        return LocMemLRUBackend(conf["MAX_ENTRIES"], conf["MAX_BYTES"])
+    if name == "filesystem":
+        return FileSystemBackend(conf["DIRECTORY"], conf["MAX_ENTRIES"], conf["MAX_BYTES"])
+    if name == "django":
+        return DjangoCacheBackend(conf["DJANGO_CACHE_ALIAS"], conf["DEFAULT_TTL"] + conf["STALE_TTL"])
+    raise ValueError(f"Backend de caché desconocido: {name}")
+
+
+_backend_lock = threading.Lock()
+_backend: Optional[BaseCacheBackend] = None
+
+
+def get_backend() -> BaseCacheBackend:
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = build_backend(get_config())
+    return _backend
+
+
+def get_ttls(namespace: str) -> Tuple[int, int]:
+    """(ttl, stale_ttl) para un namespace; TTLS admite un int o un dict {"TTL", "STALE_TTL"}."""
+    conf = get_config()
+    override = conf["TTLS"].get(namespace)
+    if isinstance(override, dict):
+        return override.get("TTL", conf["DEFAULT_TTL"]), override.get("STALE_TTL", conf["STALE_TTL"])
+    if override is not None:
+        return int(override), conf["STALE_TTL"]
+    return conf["DEFAULT_TTL"], conf["STALE_TTL"]
+
+
+# -----------------------
+# API de alto nivel
+# -----------------------
+_revalidating = set()
+_revalidating_lock = threading.Lock()
+
+
+def store(namespace: str, key: str, data: Any) -> None:
+    conf = get_config()
+    ttl, stale_ttl = get_ttls(namespace)
+    blob = dumps(data, conf["SERIALIZER"], conf["COMPRESS"])
+    get_backend().set(key, CacheEntry(blob, time.time(), ttl, stale_ttl))
+
+
+def lookup(key: str) -> Tuple[Any, str]:
+    """Devuelve (datos, estado) con estado en FRESH/STALE/MISS."""
+    backend = get_backend()
+    entry = backend.get(key)
+    if entry is None:
+        return None, MISS
+    state = entry.state()
+    if state == MISS:
+        backend.delete(key)
+        return None, MISS
+    try:
+        return loads(entry.blob), state
+    except Exception:
+        logger.warning("No se pudo deserializar la entrada %s", key)
+        backend.delete(key)
+        return None, MISS
+
+
+def _revalidate(key: str, refresh: Callable[[], Any]) -> None:
+    try:
+        refresh()
+    except Exception:
+        logger.exception("Fallo revalidando entrada de caché %s", key)
+    finally:
+        with _revalidating_lock:
+            _revalidating.discard(key)
+
+
+def schedule_revalidation(key: str, refresh: Callable[[], Any]) -> bool:
+    """
+    Lanza en segundo plano refresh() (que debe descargar y guardar la entrada)
+    si no hay ya un refresco en curso para la clave en este proceso.
+    """
+    with _revalidating_lock:
+        if key in _revalidating:
+            return False
+        _revalidating.add(key)
+    threading.Thread(target=_revalidate, args=(key, refresh), daemon=True).start()
+    return True
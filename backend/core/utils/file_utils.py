@@ -1,50 +1,131 @@
-import os
-import json
-from django.utils.text import slugify
+import asyncio
+import logging
 
-def handle_dataset_file(directory, filename, fetch_function, fetch_args=None, force_download=False):
+from asgiref.sync import sync_to_async
+
+from core.utils import dataset_cache, single_flight
+
+logger = logging.getLogger(__name__)
+
+
+def handle_dataset_file(namespace, params, fetch_function, fetch_args=None, force_download=False):
     """
-    Maneja la lógica de verificación y descarga de archivos de datasets
-    
+    Maneja la lógica de caché y descarga de los datos remotos de un endpoint.
+    Las descargas concurrentes de la misma clave (en este proceso o en otros
+    workers) se coalescen: sólo una llega al servidor remoto.
+
     Args:
-        directory (str): Directorio donde se guardarán los archivos (ej. 'core/data')
-        filename (str): Nombre base del archivo (sin extensión)
+        namespace (str): Endpoint/espacio de claves (ej. 'search_title'); determina el TTL
+        params (dict): Parámetros normalizados de la petición; forman la clave de caché
         fetch_function (function): Función que obtiene los datos si es necesario descargarlos
         fetch_args (tuple): Argumentos para la función fetch_function
-        force_download (bool): Si True, ignora archivos existentes y fuerza la descarga
-    
+        force_download (bool): Si True, ignora la caché y fuerza la descarga
+
     Returns:
         tuple: (datos, mensaje, status_code)
     """
-    # Crear el directorio si no existe
-    os.makedirs(directory, exist_ok=True)
-    
-    # Generar nombre de archivo seguro
-    safe_filename = f"{slugify(filename)}.json"
-    file_path = os.path.join(directory, safe_filename)
-    
-    # Si el archivo existe y no forzamos descarga, cargarlo
-    if not force_download and os.path.exists(file_path):
-        try:
-            with open(file_path, encoding="utf-8") as f:
-                data = json.load(f)
-            return data, f"Archivo '{safe_filename}' cargado desde disco", 200
-        except Exception as e:
-            # Si hay error al leer, proceder a descargar
-            pass
-    
-    # Obtener datos de la función proporcionada
-    try:
+    key = dataset_cache.make_cache_key(namespace, params)
+
+    def fetch_and_store():
         data = fetch_function(*(fetch_args or ()))
+        if data:
+            try:
+                dataset_cache.store(namespace, key, data)
+            except Exception:
+                logger.exception("Datos obtenidos pero no se pudieron guardar en caché (%s)", key)
+        return data
+
+    def recheck():
+        # Con el lock entre procesos ya tomado: ¿otro worker acaba de guardarlo?
+        data, state = dataset_cache.lookup(key)
+        return data if state == dataset_cache.FRESH else None
+
+    def coalesced_fetch():
+        return single_flight.do(key, fetch_and_store, recheck=None if force_download else recheck)
+
+    # Servir desde caché: fresco tal cual, stale mientras se revalida en segundo plano
+    if not force_download:
+        data, state = dataset_cache.lookup(key)
+        if state == dataset_cache.FRESH:
+            return data, f"Datos '{key}' servidos desde caché", 200
+        if state == dataset_cache.STALE:
+            dataset_cache.schedule_revalidation(key, coalesced_fetch)
+            return data, f"Datos '{key}' servidos desde caché (revalidando)", 200
+
+    # Obtener datos (una sola descarga por clave entre llamadores concurrentes)
+    try:
+        data = coalesced_fetch()
         if not data:
             return None, "No se pudieron obtener datos", 500
     except Exception as e:
+        logger.exception("Error al obtener datos para %s", key)
         return None, f"Error al obtener datos: {str(e)}", 500
-    
-    # Guardar los datos
+
+    return data, f"Datos '{key}' obtenidos y guardados en caché", 200
+
+
+async def ahandle_dataset_file(namespace, params, afetch_function, fetch_args=None, force_download=False):
+    """
+    Variante asíncrona de handle_dataset_file para las vistas ASGI.
+    afetch_function es una corrutina; el acceso a la caché (disco/zlib) se
+    hace en un hilo para no bloquear el event loop.
+
+    Returns:
+        tuple: (datos, mensaje, status_code)
+    """
+    key = dataset_cache.make_cache_key(namespace, params)
+    lookup = sync_to_async(dataset_cache.lookup, thread_sensitive=False)
+    store = sync_to_async(dataset_cache.store, thread_sensitive=False)
+
+    async def fetch_and_store():
+        data = await afetch_function(*(fetch_args or ()))
+        if data:
+            try:
+                await store(namespace, key, data)
+            except Exception:
+                logger.exception("Datos obtenidos pero no se pudieron guardar en caché (%s)", key)
+        return data
+
+    async def recheck():
+        data, state = await lookup(key)
+        return data if state == dataset_cache.FRESH else None
+
+    async def coalesced_fetch():
+        return await single_flight.ado(key, fetch_and_store, arecheck=None if force_download else recheck)
+
+    if not force_download:
+        data, state = await lookup(key)
+        if state == dataset_cache.FRESH:
+            return data, f"Datos '{key}' servidos desde caché", 200
+        if state == dataset_cache.STALE:
+            _schedule_async_revalidation(key, coalesced_fetch)
+            return data, f"Datos '{key}' servidos desde caché (revalidando)", 200
+
     try:
-        with open(file_path, 'w', encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        return data, f"Datos guardados en '{safe_filename}'", 200
+        data = await coalesced_fetch()
+        if not data:
+            return None, "No se pudieron obtener datos", 500
     except Exception as e:
-        return data, f"Datos obtenidos pero no se pudieron guardar: {str(e)}", 500
\ No newline at end of file
+        logger.exception("Error al obtener datos para %s", key)
+        return None, f"Error al obtener datos: {str(e)}", 500
+
+    return data, f"Datos '{key}' obtenidos y guardados en caché", 200
+
+
+_background_tasks = set()
+
+
+def _schedule_async_revalidation(key, refresh):
+    # Referencia fuerte a la tarea hasta que termine (asyncio sólo guarda weakrefs)
+    if key in {t.get_name() for t in _background_tasks}:
+        return
+
+    async def run():
+        try:
+            await refresh()
+        except Exception:
+            logger.exception("Fallo revalidando entrada de caché %s", key)
+
+    task = asyncio.get_running_loop().create_task(run(), name=key)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
@@ -0,0 +1,244 @@
+# core/utils/single_flight.py
+# Coalescencia de peticiones idénticas concurrentes ("single-flight"):
+# el primer llamador ejecuta la descarga y el resto espera su mismo resultado.
+# Dentro del proceso se usa un Event por clave; entre procesos (varios workers
+# de gunicorn/uvicorn) un lock de fichero hace de "líder" y el resto, al obtener
+# el lock, vuelve a consultar la caché compartida antes de descargar.
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "LOCK_DIR": None,       # por defecto BASE_DIR/core/data/locks
+    "WAIT_TIMEOUT": 90,     # segundos máximos esperando a otro llamador
+    "POLL_INTERVAL": 0.05,
+}
+
+
+class SingleFlightTimeout(Exception):
+    pass
+
+
+def get_config() -> Dict[str, Any]:
+    conf = dict(DEFAULTS)
+    conf.update(getattr(settings, "SINGLE_FLIGHT", {}) or {})
+    if not conf["LOCK_DIR"]:
+        conf["LOCK_DIR"] = os.path.join(settings.BASE_DIR, "core", "data", "locks")
+    return conf
+
+
+# -----------------------
+# Lock entre procesos
+# -----------------------
+def _try_lock(fd) -> bool:
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def _unlock(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+# Un fichero de lock por clave (hash), borrado al liberar para que el directorio
+# no crezca. Si otro proceso abrió el fichero justo antes del borrado puede acabar
+# con un lock "huérfano" y repetir la descarga: se acepta (las escrituras en caché
+# son atómicas), a cambio de que claves distintas nunca se esperen entre sí.
+def _lock_path(key: str, conf: Dict[str, Any]) -> str:
+    os.makedirs(conf["LOCK_DIR"], exist_ok=True)
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+    return os.path.join(conf["LOCK_DIR"], f"sf-{digest}.lock")
+
+
+def _release(fd: int, path: str, acquired: bool):
+    if acquired:
+        try:
+            os.remove(path)
+        except OSError:
+            pass  # Windows no permite borrar un fichero abierto
+        _unlock(fd)
+    os.close(fd)
+
+
+@contextmanager
+def interprocess_lock(key: str, timeout: Optional[float] = None):
+    """
+    Lock exclusivo entre procesos para `key`. Si no se consigue en `timeout`
+    segundos se continúa sin lock (mejor una descarga duplicada que un error).
+    Cede True/False según se haya obtenido el lock.
+    """
+    conf = get_config()
+    timeout = conf["WAIT_TIMEOUT"] if timeout is None else timeout
+    path = _lock_path(key, conf)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    acquired = False
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            acquired = _try_lock(fd)
+            if acquired or time.monotonic() >= deadline:
+                break
+            time.sleep(conf["POLL_INTERVAL"])
+        if not acquired:
+            logger.warning("Timeout esperando lock single-flight para %s; se continúa sin lock", key)
+        yield acquired
+    finally:
+        _release(fd, path, acquired)
+
+
+@asynccontextmanager
+async def ainterprocess_lock(key: str, timeout: Optional[float] = None):
+    """Como interprocess_lock, pero espera con asyncio.sleep sin bloquear el event loop."""
+    conf = get_config()
+    timeout = conf["WAIT_TIMEOUT"] if timeout is None else timeout
+    path = _lock_path(key, conf)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    acquired = False
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            acquired = _try_lock(fd)
+            if acquired or time.monotonic() >= deadline:
+                break
+            await asyncio.sleep(conf["POLL_INTERVAL"])
+        if not acquired:
+            logger.warning("Timeout esperando lock single-flight para %s; se continúa sin lock", key)
+        yield acquired
+    finally:
+        _release(fd, path, acquired)
+
+
+# -----------------------
+# Coalescencia en proceso
+# -----------------------
+class _Call:
+    __slots__ = ("event", "result", "error", "waiters")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+_calls: Dict[str, _Call] = {}
+_calls_lock = threading.Lock()
+_stats = {"leaders": 0, "coalesced": 0}
+
+
+def get_stats() -> Dict[str, int]:
+    return dict(_stats, in_flight=len(_calls) + sum(len(c) for c in list(_async_calls.values())))
+
+
+def do(key: str, fn: Callable[[], Any], recheck: Optional[Callable[[], Any]] = None,
+       timeout: Optional[float] = None) -> Any:
+    """
+    Ejecuta fn() una sola vez por clave entre todos los llamadores concurrentes.
+    - recheck: callable que, ya con el lock entre procesos, devuelve el resultado
+      si otro proceso lo acaba de producir (p.ej. leyendo la caché), o None.
+    Los llamadores que esperan reciben el mismo resultado o la misma excepción.
+    """
+    timeout = get_config()["WAIT_TIMEOUT"] if timeout is None else timeout
+    with _calls_lock:
+        call = _calls.get(key)
+        leader = call is None
+        if leader:
+            call = _Call()
+            _calls[key] = call
+            _stats["leaders"] += 1
+        else:
+            call.waiters += 1
+            _stats["coalesced"] += 1
+
+    if not leader:
+        if not call.event.wait(timeout):
+            raise SingleFlightTimeout(f"Timeout esperando resultado compartido para {key}")
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    try:
+        with interprocess_lock(key, timeout):
+            result = recheck() if recheck is not None else None
+            if result is None:
+                result = fn()
+        call.result = result
+        return result
+    except BaseException as e:
+        call.error = e
+        raise
+    finally:
+        with _calls_lock:
+            _calls.pop(key, None)
+        call.event.set()
+
+
+# -----------------------
+# Coalescencia en proceso (asyncio)
+# -----------------------
+# Un Future por clave y event loop; los seguidores hacen await sobre el mismo Future.
+_async_calls: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Future]]" = weakref.WeakKeyDictionary()
+
+
+async def ado(key: str, afn: Callable[[], Awaitable[Any]],
+              arecheck: Optional[Callable[[], Awaitable[Any]]] = None,
+              timeout: Optional[float] = None) -> Any:
+    """Variante asíncrona de do(): afn y arecheck son corrutinas sin argumentos."""
+    timeout = get_config()["WAIT_TIMEOUT"] if timeout is None else timeout
+    loop = asyncio.get_running_loop()
+    calls = _async_calls.get(loop)
+    if calls is None:
+        calls = _async_calls[loop] = {}
+
+    fut = calls.get(key)
+    if fut is not None:
+        _stats["coalesced"] += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(fut), timeout)
+        except asyncio.TimeoutError:
+            raise SingleFlightTimeout(f"Timeout esperando resultado compartido para {key}")
+
+    fut = loop.create_future()
+    calls[key] = fut
+    _stats["leaders"] += 1
+    try:
+        async with ainterprocess_lock(key, timeout):
+            result = await arecheck() if arecheck is not None else None
+            if result is None:
+                result = await afn()
+        fut.set_result(result)
+        return result
+    except asyncio.CancelledError:
+        fut.cancel()
+        raise
+    except BaseException as e:
+        fut.set_exception(e)
+        fut.exception()  # marcar como recuperada si nadie más esperaba
+        raise
+    finally:
+        calls.pop(key, None)
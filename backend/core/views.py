@@ -1,43 +1,67 @@
 # core/views.py
-import os
+import json
 import logging
+import time
 from django.shortcuts import render
-from django.views.decorators.http import require_GET
-from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_http_methods, require_POST
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from django.contrib.auth.models import User
-from django.utils.text import slugify
+
+from core.models import AnalysisJob
+
+from asgiref.sync import sync_to_async
 
 from core.services.search_datasets import (
+    PAGE_SIZE,
     search_by_title,
     search_by_keyword,
     search_by_spatial,
     search_by_category,
+    asearch_by_title,
+    asearch_by_keyword,
+    asearch_by_spatial,
+    asearch_by_category,
 )
 from core.services.sparql_service import (
     get_total_datasets,
     get_all_themes,
     get_dataset_counts_by_theme,
+    aget_total_datasets,
+    aget_all_themes,
+    aget_dataset_counts_by_theme,
 )
 
 from core.services.ine_api_service import (
+    INEApiError,
+    ine_query_params,
     is_ine_dataset,
     get_dataset_from_ine,
     extract_ine_idtable,
-    INEApiError,
+    get_table_metadata,
+    aget_table_metadata,
+    resolve_ine_filters,
+    aresolve_ine_filters,
+    describe_table,
+    suggest_from_metadata,
 )
 
 from core.utils.file_utils import (
-    handle_dataset_file
+    handle_dataset_file,
+    ahandle_dataset_file,
 )
+from core.utils.dataset_cache import make_cache_key
+from core.utils import single_flight
 from core.services.dataset_analyzer import (
-    analyze_distribution_url
+    analyze_distribution_url, arun_analysis, materialize_distribution, run_analysis
 )
+from core.services import analysis_jobs, batch_analysis, chart_data, columnar_store, correlation, forecasting, geo_index, geo_shapes, distribution_resolver, http_client, search_fanout, search_projection, sparql_search, stats_snapshot
 
 logger = logging.getLogger(__name__)
 
-DATASETS_DIR = os.path.join("core", "data")
-
-
 def home(request):
     return render(request, "core/home.html")
 
@@ -60,23 +84,19 @@ def test_conexion_bd_api(request):
 
 
 # --- Generic search view helper to avoid repetition ---
-def _generic_search_view(
-    request, required_params, fetch_function, filename_builder=None, extra_args_from_request=None
-):
+def _parse_search_request(request, required_params, extra_args_from_request=None):
     """
-    - required_params: list of parameter names that must exist in GET (e.g. ['title'] or ['spatial_type','spatial_value'])
-    - fetch_function: function to call to obtain remote data (must accept args as tuple)
-    - filename_builder: optional callable (params_dict, page_int) -> filename string
-    - extra_args_from_request: optional callable (params_dict, page_int) -> tuple(fetch_args)
+    Shared by the sync and async search views.
+    Returns (cache_params, fetch_args, None) or (None, None, error_response).
     """
     params = {}
     for p in required_params:
-        params[p] = request.GET.get(p)
+        params[p] = (request.GET.get(p) or "").strip()
 
     # Validate required params
     missing = [p for p, v in params.items() if not v]
     if missing:
-        return JsonResponse(
+        return None, None, JsonResponse(
             {"success": False, "message": f"Faltan parámetros: {', '.join(missing)}"}, status=400
         )
 
@@ -89,13 +109,8 @@ def _generic_search_view(
     except ValueError:
         page_int = 0
 
-    # Build filename for cached file
-    if filename_builder:
-        filename = filename_builder(params, page_int)
-    else:
-        # default: join values with underscore
-        safe_vals = "_".join([str(v).replace(" ", "_") for v in params.values()])
-        filename = f"{safe_vals}_{page_int}"
+    # Cache key params: exact values (no slugify), so distinct queries never share an entry
+    cache_params = {**params, "page": page_int}
 
     # Build fetch args
     if extra_args_from_request:
@@ -103,20 +118,25 @@ def _generic_search_view(
     else:
         # default: pass all params in order, then page
         fetch_args = tuple(list(params.values()) + [page_int])
+    return cache_params, fetch_args, None
+
 
+def _parse_projection(request):
+    """Returns (projection or None, None) or (None, error_response). See core/services/search_projection.py."""
     try:
-        data, message, status = handle_dataset_file(
-            directory=DATASETS_DIR, filename=filename, fetch_function=fetch_function, fetch_args=fetch_args
-        )
-    except Exception as e:
-        logger.exception("Error interno al llamar handle_dataset_file")
-        return JsonResponse({"success": False, "message": "Error interno del servidor"}, status=500)
+        return search_projection.parse_projection(
+            request.GET.get("view"), request.GET.get("fields"), request.GET.get("lang")), None
+    except search_projection.ProjectionError as e:
+        return None, JsonResponse({"success": False, "message": str(e)}, status=400)
 
+
+def _search_response(data, message, status, cache_namespace, cache_params, projection=None):
     if status != 200 or not data:
         # message may already be meaningful from handle_dataset_file
         return JsonResponse({"success": False, "message": message}, status=status)
 
     result_obj = data.get("result", {}) if isinstance(data, dict) else {}
+    result_obj = search_projection.project_result(result_obj, projection)
     # Prefer an explicit items_count returned by the fetch result if present; otherwise use len(items)
     items_count = None
     if isinstance(result_obj, dict) and "items_count" in result_obj:
@@ -130,26 +150,128 @@ def _generic_search_view(
     if items_count is None:
         items_count = computed_items_count
 
-    file_path = os.path.join(DATASETS_DIR, f"{slugify(filename)}.json")
-
     return JsonResponse(
         {
             "success": True,
             "message": message,
             "result": result_obj,
             "items_count": items_count,
-            "file_path": file_path,
+            "cache_key": make_cache_key(cache_namespace, cache_params),
         },
         status=200,
     )
 
+
+def _parse_all_pages(request):
+    """all_pages=1 activa el modo NDJSON con todas las páginas; max_pages lo acota."""
+    if (request.GET.get("all_pages") or "").lower() not in ("1", "true", "yes"):
+        return None
+    try:
+        return max(int(request.GET.get("max_pages") or 0), 0)
+    except ValueError:
+        return 0
+
+
+def _page_request(cache_params, extra_args_from_request, page):
+    # (cache_params, fetch_args) de otra página de la misma búsqueda
+    params = {k: v for k, v in cache_params.items() if k != "page"}
+    if extra_args_from_request:
+        return {**params, "page": page}, extra_args_from_request(params, page)
+    return {**params, "page": page}, tuple(list(params.values()) + [page])
+
+
+def _ndjson_response(stream):
+    response = StreamingHttpResponse(stream, content_type="application/x-ndjson")
+    response["X-Accel-Buffering"] = "no"  # que un proxy (nginx) no retenga las líneas
+    return response
+
+
+def _generic_search_view(
+    request, required_params, fetch_function, cache_namespace, extra_args_from_request=None
+):
+    """
+    - required_params: list of parameter names that must exist in GET (e.g. ['title'] or ['spatial_type','spatial_value'])
+    - fetch_function: function to call to obtain remote data (must accept args as tuple)
+    - cache_namespace: cache key namespace for this endpoint (also selects its TTL)
+    - extra_args_from_request: optional callable (params_dict, page_int) -> tuple(fetch_args)
+    With all_pages=1 the response is NDJSON: one item per line (deduplicated by
+    _about) from every page, fetched concurrently, plus a final {"_meta": ...} line.
+    """
+    cache_params, fetch_args, error = _parse_search_request(request, required_params, extra_args_from_request)
+    if error is None:
+        projection, error = _parse_projection(request)
+    if error is not None:
+        return error
+    transform = (lambda item: search_projection.project_item(item, projection)) if projection else None
+
+    max_pages = _parse_all_pages(request)
+    if max_pages is not None:
+        def fetch_page(page):
+            page_params, page_args = _page_request(cache_params, extra_args_from_request, page)
+            data, message, status = handle_dataset_file(cache_namespace, page_params, fetch_function, page_args)
+            return data if status == 200 else None
+
+        return _ndjson_response(search_fanout.stream_all_pages(
+            fetch_page, PAGE_SIZE, start_page=cache_params["page"], max_pages=max_pages, transform=transform))
+
+    try:
+        data, message, status = handle_dataset_file(
+            namespace=cache_namespace, params=cache_params, fetch_function=fetch_function, fetch_args=fetch_args
+        )
+    except Exception as e:
+        logger.exception("Error interno al llamar handle_dataset_file")
+        return JsonResponse({"success": False, "message": "Error interno del servidor"}, status=500)
+
+    return _search_response(data, message, status, cache_namespace, cache_params, projection)
+
+def _parse_sparql_search_request(request):
+    """Returns ((theme, q, limit, cursor), None) or (None, error_response)."""
+    try:
+        args = sparql_search.validate_params(
+            (request.GET.get("theme") or "").strip(),
+            (request.GET.get("q") or "").strip(),
+            (request.GET.get("limit") or "").strip(),
+            (request.GET.get("cursor") or "").strip(),
+        )
+    except sparql_search.SparqlSearchError as e:
+        return None, JsonResponse({"success": False, "message": str(e)}, status=400)
+    return args, None
+
+
+@require_GET
+def search_sparql_view(request):
+    """
+    Búsqueda SPARQL paginada por cursor: ?theme=&q=&limit=&cursor=. Cada
+    respuesta trae result.next_cursor (opaco) para pedir la página siguiente,
+    que ya se está precargando.
+    """
+    args, error = _parse_sparql_search_request(request)
+    if error is None:
+        projection, error = _parse_projection(request)
+    if error is not None:
+        return error
+    cache_params = sparql_search.cache_params(*args)
+    try:
+        data, message, status = handle_dataset_file(
+            namespace=sparql_search.NAMESPACE, params=cache_params,
+            fetch_function=sparql_search.search_page, fetch_args=args,
+        )
+    except Exception as e:
+        logger.exception("Error interno al llamar handle_dataset_file")
+        return JsonResponse({"success": False, "message": "Error interno del servidor"}, status=500)
+
+    if status == 200:
+        sparql_search.prefetch_next(*args[:3], data)
+    return _search_response(data, message, status, sparql_search.NAMESPACE, cache_params, projection)
+
+
 @require_GET
 def search_by_title_view(request):
     return _generic_search_view(
         request,
         required_params=["title"],
         fetch_function=search_by_title,
-        filename_builder=lambda params, page: f"{params['title']}_{page}",
+        cache_namespace="search_title",
         extra_args_from_request=lambda params, page: (params["title"], page),
     )
 
@@ -160,7 +282,7 @@ def search_by_keyword_view(request):
         request,
         required_params=["keyword"],
         fetch_function=search_by_keyword,
-        filename_builder=lambda params, page: f"{params['keyword']}_{page}",
+        cache_namespace="search_keyword",
         extra_args_from_request=lambda params, page: (params["keyword"], page),
     )
 
@@ -171,7 +293,7 @@ def search_by_spatial_view(request):
         request,
         required_params=["spatial_type", "spatial_value"],
         fetch_function=search_by_spatial,
-        filename_builder=lambda params, page: f"{params['spatial_type']}_{params['spatial_value']}_{page}",
+        cache_namespace="search_spatial",
         extra_args_from_request=lambda params, page: (params["spatial_type"], params["spatial_value"], page),
     )
 
@@ -182,83 +304,846 @@ def search_by_category_view(request):
         request,
         required_params=["category"],
         fetch_function=search_by_category,
-        filename_builder=lambda params, page: f"{params['category']}_{page}",
+        cache_namespace="search_category",
         extra_args_from_request=lambda params, page: (params["category"], page),
     )
 
-@require_GET
-def total_datasets_view(request):
+def _snapshot_response(request, snapshot, field):
+    """Respuesta desde la instantánea con ETag/Last-Modified (304 si el cliente ya la tiene)."""
+    response = JsonResponse({
+        "success": True,
+        field: snapshot["data"],
+        "snapshot": {"version": snapshot["version"], "refreshed_at": snapshot["refreshed_at"]},
+    })
+    last_modified = int(snapshot["changed_at"].timestamp())
+    response["ETag"] = f'"{snapshot["etag"]}"'
+    response["Last-Modified"] = http_date(last_modified)
+    response["Cache-Control"] = "no-cache"  # el navegador revalida siempre: 304 si no ha cambiado
+    return get_conditional_response(request, etag=response["ETag"], last_modified=last_modified, response=response)
+
+
+def _stats_view(request, key, field, fetch_function, error_label):
+    # Home se sirve de la instantánea; en directo contra SPARQL sólo si aún no existe
+    stats_snapshot.ensure_scheduler()
+    snapshot = stats_snapshot.get_snapshot(key)
+    if snapshot:
+        return _snapshot_response(request, snapshot, field)
     try:
-        total = get_total_datasets()
-        return JsonResponse({"success": True, "total_datasets": total})
+        return JsonResponse({"success": True, field: fetch_function()})
     except Exception as e:
-        logger.exception("Error obteniendo total datasets")
+        logger.exception(error_label)
         return JsonResponse({"success": False, "message": str(e)}, status=500)
 
 
+@require_GET
+def total_datasets_view(request):
+    return _stats_view(request, "total_datasets", "total_datasets", get_total_datasets,
+                       "Error obteniendo total datasets")
+
+
 @require_GET
 def all_themes_view(request):
-    try:
-        themes = get_all_themes()
-        return JsonResponse({"success": True, "themes": themes}, safe=False)
-    except Exception as e:
-        logger.exception("Error obteniendo themes")
-        return JsonResponse({"success": False, "message": str(e)}, status=500)
+    return _stats_view(request, "all_themes", "themes", get_all_themes, "Error obteniendo themes")
 
 
 @require_GET
 def dataset_counts_by_theme_view(request):
-    try:
-        data = get_dataset_counts_by_theme()
-        return JsonResponse({"success": True, "themes": data})
-    except Exception as e:
-        logger.exception("Error dataset counts by theme")
-        return JsonResponse({"success": False, "message": str(e)}, status=500)
+    return _stats_view(request, "dataset_counts_by_theme", "themes", get_dataset_counts_by_theme,
+                       "Error dataset counts by theme")
 
 
 @require_GET
-def analyze_dataset_view(request):
-    dataset_url = request.GET.get("url")
+def http_client_metrics_view(request):
+    return JsonResponse({
+        "success": True,
+        "hosts": http_client.get_metrics(),
+        "single_flight": single_flight.get_stats(),
+    })
+
+
+def _parse_ine_filters(request):
+    """
+    Filtros que se reenvían al INE (wstempus) para que recorte en el servidor:
+    nult, date_from, date_to (AAAA-MM-DD), tip y tv=variable:valor (repetible o
+    separado por comas; ids o nombres, que se resuelven con los metadatos de la
+    tabla). Lanza INEApiError si alguno no es válido.
+    """
+    tv = [f.strip() for value in request.GET.getlist("tv") for f in value.split(",") if f.strip()]
+    filters = {
+        "nult": (request.GET.get("nult") or "").strip() or None,
+        "date_from": (request.GET.get("date_from") or "").strip() or None,
+        "date_to": (request.GET.get("date_to") or "").strip() or None,
+        "tip": (request.GET.get("tip") or "").strip() or None,
+        "tv": tv or None,
+    }
+    filters = {k: v for k, v in filters.items() if v is not None}
+    # validación; tv se comprueba contra los metadatos de la tabla en get_dataset_from_ine
+    ine_query_params(**{k: v for k, v in filters.items() if k != "tv"})
+    for f in tv:
+        var_key, sep, val_key = f.partition(":")
+        if not (sep and var_key.strip() and val_key.strip()):
+            raise INEApiError(f"Filtro tv '{f}' no válido (usa variable:valor)")
+    if "nult" in filters:
+        filters["nult"] = int(filters["nult"])
+    return filters
+
+
+def _parse_analyze_request(request):
+    """
+    Returns (dataset_url, fmt, max_rows, options, None) or (None, None, None, None, error_response).
+    options: {"profile": bool, "ine_filters": dict[, "materialize": True]}. profile=1
+    activa el perfilado del recurso completo (estadísticas por columna);
+    materialize=1 guarda el recurso en el almacén columnar local para los
+    análisis siguientes.
+    """
+    dataset_url = (request.GET.get("url") or "").strip()
     fmt = (request.GET.get("format") or "").lower()
     rows_param = request.GET.get("rows")
+    profile = (request.GET.get("profile") or "").lower() in ("1", "true", "yes")
+    materialize = (request.GET.get("materialize") or "").lower() in ("1", "true", "yes")
 
     if not dataset_url:
-        return JsonResponse({"success": False, "message": "Parámetro 'url' es obligatorio"}, status=400)
+        return None, None, None, None, JsonResponse({"success": False, "message": "Parámetro 'url' es obligatorio"}, status=400)
 
     supported_formats = [None, "", "json", "csv", "xml", "rdf+xml", "html", "pc-axis"]
     if fmt not in supported_formats:
-        return JsonResponse({"success": False, "message": f"Formato '{fmt}' no soportado"}, status=415)
+        return None, None, None, None, JsonResponse({"success": False, "message": f"Formato '{fmt}' no soportado"}, status=415)
+
+    try:
+        ine_filters = _parse_ine_filters(request)
+    except INEApiError as e:
+        return None, None, None, None, JsonResponse({"success": False, "message": str(e)}, status=400)
 
     try:
         max_rows = None if rows_param == "-1" else int(rows_param) if rows_param else 80
     except ValueError:
         max_rows = 80
+    options = {"profile": profile, "ine_filters": ine_filters}
+    if materialize:
+        options["materialize"] = True   # sólo si se pide: no cambia la clave de caché del resto
+    return dataset_url, fmt, max_rows, options, None
+
 
+def _analysis_response(data, message, status):
+    if status != 200 or not data:
+        return JsonResponse({"success": False, "message": message}, status=status)
+    return JsonResponse({"success": True, **data}, status=200)
+
+
+@require_GET
+def analyze_dataset_view(request):
+    dataset_url, fmt, max_rows, options, error = _parse_analyze_request(request)
+    if error is not None:
+        return error
+    if is_ine_dataset(dataset_url):
+        try:
+            options["ine_filters"] = resolve_ine_filters(dataset_url, options["ine_filters"])
+        except INEApiError as e:
+            return JsonResponse({"success": False, "message": str(e)}, status=400)
+
+    # Análisis concurrentes con los mismos parámetros se coalescen (single-flight)
+    # y el resultado se comparte entre workers a través de la caché "analyze".
     try:
-        # Si es dataset del INE -> usar wstempus via our service
-        if is_ine_dataset(dataset_url):
-            try:
-                data = get_dataset_from_ine(dataset_url, sample_rows=max_rows)
-            except INEApiError as ie:
-                logger.exception("Error INE API")
-                return JsonResponse({"success": False, "message": str(ie)}, status=500)
-
-            suggestion = {"type": "table", "title": f"Tabla INE {extract_ine_idtable(dataset_url)}"}
-            return JsonResponse({
-                "success": True,
-                **data,
-                "suggestions": [suggestion],  # 🔹 ya como array
-                "format_detected": "ine-api"  # 🔹 para diferenciar
-            }, status=200)
-
-        # Flujo "normal" para CSV/JSON/XML/PC-AXIS ya implementado
-        analysis_result = analyze_distribution_url(
-            dataset_url,
-            format_override=fmt or None,  # usa el que venga del frontend si existe
-            sample_rows=max_rows if max_rows is not None else 999999,
+        data, message, status = handle_dataset_file(
+            namespace="analyze",
+            params={"url": dataset_url, "format": fmt, "rows": max_rows, **options},
+            fetch_function=run_analysis,
+            fetch_args=(dataset_url, fmt, max_rows, options),
         )
-        return JsonResponse({"success": True, **analysis_result}, status=200)
+    except Exception as e:
+        logger.exception("Error analizando dataset")
+        return JsonResponse({"success": False, "message": "Error interno del servidor"}, status=500)
+
+    return _analysis_response(data, message, status)
+
 
+@csrf_exempt
+@require_POST
+def materialize_dataset_view(request):
+    """
+    Materializa una distribución (url, format; refresh=1 la rehace) en el
+    almacén columnar local; los análisis siguientes la leen de disco.
+    """
+    dataset_url = (request.GET.get("url") or "").strip()
+    fmt = (request.GET.get("format") or "").lower()
+    if not dataset_url:
+        return JsonResponse({"success": False, "message": "Parámetro 'url' es obligatorio"}, status=400)
+    if is_ine_dataset(dataset_url):
+        return JsonResponse({"success": False, "message": "Las tablas del INE se sirven desde su API"}, status=400)
+    force = (request.GET.get("refresh") or "").lower() in ("1", "true", "yes")
+    try:
+        table = materialize_distribution(dataset_url, fmt or None, force=force)
+    except Exception as e:
+        logger.warning("No se pudo materializar %s: %s", dataset_url, e)
+        return JsonResponse({"success": False, "message": str(e)}, status=502)
+    return JsonResponse({"success": True, "url": dataset_url, **table.info(), "store": columnar_store.stats()})
+
+
+def _parse_chart_request(request):
+    """
+    Returns (dataset_url, fmt, spec, ine_filters, force, None) or (..., error_response).
+    spec: type + los campos de la sugerencia (x/y, category/value, geo_name/value,
+    lat/lon) y agg, width, top, method; level y zoom en choropleth (ver
+    core/services/chart_data.py).
+    """
+    dataset_url = (request.GET.get("url") or "").strip()
+    fmt = (request.GET.get("format") or "").lower()
+    if not dataset_url:
+        return None, None, None, None, None, JsonResponse({"success": False, "message": "Parámetro 'url' es obligatorio"}, status=400)
+    try:
+        spec = chart_data.normalize_spec(request.GET)
+        ine_filters = _parse_ine_filters(request) if is_ine_dataset(dataset_url) else None
+    except (chart_data.ChartDataError, INEApiError) as e:
+        return None, None, None, None, None, JsonResponse({"success": False, "message": str(e)}, status=400)
+    force = (request.GET.get("refresh") or "").lower() in ("1", "true", "yes")
+    return dataset_url, fmt, spec, ine_filters, force, None
+
+
+def _chart_data(dataset_url, fmt, spec, ine_filters, force):
+    if ine_filters:
+        ine_filters = resolve_ine_filters(dataset_url, ine_filters)
+    data, cache = chart_data.get_chart_data(dataset_url, fmt, spec, ine_filters, force=force)
+    return {**data, "cache": cache}
+
+
+def _chart_response(run):
+    try:
+        data = run()
+    except (chart_data.ChartDataError, INEApiError) as e:
+        return JsonResponse({"success": False, "message": str(e)}, status=400)
+    except Exception as e:
+        logger.warning("No se pudieron calcular los datos del gráfico: %s", e)
+        return JsonResponse({"success": False, "message": str(e)}, status=502)
+    return JsonResponse({"success": True, **data})
+
+
+@require_GET
+def chart_data_view(request):
+    """
+    Datos listos para pintar una sugerencia (agregados por grupo, top-N + "Otros",
+    series reducidas a ~width puntos) en lugar de las filas de muestra.
+    """
+    dataset_url, fmt, spec, ine_filters, force, error = _parse_chart_request(request)
+    if error is not None:
+        return error
+    return _chart_response(lambda: _chart_data(dataset_url, fmt, spec, ine_filters, force))
+
+
+def _parse_correlation_request(request):
+    """
+    Returns (params, force, None) or (None, None, error_response).
+    Cuerpo JSON: {"series": [url | {"url", "format", "x", "y", "agg", "tv", "name"}],
+    "method": ["pearson", "spearman"], "max_lag": 0, "freq": "auto", "min_periods": 3}.
+    """
+    try:
+        body = json.loads(request.body or b"{}")
+    except (ValueError, UnicodeDecodeError):
+        return None, None, JsonResponse({"success": False, "message": "Cuerpo JSON no válido"}, status=400)
+    if not isinstance(body, dict):
+        return None, None, JsonResponse({"success": False, "message": "Cuerpo JSON no válido"}, status=400)
+    try:
+        params = correlation.parse_request(body)
+    except correlation.CorrelationError as e:
+        return None, None, JsonResponse({"success": False, "message": str(e)}, status=400)
+    force = body.get("refresh") is True or (request.GET.get("refresh") or "").lower() in ("1", "true", "yes")
+    return params, force, None
+
+
+def _correlation_response(params, force):
+    started = time.monotonic()
+    try:
+        data, cache = correlation.correlate(params, force=force)
+    except (correlation.CorrelationError, chart_data.ChartDataError, INEApiError) as e:
+        return JsonResponse({"success": False, "message": str(e)}, status=400)
+    except Exception as e:
+        logger.warning("No se pudo calcular la correlación: %s", e)
+        return JsonResponse({"success": False, "message": str(e)}, status=502)
+    return JsonResponse({"success": True, **data, "cache": cache,
+                         "elapsed_ms": round((time.monotonic() - started) * 1000)})
+
+
+@csrf_exempt
+@require_POST
+def correlation_view(request):
+    """
+    Matrices de correlación (Pearson / Spearman, pairwise-complete) y
+    correlación cruzada con desfase entre series del INE y de distribuciones
+    analizadas, alineadas por periodo.
+    """
+    params, force, error = _parse_correlation_request(request)
+    if error is not None:
+        return error
+    return _correlation_response(params, force)
+
+
+def _parse_forecast_request(request):
+    """
+    Returns (dataset_url, options, ine_filters, refit, None) or (..., error_response).
+    url (tabla del INE), model (ets | arima | linear), horizon, level y los
+    filtros del INE; refit=1 reajusta aunque haya modelos en caché.
+    """
+    dataset_url = (request.GET.get("url") or request.GET.get("id") or "").strip()
+    if not is_ine_dataset(dataset_url):
+        return None, None, None, None, JsonResponse({"success": False, "message": "Parámetro 'url' (tabla del INE) es obligatorio"}, status=400)
+    try:
+        options = forecasting.normalize_options(request.GET.get("model"), request.GET.get("horizon"), request.GET.get("level"))
+        ine_filters = _parse_ine_filters(request)
+    except (forecasting.ForecastError, INEApiError) as e:
+        return None, None, None, None, JsonResponse({"success": False, "message": str(e)}, status=400)
+    refit = (request.GET.get("refit") or "").lower() in ("1", "true", "yes")
+    return dataset_url, options, ine_filters, refit, None
+
+
+def _forecast_response(dataset_url, options, ine_filters, refit):
+    try:
+        if ine_filters:
+            ine_filters = resolve_ine_filters(dataset_url, ine_filters)
+        data = forecasting.forecast_ine_table(dataset_url, options, ine_filters, refit=refit)
+    except (forecasting.ForecastError, INEApiError) as e:
+        return JsonResponse({"success": False, "message": str(e)}, status=400)
+    except Exception as e:
+        logger.warning("No se pudo calcular la predicción: %s", e)
+        return JsonResponse({"success": False, "message": str(e)}, status=502)
+    return JsonResponse({"success": True, **data})
+
+
+@require_GET
+def forecast_view(request):
+    """
+    Predicción (con intervalo) de las series de una tabla del INE. Los modelos
+    ajustados se reutilizan mientras los datos de cada serie no cambien.
+    """
+    dataset_url, options, ine_filters, refit, error = _parse_forecast_request(request)
+    if error is not None:
+        return error
+    return _forecast_response(dataset_url, options, ine_filters, refit)
+
+
+@require_GET
+def geo_layers_view(request):
+    """Capas geográficas construidas (zooms, tamaños) y tamaño del índice de nombres."""
+    index = geo_index.get_index()
+    return JsonResponse({
+        "success": True,
+        "layers": geo_shapes.read_manifest()["layers"],
+        "index": {"records": len(index.records), "names": len(index.names),
+                  "municipalities": index.has_municipalities},
+    })
+
+
+@require_GET
+def geo_shapes_view(request, level):
+    """
+    TopoJSON simplificado de una capa (ccaa | prov | mun) para el zoom pedido
+    (?zoom=, el más cercano construido por debajo). Los ficheros no cambian
+    hasta que se reconstruyen: ETag del manifiesto y caché larga en el navegador.
+    """
+    try:
+        zoom = int(request.GET["zoom"]) if request.GET.get("zoom") else None
+        path, zoom, info = geo_shapes.layer_file(level, zoom)
+    except ValueError as e:   # GeoShapesError o zoom no entero
+        return JsonResponse({"success": False, "message": str(e)}, status=404 if isinstance(e, geo_shapes.GeoShapesError) else 400)
+    etag = f'"{info["etag"]}"'
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+    try:
+        with open(path, "rb") as f:
+            body = f.read()
+    except OSError as e:
+        logger.warning("No se pudo leer la topología %s: %s", path, e)
+        return JsonResponse({"success": False, "message": "Capa no disponible"}, status=404)
+    response = HttpResponse(body, content_type="application/json")
+    response["ETag"] = etag
+    response["X-Geo-Zoom"] = str(zoom)
+    response["Cache-Control"] = "public, max-age=86400"
+    return response
+
+
+def _ine_metadata_payload(metadata):
+    return {
+        **describe_table(metadata),
+        "variables": metadata["variables"],   # con sus valores, para construir filtros tv
+        "suggestions": suggest_from_metadata(metadata),
+    }
+
+
+def _parse_ine_metadata_request(request):
+    """Returns (table_id, force_download, None) or (None, None, error_response)."""
+    table_id = extract_ine_idtable((request.GET.get("url") or request.GET.get("id") or "").strip())
+    if not table_id:
+        return None, None, JsonResponse({"success": False, "message": "Parámetro 'url' o 'id' es obligatorio"}, status=400)
+    return table_id, (request.GET.get("refresh") or "").lower() in ("1", "true", "yes"), None
+
+
+@require_GET
+def ine_table_metadata_view(request):
+    """Estructura de una tabla del INE (variables, valores, periodicidad) sin descargar datos."""
+    table_id, force_download, error = _parse_ine_metadata_request(request)
+    if error is not None:
+        return error
+    metadata = get_table_metadata(table_id, force_download=force_download)
+    if not metadata:
+        return JsonResponse({"success": False, "message": f"Sin metadatos para la tabla INE {table_id}"}, status=502)
+    return JsonResponse({"success": True, **_ine_metadata_payload(metadata)})
+
+
+# -----------------------
+# Análisis por lotes (VisualizationModal -> /api/process-datasets/)
+# -----------------------
+def _parse_batch_request(request):
+    """
+    Returns (items, max_rows, stream, None) or (None, None, None, error_response).
+    Cuerpo JSON: {"datasets": [...], "rows": 80, "stream": false}; datasets
+    admite URLs, {"url", "format"} o los items de la búsqueda tal cual.
+    """
+    try:
+        body = json.loads(request.body or b"{}")
+    except (ValueError, UnicodeDecodeError):
+        return None, None, None, JsonResponse({"success": False, "message": "Cuerpo JSON no válido"}, status=400)
+    if not isinstance(body, dict):
+        return None, None, None, JsonResponse({"success": False, "message": "Cuerpo JSON no válido"}, status=400)
+    try:
+        items = batch_analysis.parse_items(body.get("datasets"))
+    except batch_analysis.BatchError as e:
+        return None, None, None, JsonResponse({"success": False, "message": str(e)}, status=400)
+
+    rows = body.get("rows", 80)
+    try:
+        max_rows = None if str(rows) == "-1" else int(rows)
+    except (TypeError, ValueError):
+        max_rows = 80
+    stream = (body.get("stream") is True
+              or (request.GET.get("stream") or "").lower() in ("1", "true", "yes")
+              or "application/x-ndjson" in request.headers.get("Accept", ""))
+    return items, max_rows, stream, None
+
+
+def _analyze_params(url, fmt, max_rows, ine_filters):
+    # Misma clave de caché que /dataset/analyze/?url=...&format=...&rows=...
+    return {"url": url, "format": fmt or "", "rows": max_rows, "profile": False, "ine_filters": ine_filters}
+
+
+def _json_line(obj):
+    return json.dumps(obj, ensure_ascii=False).encode("utf-8") + b"\n"
+
+
+def _batch_response(results, started):
+    results = sorted(results, key=lambda r: r["index"])
+    return JsonResponse({
+        "success": True,
+        "processed_datasets": [r for r in results if r["success"]],
+        "errors": [r for r in results if not r["success"]],
+        "elapsed_ms": round((time.monotonic() - started) * 1000),
+    })
+
+
+def _analyze_item(url, fmt, max_rows):
+    try:
+        ine_filters = resolve_ine_filters(url, {}) if is_ine_dataset(url) else {}
+    except INEApiError as e:
+        return None, str(e), 400
+    return handle_dataset_file(
+        namespace="analyze",
+        params=_analyze_params(url, fmt, max_rows, ine_filters),
+        fetch_function=run_analysis,
+        fetch_args=(url, fmt or "", max_rows, {"profile": False, "ine_filters": ine_filters}),
+    )
+
+
+@csrf_exempt
+@require_POST
+def process_datasets_view(request):
+    """
+    Analiza varias distribuciones a la vez (pool acotado, plazo por elemento).
+    Con stream=1 devuelve NDJSON, una línea por distribución según terminan;
+    si no, una sola respuesta {"processed_datasets": [...], "errors": [...]}.
+    """
+    items, max_rows, stream, error = _parse_batch_request(request)
+    if error is not None:
+        return error
+
+    def run_item(url, fmt):
+        return _analyze_item(url, fmt, max_rows)
+
+    if stream:
+        return _ndjson_response(_json_line(r) for r in batch_analysis.iter_batch(items, run_item))
+    started = time.monotonic()
+    return _batch_response(list(batch_analysis.iter_batch(items, run_item)), started)
+
+
+# -----------------------
+# Análisis en segundo plano (cola AnalysisJob; worker: run_analysis_worker)
+# -----------------------
+def _job_payload(job):
+    return {
+        "job_id": str(job.pk),
+        "status": job.status,
+        "url": job.params.get("url"),
+        "progress": analysis_jobs.job_progress(job),
+        "error": job.error or None,
+        "attempts": job.attempts,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "status_url": reverse("analysis_job_view", args=[job.pk]),
+        "result_url": reverse("analysis_job_result_view", args=[job.pk]),
+    }
+
+
+def _job_not_found(job_id):
+    return JsonResponse({"success": False, "message": f"Trabajo {job_id} no encontrado"}, status=404)
+
+
+@csrf_exempt
+@require_POST
+def submit_analysis_job_view(request):
+    """
+    Encola un análisis con los mismos parámetros que /dataset/analyze/ (en la
+    query string) y responde 202 al momento; pensado para rows=-1 o profile=1,
+    que no caben en el timeout del proxy.
+    """
+    dataset_url, fmt, max_rows, options, error = _parse_analyze_request(request)
+    if error is not None:
+        return error
+    if is_ine_dataset(dataset_url):
+        try:
+            options["ine_filters"] = resolve_ine_filters(dataset_url, options["ine_filters"])
+        except INEApiError as e:
+            return JsonResponse({"success": False, "message": str(e)}, status=400)
+
+    job, created = analysis_jobs.submit({"url": dataset_url, "format": fmt, "rows": max_rows, **options})
+    response = JsonResponse({"success": True, "created": created, **_job_payload(job)},
+                            status=202 if job.status not in AnalysisJob.FINISHED else 200)
+    response["Location"] = reverse("analysis_job_view", args=[job.pk])
+    return response
+
+
+@require_GET
+def analysis_job_view(request, job_id):
+    job = AnalysisJob.objects.filter(pk=job_id).defer("result").first()
+    if job is None:
+        return _job_not_found(job_id)
+    return JsonResponse({"success": True, **_job_payload(job)})
+
+
+@require_GET
+def analysis_job_result_view(request, job_id):
+    """200 con el análisis (mismo cuerpo que /dataset/analyze/); 409 si aún no ha terminado."""
+    job = AnalysisJob.objects.filter(pk=job_id).first()
+    if job is None:
+        return _job_not_found(job_id)
+    if job.status == AnalysisJob.DONE:
+        return _analysis_response(job.result, "", 200)
+    status = {AnalysisJob.FAILED: 500, AnalysisJob.CANCELLED: 410}.get(job.status, 409)
+    message = job.error or f"El trabajo está en estado '{job.status}'"
+    return JsonResponse({"success": False, "message": message, **_job_payload(job)}, status=status)
+
+
+@csrf_exempt
+@require_POST
+def cancel_analysis_job_view(request, job_id):
+    job = analysis_jobs.cancel(job_id)
+    if job is None:
+        return _job_not_found(job_id)
+    if job.status in (AnalysisJob.DONE, AnalysisJob.FAILED):
+        return JsonResponse({"success": False, "message": "El trabajo ya ha terminado", **_job_payload(job)},
+                            status=409)
+    return JsonResponse({"success": True, **_job_payload(job)}, status=202 if job.status == AnalysisJob.RUNNING else 200)
+
+
+# -----------------------
+# Resolución de distribuciones (páginas HTML -> ficheros descargables)
+# -----------------------
+def _flag(value):
+    return None if value is None else str(value).lower() in ("1", "true", "yes")
+
+
+def _parse_resolve_request(request):
+    """
+    Returns (urls, validate, force, None) or (None, None, None, error_response).
+    GET ?url=...&url=... o POST {"urls": [...]}; las URLs pueden venir como
+    las distribuciones de la API ({"accessURL": ...}).
+    """
+    if request.method == "POST":
+        try:
+            body = json.loads(request.body or b"{}")
+        except (ValueError, UnicodeDecodeError):
+            body = None
+        if not isinstance(body, dict):
+            return None, None, None, JsonResponse({"success": False, "message": "Cuerpo JSON no válido"}, status=400)
+        raw, validate, force = body.get("urls") or [], _flag(body.get("validate")), _flag(body.get("refresh"))
+    else:
+        raw = request.GET.getlist("url")
+        validate, force = _flag(request.GET.get("validate")), _flag(request.GET.get("refresh"))
+
+    urls = []
+    for entry in raw if isinstance(raw, list) else [raw]:
+        url = entry.get("accessURL") if isinstance(entry, dict) else entry
+        url = (url[0] if isinstance(url, list) and url else url) or ""
+        if isinstance(url, str) and url.strip():
+            urls.append(url.strip())
+    if not urls:
+        return None, None, None, JsonResponse({"success": False, "message": "Parámetro 'url' es obligatorio"}, status=400)
+    max_urls = distribution_resolver.get_config()["MAX_URLS"]
+    if len(urls) > max_urls:
+        return None, None, None, JsonResponse(
+            {"success": False, "message": f"Como máximo {max_urls} URLs por petición"}, status=400)
+    return urls, validate, bool(force), None
+
+
+def _resolve_response(results):
+    return JsonResponse({
+        "success": True,
+        "results": results,
+        # Todos los ficheros en una lista, como concatenaba el frontend
+        "files": [{**f, "distribution": r["url"]} for r in results for f in r["files"]],
+    })
+
+
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+def resolve_distributions_view(request):
+    """Ficheros {format, url} de una o varias distribuciones en una sola llamada."""
+    urls, validate, force, error = _parse_resolve_request(request)
+    if error is not None:
+        return error
+    return _resolve_response(distribution_resolver.resolve_many(urls, validate=validate, force=force))
+
+
+# ---------------------------------------------------------------
+# Async (ASGI) variants: same contract as the sync views, but the upstream
+# call awaits on the shared aiohttp session instead of blocking a worker.
+# Mounted under /api/async/...
+# ---------------------------------------------------------------
+async def _ageneric_search_view(
+    request, required_params, afetch_function, cache_namespace, extra_args_from_request=None
+):
+    cache_params, fetch_args, error = _parse_search_request(request, required_params, extra_args_from_request)
+    if error is None:
+        projection, error = _parse_projection(request)
+    if error is not None:
+        return error
+    transform = (lambda item: search_projection.project_item(item, projection)) if projection else None
+
+    max_pages = _parse_all_pages(request)
+    if max_pages is not None:
+        async def afetch_page(page):
+            page_params, page_args = _page_request(cache_params, extra_args_from_request, page)
+            data, message, status = await ahandle_dataset_file(cache_namespace, page_params, afetch_function, page_args)
+            return data if status == 200 else None
+
+        return _ndjson_response(search_fanout.astream_all_pages(
+            afetch_page, PAGE_SIZE, start_page=cache_params["page"], max_pages=max_pages, transform=transform))
+
+    try:
+        data, message, status = await ahandle_dataset_file(
+            namespace=cache_namespace, params=cache_params, afetch_function=afetch_function, fetch_args=fetch_args
+        )
+    except Exception as e:
+        logger.exception("Error interno al llamar ahandle_dataset_file")
+        return JsonResponse({"success": False, "message": "Error interno del servidor"}, status=500)
+
+    return _search_response(data, message, status, cache_namespace, cache_params, projection)
+
+
+@require_GET
+async def search_sparql_async_view(request):
+    args, error = _parse_sparql_search_request(request)
+    if error is None:
+        projection, error = _parse_projection(request)
+    if error is not None:
+        return error
+    cache_params = sparql_search.cache_params(*args)
+    try:
+        data, message, status = await ahandle_dataset_file(
+            namespace=sparql_search.NAMESPACE, params=cache_params,
+            afetch_function=sync_to_async(sparql_search.search_page, thread_sensitive=False), fetch_args=args,
+        )
+    except Exception as e:
+        logger.exception("Error interno al llamar ahandle_dataset_file")
+        return JsonResponse({"success": False, "message": "Error interno del servidor"}, status=500)
+
+    if status == 200:
+        sparql_search.prefetch_next(*args[:3], data)
+    return _search_response(data, message, status, sparql_search.NAMESPACE, cache_params, projection)
+
+
+@require_GET
+async def search_by_title_async_view(request):
+    return await _ageneric_search_view(
+        request,
+        required_params=["title"],
+        afetch_function=asearch_by_title,
+        cache_namespace="search_title",
+        extra_args_from_request=lambda params, page: (params["title"], page),
+    )
+
+
+@require_GET
+async def search_by_keyword_async_view(request):
+    return await _ageneric_search_view(
+        request,
+        required_params=["keyword"],
+        afetch_function=asearch_by_keyword,
+        cache_namespace="search_keyword",
+        extra_args_from_request=lambda params, page: (params["keyword"], page),
+    )
+
+
+@require_GET
+async def search_by_spatial_async_view(request):
+    return await _ageneric_search_view(
+        request,
+        required_params=["spatial_type", "spatial_value"],
+        afetch_function=asearch_by_spatial,
+        cache_namespace="search_spatial",
+        extra_args_from_request=lambda params, page: (params["spatial_type"], params["spatial_value"], page),
+    )
+
+
+@require_GET
+async def search_by_category_async_view(request):
+    return await _ageneric_search_view(
+        request,
+        required_params=["category"],
+        afetch_function=asearch_by_category,
+        cache_namespace="search_category",
+        extra_args_from_request=lambda params, page: (params["category"], page),
+    )
+
+
+async def _astats_view(request, key, field, afetch_function, error_label):
+    stats_snapshot.ensure_scheduler()
+    snapshot = await sync_to_async(stats_snapshot.get_snapshot)(key)
+    if snapshot:
+        return _snapshot_response(request, snapshot, field)
+    try:
+        return JsonResponse({"success": True, field: await afetch_function()})
+    except Exception as e:
+        logger.exception(error_label)
+        return JsonResponse({"success": False, "message": str(e)}, status=500)
+
+
+@require_GET
+async def total_datasets_async_view(request):
+    return await _astats_view(request, "total_datasets", "total_datasets", aget_total_datasets,
+                              "Error obteniendo total datasets")
+
+
+@require_GET
+async def all_themes_async_view(request):
+    return await _astats_view(request, "all_themes", "themes", aget_all_themes, "Error obteniendo themes")
+
+
+@require_GET
+async def dataset_counts_by_theme_async_view(request):
+    return await _astats_view(request, "dataset_counts_by_theme", "themes", aget_dataset_counts_by_theme,
+                              "Error dataset counts by theme")
+
+
+@require_GET
+async def analyze_dataset_async_view(request):
+    dataset_url, fmt, max_rows, options, error = _parse_analyze_request(request)
+    if error is not None:
+        return error
+    if is_ine_dataset(dataset_url):
+        try:
+            options["ine_filters"] = await aresolve_ine_filters(dataset_url, options["ine_filters"])
+        except INEApiError as e:
+            return JsonResponse({"success": False, "message": str(e)}, status=400)
+
+    try:
+        data, message, status = await ahandle_dataset_file(
+            namespace="analyze",
+            params={"url": dataset_url, "format": fmt, "rows": max_rows, **options},
+            afetch_function=arun_analysis,
+            fetch_args=(dataset_url, fmt, max_rows, options),
+        )
     except Exception as e:
         logger.exception("Error analizando dataset")
         return JsonResponse({"success": False, "message": "Error interno del servidor"}, status=500)
+
+    return _analysis_response(data, message, status)
+
+
+@require_GET
+async def ine_table_metadata_async_view(request):
+    table_id, force_download, error = _parse_ine_metadata_request(request)
+    if error is not None:
+        return error
+    metadata = await aget_table_metadata(table_id, force_download=force_download)
+    if not metadata:
+        return JsonResponse({"success": False, "message": f"Sin metadatos para la tabla INE {table_id}"}, status=502)
+    return JsonResponse({"success": True, **_ine_metadata_payload(metadata)})
+
+
+async def _aanalyze_item(url, fmt, max_rows):
+    try:
+        ine_filters = await aresolve_ine_filters(url, {}) if is_ine_dataset(url) else {}
+    except INEApiError as e:
+        return None, str(e), 400
+    return await ahandle_dataset_file(
+        namespace="analyze",
+        params=_analyze_params(url, fmt, max_rows, ine_filters),
+        afetch_function=arun_analysis,
+        fetch_args=(url, fmt or "", max_rows, {"profile": False, "ine_filters": ine_filters}),
+    )
+
+
+@csrf_exempt
+@require_POST
+async def process_datasets_async_view(request):
+    items, max_rows, stream, error = _parse_batch_request(request)
+    if error is not None:
+        return error
+
+    def arun_item(url, fmt):
+        return _aanalyze_item(url, fmt, max_rows)
+
+    if stream:
+        async def lines():
+            async for result in batch_analysis.aiter_batch(items, arun_item):
+                yield _json_line(result)
+        return _ndjson_response(lines())
+    started = time.monotonic()
+    return _batch_response([r async for r in batch_analysis.aiter_batch(items, arun_item)], started)
+
+
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+async def resolve_distributions_async_view(request):
+    urls, validate, force, error = _parse_resolve_request(request)
+    if error is not None:
+        return error
+    # Las páginas y los HEAD ya se piden en paralelo con hilos: se ejecuta fuera del event loop
+    results = await sync_to_async(distribution_resolver.resolve_many, thread_sensitive=False)(
+        urls, validate=validate, force=force)
+    return _resolve_response(results)
+
+
+@require_GET
+async def chart_data_async_view(request):
+    dataset_url, fmt, spec, ine_filters, force, error = _parse_chart_request(request)
+    if error is not None:
+        return error
+    return await sync_to_async(_chart_response, thread_sensitive=False)(
+        lambda: _chart_data(dataset_url, fmt, spec, ine_filters, force))
+
+
+@csrf_exempt
+@require_POST
+async def correlation_async_view(request):
+    params, force, error = _parse_correlation_request(request)
+    if error is not None:
+        return error
+    # Descargas y álgebra (BLAS) fuera del event loop
+    return await sync_to_async(_correlation_response, thread_sensitive=False)(params, force)
+
+
+@require_GET
+async def forecast_async_view(request):
+    dataset_url, options, ine_filters, refit, error = _parse_forecast_request(request)
+    if error is not None:
+        return error
+    return await sync_to_async(_forecast_response, thread_sensitive=False)(dataset_url, options, ine_filters, refit)
@@ -55,4 +55,28 @@ export async function analyze_dataset(datasetUrl, format = "", rows) {
     throw new Error(`Error ${response.status}${text ? ` - ${text}` : ""}`);
   }
   return response.json();
+}
+
+/* ---------- Datos de un gráfico agregados en el servidor (GET) ---------- */
+export async function chart_data(datasetUrl, format = "", suggestion, width = 800) {
+  const url = new URL(`${API_BASE}/api/dataset/chart-data/`, window.location.origin);
+  url.searchParams.set("url", datasetUrl);
+  if (format) url.searchParams.set("format", format);
+  ["type", "x", "y", "category", "value", "geo_name", "lat", "lon"].forEach((k) => {
+    if (suggestion?.[k]) url.searchParams.set(k, suggestion[k]);
+  });
+  url.searchParams.set("width", String(width));
+  const response = await fetch(url.toString(), { credentials: "include" });
+  if (!response.ok) {
+    let text = "";
+    try { text = await response.text(); } catch (e) {}
+    throw new Error(`Error ${response.status}${text ? ` - ${text}` : ""}`);
+  }
+  return response.json();
+}
+
+/* ---------- Topología simplificada de una capa geográfica (GET) ---------- */
+export async function geo_shapes(path) {
+  // path tal cual lo devuelve chart-data (topology.url), p. ej. /api/geo/shapes/prov/?zoom=6
+  return apiGet(path);
 }
\ No newline at end of file
@@ -0,0 +1,109 @@
+// src/components/ChoroplethMap.jsx
+// Mapa de coropletas en SVG a partir de los valores ya cruzados en el servidor
+// (/api/dataset/chart-data/?type=choropleth) y de la topología simplificada
+// para el zoom (/api/geo/shapes/<nivel>/), sin librerías de mapas.
+import React, { useEffect, useMemo, useState } from "react";
+import { geo_shapes } from "../api/backendService";
+
+const WIDTH = 800;
+const HEIGHT = 600;
+
+// TopoJSON -> { id: { name, rings: [[[lon, lat], ...], ...] } }
+function decodeTopology(topology, layer) {
+  const [sx, sy] = topology.transform.scale;
+  const [tx, ty] = topology.transform.translate;
+  const arcs = topology.arcs.map((arc) => {
+    let x = 0;
+    let y = 0;
+    return arc.map(([dx, dy]) => {
+      x += dx;
+      y += dy;
+      return [x * sx + tx, y * sy + ty];
+    });
+  });
+  const ring = (refs) => {
+    const points = [];
+    refs.forEach((ref) => {
+      const arc = ref >= 0 ? arcs[ref] : arcs[~ref].slice().reverse();
+      points.push(...(points.length ? arc.slice(1) : arc));
+    });
+    return points;
+  };
+  const shapes = {};
+  (topology.objects[layer]?.geometries || []).forEach((g) => {
+    const polygons = g.type === "Polygon" ? [g.arcs] : g.arcs;
+    shapes[g.id] = { name: g.properties?.name, rings: polygons.flatMap((p) => p.map(ring)) };
+  });
+  return shapes;
+}
+
+// Mercator ajustado a la caja de la capa
+function projection(bbox) {
+  const merc = ([lon, lat]) => [lon, Math.log(Math.tan(Math.PI / 4 + (lat * Math.PI) / 360)) * (180 / Math.PI)];
+  const [x0, y0] = merc([bbox[0], bbox[1]]);
+  const [x1, y1] = merc([bbox[2], bbox[3]]);
+  const k = Math.min(WIDTH / (x1 - x0 || 1), HEIGHT / (y1 - y0 || 1));
+  return (p) => {
+    const [x, y] = merc(p);
+    return [(x - x0) * k, HEIGHT - (y - y0) * k];
+  };
+}
+
+function color(value, range) {
+  if (value === null || value === undefined || !range) return "#444";
+  const t = range[1] > range[0] ? (value - range[0]) / (range[1] - range[0]) : 0.5;
+  return `hsl(${210 - t * 190}, 70%, ${65 - t * 25}%)`;
+}
+
+function ChoroplethMap({ chartData, title }) {
+  const [topology, setTopology] = useState(null);
+  const [error, setError] = useState(null);
+  const ref = chartData?.topology;
+
+  useEffect(() => {
+    if (!ref?.url) return;
+    let cancelled = false;
+    setError(null);
+    geo_shapes(ref.url)
+      .then((res) => { if (!cancelled) setTopology(res); })
+      .catch((e) => { if (!cancelled) setError(e.message); });
+    return () => { cancelled = true; };
+  }, [ref?.url]);
+
+  const paths = useMemo(() => {
+    if (!topology || !ref) return [];
+    const shapes = decodeTopology(topology, ref.layer);
+    const project = projection(topology.bbox);
+    const values = new Map(chartData.ids.map((id, i) => [id, chartData.values[i]]));
+    return Object.entries(shapes).map(([id, shape]) => ({
+      id,
+      name: shape.name,
+      value: values.get(id),
+      d: shape.rings
+        .map((r) => "M" + r.map((p) => project(p).map((c) => c.toFixed(1)).join(",")).join("L") + "Z")
+        .join(""),
+    }));
+  }, [topology, ref, chartData]);
+
+  if (error) return <div style={{ padding: 12, color: "#ddd" }}>No se pudo cargar el mapa: {error}</div>;
+  if (!topology) return <div style={{ padding: 12, color: "#ddd" }}>Cargando mapa…</div>;
+
+  return (
+    <div>
+      <svg viewBox={`0 0 ${WIDTH} ${HEIGHT}`} style={{ width: "100%", height: 450 }} role="img" aria-label={title}>
+        {paths.map((p) => (
+          <path key={p.id} d={p.d} fill={color(p.value, chartData.range)} stroke="#222" strokeWidth={0.5} fillRule="evenodd">
+            <title>{`${p.name}: ${p.value ?? "sin dato"}`}</title>
+          </path>
+        ))}
+      </svg>
+      {chartData.unmatched?.categories > 0 && (
+        <div style={{ fontSize: 12, color: "#aaa" }}>
+          {chartData.unmatched.categories} valores sin región reconocida ({chartData.unmatched.labels.slice(0, 5).join(", ")}…)
+        </div>
+      )}
+    </div>
+  );
+}
+
+export default ChoroplethMap;
@@ -1,6 +1,7 @@
 // src/components/DataVisualization.jsx
 import React from "react";
 import { Bar, Line, Pie } from "react-chartjs-2";
+import ChoroplethMap from "./ChoroplethMap";
 import {
   Chart as ChartJS,
   CategoryScale,
@@ -24,13 +25,19 @@ ChartJS.register(
   Legend
 );
 
-function SimpleChart({ suggestion, sampleRows, labels, series }) {
+function SimpleChart({ suggestion, sampleRows, labels, series, chartData }) {
   if ((!suggestion && !(labels && series)) || (sampleRows && sampleRows.length === 0 && !series)) {
     return null;
   }
 
   const type = suggestion?.type;
 
+  // Coropletas: mapa si la capa está construida; si no, barras por región
+  if (chartData && type === "choropleth" && chartData.type === type && Array.isArray(chartData.ids)) {
+    if (chartData.topology) return <ChoroplethMap chartData={chartData} title={suggestion?.title} />;
+    chartData = { ...chartData, labels: chartData.names };
+  }
+
   // 🔹 Formatear valores que parecen timestamps
   const formatLabel = (label) => {
     if (!isNaN(label) && Number(label) > 1000000000) {
@@ -81,6 +88,58 @@ function SimpleChart({ suggestion, sampleRows, labels, series }) {
     },
   };
 
+  // ========================
+  // 🧮 Datos ya agregados/reducidos en el servidor (/api/dataset/chart-data/)
+  // ========================
+  if (chartData && chartData.type === type && Array.isArray(chartData.series)) {
+    // Cada serie trae sus propios puntos (LTTB): eje común = unión ordenada
+    const xs = [...new Set(chartData.series.flatMap((s) => s.x))];
+    if (chartData.x_type !== "label") xs.sort((a, b) => (a < b ? -1 : a > b ? 1 : 0));
+    const chart = {
+      labels: xs.map(formatLabel),
+      datasets: chartData.series.map((s, i) => {
+        const byX = new Map(s.x.map((x, j) => [x, s.y[j]]));
+        return {
+          label: s.name,
+          data: xs.map((x) => (byX.has(x) ? byX.get(x) : null)),
+          spanGaps: true,
+          borderColor: `hsl(${(i * 360) / chartData.series.length}, 70%, 50%)`,
+          backgroundColor: `hsl(${(i * 360) / chartData.series.length}, 70%, 60%)`,
+          tension: 0.3,
+          pointRadius: 0,
+          fill: false,
+        };
+      }),
+    };
+    return <Line data={chart} options={commonOptions} height={450} />;
+  }
+  if (chartData && chartData.type === type && Array.isArray(chartData.labels)) {
+    const chart = {
+      labels: chartData.labels.map(formatLabel),
+      datasets: [
+        {
+          label: suggestion?.title || chartData.value,
+          data: chartData.values,
+          backgroundColor: chartData.labels.map((_, i) => `hsl(${(i * 360) / chartData.labels.length}, 70%, 60%)`),
+          borderWidth: 1,
+          borderColor: "#222",
+        },
+      ],
+    };
+    if (type === "piechart") {
+      const pieOptions = {
+        responsive: true,
+        maintainAspectRatio: false,
+        plugins: {
+          legend: { position: "right", labels: { color: "#ddd", boxWidth: 12, padding: 10 } },
+          tooltip: { enabled: true },
+        },
+      };
+      return <Pie data={chart} options={pieOptions} height={450} />;
+    }
+    return <Bar data={chart} options={commonOptions} height={450} />;
+  }
+
   // ========================
   // 📊 Caso especial INE API (labels + series)
   // ========================
@@ -1,5 +1,5 @@
-import { useState } from "react";
-import { analyze_dataset } from "../api/backendService";
+import { useEffect, useState } from "react";
+import { analyze_dataset, chart_data } from "../api/backendService";
 import SimpleChart from "./DataVisualization";
 
 export default function ProcessDatasetPanel({ selectedItems }) {
@@ -7,6 +7,8 @@ export default function ProcessDatasetPanel({ selectedItems }) {
   const [analysis, setAnalysis] = useState(null);
   const [error, setError] = useState(null);
   const [chosenSuggestionIndex, setChosenSuggestionIndex] = useState(0);
+  const [analyzedDistribution, setAnalyzedDistribution] = useState(null);
+  const [chartData, setChartData] = useState(null);
 
   const [rowsToProcess, setRowsToProcess] = useState(80);
   const [useMaxRows, setUseMaxRows] = useState(true);
@@ -79,6 +81,7 @@ export default function ProcessDatasetPanel({ selectedItems }) {
         res.suggestions = [res.suggestion];
       }
       setAnalysis(res);
+      setAnalyzedDistribution({ url: chosen.url, format: isIne ? "" : chosen.format });
       setChosenSuggestionIndex(0);
       // Reset tipo de gráfico al analizar nuevo dataset (opcional)
       setChartType("line");
@@ -91,6 +94,19 @@ export default function ProcessDatasetPanel({ selectedItems }) {
     }
   };
 
+  // Gráficos agregados y reducidos en el servidor sobre el recurso completo;
+  // si falla, SimpleChart sigue pintando a partir de las filas de muestra.
+  useEffect(() => {
+    const suggestion = (Array.isArray(analysis?.suggestions) ? analysis.suggestions : [])[chosenSuggestionIndex];
+    setChartData(null);
+    if (!analyzedDistribution || !["timeseries", "barchart", "piechart", "choropleth"].includes(suggestion?.type)) return;
+    let cancelled = false;
+    chart_data(analyzedDistribution.url, analyzedDistribution.format, suggestion)
+      .then((res) => { if (!cancelled && res.success) setChartData(res); })
+      .catch((e) => console.warn("chart-data:", e.message));
+    return () => { cancelled = true; };
+  }, [analysis, analyzedDistribution, chosenSuggestionIndex]);
+
   return (
     <div style={{ padding: 12, borderRadius: 6, background: "#222", color: "#fff" }}>
       <h4 style={{ marginTop: 0 }}>Procesar dataset seleccionado</h4>
@@ -241,6 +257,7 @@ export default function ProcessDatasetPanel({ selectedItems }) {
                   sampleRows={Array.isArray(analysis.sample_rows) ? analysis.sample_rows : []}
                   labels={analysis.labels || []}
                   series={analysis.series || []}
+                  chartData={chartData}
                   chartType={chartType}
                 />
               </div>
@@ -174,16 +174,19 @@ const [funcionalidadSeleccionada, setFuncionalidadSeleccionada] = useState("Ver
       if (!item.distribution) return [];
       const distUrls = Array.isArray(item.distribution) ? item.distribution : [item.distribution];
 
-      let results = [];
-      for (const url of distUrls) {
-        try {
-          const data = await resolve_distribution(url);
-          results = results.concat(data.files);
-        } catch (e) {
-          console.error("Error resolviendo distribución", e);
-        }
+      // Una sola llamada: el backend resuelve todas las páginas en paralelo (y las cachea)
+      try {
+        const response = await fetch("/api/distribution/resolve/", {
+          method: "POST",
+          headers: { "Content-Type": "application/json" },
+          body: JSON.stringify({ urls: distUrls }),
+        });
+        const data = await response.json();
+        return data.files || [];
+      } catch (e) {
+        console.error("Error resolviendo distribuciones", e);
+        return [];
       }
-      return results;
     };
 
     useEffect(() => {